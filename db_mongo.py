@@ -4,8 +4,9 @@ import os
 import re
 import json
 import hashlib
+import threading
 
-from pymongo import MongoClient, ReturnDocument, ASCENDING
+from pymongo import MongoClient, ReturnDocument, ASCENDING, UpdateOne
 from pymongo.errors import ConfigurationError
 from pymongo.database import Database
 from settings import settings
@@ -28,7 +29,12 @@ def _create_client() -> MongoClient:
         if not mongomock:
             raise RuntimeError("mongomock is required for mongomock:// URIs")
         return mongomock.MongoClient()
-    return MongoClient(uri)
+    listeners = []
+    if settings.db_metrics_enabled:
+        from server.src.modules.db_metrics import MongoCommandListener
+
+        listeners.append(MongoCommandListener(track_bytes=settings.db_metrics_track_bytes))
+    return MongoClient(uri, event_listeners=listeners)
 
 
 @lru_cache
@@ -52,10 +58,62 @@ def get_col(name: str):
     return get_db()[name]
 
 
+class LazyCollection:
+    """
+    Module-level collection handle that opens the client on first use, so
+    importing a module does not connect to Mongo.
+    """
+
+    __slots__ = ("_name", "_col")
+
+    def __init__(self, name: str):
+        self._name = name
+        self._col = None
+
+    def resolve(self):
+        if self._col is None:
+            self._col = get_col(self._name)
+        return self._col
+
+    def __getattr__(self, attr: str):
+        return getattr(self.resolve(), attr)
+
+    def __repr__(self) -> str:
+        return f"LazyCollection({self._name!r})"
+
+
+def lazy_col(name: str) -> LazyCollection:
+    return LazyCollection(name)
+
+
+def is_mongomock() -> bool:
+    return _normalize_mongodb_uri(settings.mongodb_uri).startswith("mongomock://")
+
+
+def bulk_update(col, updates: List[tuple[dict, dict]], upsert: bool = False) -> int:
+    """
+    Apply (filter, update) pairs with one unordered bulk_write.
+    mongomock cannot consume pymongo's UpdateOne, so it gets one update_one per pair.
+    """
+    if not updates:
+        return 0
+    if is_mongomock():
+        for flt, upd in updates:
+            col.update_one(flt, upd, upsert=upsert)
+        return len(updates)
+    col.bulk_write([UpdateOne(flt, upd, upsert=upsert) for flt, upd in updates], ordered=False)
+    return len(updates)
+
+
 def norm_key(value: str) -> str:
     return re.sub(r"\s+", " ", (value or "").strip()).lower()
 
 
+# Bump whenever ensure_indexes() changes: startup skips index setup while the
+# version stamped in `schema_meta` matches (see startup_tasks.py).
+SCHEMA_VERSION = 5
+
+
 def ensure_indexes() -> None:
     db = get_db()
     db.spells.create_index("id", unique=True)
@@ -64,7 +122,11 @@ def ensure_indexes() -> None:
     db.effects.create_index("id", unique=True)
     db.schools.create_index("id", unique=True)
     db.users.create_index("username", unique=True)
-    db.spells.create_index("name_key")
+    # Shared sessions (session_store.MongoSessionStore): TTL-pruned at expires_at.
+    db.sessions.create_index("expires_at", expireAfterSeconds=0)
+    db.sessions.create_index("username")
+    db.spells.create_index("school_ids")
+    db.spells.create_index([("name_key", ASCENDING), ("id", ASCENDING)])
     db.effects.create_index("name_key")
     db.schools.create_index("name_key")
     db.tools.create_index("id", unique=True)
@@ -89,8 +151,11 @@ def ensure_indexes() -> None:
             "school": {"$exists": True, "$type": "string"},
         },
     )
+    db.jobs.create_index("id", unique=True)
+    db.jobs.create_index([("status", ASCENDING), ("heartbeat_at", ASCENDING)])
+    db.job_output.create_index([("job_id", ASCENDING), ("_id", ASCENDING)])
     db.campaign_chat.create_index("id", unique=True)
-    db.campaign_chat.create_index([("campaign_id", ASCENDING), ("ts", ASCENDING)])
+    db.campaign_chat.create_index([("campaign_id", ASCENDING), ("ts", ASCENDING), ("id", ASCENDING)])
     db.campaign_combats.create_index("id", unique=True)
     db.campaign_combats.create_index("campaign_id")
     db.economy_entities_0_3_5.create_index("id", unique=True)
@@ -100,38 +165,120 @@ def ensure_indexes() -> None:
     db.economy_item_meta_0_3_5.create_index([("source_kind", ASCENDING), ("source_id", ASCENDING)], unique=True)
 
 
+# Sequences whose ids nobody reads or types in, so gaps left by unused blocks
+# are harmless. Everything else defaults to ID_BLOCK_SIZE (1: dense ids).
+HOT_SEQUENCE_BLOCKS = {
+    "combat_part": 50,
+    "invitem": 50,
+    "invupg": 50,
+    "container": 20,
+}
+
+
+def _parse_block_sizes(raw: str) -> dict[str, int]:
+    sizes = {}
+    for part in (raw or "").split(","):
+        name, _, size = part.partition("=")
+        try:
+            sizes[name.strip()] = max(1, int(size))
+        except ValueError:
+            continue
+    return sizes
+
+
+class IdBlockAllocator:
+    """
+    hi/lo allocator over the `counters` collection. Each `$inc` reserves a
+    block of ids for this process; `seq` stays the persisted high-water mark,
+    so other processes never see an id twice. Ids from a block that is not
+    used up before the process exits are skipped.
+    """
+
+    def __init__(self, default_size: int = 1, sizes: dict[str, int] | None = None):
+        self.default_size = max(1, default_size)
+        self.sizes = dict(sizes or {})
+        self._blocks: dict[str, tuple[int, int]] = {}  # name -> (next, last)
+        self._lock = threading.Lock()
+
+    def block_size(self, sequence_name: str) -> int:
+        return self.sizes.get(sequence_name, self.default_size)
+
+    def _reserve(self, sequence_name: str, count: int) -> int:
+        doc = get_col("counters").find_one_and_update(
+            {"_id": sequence_name},
+            {"$inc": {"seq": count}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        return int(doc["seq"])
+
+    def take(self, sequence_name: str, n: int = 1) -> list[int]:
+        """`n` ascending ids, with at most one counter round-trip."""
+        if n <= 0:
+            return []
+        with self._lock:
+            nxt, last = self._blocks.get(sequence_name, (1, 0))
+            ids = list(range(nxt, min(last, nxt + n - 1) + 1))
+            missing = n - len(ids)
+            if missing:
+                size = max(missing, self.block_size(sequence_name))
+                hi = self._reserve(sequence_name, size)
+                lo = hi - size + 1
+                ids.extend(range(lo, lo + missing))
+                nxt, last = lo + missing, hi
+            else:
+                nxt += n
+            self._blocks[sequence_name] = (nxt, last)
+        return ids
+
+    def reset(self) -> None:
+        """Forget reserved blocks (after counters were raised or dropped)."""
+        with self._lock:
+            self._blocks.clear()
+
+
+ID_ALLOCATOR = IdBlockAllocator(
+    settings.id_block_size,
+    {**HOT_SEQUENCE_BLOCKS, **_parse_block_sizes(settings.id_block_sizes)},
+)
+
+
 def next_id_str(sequence_name: str, padding: int = 4) -> str:
-    doc = get_col("counters").find_one_and_update(
-        {"_id": sequence_name},
-        {"$inc": {"seq": 1}},
-        upsert=True,
-        return_document=ReturnDocument.AFTER,
-    )
-    return str(doc["seq"]).zfill(padding)
+    return str(ID_ALLOCATOR.take(sequence_name)[0]).zfill(padding)
+
+
+def next_ids(sequence_name: str, n: int, padding: int = 4) -> list[str]:
+    """Batch form of next_id_str for bulk inserts."""
+    return [str(i).zfill(padding) for i in ID_ALLOCATOR.take(sequence_name, n)]
+
+
+def _max_numeric_id(col) -> int:
+    """
+    Highest numeric `id` in a collection, computed server-side. mongomock
+    lacks $convert, so it gets the equivalent Python scan.
+    """
+    if is_mongomock():
+        max_id = 0
+        for d in col.find({}, {"id": 1, "_id": 0}):
+            raw = str(d.get("id") or "")
+            if re.fullmatch(r"\s*\d+\s*", raw):
+                max_id = max(max_id, int(raw))
+        return max_id
+    pipeline = [
+        {"$group": {"_id": None, "max": {"$max": {"$convert": {"input": "$id", "to": "long", "onError": None, "onNull": None}}}}},
+    ]
+    rows = list(col.aggregate(pipeline))
+    return int(rows[0].get("max") or 0) if rows else 0
 
 
 def sync_counters() -> None:
+    """Raise each id counter to at least the highest id already stored."""
     db = get_db()
     for coll in ("effects", "schools", "spells"):
-        max_id = 0
-        for d in db[coll].find({}, {"id": 1, "_id": 0}):
-            try:
-                max_id = max(max_id, int(str(d.get("id", "0")).lstrip("0") or "0"))
-            except Exception:
-                pass
+        max_id = _max_numeric_id(db[coll])
         db.counters.update_one({"_id": coll}, {"$max": {"seq": max_id}}, upsert=True)
-    max_chat = 0
-    for d in db.campaign_chat.find({}, {"id": 1, "_id": 0}):
-        raw = str(d.get("id") or "")
-        match = re.search(r"(\d+)$", raw)
-        if not match:
-            continue
-        try:
-            max_chat = max(max_chat, int(match.group(1)))
-        except Exception:
-            pass
-    if max_chat:
-        db.counters.update_one({"_id": "campaign_chat"}, {"$max": {"seq": max_chat}}, upsert=True)
+    # A block reserved before the sync may sit below ids that were imported.
+    ID_ALLOCATOR.reset()
 
 
 def spell_sig(activation: str, range_val: int, aoe: str, duration: int, effect_ids: List[str]) -> str:
@@ -0,0 +1,306 @@
+# scripts/bench_endpoints.py
+"""
+Latency baseline for the hot endpoints, run in-process through
+httpx.ASGITransport against seeded synthetic data.
+
+    python scripts/bench_endpoints.py [--scale 1.0] [--repeat 20] [--out bench_endpoints.json]
+    python scripts/bench_endpoints.py --scale 0.05 --baseline bench_endpoints.json   # CI smoke
+
+At --scale 1 the dataset is 50k spells, 5k effects, 1k characters, inventories
+of 500 items, 10k wiki pages with 3 revisions each and campaigns with 10k chat
+messages. The default target is mongomock; pass --mongodb-uri for a local
+mongod (the database name must contain "bench", it is dropped and reseeded).
+
+Results are written as JSON with p50/p95 per scenario. With --baseline, a
+scenario whose p95 grew by more than --max-regression (and by more than
+--min-delta-ms) makes the script exit with status 1.
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+SEED = 1337
+ITEMS_PER_INVENTORY = 500
+REVISIONS_PER_PAGE = 3
+BENCH_TOKEN = "bench-token"
+BENCH_USER = "bench"
+
+ACTIVATIONS = ["Action", "Bonus Action", "Reaction", "Ritual", "Special Action"]
+AOES = ["A Square", "Cone (3)", "Line (5)", "Sphere (2)"]
+STATS = ("str", "dex", "con", "int", "wis", "cha")
+
+
+def _parse_args() -> argparse.Namespace:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--scale", type=float, default=1.0, help="multiplier for dataset sizes (items per inventory stay 500)")
+    ap.add_argument("--repeat", type=int, default=20, help="timed requests per scenario")
+    ap.add_argument("--warmup", type=int, default=2, help="untimed requests per scenario")
+    ap.add_argument("--only", action="append", default=[], help="run only scenarios whose name contains this (repeatable)")
+    ap.add_argument("--mongodb-uri", default="mongomock://localhost")
+    ap.add_argument("--out", default="bench_endpoints.json")
+    ap.add_argument("--baseline", help="previous results JSON to compare against")
+    ap.add_argument("--max-regression", type=float, default=0.25, help="allowed relative p95 growth")
+    ap.add_argument("--min-delta-ms", type=float, default=2.0, help="ignore p95 growth below this many ms")
+    return ap.parse_args()
+
+
+def _n(base: int, scale: float) -> int:
+    return max(1, int(base * scale))
+
+
+def _iso(dt: datetime.datetime) -> str:
+    return dt.isoformat() + "Z"
+
+
+def seed(db, scale: float) -> dict:
+    """Insert the synthetic dataset and return the ids the scenarios need."""
+    from db_mongo import spell_sig
+    rng = random.Random(SEED)
+    epoch = datetime.datetime(2024, 1, 1)
+
+    schools = [
+        {"id": f"{i:04d}", "name": f"School {i}", "name_key": f"school {i}", "school_type": rng.choice(["Simple", "Complex"]),
+         "range_type": rng.choice("ABC"), "aoe_type": rng.choice("ABC"), "upgrade": i % 6 == 0}
+        for i in range(1, 13)
+    ]
+    db.schools.insert_many(schools)
+
+    n_effects = _n(5000, scale)
+    db.effects.insert_many([
+        {"id": f"{i:04d}", "name": f"Effect {i}", "name_key": f"effect {i}", "school": schools[i % len(schools)]["id"],
+         "mp_cost": rng.randint(1, 12), "en_cost": rng.randint(0, 4), "description": "Deals elemental damage. " * 3}
+        for i in range(1, n_effects + 1)
+    ])
+
+    n_spells = _n(50000, scale)
+    batch = []
+    for i in range(1, n_spells + 1):
+        picked = rng.sample(schools, 2)
+        # Spell ids double as a salt so every signature stays unique.
+        spell = {
+            "activation": rng.choice(ACTIVATIONS), "range": rng.randint(0, 10), "aoe": rng.choice(AOES),
+            "duration": rng.randint(1, 6), "effects": [f"{rng.randint(1, n_effects):04d}" for _ in range(rng.randint(1, 4))] + [f"{i:06d}"],
+        }
+        batch.append({
+            **spell, "id": f"{i:04d}", "name": f"Spell {i}", "name_key": f"spell {i}",
+            "sig_v1": spell_sig(spell["activation"], spell["range"], spell["aoe"], spell["duration"], spell["effects"]),
+            "mp_cost": rng.randint(5, 60), "en_cost": rng.randint(0, 8), "category": rng.choice(["Novice", "Adept", "Master"]),
+            "status": rng.choice(["green", "green", "yellow"]), "creator": f"user{i % 50}",
+            "school_ids": [s["id"] for s in picked], "schools": [{"id": s["id"], "name": s["name"]} for s in picked],
+            "description": "A lance of storm-fire arcs between targets. " * 2,
+        })
+        if len(batch) == 5000:
+            db.spells.insert_many(batch)
+            batch = []
+    if batch:
+        db.spells.insert_many(batch)
+
+    db.abilities.insert_many([
+        {"id": f"{i:04d}", "name": f"Ability {i}", "type": "passive",
+         "passive": {"modifiers": [{"target": f"{rng.choice(STATS)}.mod", "mode": "add", "value": rng.randint(1, 2)}]}}
+        for i in range(1, 301)
+    ])
+    n_characters = _n(1000, scale)
+    db.characters.insert_many([
+        {"id": f"{i:04d}", "name": f"Hero {i}", "name_key": f"hero {i}", "owner": BENCH_USER if i == 1 else f"user{i % 50}",
+         "stats": {k: {"base": rng.randint(8, 16), "mod": 0} for k in STATS},
+         "abilities": {kind: [{"id": f"{rng.randint(1, 300):04d}"} for _ in range(8)] for kind in ("archetype", "passive", "active")}}
+        for i in range(1, n_characters + 1)
+    ])
+
+    catalog = {"equipment": db.equipment, "objects": db.objects, "tools": db.tools}
+    for kind, col in catalog.items():
+        col.insert_many([
+            {"id": f"{i:04d}", "name": f"{kind.title()} {i}", "name_key": f"{kind} {i}", "category": "gear",
+             "enc": round(rng.uniform(0, 3), 1), "price": rng.randint(1, 500), "tags": ["bench"], "description": "Useful."}
+            for i in range(1, 301)
+        ])
+    kinds = {"equipment": "equipment", "objects": "object", "tools": "tool"}
+    n_inventories = _n(20, scale)
+    db.inventories.insert_many([
+        {"id": f"{i:04d}", "name": f"Pack {i}", "owner": BENCH_USER, "containers": [], "wallet": {},
+         "items": [
+             {"item_id": f"it_{i}_{j}", "kind": kinds[col], "ref_id": f"{rng.randint(1, 300):04d}", "qty": rng.randint(1, 5)}
+             for j, col in enumerate(rng.choice(list(kinds)) for _ in range(ITEMS_PER_INVENTORY))
+         ]}
+        for i in range(1, n_inventories + 1)
+    ])
+
+    n_pages = _n(10000, scale)
+    pages, contents, revisions = [], [], []
+    for i in range(1, n_pages + 1):
+        page_id = f"page-{i:06d}"
+        updated = epoch + datetime.timedelta(minutes=i)
+        doc_json = {"type": "doc", "content": [{"type": "paragraph", "content": [{"type": "text", "text": f"Lore entry {i}. " * 20}]}]}
+        pages.append({
+            "id": page_id, "title": f"Page {i}", "slug": f"page-{i}", "category_id": "general", "entity_type": None,
+            "template_id": None, "fields": {}, "summary": None, "tags": ["bench"], "status": "published",
+            "created_by": BENCH_USER, "updated_by": BENCH_USER, "version": REVISIONS_PER_PAGE, "acl_override": False,
+            "acl": {"view_roles": [], "edit_roles": []}, "editor_usernames": [], "created_at": epoch, "updated_at": updated,
+        })
+        contents.append({"page_id": page_id, "doc_json": doc_json, "plain_text": f"Lore entry {i}. " * 20,
+                         "toc_snapshot": [], "version": REVISIONS_PER_PAGE, "updated_at": updated})
+        revisions.extend(
+            {"id": f"{page_id}-r{v}", "page_id": page_id, "version": v, "doc_json": doc_json, "title": f"Page {i}",
+             "slug": f"page-{i}", "saved_by": BENCH_USER, "saved_at": updated}
+            for v in range(1, REVISIONS_PER_PAGE + 1)
+        )
+    db.wiki_pages.insert_many(pages)
+    db.wiki_page_content.insert_many(contents)
+    db.wiki_page_revisions.insert_many(revisions)
+
+    n_campaigns = _n(5, scale)
+    n_messages = _n(10000, scale)
+    db.campaigns.insert_many([
+        {"id": f"{c:04d}", "name": f"Campaign {c}", "owner": BENCH_USER, "members": [f"user{m}" for m in range(6)]}
+        for c in range(1, n_campaigns + 1)
+    ])
+    start_ms = int(epoch.timestamp() * 1000)
+    for c in range(1, n_campaigns + 1):
+        db.campaign_chat.insert_many([
+            {"id": f"msg_{c:02d}{m:07d}", "campaign_id": f"{c:04d}", "ts": start_ms + m * 1000, "visibility": "public",
+             "type": "message", "text": f"Message {m} " * 5, "lines": [], "user": f"user{m % 6}", "character_id": "",
+             "character_name": "", "character_avatar": "", "created_at": _iso(epoch + datetime.timedelta(seconds=m))}
+            for m in range(n_messages)
+        ])
+
+    return {
+        "effects": [f"{rng.randint(1, n_effects):04d}" for _ in range(4)],
+        "inventory": "0001",
+        "character": "0001",
+        "campaign": "0001",
+    }
+
+
+def scenarios(ids: dict) -> list[tuple[str, str, str, dict | None]]:
+    costs = {"activation": "Action", "range": 3, "aoe": "Cone (3)", "duration": 2, "effects": ids["effects"]}
+    return [
+        ("costs", "POST", "/costs", costs),
+        ("spells_page", "GET", "/spells?limit=100&page=3", None),
+        ("spells_cursor", "GET", "/spells?cursor=&limit=100", None),
+        ("inventory_500_items", "GET", f"/inventories/{ids['inventory']}", None),
+        ("character_computed", "GET", f"/characters/{ids['character']}/computed", None),
+        ("wiki_pages", "GET", "/api/wiki/pages?limit=25", None),
+        ("wiki_pages_search", "GET", "/api/wiki/pages?query=Page%2012&limit=25", None),
+        ("chat_history", "GET", f"/campaigns/{ids['campaign']}/chat?limit=200", None),
+    ]
+
+
+def _percentile(samples: list[float], pct: float) -> float:
+    ordered = sorted(samples)
+    rank = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[rank]
+
+
+async def run(app, plan, repeat: int, warmup: int) -> dict:
+    from httpx import ASGITransport, AsyncClient
+
+    results = {}
+    headers = {"Authorization": f"Bearer {BENCH_TOKEN}", "Accept-Encoding": "identity"}
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://bench", headers=headers, timeout=None) as client:
+        for name, method, path, body in plan:
+            samples, size, status = [], 0, 0
+            for i in range(warmup + repeat):
+                t0 = time.perf_counter()
+                resp = await client.request(method, path, json=body)
+                elapsed = (time.perf_counter() - t0) * 1000
+                status, size = resp.status_code, len(resp.content)
+                if status >= 400:
+                    raise SystemExit(f"{name}: {method} {path} returned {status}: {resp.text[:200]}")
+                if i >= warmup:
+                    samples.append(elapsed)
+            results[name] = {
+                "method": method, "path": path, "status": status, "bytes": size, "n": len(samples),
+                "p50_ms": round(_percentile(samples, 50), 3), "p95_ms": round(_percentile(samples, 95), 3),
+                "mean_ms": round(sum(samples) / len(samples), 3),
+                "min_ms": round(min(samples), 3), "max_ms": round(max(samples), 3),
+            }
+            r = results[name]
+            print(f"{name:<22}{r['p50_ms']:>10.1f}{r['p95_ms']:>10.1f}{r['bytes'] / 1024:>10.0f}")
+    return results
+
+
+def compare(results: dict, baseline: dict, max_regression: float, min_delta_ms: float) -> list[str]:
+    failures = []
+    for name, row in results.items():
+        old = (baseline.get("results") or {}).get(name)
+        if not old:
+            continue
+        delta = row["p95_ms"] - old["p95_ms"]
+        if delta > min_delta_ms and row["p95_ms"] > old["p95_ms"] * (1 + max_regression):
+            failures.append(f"{name}: p95 {old['p95_ms']:.1f} -> {row['p95_ms']:.1f} ms")
+    return failures
+
+
+def _git_rev() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BASE_DIR, capture_output=True, text=True).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def main() -> None:
+    args = _parse_args()
+    os.environ["MONGODB_URI"] = args.mongodb_uri
+    os.environ.setdefault("DB_NAME", "NoeBench")
+    os.environ.setdefault("WIKI_ENABLED", "true")
+    os.environ.setdefault("CORS_ORIGINS", "http://localhost")
+
+    from db_mongo import ensure_indexes, get_db, is_mongomock  # noqa: E402
+    from main import app  # noqa: E402
+    from server.src.modules.session_store import get_session_store  # noqa: E402
+    from server.src.modules.wiki_repo import ensure_wiki_collections_and_indexes  # noqa: E402
+
+    db = get_db()
+    if not is_mongomock() and "bench" not in db.name.lower():
+        raise SystemExit(f"refusing to drop database {db.name!r}: use a database name containing 'bench'")
+    for name in db.list_collection_names():
+        db.drop_collection(name)
+
+    t0 = time.perf_counter()
+    # Bulk load first, index after: mongomock checks unique indexes per insert
+    # against every stored document, and mongod builds indexes faster this way.
+    ids = seed(db, args.scale)
+    ensure_indexes()
+    ensure_wiki_collections_and_indexes()
+    seed_s = time.perf_counter() - t0
+    get_session_store().create(BENCH_TOKEN, BENCH_USER, "admin")
+    print(f"seeded in {seed_s:.1f}s (scale {args.scale}, {args.mongodb_uri.split('://')[0]})")
+
+    plan = [s for s in scenarios(ids) if not args.only or any(key in s[0] for key in args.only)]
+    print(f"{'scenario':<22}{'p50 ms':>10}{'p95 ms':>10}{'KiB':>10}")
+    results = asyncio.run(run(app, plan, args.repeat, args.warmup))
+
+    report = {
+        "meta": {
+            "created_at": _iso(datetime.datetime.utcnow()), "git": _git_rev(), "python": platform.python_version(),
+            "backend": "mongomock" if is_mongomock() else "mongod", "scale": args.scale, "repeat": args.repeat,
+            "warmup": args.warmup, "seed": SEED, "seed_seconds": round(seed_s, 2),
+        },
+        "results": results,
+    }
+    with open(args.out, "w", encoding="utf-8") as fh:
+        json.dump(report, fh, indent=2)
+    print(f"wrote {args.out}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as fh:
+            failures = compare(results, json.load(fh), args.max_regression, args.min_delta_ms)
+        for line in failures:
+            print(f"REGRESSION {line}")
+        if failures:
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
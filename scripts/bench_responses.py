@@ -0,0 +1,102 @@
+# scripts/bench_responses.py
+"""
+Serialization time and bytes on the wire for large list payloads, before
+(FastAPI default: jsonable_encoder + JSONResponse, uncompressed) and after
+(FastJSONResponse + br/gzip).
+
+    python scripts/bench_responses.py [--rows 5000] [--repeat 5]
+"""
+import argparse
+import datetime
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("MONGODB_URI", "mongomock://localhost")
+
+from bson import ObjectId  # noqa: E402
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from starlette.responses import JSONResponse  # noqa: E402
+
+from server.src.modules.compression import brotli, compress_bytes  # noqa: E402
+from server.src.modules.fast_json import FastJSONResponse  # noqa: E402
+
+
+def ability(i: int) -> dict:
+    return {
+        "id": f"{i:04d}", "name": f"Ability {i}", "type": "passive", "source_category": "archetype",
+        "source_ref": f"arch_{i % 40}", "tags": ["phb", "combat"],
+        "description": "Gain advantage on the next attack roll after a successful parry. " * 3,
+        "passive": {"modifiers": [{"target": "skill.athletics", "value": 1}, {"target": "ac", "value": i % 3}]},
+        "created_at": datetime.datetime(2024, 1, 1) + datetime.timedelta(minutes=i),
+    }
+
+
+def spell(i: int) -> dict:
+    return {
+        "id": f"{i:04d}", "name": f"Spell {i}", "activation": "Action", "range": i % 10, "aoe": "Cone (3)",
+        "duration": 1 + i % 6, "effects": [f"{e:04d}" for e in range(i % 5 + 1)], "mp_cost": 10 + i % 40,
+        "en_cost": i % 7, "category": "Adept", "status": "green", "school_ids": ["0001", "0002"],
+        "schools": [{"id": "0001", "name": "Fire"}, {"id": "0002", "name": "Storm"}],
+        "description": "A lance of storm-fire arcs between targets. " * 2, "sig_v1": "%064x" % i,
+    }
+
+
+def character(i: int) -> dict:
+    return {
+        "id": f"{i:04d}", "_oid": ObjectId(), "name": f"Hero {i}", "owner": f"user{i % 50}",
+        "stats": {k: {"base": 10 + i % 5, "mod": i % 3} for k in ("str", "dex", "con", "int", "wis", "cha")},
+        "abilities": [f"{a:04d}" for a in range(20)], "spells": [f"{s:04d}" for s in range(30)],
+        "notes": "Backstory. " * 40, "updated_at": datetime.datetime(2024, 6, 1),
+    }
+
+
+DATASETS = {
+    "abilities": ("abilities", ability),
+    "spells?limit=500": ("spells", spell),
+    "admin/characters": ("characters", character),
+}
+
+
+def _timed(fn, repeat: int) -> tuple[float, bytes]:
+    samples, out = [], b""
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn()
+        samples.append(time.perf_counter() - t0)
+    return statistics.median(samples) * 1000, out
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=5000)
+    ap.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args()
+
+    header = f"{'payload':<18}{'rows':>6}{'before ms':>11}{'after ms':>10}{'raw KiB':>10}{'gzip KiB':>10}{'br KiB':>9}{'gzip ms':>9}{'br ms':>8}"
+    print(header)
+    print("-" * len(header))
+    for label, (key, make) in DATASETS.items():
+        rows = args.rows if key != "spells" else min(args.rows, 500)
+        payload = {"status": "success", key: [make(i) for i in range(rows)]}
+        # Before: FastAPI's default path for a returned dict (ObjectId is not
+        # encodable there, so it is stringified up front for a fair comparison).
+        plain = {"status": "success", key: [{k: (str(v) if isinstance(v, ObjectId) else v) for k, v in d.items()} for d in payload[key]]}
+        before_ms, raw = _timed(lambda: JSONResponse(jsonable_encoder(plain)).body, args.repeat)
+        after_ms, fast = _timed(lambda: FastJSONResponse(payload).body, args.repeat)
+        gz_ms, gz = _timed(lambda: compress_bytes(fast, "gzip"), args.repeat)
+        if brotli is not None:
+            br_ms, br = _timed(lambda: compress_bytes(fast, "br"), args.repeat)
+            br_kib, br_ms_s = f"{len(br) / 1024:>9.0f}", f"{br_ms:>8.1f}"
+        else:
+            br_kib, br_ms_s = f"{'n/a':>9}", f"{'n/a':>8}"
+        print(
+            f"{label:<18}{rows:>6}{before_ms:>11.1f}{after_ms:>10.1f}{len(raw) / 1024:>10.0f}"
+            f"{len(gz) / 1024:>10.0f}{br_kib}{gz_ms:>9.1f}{br_ms_s}"
+        )
+
+
+if __name__ == "__main__":
+    main()
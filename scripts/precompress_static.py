@@ -0,0 +1,100 @@
+# scripts/precompress_static.py
+"""
+Build step: write `.br` and `.gz` siblings next to compressible static files so
+PrecompressedStaticFiles can serve them without compressing per request.
+
+    python scripts/precompress_static.py            # client/, assets/, frontend/*/dist
+    python scripts/precompress_static.py frontend/wiki/dist
+    python scripts/precompress_static.py --clean    # remove generated variants
+
+Variants that are already newer than their source are skipped, and variants
+that don't save at least 5% are not written, so reruns are cheap.
+"""
+import argparse
+import gzip
+import os
+import sys
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+DEFAULT_ROOTS = [BASE_DIR / "client", BASE_DIR / "assets", *sorted((BASE_DIR / "frontend").glob("*/dist"))]
+COMPRESSIBLE = {".js", ".mjs", ".css", ".html", ".svg", ".json", ".map", ".txt", ".xml", ".wasm"}
+VARIANT_SUFFIXES = (".br", ".gz")
+MIN_SIZE = 1024
+MIN_SAVING = 0.05
+
+
+def _encoders():
+    yield ".gz", lambda data: gzip.compress(data, compresslevel=9, mtime=0)
+    if brotli is not None:
+        yield ".br", lambda data: brotli.compress(data, quality=11)
+
+
+def _sources(root: Path):
+    for path in sorted(root.rglob("*")):
+        if path.is_file() and path.suffix.lower() in COMPRESSIBLE and path.stat().st_size >= MIN_SIZE:
+            yield path
+
+
+def precompress(root: Path) -> tuple[int, int, int]:
+    written = skipped = raw_bytes = 0
+    for path in _sources(root):
+        source_mtime = path.stat().st_mtime
+        data = None
+        for suffix, encode in _encoders():
+            target = path.with_name(path.name + suffix)
+            if target.exists() and target.stat().st_mtime >= source_mtime:
+                skipped += 1
+                continue
+            if data is None:
+                data = path.read_bytes()
+                raw_bytes += len(data)
+            packed = encode(data)
+            if len(packed) > len(data) * (1 - MIN_SAVING):
+                target.unlink(missing_ok=True)
+                continue
+            tmp = target.with_name(target.name + ".tmp")
+            tmp.write_bytes(packed)
+            os.replace(tmp, target)
+            written += 1
+    return written, skipped, raw_bytes
+
+
+def clean(root: Path) -> int:
+    removed = 0
+    for suffix in VARIANT_SUFFIXES:
+        for target in root.rglob(f"*{suffix}"):
+            source = target.with_name(target.name[: -len(suffix)])
+            if source.suffix.lower() in COMPRESSIBLE:
+                target.unlink()
+                removed += 1
+    return removed
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("roots", nargs="*", type=Path)
+    ap.add_argument("--clean", action="store_true")
+    args = ap.parse_args()
+
+    roots = [root.resolve() for root in args.roots] or DEFAULT_ROOTS
+    if brotli is None:
+        print("brotli is not installed; writing .gz variants only", file=sys.stderr)
+    for root in roots:
+        if not root.is_dir():
+            continue
+        if args.clean:
+            print(f"{root}: removed {clean(root)} variants")
+            continue
+        written, skipped, raw_bytes = precompress(root)
+        print(f"{root}: wrote {written} variants from {raw_bytes / 1024:.0f} KiB, {skipped} up to date")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,30 @@
+# scripts/startup_tasks.py
+"""
+Release step: apply index setup, counter sync and the wiki schema once per
+deploy, so app workers can boot with STARTUP_TASKS_MODE=skip (or keep the
+default `auto`, which then finds every stamp current).
+
+    DEPLOY_ID=$GIT_SHA python scripts/startup_tasks.py [--force]
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from server.src.modules.startup_tasks import run_startup_tasks  # noqa: E402
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--force", action="store_true", help="run every task even if its version stamp is current")
+    args = ap.parse_args()
+    outcome = run_startup_tasks(mode="always" if args.force else "auto")
+    for name, result in outcome.items():
+        print(f"{name:<16}{result}")
+    if "failed" in outcome.values():
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
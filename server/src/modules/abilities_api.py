@@ -0,0 +1,287 @@
+import datetime
+import re
+from typing import Any
+
+from fastapi import APIRouter, Body, Depends, HTTPException, Query, Request
+from fastapi.responses import JSONResponse
+
+from db_mongo import get_col, next_id_str, norm_key
+from server.src.modules.ability_helpers import _ability_doc_from_payload, _normalize_bool_payload
+from server.src.modules.authentification_helpers import require_auth
+from server.src.modules.avatar_helpers import _avatar_field
+from server.src.modules.db_async import json_body
+from server.src.modules.fast_json import FastJSONResponse
+from server.src.modules.item_helpers import _normalize_choice
+from server.src.modules.name_search import add_name_filter, touch_name_index
+from server.src.modules.submission_helpers import _create_pending_submission
+
+router = APIRouter()
+
+# -------------------- Abilities & Traits --------------------
+@router.post("/abilities")
+def create_ability(request: Request, payload: dict = Body(...)):
+    username, role = require_auth(request, roles=["user", "moderator", "admin"])
+    if role not in ("moderator", "admin"):
+        try:
+            doc = _ability_doc_from_payload(payload, username)
+        except HTTPException as e:
+            return JSONResponse({"status": "error", "message": str(e.detail)}, status_code=e.status_code)
+        pending = _create_pending_submission(username, role, "ability", doc)
+        return {"status": "pending", "submission": pending}
+
+    col = get_col("abilities")
+    try:
+        doc = _ability_doc_from_payload(payload, username)
+    except HTTPException as e:
+        return JSONResponse({"status": "error", "message": str(e.detail)}, status_code=e.status_code)
+
+    doc["id"] = next_id_str("abilities", padding=4)
+    col.insert_one(dict(doc))
+    touch_name_index("abilities", [doc["id"]])
+    doc.pop("_id", None)
+    return {"status":"success","ability": doc}
+
+@router.get("/abilities")
+def list_abilities(
+    request: Request,
+    name: str | None = Query(default=None),
+    source: str | None = Query(default=None),
+    source_ref: str | None = Query(default=None),
+    archetype: str | None = Query(default=None),
+    typ: str | None = Query(default=None),
+    tags: str | None = Query(default=None),
+    skill: str | None = Query(default=None),
+):
+    col = get_col("abilities")
+    q: dict = {}
+    if name:   add_name_filter(q, "abilities", name)
+    if source: q["source_category"] = {"$regex": source, "$options": "i"}
+    ref = source_ref or archetype
+    if ref:    q["source_ref"] = {"$regex": ref, "$options": "i"}
+    if typ:    q["type"] = {"$regex": typ, "$options": "i"}
+    if tags:
+        raw = [t.strip() for t in tags.split(",") if t.strip()]
+        if raw:
+            regexes = [re.compile(rf"^{re.escape(t)}$", re.IGNORECASE) for t in raw]
+            q["tags"] = {"$in": regexes}
+    if skill:
+        q["passive.modifiers.target"] = {"$regex": skill, "$options": "i"}
+    docs = list(col.find(q, {"_id": 0}))
+    docs.sort(key=lambda d: d.get("name","").lower())
+    return FastJSONResponse({"status":"success","abilities": docs})
+
+# ---- define bulk BEFORE the /{aid} route (also add trailing-slash twin) ----
+@router.get("/abilities/bulk")
+@router.get("/abilities/bulk/")
+def bulk_abilities(
+    request: Request,
+    ids: str = Query(..., description="Comma-separated ability IDs")
+):
+    id_list = [s.strip() for s in (ids or "").split(",") if s.strip()]
+    if not id_list:
+        return {"status":"success","abilities": []}
+    col = get_col("abilities")
+    docs = list(col.find({"id": {"$in": id_list}}, {"_id": 0}))
+    idx = {d["id"]: d for d in docs}
+    ordered = [idx[i] for i in id_list if i in idx]
+    return {"status":"success","abilities": ordered}
+
+@router.get("/abilities/{aid}")
+def get_ability(aid: str, request: Request):
+    doc = get_col("abilities").find_one({"id": aid}, {"_id": 0})
+    if not doc:
+        raise HTTPException(status_code=404, detail="Not found")
+    return {"status":"success","ability": doc}
+
+@router.put("/abilities/{aid}")
+def update_ability(aid: str, request: Request, payload: dict = Body(...)):
+    username, role = require_auth(request, roles=["moderator", "admin"])
+    col = get_col("abilities")
+
+    existing = col.find_one({"id": aid})
+    if not existing:
+        raise HTTPException(404, "Ability not found")
+
+    name = (payload.get("name") or existing.get("name") or "Unnamed Ability").strip()
+    if not name:
+        return JSONResponse({"status":"error","message":"Name is required"}, status_code=400)
+
+    ab_type = (payload.get("type") or existing.get("type") or "passive").strip().lower()
+    if ab_type not in ("active","passive","mixed"):
+        return JSONResponse({"status":"error","message":"Invalid type"}, status_code=400)
+
+    source_category = (payload.get("source_category") or existing.get("source_category") or "Other").strip()
+    source_ref      = (payload.get("source_ref") or existing.get("source_ref") or "").strip()
+    tags = [str(t).strip() for t in (payload.get("tags") or existing.get("tags") or []) if str(t).strip()]
+    description = (payload.get("description") or existing.get("description") or "").strip()
+
+    active_in  = payload.get("active")  or existing.get("active")  or {}
+    passive_in = payload.get("passive") or existing.get("passive") or {}
+    archetype_version = int(payload.get("archetype_version") or existing.get("archetype_version") or 1)
+    archetype_original_rank = int(payload.get("archetype_original_rank") or existing.get("archetype_original_rank") or 0)
+    archetype_replaces = (payload.get("archetype_replaces") or existing.get("archetype_replaces") or "").strip()
+    allow_multiple = _normalize_bool_payload(payload.get("allow_multiple", existing.get("allow_multiple", False)))
+
+    active_block = None
+    if ab_type in ("active","mixed"):
+        activation = (active_in.get("activation") or "Action").strip()
+        try:
+            rng = int(active_in.get("range") or 0)
+        except Exception:
+            return JSONResponse({"status":"error","message":"Active range must be an integer"}, status_code=400)
+        aoe = (active_in.get("aoe") or "").strip()
+        costs_in = active_in.get("costs") or {}
+        def _num(k,d=0):
+            v = costs_in.get(k,d)
+            try: return int(v or 0)
+            except Exception: raise ValueError(k)
+        try:
+            costs = {"HP":_num("HP"),"EN":_num("EN"),"MP":_num("MP"),"FO":_num("FO"),"MO":_num("MO"),"TX":_num("TX")}
+        except ValueError as bad:
+            return JSONResponse({"status":"error","message":f"Cost {bad} must be an integer"}, status_code=400)
+        costs["other_label"] = (costs_in.get("other_label") or "").strip()
+        try: costs["other_value"] = int(costs_in.get("other_value") or 0)
+        except Exception: costs["other_value"] = 0
+        costs_active = bool(active_in.get("costs_active") or active_in.get("cost_active") or existing.get("active", {}).get("costs_active") or False)
+
+        rolls_in = active_in.get("rolls") or existing.get("active", {}).get("rolls") or []
+        rolls = []
+        if isinstance(rolls_in, list):
+            for r in rolls_in:
+                if not isinstance(r, dict):
+                    continue
+                expr = (r.get("expr") or r.get("expression") or "").strip()
+                if not expr:
+                    continue
+                kind = (r.get("kind") or r.get("reason") or "custom").strip().lower()
+                damage_type = (r.get("damage_type") or r.get("damageType") or "").strip()
+                label = (r.get("label") or r.get("custom_label") or "").strip()
+                rolls.append({
+                    "expr": expr,
+                    "kind": kind,
+                    "damage_type": damage_type,
+                    "label": label,
+                })
+        requires_skill_roll = bool(active_in.get("requires_skill_roll") or active_in.get("skill_roll") or existing.get("active", {}).get("requires_skill_roll") or False)
+        skill_roll_in = active_in.get("skill_roll_skills")
+        if skill_roll_in is None:
+            skill_roll_in = existing.get("active", {}).get("skill_roll_skills") or existing.get("active", {}).get("roll_skills") or []
+        skill_roll_skills = []
+        if isinstance(skill_roll_in, list):
+            skill_roll_skills = [str(s).strip() for s in skill_roll_in if str(s).strip()]
+        active_block = {
+            "activation": activation,
+            "range": rng,
+            "aoe": aoe,
+            "costs": costs,
+            "costs_active": costs_active,
+            "rolls": rolls,
+            "requires_skill_roll": requires_skill_roll,
+            "skill_roll_skills": skill_roll_skills,
+        }
+
+    passive_block = None
+    if ab_type in ("passive","mixed"):
+        pdesc = (passive_in.get("description") or "").strip()
+        mods_in = passive_in.get("modifiers") or []
+        modifiers = []
+        for m in mods_in:
+            if not isinstance(m, dict):
+                continue
+            target = (m.get("target") or "").strip()
+            if not target: continue
+            mode = (m.get("mode") or "add").strip().lower()
+            if mode not in ("add","mul","set"): mode = "add"
+            try:
+                value = float(m.get("value") or 0)
+            except Exception:
+                return JSONResponse({"status":"error","message":f"Invalid modifier value for {target}"}, status_code=400)
+            note = (m.get("note") or "").strip()
+            choice = _normalize_choice(m.get("choice") if isinstance(m.get("choice"), dict) else None)
+            mod = {"target":target,"mode":mode,"value":value,"note":note}
+            try:
+                level_step = int(m.get("level_step") or 0)
+            except Exception:
+                level_step = 0
+            try:
+                level_increment = int(m.get("level_increment") or 1)
+            except Exception:
+                level_increment = 1
+            if level_step > 0:
+                mod["level_step"] = level_step
+                mod["level_increment"] = max(1, level_increment)
+            group = (m.get("group") or "").strip()
+            if group:
+                mod["group"] = group
+                try:
+                    gmax = int(m.get("group_max_choices") or m.get("group_max") or 1)
+                except Exception:
+                    gmax = 1
+                mod["group_max_choices"] = max(0, gmax)
+            if choice:
+                mod["choice"] = choice
+            modifiers.append(mod)
+        passive_block = {"description":pdesc,"modifiers":modifiers}
+
+    now = datetime.datetime.utcnow().isoformat()+"Z"
+    updated = {
+        "name": name,
+        "name_key": norm_key(name),
+        "type": ab_type,
+        "source_category": source_category,
+        "source_ref": source_ref,
+        "tags": tags,
+        "description": description,
+        "active": active_block,
+        "passive": passive_block,
+        "allow_multiple": allow_multiple,
+        "updated_at": now,
+        "archetype_version": archetype_version,
+        "archetype_original_rank": archetype_original_rank,
+        "archetype_replaces": archetype_replaces,
+    }
+    avatar_key, avatar_unset = _avatar_field(payload)
+    unset_fields = {}
+    if avatar_key:
+        updated["default_avatar"] = avatar_key
+    elif avatar_unset:
+        unset_fields["default_avatar"] = ""
+
+    update_ops: dict[str, Any] = {"$set": updated}
+    if unset_fields:
+        update_ops["$unset"] = unset_fields
+    col.update_one({"id": aid}, update_ops)
+    touch_name_index("abilities", [aid])
+    existing.update(updated)
+    for field in unset_fields:
+        existing.pop(field, None)
+    existing.pop("_id", None)
+    return {"status":"success","ability": existing}
+
+def _delete_ability_and_references(aid: str):
+    """Delete an ability and clean up common references on characters."""
+    col = get_col("abilities")
+    res = col.delete_one({"id": aid})
+    touch_name_index("abilities", [aid])
+    if res.deleted_count == 0:
+        raise HTTPException(404, "Ability not found")
+    # Remove from character ability arrays and clear related choices
+    chars = get_col("characters")
+    unset_field = {f"ability_choices.{aid}": ""}
+    chars.update_many({}, {"$pull": {"abilities": aid}, "$unset": unset_field})
+    return {"status": "success", "deleted": aid}
+
+@router.delete("/abilities/{aid}")
+def delete_ability(aid: str, request: Request):
+    username, role = require_auth(request, roles=["moderator", "admin"])
+    return _delete_ability_and_references(aid)
+
+@router.post("/abilities/delete")
+def delete_ability_fallback(request: Request, body: Any = Depends(json_body)):
+    username, role = require_auth(request, roles=["moderator", "admin"])
+    if body is None:
+        body = {}
+    aid = (body.get("id") or "").strip()
+    if not aid:
+        raise HTTPException(400, "id required")
+    return _delete_ability_and_references(aid)
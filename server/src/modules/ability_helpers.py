@@ -0,0 +1,170 @@
+from typing import Any
+
+from fastapi import HTTPException
+
+from db_mongo import norm_key
+from server.src.modules.avatar_helpers import _avatar_field
+from server.src.modules.item_helpers import _normalize_choice
+from server.src.modules.submission_helpers import _now_iso
+
+
+def _normalize_bool_payload(value: Any) -> bool:
+    if isinstance(value, bool):
+        return value
+    if value is None:
+        return False
+    raw = str(value).strip().lower()
+    return raw in {"1", "true", "yes", "y", "on"}
+
+def _ability_doc_from_payload(payload: dict, creator: str) -> dict:
+    name = (payload.get("name") or "Unnamed Ability").strip()
+    if not name:
+        raise HTTPException(status_code=400, detail="Name is required")
+
+    ab_type = (payload.get("type") or "passive").strip().lower()
+    if ab_type not in ("active", "passive", "mixed"):
+        raise HTTPException(status_code=400, detail="Invalid type")
+
+    source_category = (payload.get("source_category") or "Other").strip()
+    source_ref      = (payload.get("source_ref") or "").strip()
+    tags = [str(t).strip() for t in (payload.get("tags") or []) if str(t).strip()]
+    description = (payload.get("description") or "").strip()
+    allow_multiple = _normalize_bool_payload(payload.get("allow_multiple"))
+
+    active_in  = payload.get("active") or {}
+    passive_in = payload.get("passive") or {}
+    # Archetype-specific metadata (optional)
+    archetype_version = int(payload.get("archetype_version") or 1)
+    archetype_original_rank = int(payload.get("archetype_original_rank") or 0)
+    archetype_replaces = (payload.get("archetype_replaces") or "").strip()
+
+    # --- active part ---
+    active_block = None
+    if ab_type in ("active", "mixed"):
+        activation = (active_in.get("activation") or "Action").strip()
+        try:
+            rng = int(active_in.get("range") or 0)
+        except Exception:
+            raise HTTPException(status_code=400, detail="Active range must be an integer")
+        aoe = (active_in.get("aoe") or "").strip()
+
+        costs_in = active_in.get("costs") or {}
+        def _num(k, d=0):
+            v = costs_in.get(k, d)
+            try: return int(v or 0)
+            except Exception: raise ValueError(k)
+
+        try:
+            costs = {"HP":_num("HP"),"EN":_num("EN"),"MP":_num("MP"),"FO":_num("FO"),"MO":_num("MO"),"TX":_num("TX")}
+        except ValueError as bad:
+            raise HTTPException(status_code=400, detail=f"Cost {bad} must be an integer")
+
+        costs["other_label"] = (costs_in.get("other_label") or "").strip()
+        try: costs["other_value"] = int(costs_in.get("other_value") or 0)
+        except Exception: costs["other_value"] = 0
+
+        costs_active = bool(active_in.get("costs_active") or active_in.get("cost_active") or False)
+
+        rolls_in = active_in.get("rolls") or []
+        rolls = []
+        if isinstance(rolls_in, list):
+            for r in rolls_in:
+                if not isinstance(r, dict):
+                    continue
+                expr = (r.get("expr") or r.get("expression") or "").strip()
+                if not expr:
+                    continue
+                kind = (r.get("kind") or r.get("reason") or "custom").strip().lower()
+                damage_type = (r.get("damage_type") or r.get("damageType") or "").strip()
+                label = (r.get("label") or r.get("custom_label") or "").strip()
+                rolls.append({
+                    "expr": expr,
+                    "kind": kind,
+                    "damage_type": damage_type,
+                    "label": label,
+                })
+        requires_skill_roll = bool(active_in.get("requires_skill_roll") or active_in.get("skill_roll") or False)
+        skill_roll_in = active_in.get("skill_roll_skills") or active_in.get("roll_skills") or []
+        skill_roll_skills = []
+        if isinstance(skill_roll_in, list):
+            skill_roll_skills = [str(s).strip() for s in skill_roll_in if str(s).strip()]
+        active_block = {
+            "activation": activation,
+            "range": rng,
+            "aoe": aoe,
+            "costs": costs,
+            "costs_active": costs_active,
+            "rolls": rolls,
+            "requires_skill_roll": requires_skill_roll,
+            "skill_roll_skills": skill_roll_skills,
+        }
+
+    # --- passive part ---
+    passive_block = None
+    if ab_type in ("passive", "mixed"):
+        pdesc = (passive_in.get("description") or "").strip()
+        mods_in = passive_in.get("modifiers") or []
+        modifiers = []
+        for m in mods_in:
+            if not isinstance(m, dict):
+                continue
+            target = (m.get("target") or "").strip()
+            if not target: continue
+            mode = (m.get("mode") or "add").strip().lower()
+            if mode not in ("add","mul","set"): mode = "add"
+            try:
+                value = float(m.get("value") or 0)
+            except Exception:
+                raise HTTPException(status_code=400, detail=f"Invalid modifier value for {target}")
+            note = (m.get("note") or "").strip()
+            choice = _normalize_choice(m.get("choice") if isinstance(m.get("choice"), dict) else None)
+            mod = {"target":target,"mode":mode,"value":value,"note":note}
+            try:
+                level_step = int(m.get("level_step") or 0)
+            except Exception:
+                level_step = 0
+            try:
+                level_increment = int(m.get("level_increment") or 1)
+            except Exception:
+                level_increment = 1
+            if level_step > 0:
+                mod["level_step"] = level_step
+                mod["level_increment"] = max(1, level_increment)
+            group = (m.get("group") or "").strip()
+            if group:
+                mod["group"] = group
+                try:
+                    gmax = int(m.get("group_max_choices") or m.get("group_max") or 1)
+                except Exception:
+                    gmax = 1
+                mod["group_max_choices"] = max(0, gmax)
+            if choice: mod["choice"] = choice
+            modifiers.append(mod)
+        passive_block = {"description":pdesc,"modifiers":modifiers}
+
+    now = _now_iso()
+    avatar_key, _ = _avatar_field(payload)
+
+    ability_doc = {
+        "name": name,
+        "name_key": norm_key(name),
+        "type": ab_type,
+        "source_category": source_category,
+        "source_ref": source_ref,
+        "tags": tags,
+        "description": description,
+        "allow_multiple": allow_multiple,
+        "active": active_block,
+        "passive": passive_block,
+        "creator": creator,
+        "created_at": now,
+        "updated_at": now,
+        "archetype_version": archetype_version,
+        "archetype_original_rank": archetype_original_rank,
+        "archetype_replaces": archetype_replaces,
+    }
+
+    if avatar_key:
+        ability_doc["default_avatar"] = avatar_key
+
+    return ability_doc
@@ -0,0 +1,824 @@
+import datetime
+import re
+from typing import Any
+
+from fastapi import APIRouter, Body, Depends, HTTPException, Query, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from db_mongo import get_col, next_id_str
+from server.src.modules.admin_jobs import get_job, get_job_output, list_jobs, submit_job
+from server.src.modules.audit_logs import audit_page, build_audit_filter, iter_audit_ndjson
+from server.src.modules.audit_writer import AUDIT_WRITER
+from server.src.modules.authentification_helpers import (
+    _ALLOWED_ROLES,
+    PASSWORD_RESET_VERSION,
+    _generate_temp_password,
+    _sha256,
+    require_auth,
+    revoke_user_sessions,
+)
+from server.src.modules.campaign_chat_helpers import CHAT_WRITER, chat_socket_stats
+from server.src.modules.db_async import json_body
+from server.src.modules.db_metrics import ROUTE_METRICS
+from server.src.modules.logging_helpers import logger, write_audit
+from server.src.modules.name_search import add_name_filter, touch_name_index
+from server.src.modules.pagination import InvalidCursor
+from server.src.modules.spell_catalog import invalidate_spell_catalog
+from server.src.modules.spell_helpers import (
+    _effect_duplicate_groups,
+    _recompute_spells_for_effect,
+    _recompute_spells_for_effects,
+    _recompute_spells_for_school,
+    format_recompute_line,
+    recompute_spells,
+    spell_sig_duplicate_groups,
+)
+from server.src.modules.wiki_auth import invalidate_wiki_role
+from settings import settings
+
+router = APIRouter()
+
+def _clean_modifiers(raw):
+    mods = []
+    if not isinstance(raw, list):
+        return mods
+    for m in raw:
+        if not isinstance(m, dict):
+            continue
+        tgt = str(m.get("target") or m.get("key") or "").strip()
+        if not tgt:
+            continue
+        mod = {
+            "target": tgt,
+            "mode": (m.get("mode") or "add"),
+            "value": m.get("value", 0),
+        }
+        if m.get("note"): mod["note"] = m.get("note")
+        if m.get("group"): mod["group"] = m.get("group")
+        if m.get("quality_step") is not None: mod["quality_step"] = m.get("quality_step")
+        if m.get("level_step") is not None: mod["level_step"] = m.get("level_step")
+        if m.get("level_increment") is not None: mod["level_increment"] = m.get("level_increment")
+        mods.append(mod)
+    return mods
+
+def _normalize_skill_list(raw):
+    if isinstance(raw, list):
+        return [str(x).strip() for x in raw if str(x).strip()]
+    if isinstance(raw, str):
+        return [s.strip() for s in raw.split(",") if s.strip()]
+    return []
+
+def _normalize_rolls(raw):
+    if not isinstance(raw, list):
+        return []
+    rolls = []
+    for r in raw:
+        if not isinstance(r, dict):
+            continue
+        expr = str(r.get("expr") or r.get("expression") or "").strip()
+        if not expr:
+            continue
+        kind = str(r.get("kind") or r.get("reason") or "custom").strip()
+        dmg_type = str(r.get("damage_type") or r.get("damageType") or "").strip()
+        label = str(r.get("label") or r.get("custom_label") or "").strip()
+        rolls.append({
+            "expr": expr,
+            "kind": kind,
+            "damage_type": dmg_type,
+            "label": label,
+        })
+    return rolls
+
+def _normalize_tags(val):
+    if val is None:
+        return None
+    if isinstance(val, str):
+        return [t.strip() for t in val.split(",") if t.strip()]
+    if isinstance(val, list):
+        return [str(t).strip() for t in val if str(t).strip()]
+    return []
+
+# ---------- Effects import ----------
+@router.post("/effects/bulk_create")
+@router.post("/admin/effects/bulk_create")
+def bulk_create_effects(request: Request, body: Any = Depends(json_body)):
+
+    try:
+        require_auth(request, ["admin", "moderator"])
+    except Exception as e:
+        msg = str(e)
+        code = 401 if "Not authenticated" in msg else 403
+        return JSONResponse({"status": "error", "message": msg}, status_code=code)
+
+    if body is None:
+        return JSONResponse({"status": "error", "message": "Invalid JSON"}, status_code=400)
+    
+    replace_duplicates = bool(body.get("replace_duplicates", False))
+    updated = []
+    patch_lines = []
+
+    try:
+        school_name = (body.get("school_name") or "").strip()
+        school_type = (body.get("school_type") or "Simple").strip()
+        range_type  = (body.get("range_type")  or "A").strip()
+        aoe_type    = (body.get("aoe_type")    or "A").strip()
+        upgrade     = bool(body.get("upgrade", body.get("is_upgrade", False)))
+        effects     = body.get("effects") or []
+
+        if not school_name:
+            return JSONResponse({"status":"error","message":"school_name is required"}, status_code=400)
+        if not effects:
+            return JSONResponse({"status":"error","message":"effects must be a non-empty list"}, status_code=400)
+
+        # Validate every row before writing anything.
+        rows = []
+        for e in effects:
+            name = (e.get("name") or "").strip()
+            try:
+                mp = int(e.get("mp_cost"))
+                en = int(e.get("en_cost"))
+            except Exception:
+                return JSONResponse({"status":"error","message":f"Non-numeric MP/EN in effect '{name}'"}, status_code=400)
+            rows.append((e, name, mp, en))
+
+        sch_col = get_col("schools")
+        eff_col = get_col("effects")
+
+        existing = sch_col.find_one(
+            {"name": {"$regex": f"^{re.escape(school_name)}$", "$options": "i"}}, {"_id": 0}
+        )
+        if existing:
+            sid = existing["id"]
+            sch_col.update_one(
+                {"id": sid},
+                {"$set": {
+                    "school_type": school_type,
+                    "range_type": range_type,
+                    "aoe_type": aoe_type,
+                    "upgrade": bool(upgrade)
+                }}
+            )
+            school = sch_col.find_one({"id": sid}, {"_id": 0})
+        else:
+            sid = next_id_str("schools", padding=4)
+            school = {
+                "id": sid, "name": school_name, "school_type": school_type,
+                "range_type": range_type, "aoe_type": aoe_type, "upgrade": bool(upgrade)
+            }
+            sch_col.insert_one(school)
+
+        created = []
+        for e, name, mp, en in rows:
+            desc = (e.get("description") or "").strip()
+            tags = _normalize_tags(e.get("tags"))
+            if not tags:
+                tags = ["phb"]
+
+            name_match = eff_col.find_one(
+                {"school": school["id"], "name": {"$regex": f"^{re.escape(name)}$", "$options": "i"}},
+                {"_id": 1, "id": 1, "name": 1, "mp_cost": 1, "en_cost": 1, "description": 1}
+            )
+
+            if name_match:
+                if replace_duplicates:
+                    before = {k: name_match.get(k) for k in ("name","mp_cost","en_cost","description")}
+                    eff_col.update_one(
+                        {"_id": name_match["_id"]},
+                        {"$set": {
+                            "name": name,
+                            "description": desc,
+                            "mp_cost": mp,
+                            "en_cost": en,
+                            "school": school["id"],
+                            "modifiers": _clean_modifiers(e.get("modifiers") or []),
+                            "tags": tags
+                        }}
+                    )
+                    updated.append(name_match["id"])
+                    continue
+                else:
+                    # keep old behavior: if exact same values, treat as duplicate no-op; otherwise create new id
+                    if int(name_match.get("mp_cost", 0)) == mp and int(name_match.get("en_cost", 0)) == en:
+                        continue
+                    # else fall through to create as a new effect
+
+            eff_id = next_id_str("effects", padding=4)
+            rec = {
+                "id": eff_id,
+                "name": name,
+                "description": desc,
+                "mp_cost": mp,
+                "en_cost": en,
+                "school": school["id"],
+                "modifiers": _clean_modifiers(e.get("modifiers") or []),
+                "tags": tags
+            }
+            eff_col.insert_one(rec)
+            created.append(eff_id)
+
+        # One catalog bump for the whole import; the recompute below loads
+        # that snapshot once for every replaced effect.
+        invalidate_spell_catalog()
+        touch_name_index("effects", created + updated)
+        if updated:
+            try:
+                note, _changed = _recompute_spells_for_effects(updated)
+                patch_lines.append(note)
+            except Exception as _e:
+                patch_lines.append(f"[WARN] Recompute failed for effects {', '.join(updated)}: {_e}")
+
+        
+        # Per-effect audit entries
+        try:
+            username, _ = require_auth(request, ["admin","moderator"])
+        except Exception:
+            username = "anonymous"
+        try:
+            for _eid in created:
+                write_audit("effect.create", username, _eid, None, {"school": school.get("id"), "created_via_bulk": True})
+            for _eid in updated:
+                write_audit("effect.update", username, _eid, None, {"updated_via_bulk": True})
+        except Exception:
+            pass
+
+        write_audit("bulk_create_effects", "admin-ui", "—", None, {"school": school, "created": created})
+        return {
+            "status": "success",
+            "school": school,
+            "created": created,
+            "updated": updated,
+            "patch_text": "\n".join(patch_lines).strip() + ("\n" if patch_lines else "")
+        }
+
+    except Exception as e:
+        logger.exception("bulk_create_effects failed")
+        return JSONResponse({"status":"error","message":str(e)}, status_code=500)
+
+# ---------- Spell lists ----------
+@router.get("/admin/spelllists")
+def admin_list_spell_lists(request: Request, owner: str | None = Query(default=None), name: str | None = Query(default=None),
+                           page: int = Query(default=1, ge=1), limit: int = Query(default=50, ge=1, le=200)):
+    """
+    Admin/moderator: list all users' spell lists with optional filters.
+    """
+    require_auth(request, ["admin", "moderator"])
+    col = get_col("spell_lists")
+
+    q = {}
+    if owner:
+        q["$or"] = [{"owner": {"$regex": owner, "$options": "i"}}, {"owner_email": {"$regex": owner, "$options": "i"}}]
+    if name:
+        q["name"] = {"$regex": name, "$options": "i"}
+
+    total = col.count_documents(q)
+    cursor = col.find(q, {"_id": 0}).skip((page-1)*limit).limit(limit)
+    items = list(cursor)
+    for it in items:
+        it["count"] = len(it.get("spells") or [])
+    items.sort(key=lambda x: (x.get("owner","").lower(), x.get("name","").lower()))
+
+    return {"status": "success", "spelllists": items, "page": page, "limit": limit, "total": total}
+
+# ---------- Users, spells, jobs and metrics ----------
+@router.get("/admin/users")
+def admin_list_users(request: Request):
+    require_auth(request, roles=["admin"])
+    users = list(
+        get_col("users").find({}, {"_id": 0, "username": 1, "email": 1, "role": 1, "created_at": 1})
+    )
+    users.sort(key=lambda u: u["username"].lower())
+    return {"status": "success", "users": users}
+
+@router.put("/admin/users/{target_username}/role")
+def admin_set_user_role(target_username: str, request: Request, body: Any = Depends(json_body)):
+    admin_username, _ = require_auth(request, roles=["admin"])
+    role = (body.get("role") or "").strip().lower()
+
+    if role not in _ALLOWED_ROLES:
+        return JSONResponse({"status": "error", "message": "Invalid role."}, status_code=400)
+
+    r = get_col("users").update_one({"username": target_username}, {"$set": {"role": role}})
+    if r.matched_count == 0:
+        return JSONResponse({"status": "error", "message": "User not found."}, status_code=404)
+
+    # Sessions carry the role they were opened with; make the user log in again.
+    revoke_user_sessions(target_username)
+    invalidate_wiki_role(target_username)
+    write_audit("set_role", admin_username, spell_id="—", before=None, after={"user": target_username, "role": role})
+    return {"status": "success", "username": target_username, "role": role}
+
+@router.delete("/admin/users/{target_username}/sessions")
+def admin_revoke_user_sessions(target_username: str, request: Request):
+    """Log a user out on every worker."""
+    admin_username, _ = require_auth(request, roles=["admin"])
+    revoked = revoke_user_sessions(target_username)
+    write_audit("revoke_sessions", admin_username, spell_id="—", before={"user": target_username}, after={"revoked": revoked})
+    return {"status": "success", "username": target_username, "revoked": revoked}
+
+@router.post("/admin/users/{target_username}/reset-password")
+def admin_reset_user_password(target_username: str, request: Request):
+    admin_username, _ = require_auth(request, roles=["admin"])
+    temp_password = _generate_temp_password()
+    res = get_col("users").update_one(
+        {"username": target_username},
+        {
+            "$set": {
+                "password_hash": _sha256(temp_password),
+                "password_reset_version": PASSWORD_RESET_VERSION,
+            },
+            "$unset": {"reset_code": "", "reset_at": ""},
+        },
+    )
+    if res.matched_count == 0:
+        return JSONResponse({"status": "error", "message": "User not found."}, status_code=404)
+    revoke_user_sessions(target_username)
+    write_audit("reset_password", admin_username, spell_id="—", before={"user": target_username}, after={"user": target_username})
+    return {"status": "success", "username": target_username, "temporary_password": temp_password}
+
+@router.put("/admin/spells/{spell_id}/status")
+def set_spell_status(spell_id: str, request: Request, payload: dict = Body(...)):
+    try:
+        username, role = require_auth(request, ["admin", "moderator"])
+    except Exception as e:
+        return JSONResponse({"status": "error", "message": str(e)}, status_code=401)
+
+    status = str(payload.get("status", "")).lower()
+    if status not in ("red", "yellow", "green"):
+        return JSONResponse({"status":"error","message":"invalid status"}, status_code=400)
+
+    r = get_col("spells").update_one({"id": spell_id}, {"$set": {"status": status}})
+    if r.matched_count == 0:
+        return JSONResponse({"status":"error","message":f"Spell {spell_id} not found"}, status_code=404)
+
+    try:
+        write_audit("set_status", username, spell_id, before=None, after={"status": status})
+    except Exception:
+        pass
+
+    return {"status": "success", "id": spell_id, "new_status": status}
+
+@router.delete("/admin/spells/flagged")
+def delete_flagged_spells(request: Request):
+    require_auth(request, ["admin", "moderator"])
+    r = get_col("spells").delete_many({"status": "red"})
+    touch_name_index("spells")
+
+
+
+@router.post("/admin/spells/recompute_all")
+def admin_recompute_all_spells(request: Request):
+    """Queue a full recompute; poll GET /admin/jobs/{id} for progress and the report."""
+    user, role = require_auth(request)
+    if role not in ("admin", "moderator"):
+        raise HTTPException(status_code=403, detail="Forbidden")
+    job = submit_job("spells.recompute_all", created_by=user)
+    return JSONResponse({"status": "success", "job": job}, status_code=202)
+
+@router.get("/admin/jobs")
+def admin_list_jobs(
+    request: Request,
+    kind: str | None = Query(default=None),
+    status: str | None = Query(default=None),
+    limit: int = Query(default=50, ge=1, le=200),
+):
+    require_auth(request, ["admin", "moderator"])
+    return {"status": "success", "jobs": list_jobs(kind, status, limit)}
+
+@router.get("/admin/jobs/{job_id}")
+def admin_get_job(job_id: str, request: Request):
+    require_auth(request, ["admin", "moderator"])
+    job = get_job(job_id)
+    if not job:
+        return JSONResponse({"status": "error", "message": "Job not found"}, status_code=404)
+    return {"status": "success", "job": job}
+
+@router.get("/admin/jobs/{job_id}/output")
+def admin_get_job_output(
+    job_id: str,
+    request: Request,
+    limit: int = Query(default=500, ge=1, le=5000),
+    offset: int = Query(default=0, ge=0),
+):
+    """Per-item rows a job reported (e.g. the spells a recompute changed), in order."""
+    require_auth(request, ["admin", "moderator"])
+    if not get_job(job_id):
+        return JSONResponse({"status": "error", "message": "Job not found"}, status_code=404)
+    return {"status": "success", "items": get_job_output(job_id, limit=limit, skip=offset)}
+
+@router.get("/admin/metrics")
+def admin_metrics(request: Request):
+    """Mongo commands, DB time and bytes per route since start (or the last reset)."""
+    require_auth(request, ["admin", "moderator"])
+    return {"status": "success", "query_budget": settings.db_query_budget, **ROUTE_METRICS.snapshot(), "audit": AUDIT_WRITER.stats(), "chat": chat_socket_stats(), "chat_writer": CHAT_WRITER.stats()}
+
+@router.post("/admin/metrics/reset")
+def admin_reset_metrics(request: Request):
+    require_auth(request, ["admin"])
+    ROUTE_METRICS.reset()
+    return {"status": "success"}
+
+# ---------- Maintenance ----------
+@router.post("/admin/maintenance/backfill_spell_sigs")
+def backfill_spell_sigs(request: Request):
+    username, _ = require_auth(request, ["admin", "moderator"])
+    job = submit_job("spells.backfill_sigs", created_by=username)
+    return JSONResponse({"status": "success", "job": job}, status_code=202)
+
+@router.post("/admin/maintenance/backfill_spell_schools")
+def backfill_spell_schools(request: Request):
+    username, _ = require_auth(request, ["admin", "moderator"])
+    job = submit_job("spells.backfill_schools", created_by=username)
+    return JSONResponse({"status": "success", "job": job}, status_code=202)
+
+@router.post("/admin/maintenance/dedupe_spells_by_sig")
+def dedupe_spells_by_sig(request: Request, body: Any = Depends(json_body)):
+    username, _ = require_auth(request, ["admin", "moderator"])
+    body = body or {}
+    apply = bool(body.get("apply"))
+    if not apply:
+        return {"status": "success", "applied": False, "groups": spell_sig_duplicate_groups()}
+    job = submit_job("spells.dedupe_by_sig", {"apply": True}, created_by=username)
+    return JSONResponse({"status": "success", "job": job}, status_code=202)
+
+# ---- Admin: list / edit / delete effects ------------------------------------
+
+@router.get("/admin/effects")
+def admin_list_effects(
+    request: Request,
+    name: str | None = Query(default=None),
+    school: str | None = Query(default=None),
+    page: int = Query(default=1, ge=1),
+    limit: int = Query(default=100, ge=1, le=500),
+):
+    require_auth(request, ["admin", "moderator"])
+    col = get_col("effects")
+    sch = get_col("schools")
+
+    q: dict = {}
+    if name:
+        add_name_filter(q, "effects", name)
+    if school:
+        or_terms = [{"school": {"$regex": school, "$options": "i"}}]
+        ids = [s["id"] for s in sch.find({"name": {"$regex": school, "$options": "i"}}, {"id": 1})]
+        if ids:
+            or_terms.append({"school": {"$in": ids}})
+        q["$or"] = or_terms
+
+    total = col.count_documents(q)
+    docs = list(col.find(q, {"_id": 0}).skip((page-1)*limit).limit(limit))
+    s_map = {s["id"]: s.get("name", s["id"]) for s in sch.find({}, {"_id": 0, "id": 1, "name": 1})}
+    for e in docs:
+        sid = str(e.get("school") or "")
+        e["school_name"] = s_map.get(sid, sid)
+    docs.sort(key=lambda e: e["name"].lower())
+
+    return {"status": "success", "effects": docs, "page": page, "limit": limit, "total": total}
+
+@router.put("/admin/effects/{effect_id}")
+def admin_update_effect(effect_id: str, request: Request, body: Any = Depends(json_body)):
+    require_auth(request, ["admin", "moderator"])
+
+    col = get_col("effects")
+    old = col.find_one({"id": effect_id}, {"_id": 0})
+    if not old:
+        return JSONResponse({"status":"error","message":"Effect not found"}, status_code=404)
+
+    name = (body.get("name") or old.get("name") or "").strip()
+    desc = (body.get("description") or body.get("desc") or old.get("description") or "").strip()
+    try:
+        mp = int(body.get("mp_cost", old.get("mp_cost", 0)))
+        en = int(body.get("en_cost", old.get("en_cost", 0)))
+    except Exception:
+        return JSONResponse({"status":"error","message":"MP/EN must be integers"}, status_code=400)
+
+    school = str(body.get("school", old.get("school",""))).strip() or old.get("school","")
+    modifiers = _clean_modifiers(body.get("modifiers") or old.get("modifiers") or [])
+    tags_in = body.get("tags", None)
+    tags = _normalize_tags(tags_in) if tags_in is not None else (old.get("tags") or [])
+    if not tags:
+        tags = ["phb"]
+    skill_roll = bool(body.get("skill_roll", old.get("skill_roll", False)))
+    skill_roll_skills = _normalize_skill_list(body.get("skill_roll_skills", old.get("skill_roll_skills", [])))
+    rolls = _normalize_rolls(body.get("rolls", old.get("rolls", [])))
+
+    col.update_one({"id": effect_id}, {"$set": {
+        "name": name, "description": desc, "mp_cost": mp, "en_cost": en, "school": school,
+        "modifiers": modifiers, "tags": tags,
+        "skill_roll": skill_roll, "skill_roll_skills": skill_roll_skills, "rolls": rolls
+    }})
+    invalidate_spell_catalog()
+    touch_name_index("effects", [effect_id])
+    try:
+        username, _ = require_auth(request, ["admin","moderator"])
+    except Exception:
+        username = "anonymous"
+    try:
+        write_audit("effect.update", username, effect_id, {k: old.get(k) for k in ("name","description","mp_cost","en_cost","school")}, {"name": name, "description": desc, "mp_cost": mp, "en_cost": en, "school": school})
+    except Exception:
+        pass
+
+
+    effect_changes = []
+    def _chg(label, a, b):
+        if a != b: effect_changes.append(f"{label}: {a} → {b}")
+
+    _chg("Name", old.get("name",""), name)
+    _chg("School", old.get("school",""), school)
+    _chg("MP", int(old.get("mp_cost",0)), mp)
+    _chg("EN", int(old.get("en_cost",0)), en)
+    _chg("Skill roll", bool(old.get("skill_roll", False)), skill_roll)
+    if (old.get("description","") != desc):
+        effect_changes.append("Description: (updated)")
+    if (old.get("modifiers") or []) != modifiers:
+        effect_changes.append("Modifiers updated")
+    if (old.get("skill_roll_skills") or []) != skill_roll_skills:
+        effect_changes.append("Skill roll skills updated")
+    if (old.get("rolls") or []) != rolls:
+        effect_changes.append("Rolls updated")
+
+    header = [f"Edited Effect [{effect_id}]", ""] + ([*effect_changes, ""] if effect_changes else ["No direct field changes",""])
+
+    spell_patch_text, changed_count = _recompute_spells_for_effect(effect_id)
+
+    patch_text = "\n".join(header + ["Impacted Spells:", spell_patch_text]) + "\n"
+    return {"status":"success","updated":effect_id,"changed_spells":changed_count,"patch_text":patch_text}
+
+@router.delete("/admin/effects/{effect_id}")
+def admin_delete_effect(effect_id: str, request: Request):
+    require_auth(request, ["admin", "moderator"])
+    col = get_col("effects")
+    old = col.find_one({"id": effect_id}, {"_id": 0})
+    if not old:
+        return {"status":"error","message":"Effect not found"}
+
+    col.delete_one({"id": effect_id})
+    invalidate_spell_catalog()
+    touch_name_index("effects", [effect_id])
+
+    report = recompute_spells({"effects": effect_id}, remove_effects={effect_id})
+    affected = report["changes"]
+    lines = [f"Deleted Effect [{effect_id}] {old.get('name','')}",""]
+    lines.extend(format_recompute_line(c, " (effect removed)") for c in affected)
+
+    if len(lines) == 2:
+        lines.append("No spells referenced this effect.")
+
+    
+    try:
+        username, _ = require_auth(request, ["admin","moderator"])
+    except Exception:
+        username = "anonymous"
+    try:
+        affected_ids = [sp.get("id") for sp in affected]
+        write_audit("effect.delete", username, effect_id, old, {"deleted": True, "affected_spells": affected_ids})
+    except Exception:
+        pass
+
+    return {"status":"success","deleted":effect_id,"patch_text":"\n".join(lines) + "\n"}
+
+@router.get("/admin/effects/duplicates")
+def admin_effect_duplicates_preview(request: Request):
+    """List duplicate groups (same normalized name+description)."""
+    require_auth(request, ["admin", "moderator"])
+    groups = _effect_duplicate_groups()
+    return {"status": "success", "groups": groups, "total_groups": len(groups)}
+
+@router.post("/admin/effects/duplicates")
+def admin_effect_duplicates_apply(request: Request, body: Any = Depends(json_body)):
+    """
+    Apply dedupe as a background job:
+      - for each group keep the lowest id and delete the others
+      - update any spells referencing removed ids to reference the kept id
+      - avoid inserting duplicate ids in a spell's effects
+    """
+    username, _ = require_auth(request, ["admin", "moderator"])
+    body = body or {}
+    apply = bool(body.get("apply"))
+    if not apply:
+        plan = _effect_duplicate_groups()
+        return {"status":"success","applied":False,"groups":plan,"total_groups":len(plan)}
+    job = submit_job("effects.dedupe", created_by=username)
+    return JSONResponse({"status": "success", "job": job}, status_code=202)
+
+# ---- Admin: list / edit / delete schools ------------------------------------
+
+@router.get("/admin/schools")
+def admin_list_schools(
+    request: Request,
+    name: str | None = Query(default=None),
+    sid: str | None = Query(default=None),
+    page: int = Query(default=1, ge=1),
+    limit: int = Query(default=100, ge=1, le=500),
+):
+    require_auth(request, ["admin", "moderator"])
+    sch = get_col("schools")
+
+    q: dict = {}
+    if name:
+        q["name"] = {"$regex": name, "$options": "i"}
+    if sid:
+        q["id"] = {"$regex": sid, "$options": "i"}
+
+    total = sch.count_documents(q)
+    docs = list(sch.find(q, {"_id": 0}).skip((page-1)*limit).limit(limit))
+    docs.sort(key=lambda x: x.get("name","").lower())
+    return {"status":"success","schools":docs,"page":page,"limit":limit,"total":total}
+
+@router.put("/admin/schools/{school_id}")
+def admin_update_school(school_id: str, request: Request, body: Any = Depends(json_body)):
+    require_auth(request, ["admin", "moderator"])
+
+    sch = get_col("schools")
+    old = sch.find_one({"id": school_id}, {"_id": 0})
+    if not old:
+        return JSONResponse({"status":"error","message":"School not found"}, status_code=404)
+
+    name        = (body.get("name") or old.get("name","")).strip()
+    school_type = (body.get("school_type") or old.get("school_type","Simple")).strip()
+    range_type  = (body.get("range_type")  or old.get("range_type","A")).strip().upper()
+    aoe_type    = (body.get("aoe_type")    or old.get("aoe_type","A")).strip().upper()
+    upgrade     = bool(body.get("upgrade", old.get("upgrade", old.get("is_upgrade", False))))
+    cost_mode   = (body.get("cost_mode")  or old.get("cost_mode", "en")).strip().lower()
+    if cost_mode not in ("en", "nen", "hp"):
+        cost_mode = old.get("cost_mode", "en")
+
+    VALID_SKILLS = {"aura","incantation","enchantement","potential","restoration","stealth","investigation","charm","intimidation","absorption","spirit"}
+    VALID_INTS   = {"fire","water","wind","earth","sun","moon","lightning","ki"}
+
+    ls_raw = (body.get("linked_skill", old.get("linked_skill","")) or "").strip().lower()
+    linked_skill = ls_raw if ls_raw in VALID_SKILLS else ""
+
+    li_raw = body.get("linked_intensities", old.get("linked_intensities", [])) or []
+    linked_intensities = sorted({str(x).strip().lower() for x in li_raw if str(x).strip().lower() in VALID_INTS})
+
+    sch.update_one({"id": school_id}, {"$set":{
+        "name": name,
+        "school_type": school_type,
+        "range_type": range_type,
+        "aoe_type": aoe_type,
+        "upgrade": bool(upgrade),
+        "cost_mode": cost_mode,
+        "linked_skill": linked_skill,
+        "linked_intensities": linked_intensities,
+    }})
+    invalidate_spell_catalog()
+
+    ch = []
+    def _chg(lbl, a, b):
+        if a != b: ch.append(f"{lbl}: {a} → {b}")
+    _chg("Name", old.get("name",""), name)
+    _chg("Type", old.get("school_type",""), school_type)
+    _chg("Range Type", old.get("range_type",""), range_type)
+    _chg("AoE Type", old.get("aoe_type",""), aoe_type)
+    _chg("Upgrade", bool(old.get("upgrade", old.get("is_upgrade", False))), bool(upgrade))
+    _chg("Cost Mode", old.get("cost_mode","en"), cost_mode)
+
+    header = [f"Edited School [{school_id}] {name}", ""]
+    header.extend(ch if ch else ["No direct field changes"])
+    header.append("")
+
+    patch_text, changed_count = _recompute_spells_for_school(school_id)
+    return {"status":"success","updated":school_id,"changed_spells":changed_count,"patch_text":"\n".join(header)+patch_text+"\n"}
+
+@router.post("/admin/schools/{school_id}/clear_effects")
+def admin_clear_school_effects(school_id: str, request: Request):
+    require_auth(request, ["admin"])
+    sch = get_col("schools")
+    eff = get_col("effects")
+
+    school = sch.find_one({"id": school_id}, {"_id": 0})
+    if not school:
+        return JSONResponse({"status":"error","message":"School not found"}, status_code=404)
+
+    eff_ids = [e["id"] for e in eff.find({"school": school_id}, {"_id":0,"id":1})]
+    if not eff_ids:
+        return {"status":"success","deleted_effects":0,"touched_spells":0,"message":"No effects to clear."}
+
+    eff.delete_many({"school": school_id})
+    invalidate_spell_catalog()
+    touch_name_index("effects", eff_ids)
+    from_ids = set(eff_ids)
+
+    report = recompute_spells({"effects": {"$in": list(from_ids)}}, remove_effects=from_ids)
+    affected = report["changes"]
+
+    lines = [f"Cleared Effects for School [{school_id}] {school.get('name','')}", ""]
+    lines.extend(format_recompute_line(c, " (effects cleared)") for c in affected)
+
+    try:
+        username, _ = require_auth(request, ["admin"])
+    except Exception:
+        username = "anonymous"
+    try:
+        write_audit("school.clear_effects", username, school_id, school, {
+            "deleted_effects": eff_ids,
+            "touched_spells": [sp.get("id") for sp in affected]
+        })
+    except Exception:
+        pass
+
+    return {
+        "status":"success",
+        "deleted_effects": len(eff_ids),
+        "touched_spells": len(affected),
+        "patch_text":"\n".join(lines) + "\n"
+    }
+
+
+@router.delete("/admin/schools/{school_id}")
+def admin_delete_school(school_id: str, request: Request, force: bool = Query(default=False)):
+    require_auth(request, ["admin", "moderator"])
+    sch = get_col("schools")
+    eff = get_col("effects")
+
+    school = sch.find_one({"id": school_id}, {"_id": 0})
+    if not school:
+        return {"status":"error","message":"School not found"}
+
+    used_count = eff.count_documents({"school": school_id})
+    if used_count > 0 and not force:
+        return {"status":"error","message":f"Cannot delete: {used_count} effect(s) still reference this school. Reassign or delete them first."}
+
+    lines = [f"Deleted School [{school_id}] {school.get('name','')}",""]
+    if used_count > 0 and force:
+        eff_ids = [e["id"] for e in eff.find({"school": school_id}, {"_id":0,"id":1})]
+        eff.delete_many({"school": school_id})
+        invalidate_spell_catalog()
+        touch_name_index("effects", eff_ids)
+        from_ids = set(eff_ids)
+
+        report = recompute_spells({"effects": {"$in": list(from_ids)}}, remove_effects=from_ids)
+        affected = report["changes"]
+        lines.extend(format_recompute_line(c, " (effects removed with school)") for c in affected)
+
+    
+    try:
+        username, _ = require_auth(request, ["admin","moderator"])
+    except Exception:
+        username = "anonymous"
+    try:
+        _deleted_effects = []
+        try:
+            _deleted_effects = eff_ids
+        except Exception:
+            _deleted_effects = []
+        _touched_spells = []
+        try:
+            _touched_spells = [sp.get("id") for sp in affected]
+        except Exception:
+            _touched_spells = []
+        write_audit("school.delete", username, school_id, school, {"deleted": True, "deleted_effects": _deleted_effects, "touched_spells": _touched_spells, "force": bool(force)})
+    except Exception:
+        pass
+
+    sch.delete_one({"id": school_id})
+    invalidate_spell_catalog()
+    return {"status":"success","deleted":school_id,"patch_text":"\n".join(lines) + "\n"}
+
+# ---------- Audit logs ----------
+@router.get("/admin/logs")
+def admin_logs(request: Request, user: str = "", action: str = "", spell_id: str = "", from_: str = "", to: str = "", limit: int = 200, cursor: str = ""):
+    admin_user, _ = require_auth(request, roles=["admin"])
+    try:
+        q = build_audit_filter(user, action, spell_id, from_, to)
+    except ValueError:
+        return JSONResponse({"status": "error", "message": "from_/to must be ISO 8601 timestamps"}, status_code=400)
+    # Entries still in the audit queue would be missing from the listing.
+    AUDIT_WRITER.flush(timeout=1.0)
+    try:
+        items, next_cursor = audit_page(q, min(1000, max(1, limit)), cursor)
+    except InvalidCursor as e:
+        return JSONResponse({"status": "error", "message": str(e)}, status_code=400)
+    if not cursor:
+        try: write_audit("logs.view", admin_user, None, {"filter": q}, {"count": len(items)})
+        except Exception: pass
+    return {"status": "success", "items": items, "next_cursor": next_cursor}
+
+@router.get("/admin/logs/export")
+def admin_logs_export(request: Request, user: str = "", action: str = "", spell_id: str = "", from_: str = "", to: str = ""):
+    """All matching entries as NDJSON, oldest first, streamed from a cursor."""
+    admin_user, _ = require_auth(request, roles=["admin"])
+    try:
+        q = build_audit_filter(user, action, spell_id, from_, to)
+    except ValueError:
+        return JSONResponse({"status": "error", "message": "from_/to must be ISO 8601 timestamps"}, status_code=400)
+    AUDIT_WRITER.flush(timeout=1.0)
+    write_audit("logs.export", admin_user, None, {"filter": q}, None)
+    stamp = datetime.datetime.utcnow().strftime("%Y%m%dT%H%M%SZ")
+    return StreamingResponse(
+        iter_audit_ndjson(q),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="audit-{stamp}.ndjson"'},
+    )
+
+# --- Admin: delete user ---
+@router.delete("/admin/users/{target_username}")
+def admin_delete_user(target_username: str, request: Request):
+    admin_username, _ = require_auth(request, roles=["admin"])
+    users = get_col("users")
+    r = users.delete_one({"username": target_username})
+    if r.deleted_count == 0:
+        return JSONResponse({"status": "error", "message": "User not found."}, status_code=404)
+    revoke_user_sessions(target_username)
+    write_audit("delete_user", admin_username, spell_id="?", before={"user": target_username}, after=None)
+    return {"status":"success","username": target_username}
@@ -0,0 +1,306 @@
+from __future__ import annotations
+
+import datetime
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from pymongo import ReturnDocument
+
+from db_mongo import bulk_update, get_col, next_id_str
+from server.src.modules.logging_helpers import logger
+from settings import settings
+
+JOBS_COL = "jobs"
+# Per-item rows a job reports (e.g. one per recomputed spell). Kept out of
+# the job document so a large run cannot push it past the 16MB BSON limit.
+JOB_OUTPUT_COL = "job_output"
+JOB_STATUSES = ("queued", "running", "succeeded", "failed")
+
+JobHandler = Callable[["JobContext"], dict]
+JOB_HANDLERS: Dict[str, JobHandler] = {}
+
+
+def _now_iso(offset_seconds: float = 0) -> str:
+    ts = datetime.datetime.utcnow() + datetime.timedelta(seconds=offset_seconds)
+    return ts.isoformat() + "Z"
+
+
+def register_job(kind: str):
+    """Decorator: register `fn(ctx) -> result dict` as the handler for `kind`."""
+    def deco(fn: JobHandler) -> JobHandler:
+        JOB_HANDLERS[kind] = fn
+        return fn
+    return deco
+
+
+class JobContext:
+    """
+    Handed to a running job. Handlers report progress and a checkpoint after
+    each unit of work; a resumed job starts again from `checkpoint`/`done`.
+    """
+
+    def __init__(self, doc: dict):
+        self.id: str = doc["id"]
+        self.kind: str = doc["kind"]
+        self.params: dict = dict(doc.get("params") or {})
+        self.created_by: str = doc.get("created_by") or "system"
+        self.checkpoint: Any = doc.get("checkpoint")
+        progress = doc.get("progress") or {}
+        self.done: int = int(progress.get("done") or 0)
+        self.total: Optional[int] = progress.get("total")
+
+    def progress(self, done: int, total: Optional[int] = None, *, checkpoint: Any = None, append: list | None = None) -> None:
+        prev_done, self.done = self.done, int(done)
+        if total is not None:
+            self.total = int(total)
+        if checkpoint is not None:
+            self.checkpoint = checkpoint
+        if append:
+            # Keyed by the progress count before this step, so a step that is
+            # replayed after a crash overwrites its rows instead of adding more.
+            rows = [
+                ({"_id": f"{self.id}:{prev_done:010d}:{i:06d}"}, {"$set": {"job_id": self.id, "row": row}})
+                for i, row in enumerate(append)
+            ]
+            bulk_update(get_col(JOB_OUTPUT_COL), rows, upsert=True)
+        get_col(JOBS_COL).update_one({"id": self.id}, {"$set": {
+            "progress": {"done": self.done, "total": self.total},
+            "checkpoint": self.checkpoint,
+            "heartbeat_at": _now_iso(),
+        }})
+
+    def output_count(self) -> int:
+        return get_col(JOB_OUTPUT_COL).count_documents({"job_id": self.id})
+
+    def output(self, limit: int = 0) -> list:
+        """Rows appended via progress(append=...), across resumptions, in order."""
+        return get_job_output(self.id, limit=limit)
+
+
+_EXECUTOR: ThreadPoolExecutor | None = None
+_EXECUTOR_LOCK = threading.Lock()
+_SWEEPER: threading.Thread | None = None
+_SWEEPER_STOP = threading.Event()
+
+
+def _executor() -> ThreadPoolExecutor:
+    global _EXECUTOR
+    with _EXECUTOR_LOCK:
+        if _EXECUTOR is None:
+            _EXECUTOR = ThreadPoolExecutor(
+                max_workers=settings.jobs_max_workers,
+                thread_name_prefix="noe-job",
+            )
+        return _EXECUTOR
+
+
+def job_view(doc: dict | None) -> dict:
+    if not doc:
+        return {}
+    return {k: v for k, v in doc.items() if k != "_id"}
+
+
+def submit_job(kind: str, params: dict | None = None, created_by: str | None = None) -> dict:
+    if kind not in JOB_HANDLERS:
+        raise KeyError(f"Unknown job kind '{kind}'")
+    now = _now_iso()
+    doc = {
+        "id": f"job_{next_id_str('jobs', padding=6)}",
+        "kind": kind,
+        "status": "queued",
+        "params": dict(params or {}),
+        "created_by": created_by or "system",
+        "created_at": now,
+        "updated_at": now,
+        "heartbeat_at": now,
+        "progress": {"done": 0, "total": None},
+        "checkpoint": None,
+        "attempts": 0,
+        "result": None,
+        "error": None,
+    }
+    get_col(JOBS_COL).insert_one(dict(doc))
+    _executor().submit(_run_job, doc["id"])
+    return job_view(doc)
+
+
+def get_job(job_id: str) -> dict | None:
+    doc = get_col(JOBS_COL).find_one({"id": job_id}, {"_id": 0})
+    return job_view(doc) if doc else None
+
+
+def get_job_output(job_id: str, limit: int = 0, skip: int = 0) -> list:
+    cur = get_col(JOB_OUTPUT_COL).find({"job_id": job_id}, {"_id": 0, "row": 1}).sort("_id", 1).skip(skip)
+    if limit:
+        cur = cur.limit(limit)
+    return [d["row"] for d in cur]
+
+
+def list_jobs(kind: str | None = None, status: str | None = None, limit: int = 50) -> list[dict]:
+    q: dict = {}
+    if kind:
+        q["kind"] = kind
+    if status:
+        q["status"] = status
+    cur = get_col(JOBS_COL).find(q, {"_id": 0, "result": 0}).sort("created_at", -1).limit(limit)
+    return [job_view(d) for d in cur]
+
+
+def _run_job(job_id: str) -> None:
+    col = get_col(JOBS_COL)
+    now = _now_iso()
+    # Claiming with a conditional update keeps two workers from running the same job.
+    doc = col.find_one_and_update(
+        {"id": job_id, "status": "queued"},
+        {"$set": {"status": "running", "started_at": now, "heartbeat_at": now, "updated_at": now},
+         "$inc": {"attempts": 1}},
+        return_document=ReturnDocument.AFTER,
+    )
+    if not doc:
+        return
+    # Every later write is conditional on this claim: if the job went stale
+    # and another worker reclaimed it, this run must not overwrite that one.
+    claim = {"id": job_id, "status": "running", "attempts": doc["attempts"]}
+    # Beat independently of ctx.progress(): a long first phase (e.g. the
+    # dedupe planning pass) must not look stale to another worker's sweep.
+    stop_beat = threading.Event()
+    beat = threading.Thread(
+        target=_heartbeat, args=(claim, stop_beat),
+        name=f"noe-job-heartbeat-{job_id}", daemon=True,
+    )
+    beat.start()
+    handler = JOB_HANDLERS.get(doc["kind"])
+    try:
+        if handler is None:
+            raise KeyError(f"No handler registered for job kind '{doc['kind']}'")
+        ctx = JobContext(doc)
+        result = handler(ctx) or {}
+        done_at = _now_iso()
+        _finish(claim, {
+            "status": "succeeded",
+            "result": result,
+            "finished_at": done_at,
+            "updated_at": done_at,
+            "heartbeat_at": done_at,
+        })
+    except Exception as e:
+        logger.exception("Job %s (%s) failed", job_id, doc.get("kind"))
+        done_at = _now_iso()
+        _finish(claim, {
+            "status": "failed",
+            "error": f"{type(e).__name__}: {e}",
+            "finished_at": done_at,
+            "updated_at": done_at,
+        })
+    finally:
+        stop_beat.set()
+
+
+def _finish(claim: dict, fields: dict) -> None:
+    res = get_col(JOBS_COL).update_one(claim, {"$set": fields})
+    if res.matched_count == 0:
+        logger.warning(
+            "Job %s attempt %s lost its claim; dropping its %s result",
+            claim["id"], claim["attempts"], fields["status"],
+        )
+
+
+def _heartbeat(claim: dict, stop: threading.Event) -> None:
+    col = get_col(JOBS_COL)
+    while not stop.wait(settings.jobs_heartbeat_seconds):
+        try:
+            res = col.update_one(claim, {"$set": {"heartbeat_at": _now_iso()}})
+        except Exception:
+            logger.exception("Heartbeat for job %s failed", claim["id"])
+            continue
+        if res.matched_count == 0:
+            # Requeued and reclaimed elsewhere; the new owner keeps it alive.
+            return
+
+
+def _requeue_stale_jobs() -> int:
+    """Flip `running` jobs with no heartbeat for JOBS_STALE_SECONDS back to queued."""
+    cutoff = _now_iso(-settings.jobs_stale_seconds)
+    res = get_col(JOBS_COL).update_many(
+        {"status": "running", "heartbeat_at": {"$lt": cutoff}},
+        {"$set": {"status": "queued", "updated_at": _now_iso()}},
+    )
+    return res.modified_count
+
+
+def _schedule_queued_jobs() -> int:
+    ids = [d["id"] for d in get_col(JOBS_COL).find({"status": "queued"}, {"_id": 0, "id": 1})]
+    for job_id in ids:
+        _executor().submit(_run_job, job_id)
+    return len(ids)
+
+
+def sweep_jobs() -> int:
+    """
+    Requeue stale `running` jobs and schedule them. Run periodically, since a
+    crashed worker is usually restarted before its heartbeat goes stale.
+    """
+    if not _requeue_stale_jobs():
+        return 0
+    count = _schedule_queued_jobs()
+    if count:
+        logger.info("Requeued stale job(s); scheduled %d queued job(s)", count)
+    return count
+
+
+def _sweep_loop() -> None:
+    while not _SWEEPER_STOP.wait(settings.jobs_sweep_seconds):
+        try:
+            sweep_jobs()
+        except Exception:
+            logger.exception("Stale job sweep failed")
+
+
+def _start_sweeper() -> None:
+    global _SWEEPER
+    if settings.jobs_sweep_seconds <= 0:
+        return
+    with _EXECUTOR_LOCK:
+        if _SWEEPER is not None and _SWEEPER.is_alive():
+            return
+        _SWEEPER_STOP.clear()
+        _SWEEPER = threading.Thread(target=_sweep_loop, name="noe-job-sweeper", daemon=True)
+        _SWEEPER.start()
+
+
+def resume_jobs() -> int:
+    """
+    Requeue jobs left `running` by a dead process (no heartbeat for
+    JOBS_STALE_SECONDS), schedule every queued job and start the periodic
+    stale-job sweep (every JOBS_SWEEP_SECONDS; 0 disables it). Safe to call
+    from several workers: only one claims each job.
+    """
+    _requeue_stale_jobs()
+    count = _schedule_queued_jobs()
+    if count:
+        logger.info("Resumed %d queued job(s)", count)
+    _start_sweeper()
+    return count
+
+
+def wait_for_job(job_id: str, timeout: float = 30.0, interval: float = 0.05) -> dict | None:
+    """Block until the job finishes (or timeout); for scripts and tests."""
+    deadline = time.monotonic() + timeout
+    while True:
+        job = get_job(job_id)
+        if not job or job.get("status") in ("succeeded", "failed") or time.monotonic() >= deadline:
+            return job
+        time.sleep(interval)
+
+
+def shutdown_jobs() -> None:
+    """Stop taking new work; unfinished jobs are resumed on the next start."""
+    global _EXECUTOR, _SWEEPER
+    _SWEEPER_STOP.set()
+    with _EXECUTOR_LOCK:
+        executor, _EXECUTOR = _EXECUTOR, None
+        _SWEEPER = None
+    if executor is not None:
+        executor.shutdown(wait=False, cancel_futures=True)
@@ -1,4 +1,5 @@
 import os
+from functools import lru_cache
 from typing import Any, Optional
 
 from fastapi import APIRouter, Depends, File, HTTPException, UploadFile
@@ -7,6 +8,7 @@ from fastapi.responses import StreamingResponse
 from gridfs.errors import NoFile
 
 from server.src.modules.assets_storage import GridFSStorage
+from server.src.modules.db_async import run_db
 from server.src.modules.wiki_auth import require_wiki_editor
 
 ALLOWED_MIME = {"image/png", "image/jpeg", "image/webp", "image/gif"}
@@ -14,7 +16,11 @@ MAX_UPLOAD_MB = int(os.environ.get("ASSETS_MAX_UPLOAD_MB", "10"))
 MAX_UPLOAD_BYTES = MAX_UPLOAD_MB * 1024 * 1024
 
 router = APIRouter(prefix="/api/assets", tags=["assets"])
-storage = GridFSStorage()
+
+
+@lru_cache(maxsize=1)
+def get_storage() -> GridFSStorage:
+    return GridFSStorage()
 
 
 def _validate_file(file: UploadFile) -> None:
@@ -34,7 +40,8 @@ async def upload_asset(
             status_code=400,
             detail=f"File too large (max {MAX_UPLOAD_MB} MiB)",
         )
-    meta = storage.upload(
+    meta = await run_db(
+        get_storage().upload,
         data=data,
         filename=file.filename or "asset",
         content_type=file.content_type or "application/octet-stream",
@@ -54,7 +61,7 @@ async def upload_asset(
 @router.get("/{asset_id}")
 def get_asset(asset_id: str):
     try:
-        grid_out = storage.get_file(asset_id)
+        grid_out = get_storage().get_file(asset_id)
     except (KeyError, NoFile):
         raise HTTPException(status_code=404, detail="Asset not found")
     headers = {"Cache-Control": "public, max-age=31536000, immutable"}
@@ -0,0 +1,145 @@
+from __future__ import annotations
+
+import datetime
+import json
+from typing import Any, Iterator
+
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING
+
+from db_mongo import bulk_update, get_col
+from server.src.modules.audit_writer import AUDIT_COL
+from server.src.modules.pagination import InvalidCursor, decode_cursor, encode_cursor, keyset_filter
+from settings import settings
+
+# 1: `ts` stored as a BSON date instead of an ISO string.
+AUDIT_SCHEMA_VERSION = 1
+
+# Every filter the admin view offers is an equality match followed by a ts
+# range and a ts sort, so each gets its own (field, ts) index.
+AUDIT_INDEXES = (
+    [("user", ASCENDING), ("ts", DESCENDING), ("_id", DESCENDING)],
+    [("action", ASCENDING), ("ts", DESCENDING), ("_id", DESCENDING)],
+    [("spell_id", ASCENDING), ("ts", DESCENDING), ("_id", DESCENDING)],
+)
+# The single-field ts index doubles as the TTL index when retention is set.
+TTL_INDEX = "ts_1"
+CURSOR_SORT = "ts"
+EXPORT_BATCH_SIZE = 1000
+
+
+def retention_days() -> int:
+    """AUDIT_RETENTION_DAYS; 0 (the default) keeps entries forever."""
+    return settings.audit_retention_days
+
+
+def parse_ts(value: Any) -> datetime.datetime:
+    """ISO string (with or without Z/offset) -> naive UTC datetime, as pymongo returns it."""
+    if isinstance(value, datetime.datetime):
+        dt = value
+    else:
+        dt = datetime.datetime.fromisoformat(str(value).strip().replace("Z", "+00:00"))
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return dt
+
+
+def format_ts(value: Any) -> Any:
+    if isinstance(value, datetime.datetime):
+        return parse_ts(value).isoformat(timespec="milliseconds") + "Z"
+    return value
+
+
+def ensure_audit_indexes(days: int | None = None) -> None:
+    col = get_col(AUDIT_COL)
+    for keys in AUDIT_INDEXES:
+        col.create_index(keys)
+    days = retention_days() if days is None else days
+    ttl_seconds = days * 86400 if days > 0 else None
+    current = col.index_information().get(TTL_INDEX)
+    if current is not None and current.get("expireAfterSeconds") != ttl_seconds:
+        col.drop_index(TTL_INDEX)
+    if ttl_seconds:
+        col.create_index([("ts", ASCENDING)], name=TTL_INDEX, expireAfterSeconds=ttl_seconds)
+    else:
+        col.create_index([("ts", ASCENDING)], name=TTL_INDEX)
+
+
+def migrate_audit_timestamps(batch_size: int = 1000) -> int:
+    """Rewrite ISO-string `ts` values as dates; unparseable ones are left alone."""
+    col = get_col(AUDIT_COL)
+    converted = 0
+    last_id = None
+    while True:
+        q: dict = {"ts": {"$type": "string"}}
+        if last_id is not None:
+            q["_id"] = {"$gt": last_id}
+        rows = list(col.find(q, {"_id": 1, "ts": 1}).sort("_id", ASCENDING).limit(batch_size))
+        if not rows:
+            return converted
+        updates = []
+        for row in rows:
+            try:
+                updates.append(({"_id": row["_id"]}, {"$set": {"ts": parse_ts(row["ts"])}}))
+            except ValueError:
+                continue
+        converted += bulk_update(col, updates)
+        last_id = rows[-1]["_id"]
+
+
+def migrate_audit_log() -> None:
+    migrate_audit_timestamps()
+    ensure_audit_indexes()
+
+
+def build_audit_filter(user: str = "", action: str = "", spell_id: str = "", from_: str = "", to: str = "") -> dict:
+    """Raises ValueError for a date that does not parse instead of ignoring it."""
+    q: dict = {}
+    if user:
+        q["user"] = user
+    if action:
+        q["action"] = action
+    if spell_id:
+        q["spell_id"] = spell_id
+    if from_:
+        q.setdefault("ts", {})["$gte"] = parse_ts(from_)
+    if to:
+        q.setdefault("ts", {})["$lte"] = parse_ts(to)
+    return q
+
+
+def audit_row(doc: dict) -> dict:
+    row = {k: v for k, v in doc.items() if k != "_id"}
+    row["ts"] = format_ts(row.get("ts"))
+    return row
+
+
+def audit_page(q: dict, limit: int, cursor: str = "") -> tuple[list[dict], str | None]:
+    """Newest first, keyset-paginated on (ts, _id). Raises InvalidCursor."""
+    flt = dict(q)
+    if cursor:
+        value, last_id = decode_cursor(cursor, CURSOR_SORT)
+        try:
+            after = keyset_filter(CURSOR_SORT, parse_ts(value), ObjectId(last_id), direction=-1, id_field="_id")
+        except Exception as e:
+            raise InvalidCursor("Invalid cursor") from e
+        flt = {"$and": [q, after]} if q else after
+    docs = list(
+        get_col(AUDIT_COL).find(flt).sort([("ts", DESCENDING), ("_id", DESCENDING)]).limit(limit + 1)
+    )
+    next_cursor = None
+    if len(docs) > limit:
+        docs = docs[:limit]
+        last = docs[-1]
+        next_cursor = encode_cursor(CURSOR_SORT, format_ts(last.get("ts")), str(last["_id"]))
+    return [audit_row(d) for d in docs], next_cursor
+
+
+def iter_audit_ndjson(q: dict) -> Iterator[bytes]:
+    """One JSON document per line, oldest first, read in driver-sized batches."""
+    cursor = get_col(AUDIT_COL).find(q).sort([("ts", ASCENDING), ("_id", ASCENDING)]).batch_size(EXPORT_BATCH_SIZE)
+    try:
+        for doc in cursor:
+            yield (json.dumps(audit_row(doc), default=str, ensure_ascii=False) + "\n").encode("utf-8")
+    finally:
+        cursor.close()
@@ -0,0 +1,25 @@
+from __future__ import annotations
+
+import logging
+
+from server.src.modules.batch_writer import BatchWriter
+
+AUDIT_COL = "audit_logs"
+
+
+class AuditWriter(BatchWriter):
+    """
+    Batches `audit_logs` inserts off the request path. Configured by
+    AUDIT_ASYNC, AUDIT_QUEUE_SIZE, AUDIT_BATCH_SIZE and AUDIT_FLUSH_MS.
+    """
+
+    collection_name = AUDIT_COL
+    settings_prefix = "audit"
+    # Not logging_helpers.logger: logging_helpers imports this module.
+    logger = logging.getLogger("noe.audit")
+
+    def describe(self, doc: dict) -> str:
+        return f"{doc.get('action')} by {doc.get('user')}"
+
+
+AUDIT_WRITER = AuditWriter()
@@ -1,12 +1,12 @@
 import hashlib
 import secrets
-from typing import Dict, Optional, Tuple
+import string
+from typing import Optional, Tuple
 from fastapi import Request, HTTPException
 
 from db_mongo import get_col
+from server.src.modules.session_store import get_session_store
 
-SESSIONS: Dict[str, Tuple[str, str]] = {}
-SESSION_ROLE_OVERRIDES: Dict[str, str] = {}
 AUTH_TOKEN_COOKIE = "auth_token"
 
 def _sha256(s: str) -> str:
@@ -31,6 +31,19 @@ def verify_password(input_pw: str, user_doc: dict) -> bool:
         or user_doc.get("password_hash") == _sha256(input_pw)
     )
 
+def _generate_temp_password(length: int = 12) -> str:
+    alphabet = string.ascii_letters + string.digits
+    return "".join(secrets.choice(alphabet) for _ in range(length))
+
+PASSWORD_RESET_VERSION = 1
+
+def _needs_password_reset(user: dict) -> bool:
+    try:
+        current = int(user.get("password_reset_version") or 0)
+    except (TypeError, ValueError):
+        current = 0
+    return current < PASSWORD_RESET_VERSION
+
 def normalize_email(email: str) -> str:
     return (email or "").strip().lower()
 
@@ -42,24 +55,35 @@ def _normalize_role(value: str | None) -> str:
     return raw if raw in _ALLOWED_ROLES else "user"
 
 
+def create_session(username: str, role: str) -> str:
+    token = make_token()
+    get_session_store().create(token, username, role)
+    return token
+
+
 def get_session_identity(token: str) -> Optional[Tuple[str, str, str]]:
     """Return (username, base_role, effective_role) for a session token."""
-    if not token or token not in SESSIONS:
+    if not token:
         return None
-    username, stored_role = SESSIONS[token]
+    record = get_session_store().get(token)
+    if record is None:
+        return None
+    username, stored_role, override_raw = record
     base_role = _normalize_role(stored_role)
-    override_raw = SESSION_ROLE_OVERRIDES.get(token)
-    override_role = _normalize_role(override_raw) if override_raw is not None else ""
     if base_role != "admin":
-        SESSION_ROLE_OVERRIDES.pop(token, None)
         return username, base_role, base_role
+    override_role = _normalize_role(override_raw) if override_raw is not None else ""
     effective_role = override_role if override_role == "user" else base_role
     return username, base_role, effective_role
 
 
 def clear_session(token: str) -> None:
-    SESSIONS.pop(token, None)
-    SESSION_ROLE_OVERRIDES.pop(token, None)
+    get_session_store().delete(token)
+
+
+def revoke_user_sessions(username: str) -> int:
+    """Log `username` out everywhere; returns the number of sessions removed."""
+    return get_session_store().revoke_user(username)
 
 
 def set_session_admin_privileges(token: str, enabled: bool) -> Tuple[str, str, str]:
@@ -69,10 +93,7 @@ def set_session_admin_privileges(token: str, enabled: bool) -> Tuple[str, str, s
     username, base_role, _ = identity
     if base_role != "admin":
         raise HTTPException(status_code=403, detail="Only admins can toggle admin privileges")
-    if enabled:
-        SESSION_ROLE_OVERRIDES.pop(token, None)
-    else:
-        SESSION_ROLE_OVERRIDES[token] = "user"
+    get_session_store().set_override(token, None if enabled else "user")
     updated = get_session_identity(token)
     if not updated:
         raise HTTPException(status_code=401, detail="Not authenticated")
@@ -92,3 +113,22 @@ def require_auth(request: Request, roles: Optional[list[str]] = None) -> Tuple[s
     if roles and role not in roles:
         raise HTTPException(status_code=403, detail="Forbidden")
     return username, role
+
+def _optional_auth(request: Request):
+    token = get_auth_token(request)
+    identity = get_session_identity(token or "")
+    if identity:
+        username, _base_role, role = identity
+        return username, role
+    return None, None
+
+def require_user_doc(request: Request):
+    token = get_auth_token(request)
+    identity = get_session_identity(token or "")
+    if not identity:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    username, _base_role, role = identity
+    user = get_col("users").find_one({"username": username})
+    if not user:
+        raise HTTPException(status_code=401, detail="User not found")
+    return user, role
@@ -0,0 +1,22 @@
+from typing import Any
+
+from server.src.modules.r2_storage import R2Storage
+
+AVATAR_KEYS = frozenset({"boon","awakening","talents","expertise","dima","archetype","spells","ammo","gear","tools","consumables","equipment","species","weapon"})
+
+# Shared by the character and campaign avatar routes.
+R2_STORAGE = R2Storage()
+
+def _normalize_avatar_key(value: Any) -> str | None:
+    raw = (value or "").strip().lower()
+    if not raw or raw == "auto":
+        return None
+    return raw if raw in AVATAR_KEYS else None
+
+def _avatar_field(payload: dict, field_name: str = "default_avatar") -> tuple[str | None, bool]:
+    if not isinstance(payload, dict) or field_name not in payload:
+        return None, False
+    key = _normalize_avatar_key(payload.get(field_name))
+    if key:
+        return key, False
+    return None, True
@@ -0,0 +1,218 @@
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Any, Optional
+
+from pymongo.errors import DuplicateKeyError
+
+from db_mongo import get_col
+from settings import settings
+
+
+class BatchWriter:
+    """
+    Bounded in-memory queue in front of one collection. A daemon thread writes
+    batches with insert_many once `batch_size` documents are waiting or
+    `flush_interval` seconds have passed since the oldest one arrived. A full
+    queue (or a disabled or stopped writer) falls back to writing inline, so
+    documents are never dropped for lack of room; `stats()` shows how often
+    that happens.
+
+    Subclasses set the collection and the prefix of their `Settings` fields
+    (`<prefix>_async`, `_queue_size`, `_batch_size`, `_flush_ms`).
+    """
+
+    collection_name = ""
+    settings_prefix = ""
+    logger = logging.getLogger("noe.batch")
+
+    def __init__(
+        self,
+        enabled: bool | None = None,
+        max_queue: int | None = None,
+        batch_size: int | None = None,
+        flush_interval: float | None = None,
+        collection: str | None = None,
+    ):
+        prefix = self.settings_prefix
+        self.enabled = getattr(settings, f"{prefix}_async") if enabled is None else enabled
+        self.max_queue = max_queue or getattr(settings, f"{prefix}_queue_size")
+        self.batch_size = batch_size or getattr(settings, f"{prefix}_batch_size")
+        self.flush_interval = flush_interval or getattr(settings, f"{prefix}_flush_ms") / 1000
+        self.collection = collection or self.collection_name
+        self._queue: deque[tuple[dict, Optional[Future]]] = deque()
+        self._cond = threading.Condition()
+        self._thread: threading.Thread | None = None
+        self._closed = False
+        self._in_flight = 0
+        self._flush_waiters = 0
+        self._stats = {
+            "enqueued": 0, "written": 0, "batches": 0, "sync_writes": 0, "overflows": 0,
+            "failed_batches": 0, "dropped": 0, "max_depth": 0, "last_batch_ms": 0.0,
+        }
+
+    def describe(self, doc: dict) -> str:
+        """How a dropped document is named in the log."""
+        return str(doc.get("_id"))
+
+    # ---- producer side ----
+
+    def submit(self, doc: dict, wait: bool = False) -> Optional[Future]:
+        """
+        Queue a document, or write it inline when the queue cannot take it.
+        With `wait`, returns a Future that resolves to True once the document
+        is written (False if it was dropped).
+        """
+        future: Optional[Future] = Future() if wait else None
+        if not self.enqueue(doc, future):
+            self.write_inline(doc, future)
+        return future
+
+    def enqueue(self, doc: dict, future: Optional[Future] = None) -> bool:
+        """Queue a document without ever writing inline; False means the caller must write it."""
+        if not self.enabled:
+            return False
+        with self._cond:
+            if self._closed:
+                return False
+            if len(self._queue) >= self.max_queue:
+                self._stats["overflows"] += 1
+                return False
+            self._queue.append((doc, future))
+            self._stats["enqueued"] += 1
+            self._stats["max_depth"] = max(self._stats["max_depth"], len(self._queue))
+            self._ensure_thread()
+            if len(self._queue) == 1 or len(self._queue) >= self.batch_size:
+                self._cond.notify_all()
+            return True
+
+    def write_inline(self, doc: dict, future: Optional[Future] = None) -> None:
+        self._write([(doc, future)], sync=True)
+
+    def _ensure_thread(self) -> None:
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name=f"{self.collection}-writer", daemon=True)
+            self._thread.start()
+
+    # ---- flusher thread ----
+
+    def _next_batch(self) -> list[tuple[dict, Optional[Future]]] | None:
+        with self._cond:
+            while not self._queue and not self._closed:
+                self._cond.wait()
+            deadline = time.monotonic() + self.flush_interval
+            while len(self._queue) < self.batch_size and not self._closed and not self._flush_waiters:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            if not self._queue:
+                return None
+            batch = [self._queue.popleft() for _ in range(min(len(self._queue), self.batch_size))]
+            self._in_flight = len(batch)
+            return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            self._write(batch)
+            with self._cond:
+                self._in_flight = 0
+                self._cond.notify_all()
+
+    def _write(self, batch: list[tuple[dict, Optional[Future]]], sync: bool = False) -> None:
+        started = time.perf_counter()
+        col = get_col(self.collection)
+        docs = [doc for doc, _ in batch]
+        try:
+            if len(docs) == 1:
+                col.insert_one(docs[0])
+            else:
+                col.insert_many(docs, ordered=False)
+            results, failed = [True] * len(docs), False
+        except Exception:
+            self.logger.exception("Batch of %d %s documents failed; retrying one by one", len(docs), self.collection)
+            results, failed = [], True
+            for doc in docs:
+                try:
+                    col.insert_one(doc)
+                    ok = True
+                except DuplicateKeyError:
+                    # Part of an unordered insert_many lands before the error.
+                    ok = "_id" in doc and col.count_documents({"_id": doc["_id"]}, limit=1) > 0
+                except Exception:
+                    ok = False
+                if not ok:
+                    self.logger.error("Dropping %s document %s", self.collection, self.describe(doc))
+                results.append(ok)
+        written = sum(results)
+        with self._cond:
+            self._stats["written"] += written
+            self._stats["dropped"] += len(batch) - written
+            self._stats["failed_batches"] += int(failed)
+            if sync:
+                self._stats["sync_writes"] += 1
+            else:
+                self._stats["batches"] += 1
+                self._stats["last_batch_ms"] = round((time.perf_counter() - started) * 1000, 3)
+        for (_doc, future), ok in zip(batch, results):
+            if future is not None:
+                future.set_result(ok)
+
+    # ---- lifecycle ----
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Block until everything queued so far is written. False on timeout."""
+        with self._cond:
+            if not self._queue and not self._in_flight:
+                return True
+            if self._thread is None or not self._thread.is_alive():
+                pending = list(self._queue)
+                self._queue.clear()
+            else:
+                pending = None
+                self._flush_waiters += 1
+                self._cond.notify_all()
+                try:
+                    return self._cond.wait_for(lambda: not self._queue and not self._in_flight, timeout)
+                finally:
+                    self._flush_waiters -= 1
+        if pending:
+            self._write(pending)
+        return True
+
+    def start(self) -> None:
+        with self._cond:
+            self._closed = False
+
+    def shutdown(self, timeout: float = 10.0) -> None:
+        """Drain the queue and stop the thread; later documents are written inline."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+            thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+            if thread.is_alive():
+                self.logger.warning("%s writer did not drain within %.0fs", self.collection, timeout)
+        with self._cond:
+            leftover = list(self._queue)
+            self._queue.clear()
+        if leftover:
+            self._write(leftover)
+
+    def stats(self) -> dict[str, Any]:
+        with self._cond:
+            return {
+                **self._stats,
+                "enabled": self.enabled,
+                "depth": len(self._queue) + self._in_flight,
+                "capacity": self.max_queue,
+                "running": bool(self._thread and self._thread.is_alive()),
+            }
@@ -1,15 +1,110 @@
+import asyncio
 import datetime
 import json
+import logging
 import secrets
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
 from typing import Any, Dict, Iterable, Set
 
 from fastapi import WebSocket
-from pymongo.errors import DuplicateKeyError
 
-from db_mongo import get_col, next_id_str
+from db_mongo import lazy_col
+from server.src.modules.batch_writer import BatchWriter
+from server.src.modules.chat_bus import get_chat_bus
+from server.src.modules.db_async import run_db
+from server.src.modules.fast_json import dumps
+from settings import settings
 
-CAMPAIGN_CHAT_COL = get_col("campaign_chat")
-CAMPAIGN_CHAT_WS: Dict[str, Set[WebSocket]] = {}
+CAMPAIGN_CHAT_COL = lazy_col("campaign_chat")
+
+CHAT_SEND_QUEUE = settings.chat_send_queue
+# Close code for a client that cannot keep up ("try again later").
+SLOW_CONSUMER_CLOSE_CODE = 1013
+
+CHAT_SOCKET_STATS: Counter[str] = Counter()
+
+
+class ChatConnection:
+    """
+    One chat WebSocket with a bounded send queue drained by its own writer
+    task, so a broadcast only enqueues and a slow client delays nobody else.
+    A client whose queue fills up is evicted.
+    """
+
+    def __init__(self, cid: str, websocket: WebSocket, max_queue: int | None = None):
+        self.cid = cid
+        self.websocket = websocket
+        self.queue: asyncio.Queue[str] = asyncio.Queue(maxsize=max_queue or CHAT_SEND_QUEUE)
+        self.closed = False
+        self._writer = asyncio.create_task(self._write_loop())
+
+    def offer(self, text: str) -> bool:
+        if self.closed:
+            return False
+        try:
+            self.queue.put_nowait(text)
+        except asyncio.QueueFull:
+            return False
+        CHAT_SOCKET_STATS["max_depth"] = max(CHAT_SOCKET_STATS["max_depth"], self.queue.qsize())
+        return True
+
+    async def _write_loop(self) -> None:
+        try:
+            while True:
+                text = await self.queue.get()
+                await self.websocket.send_text(text)
+                CHAT_SOCKET_STATS["sent"] += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            CHAT_SOCKET_STATS["send_errors"] += 1
+            self.detach()
+
+    def detach(self) -> None:
+        """Stop writing and leave the campaign's socket set."""
+        self.closed = True
+        if self._writer is not asyncio.current_task():
+            self._writer.cancel()
+        conns = CAMPAIGN_CHAT_WS.get(self.cid)
+        if conns is not None:
+            conns.discard(self)
+            if not conns:
+                CAMPAIGN_CHAT_WS.pop(self.cid, None)
+
+    async def evict(self) -> None:
+        if self.closed:
+            return
+        CHAT_SOCKET_STATS["evicted"] += 1
+        CHAT_SOCKET_STATS["dropped"] += self.queue.qsize() + 1
+        self.detach()
+        try:
+            await self.websocket.close(code=SLOW_CONSUMER_CLOSE_CODE)
+        except Exception:
+            pass
+
+
+CAMPAIGN_CHAT_WS: Dict[str, Set[ChatConnection]] = {}
+_EVICTIONS: Set[asyncio.Task] = set()
+
+
+def register_chat_socket(cid: str, websocket: WebSocket, max_queue: int | None = None) -> ChatConnection:
+    conn = ChatConnection(cid, websocket, max_queue)
+    CAMPAIGN_CHAT_WS.setdefault(cid, set()).add(conn)
+    return conn
+
+
+def chat_socket_stats() -> dict[str, int]:
+    conns = [conn for group in CAMPAIGN_CHAT_WS.values() for conn in group]
+    return {
+        "campaigns": len(CAMPAIGN_CHAT_WS),
+        "connections": len(conns),
+        "queued": sum(conn.queue.qsize() for conn in conns),
+        "capacity": CHAT_SEND_QUEUE,
+        **{key: CHAT_SOCKET_STATS[key] for key in ("sent", "max_depth", "evicted", "dropped", "send_errors")},
+    }
 
 
 def _chat_visibility(val: Any) -> str:
@@ -30,11 +125,33 @@ def _chat_lines(val: Any) -> list[str]:
     return []
 
 
-def _next_chat_id() -> str:
-    try:
-        return f"msg_{next_id_str('campaign_chat', padding=6)}"
-    except Exception:
-        return f"msg_{secrets.token_hex(4)}"
+class ChatIdGenerator:
+    """
+    Process-local chat ids, `msg_<ms:11 hex><seq:4 hex><node:6 hex>`. They
+    increase strictly within a process (the clock is not trusted to move
+    forward) and the random node suffix keeps workers apart, so history is
+    ordered by (ts, id) without a round-trip to the counters collection.
+    """
+
+    def __init__(self, node: str | None = None):
+        self.node = node or secrets.token_hex(3)
+        self._lock = threading.Lock()
+        self._last_ms = 0
+        self._seq = 0
+
+    def next(self, now_ms: int | None = None) -> str:
+        now_ms = int(time.time() * 1000) if now_ms is None else now_ms
+        with self._lock:
+            if now_ms > self._last_ms:
+                self._last_ms, self._seq = now_ms, 0
+            else:
+                self._seq += 1
+                if self._seq > 0xFFFF:
+                    self._last_ms, self._seq = self._last_ms + 1, 0
+            return f"msg_{self._last_ms:011x}{self._seq:04x}{self.node}"
+
+
+CHAT_IDS = ChatIdGenerator()
 
 
 def build_chat_doc(cid: str, user: str, body: dict[str, Any]) -> dict:
@@ -44,7 +161,7 @@ def build_chat_doc(cid: str, user: str, body: dict[str, Any]) -> dict:
     except Exception:
         ts_val = int(datetime.datetime.utcnow().timestamp() * 1000)
     doc = {
-        "id": _next_chat_id(),
+        "id": CHAT_IDS.next(),
         "campaign_id": cid,
         "ts": ts_val,
         "visibility": _chat_visibility(body.get("visibility")),
@@ -60,29 +177,67 @@ def build_chat_doc(cid: str, user: str, body: dict[str, Any]) -> dict:
     return doc
 
 
+async def deliver_campaign_chat(cid: str, payload: dict) -> None:
+    """Queue a payload, serialized once, for every socket this process holds for the campaign."""
+    conns = list(CAMPAIGN_CHAT_WS.get(cid, ()))
+    if not conns:
+        return
+    text = dumps(payload).decode("utf-8")
+    for conn in conns:
+        if not conn.offer(text):
+            task = asyncio.create_task(conn.evict())
+            _EVICTIONS.add(task)
+            task.add_done_callback(_EVICTIONS.discard)
+
+
+def chat_bus():
+    return get_chat_bus(deliver_campaign_chat)
+
+
 async def broadcast_campaign_chat(cid: str, msg: dict) -> None:
+    """Publish a chat message to every worker's sockets for the campaign."""
     if "_id" in msg:
         msg = {k: v for k, v in msg.items() if k != "_id"}
-    sockets = list(CAMPAIGN_CHAT_WS.get(cid, set()))
-    if not sockets:
-        return
-    payload = {"type": "chat", "message": msg}
-    dead: list[WebSocket] = []
-    for ws in sockets:
-        try:
-            await ws.send_json(payload)
-        except Exception:
-            dead.append(ws)
-    for ws in dead:
-        CAMPAIGN_CHAT_WS.get(cid, set()).discard(ws)
-    if not CAMPAIGN_CHAT_WS.get(cid):
-        CAMPAIGN_CHAT_WS.pop(cid, None)
+    await chat_bus().publish(cid, {"type": "chat", "message": msg})
 
 
-def insert_chat_doc(doc: dict[str, Any]) -> dict[str, Any]:
-    try:
-        CAMPAIGN_CHAT_COL.insert_one(doc)
-    except DuplicateKeyError:
-        doc["id"] = f"msg_{secrets.token_hex(4)}"
-        CAMPAIGN_CHAT_COL.insert_one(doc)
-    return doc
+class ChatWriter(BatchWriter):
+    """
+    Group commit for `campaign_chat`: messages are broadcast straight away and
+    written in insert_many batches every CHAT_WRITE_FLUSH_MS (default 5).
+    With CHAT_DURABLE=true the sender is only acknowledged once the batch
+    holding its message is written; otherwise a crash loses at most the
+    messages of the batch in flight.
+    """
+
+    collection_name = "campaign_chat"
+    settings_prefix = "chat_write"
+    logger = logging.getLogger("noe.chat")
+
+    def __init__(self, durable: bool | None = None, **kwargs: Any):
+        super().__init__(**kwargs)
+        self.durable = settings.chat_durable if durable is None else durable
+
+    def describe(self, doc: dict) -> str:
+        return f"{doc.get('id')} in campaign {doc.get('campaign_id')}"
+
+    def stats(self) -> dict[str, Any]:
+        return {**super().stats(), "durable": self.durable}
+
+
+CHAT_WRITER = ChatWriter()
+
+
+async def save_chat_doc(doc: dict[str, Any]) -> bool:
+    """
+    Hand a message to CHAT_WRITER. Returns at once unless the writer is
+    durable, in which case it waits for the batch and reports whether the
+    message was written. Inline writes (full queue, disabled writer) go
+    through run_db so they never block the loop.
+    """
+    future: Future | None = Future() if CHAT_WRITER.durable else None
+    if not CHAT_WRITER.enqueue(doc, future):
+        await run_db(CHAT_WRITER.write_inline, doc, future)
+    if future is None:
+        return True
+    return await asyncio.wrap_future(future)
@@ -0,0 +1,18 @@
+import secrets
+import string
+
+from db_mongo import lazy_col
+
+
+CAMPAIGN_COL = lazy_col("campaigns")
+
+def _gen_join_code():
+    alphabet = string.ascii_uppercase + string.digits
+    return "".join(secrets.choice(alphabet) for _ in range(6))
+
+def _ensure_join_code():
+    for _ in range(10):
+        code = _gen_join_code()
+        if not CAMPAIGN_COL.find_one({"join_code": code}):
+            return code
+    return _gen_join_code()
@@ -0,0 +1,916 @@
+import datetime
+import json
+from typing import Any, List
+from urllib.parse import quote
+
+from fastapi import APIRouter, Depends, File, HTTPException, Query, Request, UploadFile, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, RedirectResponse, Response
+
+from db_mongo import get_col, next_id_str, next_ids
+from server.src.modules.authentification_helpers import AUTH_TOKEN_COOKIE, get_session_identity, require_auth
+from server.src.modules.avatar_helpers import R2_STORAGE
+from server.src.modules.campaign_chat_helpers import (
+    CAMPAIGN_CHAT_COL,
+    CHAT_WRITER,
+    broadcast_campaign_chat,
+    build_chat_doc,
+    register_chat_socket,
+    save_chat_doc,
+)
+from server.src.modules.campaign_combat import (
+    advance_combat_turn,
+    create_combat_doc,
+    end_combat,
+    get_active_combat,
+    get_combat,
+    join_combat,
+    rebuild_initiative_order,
+    remove_combat_participant,
+    start_combat,
+    update_combat_participant,
+)
+from server.src.modules.campaign_helpers import CAMPAIGN_COL, _ensure_join_code
+from server.src.modules.db_async import json_body, run_db
+from server.src.modules.logging_helpers import logger
+from server.src.modules.pagination import InvalidCursor, decode_cursor, encode_cursor, keyset_filter
+
+router = APIRouter()
+
+def _campaign_character_id(entry: Any) -> str:
+    if isinstance(entry, dict):
+        return str(entry.get("character_id") or entry.get("id") or "").strip()
+    return str(entry or "").strip()
+
+
+def _campaign_character_entry(entry: Any) -> dict[str, Any]:
+    if isinstance(entry, dict):
+        return dict(entry)
+    cid = _campaign_character_id(entry)
+    if not cid:
+        return {}
+    # Legacy data may store bare ids instead of objects.
+    return {"character_id": cid}
+
+
+def _as_list_any(value: Any) -> list[Any]:
+    if isinstance(value, list):
+        return value
+    if isinstance(value, (tuple, set)):
+        return list(value)
+    if value is None:
+        return []
+    return [value]
+
+
+def _campaign_view(doc: dict, user: str | None = None, role: str | None = None) -> dict:
+    if not doc:
+        return {}
+    d = dict(doc)
+    d.pop("_id", None)
+    d.pop("avatar", None)
+    owner = str(d.get("owner") or "").strip()
+    owner_lower = owner.lower()
+    assistant_raw = _as_list_any(d.get("assistant_gms"))
+    assistant_processed = []
+    assistant_lower = set()
+    for entry in assistant_raw:
+        name = (str(entry or "")).strip()
+        if not name:
+            continue
+        if name.lower() == owner_lower:
+            continue
+        if name.lower() in assistant_lower:
+            continue
+        assistant_lower.add(name.lower())
+        assistant_processed.append(name)
+    d["assistant_gms"] = assistant_processed
+    members = [str(m).strip() for m in _as_list_any(d.get("members")) if str(m).strip()]
+    d["members"] = members
+    characters_raw = _as_list_any(d.get("characters"))
+    if user:
+        target_lower = user.lower()
+        d["is_owner"] = bool(owner and owner == user)
+        d["is_member"] = user in members
+        d["is_admin"] = (role or "").lower() == "admin"
+        if d["is_owner"]:
+            d["user_role"] = "gm"
+        elif target_lower in assistant_lower:
+            d["user_role"] = "assistant"
+        else:
+            d["user_role"] = "player"
+        d["is_assistant_gm"] = d["user_role"] == "assistant"
+    if user and not (d.get("is_owner") or d.get("is_admin")):
+        visible_chars = []
+        for raw in characters_raw:
+            c = _campaign_character_entry(raw)
+            if not c:
+                continue
+            perm = _resolve_campaign_character_permission(c, user, d.get("is_owner", False), d.get("is_admin", False))
+            if perm != DEFAULT_CAMPAIGN_PERMISSION:
+                visible_chars.append(c)
+        d["characters"] = visible_chars
+        characters_raw = visible_chars
+    chars = []
+    for raw in characters_raw:
+        c = _campaign_character_entry(raw)
+        if c:
+            chars.append(c)
+    d["characters"] = chars
+    if chars:
+        ids = []
+        for c in chars:
+            cid = _campaign_character_id(c)
+            if cid:
+                ids.append(cid)
+        if ids:
+            name_map = {
+                str(c.get("id")): (c.get("name") or "")
+                for c in get_col("characters").find({"id": {"$in": ids}}, {"_id": 0, "id": 1, "name": 1})
+            }
+            for c in chars:
+                cid = _campaign_character_id(c)
+                if not cid:
+                    continue
+                if not c.get("name") and not c.get("character_name"):
+                    nm = name_map.get(cid)
+                    if nm:
+                        c["name"] = nm
+                        c["character_name"] = nm
+    if d.get("avatar"):
+        d["avatar_url"] = f"/campaigns/{d['id']}/avatar"
+    return d
+
+PERMISSION_VALUES = {"none", "limited", "viewer", "owner"}
+DEFAULT_CAMPAIGN_PERMISSION = "none"
+
+def _normalize_campaign_permission(value: Any) -> str:
+    raw = (str(value) if value is not None else "").strip().lower()
+    if raw == "observer":
+        raw = "viewer"
+    return raw if raw in PERMISSION_VALUES else DEFAULT_CAMPAIGN_PERMISSION
+
+def _fallback_campaign_permission(entry: dict) -> str:
+    if not isinstance(entry, dict):
+        return DEFAULT_CAMPAIGN_PERMISSION
+    if entry.get("permission_all"):
+        return _normalize_campaign_permission(entry.get("permission_all"))
+    if entry.get("permission"):
+        return _normalize_campaign_permission(entry.get("permission"))
+    if entry.get("visible_to_others"):
+        return "viewer"
+    return DEFAULT_CAMPAIGN_PERMISSION
+
+def _resolve_campaign_character_permission(entry: dict, username: str, is_owner: bool, is_admin: bool) -> str:
+    if not isinstance(entry, dict):
+        return DEFAULT_CAMPAIGN_PERMISSION
+    if not username:
+        return DEFAULT_CAMPAIGN_PERMISSION
+    if is_owner or is_admin:
+        return "owner"
+    owner = str(entry.get("owner") or "").strip()
+    assigned_to = str(entry.get("assigned_to") or "").strip()
+    if owner == username or assigned_to == username:
+        return "owner"
+    perms_raw = entry.get("permissions") or entry.get("permission_map") or {}
+    perms = perms_raw if isinstance(perms_raw, dict) else {}
+    direct_value = perms.get(username)
+    direct = str(direct_value).strip() if direct_value is not None else ""
+    if direct:
+        return _normalize_campaign_permission(direct)
+    return _fallback_campaign_permission(entry)
+
+# ---------- Campaigns ----------
+def _require_campaign_access(cid: str, user: str, role: str | None = None):
+    doc = CAMPAIGN_COL.find_one({"id": cid})
+    if not doc:
+        raise HTTPException(404, "Campaign not found")
+    if (role or "").lower() == "admin":
+        return doc
+    if user != doc.get("owner") and user not in (doc.get("members") or []):
+        raise HTTPException(403, "Access denied")
+    return doc
+
+
+def _require_campaign_gm(cid: str, user: str, role: str | None = None):
+    doc = _require_campaign_access(cid, user, role)
+    normalized_role = (role or "").lower()
+    if normalized_role == "admin":
+        return doc
+    if doc.get("owner") == user:
+        return doc
+    assistants = [str(name or "").strip().lower() for name in (doc.get("assistant_gms") or []) if name]
+    if str(user or "").strip().lower() in assistants:
+        return doc
+    raise HTTPException(403, "Only GM/admin can manage combats")
+
+
+def _character_avatar_url(cid: str) -> str | None:
+    if not cid:
+        return None
+    return f"/characters/{quote(cid)}/avatar"
+
+
+def _combat_response_payload(doc: dict[str, Any] | None) -> dict[str, Any]:
+    if not doc:
+        return {}
+    return {k: v for k, v in doc.items() if k != "_id"}
+
+
+def _safe_int_value(value: Any, default: int = 0) -> int:
+    try:
+        if value is None or value == "":
+            return default
+        return int(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def _collect_characters(character_ids: List[str]) -> dict[str, dict[str, Any]]:
+    if not character_ids:
+        return {}
+    docs = list(
+        get_col("characters").find(
+            {"id": {"$in": [cid for cid in character_ids if cid]}},
+            {"_id": 0, "id": 1, "name": 1, "owner": 1, "initiative": 1, "stats": 1, "derived": 1},
+        )
+    )
+    return {str(doc.get("id") or ""): doc for doc in docs}
+
+
+def _extract_character_initiative(doc: dict[str, Any] | None) -> int:
+    if not isinstance(doc, dict):
+        return 0
+    stats = doc.get("stats") if isinstance(doc.get("stats"), dict) else {}
+    stats_derived = stats.get("derived") if isinstance(stats.get("derived"), dict) else {}
+    stats_derived_stats = (
+        stats.get("derived_stats") if isinstance(stats.get("derived_stats"), dict) else {}
+    )
+    top_derived = doc.get("derived") if isinstance(doc.get("derived"), dict) else {}
+    candidates = [
+        doc.get("initiative"),
+        stats.get("initiative"),
+        stats_derived.get("initiative"),
+        stats_derived_stats.get("initiative"),
+        top_derived.get("initiative"),
+    ]
+    for value in candidates:
+        try:
+            if value is None or value == "":
+                continue
+            return int(value)
+        except (TypeError, ValueError):
+            continue
+    return 0
+
+
+def _build_participants(
+    payload: Any,
+    campaign_doc: dict[str, Any],
+    gm_username: str,
+    start_idx: int = 0,
+) -> List[dict[str, Any]]:
+    if not isinstance(payload, list):
+        return []
+    sanitized: List[dict[str, Any]] = []
+    char_entries = {
+        str(entry.get("character_id") or "").strip(): entry
+        for entry in (campaign_doc.get("characters") or [])
+        if entry.get("character_id")
+    }
+    requested_ids = [
+        str(item.get("character_id") or "").strip()
+        for item in payload
+        if isinstance(item, dict) and item.get("character_id")
+    ]
+    character_docs = _collect_characters(list(dict.fromkeys(requested_ids)))
+    for offset, raw in enumerate(payload):
+        if not isinstance(raw, dict):
+            continue
+        char_id = str(raw.get("character_id") or "").strip()
+        is_character = bool(char_id)
+        if not is_character and not raw.get("name"):
+            continue
+        entry_info = char_entries.get(char_id)
+        char_doc = character_docs.get(char_id) if char_id else None
+        user_label = str(raw.get("name") or "").strip()
+        fallback_name = (
+            (entry_info and entry_info.get("name"))
+            or (char_doc and char_doc.get("name"))
+            or (char_doc and char_doc.get("id"))
+        )
+        name = user_label or fallback_name or (f"Dummy {offset + 1}" if not is_character else f"Character {char_id}")
+        default_initiative = _extract_character_initiative(char_doc) if is_character else 0
+        initiative = _safe_int_value(raw.get("initiative"), default_initiative)
+        participant = {
+            "id": "",
+            "type": "character" if is_character else "dummy",
+            "character_id": char_id if is_character else "",
+            "name": name,
+            "assigned_to": (entry_info and entry_info.get("assigned_to"))
+            or (char_doc and char_doc.get("owner"))
+            or "",
+            "initiative": initiative,
+            "added_idx": start_idx + offset,
+            "notes": str(raw.get("notes") or raw.get("note") or "").strip(),
+            "avatar": _character_avatar_url(char_id),
+            "player_controlled": bool(entry_info),
+            "created_by": gm_username,
+        }
+        sanitized.append(participant)
+    for participant, part_id in zip(sanitized, next_ids("combat_part", len(sanitized), padding=5)):
+        participant["id"] = f"part_{part_id}"
+    return sanitized
+
+@router.post("/campaigns")
+def create_campaign(req: Request, body: Any = Depends(json_body)):
+    user, role = require_auth(req)
+    name = (body.get("name") or "").strip()
+    if not name:
+        raise HTTPException(400, "Name required")
+    cid = next_id_str("camp")
+    doc = {
+        "id": cid,
+        "name": name,
+        "owner": user,
+        "join_code": _ensure_join_code(),
+        "members": [],
+        "assistant_gms": [],
+        "characters": [],
+        "folders": [],
+        "created_at": datetime.datetime.utcnow().isoformat()+"Z",
+        "description": body.get("description") or "",
+        "avatar": None,
+    }
+    CAMPAIGN_COL.insert_one(doc)
+    return {"status":"success", "campaign": _campaign_view(doc, user, role)}
+
+@router.get("/campaigns")
+def list_campaigns(req: Request):
+    user, role = require_auth(req)
+    docs = list(CAMPAIGN_COL.find({ "$or":[ {"owner":user}, {"members":user} ] }, {"_id":0}))
+    campaigns = []
+    for doc in docs:
+        try:
+            campaigns.append(_campaign_view(doc, user, role))
+        except Exception:
+            logger.exception("Failed to render campaign for list (campaign_id=%s)", str((doc or {}).get("id") if isinstance(doc, dict) else ""))
+    return {"status":"success", "campaigns": campaigns}
+
+@router.post("/campaigns/join")
+def join_campaign(req: Request, body: Any = Depends(json_body)):
+    user, role = require_auth(req)
+    code = (body.get("code") or "").strip().upper()
+    char_id = (body.get("character_id") or "").strip()
+    folder = (body.get("folder") or "").strip()
+    if not code:
+        raise HTTPException(400, "Code required")
+    doc = CAMPAIGN_COL.find_one({"join_code": code})
+    if not doc:
+        raise HTTPException(404, "Campaign not found")
+    if user != doc.get("owner") and user not in (doc.get("members") or []):
+        CAMPAIGN_COL.update_one({"id": doc["id"]}, {"$addToSet": {"members": user}})
+        doc["members"] = (doc.get("members") or []) + [user]
+    # Optional: join with a character
+    if char_id:
+        chars = [c for c in (doc.get("characters") or []) if _campaign_character_id(c) != char_id]
+        chars.append({
+            "character_id": char_id,
+            "assigned_to": user,
+            "folder": folder,
+            "editable_by_gm": False,
+            "edit_requests": [],
+            "visible_to_others": True
+        })
+        CAMPAIGN_COL.update_one({"id": doc["id"]}, {"$set": {"characters": chars}})
+        doc["characters"] = chars
+    return {"status":"success", "campaign": _campaign_view(doc, user, role)}
+
+@router.get("/campaigns/{cid}")
+def get_campaign(cid: str, req: Request):
+    user, role = require_auth(req)
+    doc = _require_campaign_access(cid, user, role)
+    return {"status":"success", "campaign": _campaign_view(doc, user, role)}
+
+@router.patch("/campaigns/{cid}")
+def update_campaign(cid: str, req: Request, body: Any = Depends(json_body)):
+    user, role = require_auth(req)
+    doc = _require_campaign_access(cid, user, role)
+    if doc.get("owner") != user and (role or "").lower() != "admin":
+        raise HTTPException(403, "Only GM/admin can edit campaign")
+    updates = {}
+    if "description" in body:
+        updates["description"] = (body.get("description") or "").strip()
+    if "name" in body:
+        updates["name"] = (body.get("name") or "").strip()
+    if updates:
+        CAMPAIGN_COL.update_one({"id": cid}, {"$set": updates})
+        doc.update(updates)
+    return {"status":"success", "campaign": _campaign_view(doc, user, role)}
+
+@router.post("/campaigns/{cid}/assistant_gms")
+def add_assistant_gm(cid: str, req: Request, body: Any = Depends(json_body)):
+    user, role = require_auth(req)
+    doc = _require_campaign_access(cid, user, role)
+    if doc.get("owner") != user and (role or "").lower() != "admin":
+        raise HTTPException(403, "Only the GM can manage assistant GMs")
+    target_raw = (body.get("username") or "").strip()
+    if not target_raw:
+        raise HTTPException(400, "Username required")
+    target_lower = target_raw.lower()
+    owner_lower = (doc.get("owner") or "").strip().lower()
+    if target_lower == owner_lower:
+        raise HTTPException(400, "Owner is already GM")
+    members = [m for m in (doc.get("members") or []) if m]
+    match_member = next((m for m in members if m.lower() == target_lower), None)
+    if not match_member:
+        raise HTTPException(400, "Target must be a campaign member")
+    assistant_raw = [a for a in (doc.get("assistant_gms") or []) if a]
+    assistant_lower = {a.lower() for a in assistant_raw}
+    if match_member.lower() not in assistant_lower:
+        assistant_raw = [a for a in assistant_raw if a.lower() != match_member.lower()]
+        assistant_raw.append(match_member)
+        CAMPAIGN_COL.update_one({"id": cid}, {"$set": {"assistant_gms": assistant_raw}})
+    updated = _require_campaign_access(cid, user, role)
+    return {"status":"success", "campaign": _campaign_view(updated, user, role)}
+
+@router.delete("/campaigns/{cid}/assistant_gms/{username}")
+def remove_assistant_gm(cid: str, username: str, req: Request):
+    user, role = require_auth(req)
+    doc = _require_campaign_access(cid, user, role)
+    if doc.get("owner") != user and (role or "").lower() != "admin":
+        raise HTTPException(403, "Only the GM can manage assistant GMs")
+    target = (username or "").strip()
+    target_lower = target.lower()
+    assistant_raw = [a for a in (doc.get("assistant_gms") or []) if a]
+    if not assistant_raw:
+        updated = _require_campaign_access(cid, user, role)
+        return {"status":"success", "campaign": _campaign_view(updated, user, role)}
+    normalized = [a for a in assistant_raw if a.lower() != target_lower]
+    if len(normalized) != len(assistant_raw):
+        CAMPAIGN_COL.update_one({"id": cid}, {"$set": {"assistant_gms": normalized}})
+    updated = _require_campaign_access(cid, user, role)
+    return {"status":"success", "campaign": _campaign_view(updated, user, role)}
+
+@router.post("/campaigns/{cid}/assign_character")
+def assign_campaign_character(cid: str, req: Request, body: Any = Depends(json_body)):
+    user, role = require_auth(req)
+    doc = _require_campaign_access(cid, user, role)
+    if doc.get("owner") != user and (role or "").lower() != "admin":
+        raise HTTPException(403, "Only GM can assign characters")
+    char_id = (body.get("character_id") or "").strip()
+    if not char_id:
+        raise HTTPException(400, "character_id required")
+    assigned_to = (body.get("assigned_to") or "").strip()
+    folder = (body.get("folder") or "").strip()
+    editable = bool(body.get("editable_by_gm"))
+    visible_to_others = True if body.get("visible_to_others") is None else bool(body.get("visible_to_others"))
+    permission_all = _normalize_campaign_permission(body.get("permission_all") or DEFAULT_CAMPAIGN_PERMISSION)
+    chars = [c for c in (doc.get("characters") or []) if _campaign_character_id(c) != char_id]
+    chars.append({
+        "character_id": char_id,
+        "assigned_to": assigned_to,
+        "folder": folder,
+        "editable_by_gm": editable,
+        "edit_requests": [],
+        "visible_to_others": visible_to_others,
+        "permission_all": permission_all,
+        "permissions": {}
+    })
+    CAMPAIGN_COL.update_one({"id": cid}, {"$set": {"characters": chars}})
+    doc["characters"] = chars
+    return {"status":"success", "campaign": _campaign_view(doc, user, role)}
+
+@router.patch("/campaigns/{cid}/characters/{char_id}")
+def update_campaign_character(cid: str, char_id: str, req: Request, body: Any = Depends(json_body)):
+    user, role = require_auth(req)
+    doc = _require_campaign_access(cid, user, role)
+    if doc.get("owner") != user and (role or "").lower() != "admin":
+        raise HTTPException(403, "Only GM/admin can update")
+    updated = []
+    found = False
+    for c in doc.get("characters") or []:
+        if c.get("character_id") == char_id:
+            found = True
+            c = dict(c)
+            if "assigned_to" in body: c["assigned_to"] = (body.get("assigned_to") or "").strip()
+            if "folder" in body: c["folder"] = (body.get("folder") or "").strip()
+            if "editable_by_gm" in body: c["editable_by_gm"] = bool(body.get("editable_by_gm"))
+            if "visible_to_others" in body: c["visible_to_others"] = bool(body.get("visible_to_others"))
+            if "permission_all" in body:
+                c["permission_all"] = _normalize_campaign_permission(body.get("permission_all"))
+            if "permissions" in body:
+                perms = dict(c.get("permissions") or {})
+                updates = body.get("permissions") or {}
+                for key, value in (updates or {}).items():
+                    key = (key or "").strip()
+                    if not key:
+                        continue
+                    level = str(value or "").strip().lower()
+                    if level == "default":
+                        perms.pop(key, None)
+                    else:
+                        perms[key] = _normalize_campaign_permission(level)
+                if perms:
+                    c["permissions"] = perms
+                else:
+                    c.pop("permissions", None)
+        updated.append(c)
+    if not found:
+        raise HTTPException(404, "Character not in campaign")
+    CAMPAIGN_COL.update_one({"id": cid}, {"$set": {"characters": updated}})
+    doc["characters"] = updated
+    return {"status":"success", "campaign": _campaign_view(doc, user, role)}
+
+@router.delete("/campaigns/{cid}/characters/{char_id}")
+def remove_campaign_character(cid: str, char_id: str, req: Request):
+    user, role = require_auth(req)
+    doc = _require_campaign_access(cid, user, role)
+    chars = doc.get("characters") or []
+    target = next((c for c in chars if c.get("character_id") == char_id), None)
+    if not target:
+        raise HTTPException(404, "Character not in campaign")
+    is_admin = (role or "").lower() == "admin"
+    is_owner = doc.get("owner") == user
+    is_assigned = (target.get("assigned_to") or "").strip() == user
+    if not (is_admin or is_owner or is_assigned):
+        raise HTTPException(403, "Only GM/admin or assigned player can unlink")
+    updated = [c for c in chars if c.get("character_id") != char_id]
+    CAMPAIGN_COL.update_one({"id": cid}, {"$set": {"characters": updated}})
+    doc["characters"] = updated
+    return {"status":"success", "campaign": _campaign_view(doc, user, role)}
+
+@router.post("/campaigns/{cid}/characters/{char_id}/duplicate")
+def duplicate_campaign_character(cid: str, char_id: str, req: Request, body: Any = Depends(json_body)):
+    user, role = require_auth(req)
+    doc = _require_campaign_access(cid, user, role)
+    if doc.get("owner") != user and (role or "").lower() != "admin":
+        raise HTTPException(403, "Only GM/admin can duplicate")
+    new_name = (body.get("name") or "").strip()
+
+    chars = doc.get("characters") or []
+    src_entry = next((c for c in chars if c.get("character_id") == char_id), None)
+    if not src_entry:
+        raise HTTPException(404, "Character not in campaign")
+    src = get_col("characters").find_one({"id": char_id})
+    if not src:
+        raise HTTPException(404, "Character not found")
+    src = dict(src)
+    src.pop("_id", None)
+    src.pop("id", None)
+    src["owner"] = user
+    src["name"] = new_name or (src.get("name") or "Character") + " (Copy)"
+    now = datetime.datetime.utcnow().isoformat() + "Z"
+    src["created_at"] = now
+    src["updated_at"] = now
+    new_id = next_id_str("characters", padding=4)
+    src["id"] = new_id
+    get_col("characters").insert_one(dict(src))
+
+    chars = [c for c in chars if c.get("character_id") != new_id]
+    chars.append({
+        "character_id": new_id,
+        "assigned_to": user,
+        "folder": (src_entry.get("folder") or ""),
+        "editable_by_gm": True,
+        "edit_requests": [],
+        "visible_to_others": True,
+        "permission_all": DEFAULT_CAMPAIGN_PERMISSION,
+        "permissions": {}
+    })
+    CAMPAIGN_COL.update_one({"id": cid}, {"$set": {"characters": chars}})
+    doc["characters"] = chars
+    return {"status":"success", "character_id": new_id, "campaign": _campaign_view(doc, user, role)}
+
+@router.post("/campaigns/{cid}/request_edit")
+def request_edit_rights(cid: str, req: Request, body: Any = Depends(json_body)):
+    user, role = require_auth(req)
+    char_id = (body.get("character_id") or "").strip()
+    if not char_id:
+        raise HTTPException(400, "character_id required")
+    doc = _require_campaign_access(cid, user, role)
+    updated = []
+    found = False
+    for c in doc.get("characters") or []:
+        if c.get("character_id") == char_id:
+            found = True
+            c = dict(c)
+            reqs = set(c.get("edit_requests") or [])
+            reqs.add(user)
+            c["edit_requests"] = list(reqs)
+        updated.append(c)
+    if not found:
+        raise HTTPException(404, "Character not in campaign")
+    CAMPAIGN_COL.update_one({"id": cid}, {"$set": {"characters": updated}})
+    doc["characters"] = updated
+    return {"status":"success", "campaign": _campaign_view(doc, user, role)}
+
+@router.patch("/campaigns/{cid}/folders")
+def update_campaign_folders(cid: str, req: Request, body: Any = Depends(json_body)):
+    user, role = require_auth(req)
+    doc = _require_campaign_access(cid, user, role)
+    if doc.get("owner") != user and (role or "").lower() != "admin":
+        raise HTTPException(403, "Only GM can edit folders")
+    folder = (body.get("folder") or "").strip()
+    if not folder:
+        raise HTTPException(400, "folder required")
+    folders = set(doc.get("folders") or [])
+    folders.add(folder)
+    folders_list = sorted(folders)
+    CAMPAIGN_COL.update_one({"id": cid}, {"$set": {"folders": folders_list}})
+    doc["folders"] = folders_list
+    return {"status":"success","campaign": _campaign_view(doc, user, role)}
+
+@router.post("/campaigns/{cid}/avatar")
+def upload_campaign_avatar(cid: str, file: UploadFile = File(...), request: Request = None):
+    user, role = require_auth(request)
+    doc = _require_campaign_access(cid, user, role)
+    if doc.get("owner") != user and (role or "").lower() != "admin":
+        raise HTTPException(403, "Only GM/admin can set avatar")
+    content = file.file.read()
+    content_type = (file.content_type or "image/png").strip().lower()
+    if content_type == "image/jpg":
+        content_type = "image/jpeg"
+    if R2_STORAGE.is_ready():
+        prev_key = str(doc.get("avatar_r2_key") or "").strip()
+        next_key = R2_STORAGE.key_for_campaign_avatar(cid, content_type)
+        R2_STORAGE.put_bytes(
+            next_key,
+            content,
+            content_type=content_type,
+            cache_control="public, max-age=31536000, immutable",
+            metadata={"campaign_id": cid, "owner": user},
+        )
+        if prev_key and prev_key != next_key:
+            R2_STORAGE.delete(prev_key)
+        CAMPAIGN_COL.update_one(
+            {"id": cid},
+            {
+                "$set": {
+                    "avatar_r2_key": next_key,
+                    "avatar_content_type": content_type,
+                    "updated_at": datetime.datetime.utcnow().isoformat() + "Z",
+                },
+                "$unset": {"avatar": ""},
+            },
+        )
+    else:
+        CAMPAIGN_COL.update_one({"id": cid}, {"$set": {"avatar": content}})
+    return {"status":"success"}
+
+@router.get("/campaigns/{cid}/avatar")
+def get_campaign_avatar(cid: str):
+    doc = CAMPAIGN_COL.find_one({"id": cid})
+    if not doc:
+        raise HTTPException(404, "No avatar")
+    r2_key = str(doc.get("avatar_r2_key") or "").strip()
+    if r2_key and R2_STORAGE.is_ready():
+        public_url = R2_STORAGE.public_url(r2_key)
+        if public_url:
+            return RedirectResponse(public_url, status_code=307)
+        try:
+            payload, content_type = R2_STORAGE.get_bytes(r2_key)
+            return Response(content=payload, media_type=content_type or "image/png")
+        except Exception:
+            pass
+    if not doc.get("avatar"):
+        raise HTTPException(404, "No avatar")
+    return Response(content=doc["avatar"], media_type="image/png")
+
+# ---------- Campaign Chat ----------
+@router.get("/campaigns/{cid}/chat")
+def get_campaign_chat(
+    cid: str,
+    req: Request,
+    limit: int = Query(200, ge=1, le=400),
+    before: int | None = Query(None),
+    cursor: str | None = Query(None),
+):
+    """Newest `limit` messages, oldest first; `next_cursor` fetches the page before them."""
+    user, role = require_auth(req)
+    _require_campaign_access(cid, user, role)
+    query: dict = {"campaign_id": cid}
+    if cursor:
+        # (ts, id) keyset: messages sharing a ts across the page boundary are kept.
+        try:
+            ts, last_id = decode_cursor(cursor, "ts")
+        except InvalidCursor as e:
+            return JSONResponse({"status": "error", "message": str(e)}, status_code=400)
+        query.update(keyset_filter("ts", ts, last_id, direction=-1))
+    elif before:
+        query["ts"] = {"$lt": int(before)}
+    # Messages acknowledged but still waiting for their batch.
+    CHAT_WRITER.flush(timeout=1.0)
+    docs = list(CAMPAIGN_CHAT_COL.find(query, {"_id": 0}).sort([("ts", -1), ("id", -1)]).limit(limit))
+    next_cursor = encode_cursor("ts", docs[-1].get("ts"), str(docs[-1].get("id"))) if len(docs) == limit else None
+    docs.reverse()
+    return {"status": "success", "messages": docs, "next_cursor": next_cursor}
+
+@router.post("/campaigns/{cid}/chat")
+async def post_campaign_chat(cid: str, req: Request):
+    user, role = await run_db(require_auth, req)
+    await run_db(_require_campaign_access, cid, user, role)
+    try:
+        body = await req.json()
+    except Exception:
+        body = {}
+    doc = build_chat_doc(cid, user, body or {})
+    message = dict(doc)
+    if not await save_chat_doc(doc):
+        raise HTTPException(503, "Message could not be saved")
+    await broadcast_campaign_chat(cid, message)
+    return {"status": "success", "message": message}
+
+@router.websocket("/campaigns/{cid}/chat/ws")
+async def campaign_chat_ws(websocket: WebSocket, cid: str):
+    token = websocket.query_params.get("token") or websocket.query_params.get("auth") or ""
+    if not token:
+        token = websocket.cookies.get(AUTH_TOKEN_COOKIE)
+    identity = await run_db(get_session_identity, token or "")
+    if not identity:
+        await websocket.close(code=1008)
+        return
+    user, _base_role, role = identity
+    try:
+        await run_db(_require_campaign_access, cid, user, role)
+    except HTTPException:
+        await websocket.close(code=1008)
+        return
+    await websocket.accept()
+    conn = register_chat_socket(cid, websocket)
+    try:
+        while True:
+            raw = await websocket.receive_text()
+            if not raw:
+                continue
+            if raw.lower() == "ping":
+                conn.offer("pong")
+                continue
+            try:
+                data = json.loads(raw)
+            except Exception:
+                continue
+            payload = data.get("message") if isinstance(data, dict) else None
+            if not isinstance(payload, dict):
+                continue
+            doc = build_chat_doc(cid, user, payload)
+            message = dict(doc)
+            if await save_chat_doc(doc):
+                await broadcast_campaign_chat(cid, message)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        conn.detach()
+
+
+# ---------- Campaign Combats ----------
+@router.get("/campaigns/{cid}/combats")
+def list_campaign_combats(cid: str, req: Request, status: str | None = Query(default=None)):
+    user, role = require_auth(req)
+    _require_campaign_access(cid, user, role)
+    query = {"campaign_id": cid}
+    if status:
+        query["status"] = status.strip().lower()
+    docs = list(get_col("campaign_combats").find(query, {"_id": 0}).sort("created_at", -1))
+    return {"status": "success", "combats": [_combat_response_payload(doc) for doc in docs]}
+
+
+@router.get("/campaigns/{cid}/combats/active")
+def get_campaign_active_combat(cid: str, req: Request):
+    user, role = require_auth(req)
+    _require_campaign_access(cid, user, role)
+    doc = get_active_combat(cid)
+    if not doc:
+        raise HTTPException(404, "No active combat")
+    return {"status": "success", "combat": _combat_response_payload(doc)}
+
+
+@router.get("/campaigns/{cid}/combats/{combat_id}")
+def get_campaign_combat(cid: str, combat_id: str, req: Request):
+    user, role = require_auth(req)
+    _require_campaign_access(cid, user, role)
+    doc = get_combat(cid, combat_id)
+    if not doc:
+        raise HTTPException(404, "Combat not found")
+    return {"status": "success", "combat": _combat_response_payload(doc)}
+
+
+@router.post("/campaigns/{cid}/combats")
+def create_campaign_combat(cid: str, req: Request, body: Any = Depends(json_body)):
+    user, role = require_auth(req)
+    campaign = _require_campaign_gm(cid, user, role)
+    if body is None:
+        body = {}
+    participants_raw = body.get("participants") or []
+    participants = _build_participants(participants_raw, campaign, user)
+    combat = create_combat_doc(
+        cid,
+        user,
+        participants,
+        title=(body.get("title") or "").strip(),
+        note=(body.get("notes") or body.get("description") or "").strip(),
+    )
+    return {"status": "success", "combat": _combat_response_payload(combat)}
+
+
+@router.post("/campaigns/{cid}/combats/{combat_id}/participants")
+def add_campaign_combat_participants(cid: str, combat_id: str, req: Request, body: Any = Depends(json_body)):
+    user, role = require_auth(req)
+    campaign = _require_campaign_gm(cid, user, role)
+    doc = get_combat(cid, combat_id)
+    if not doc:
+        raise HTTPException(404, "Combat not found")
+    if body is None:
+        body = {}
+    new_entries = _build_participants(
+        body.get("participants") or [], campaign, user, start_idx=len(doc.get("participants") or [])
+    )
+    if not new_entries:
+        return {"status": "success", "combat": _combat_response_payload(doc)}
+    coll = get_col("campaign_combats")
+    coll.update_one(
+        {"id": combat_id, "campaign_id": cid},
+        {"$push": {"participants": {"$each": new_entries}}},
+    )
+    updated = get_combat(cid, combat_id)
+    if updated and (updated.get("status") in {"active", "draft"}):
+        updated = rebuild_initiative_order(
+            cid,
+            combat_id,
+            keep_current=updated.get("status") == "active",
+            bump_turn_token=updated.get("status") == "active",
+        ) or updated
+    return {"status": "success", "combat": _combat_response_payload(updated)}
+
+
+@router.post("/campaigns/{cid}/combats/{combat_id}/start")
+def start_campaign_combat(cid: str, combat_id: str, req: Request):
+    user, role = require_auth(req)
+    _require_campaign_gm(cid, user, role)
+    doc = start_combat(cid, combat_id)
+    if not doc:
+        raise HTTPException(404, "Combat not found or no participants")
+    return {"status": "success", "combat": _combat_response_payload(doc)}
+
+
+@router.post("/campaigns/{cid}/combats/{combat_id}/advance")
+def advance_campaign_combat(cid: str, combat_id: str, req: Request, body: Any = Depends(json_body)):
+    user, role = require_auth(req)
+    _require_campaign_gm(cid, user, role)
+    if body is None:
+        body = {}
+    direction = (body.get("direction") or "next").strip().lower()
+    if direction not in {"next", "prev"}:
+        direction = "next"
+    doc = advance_combat_turn(cid, combat_id, direction)
+    if not doc:
+        raise HTTPException(404, "Combat not found or not active")
+    return {"status": "success", "combat": _combat_response_payload(doc)}
+
+
+@router.post("/campaigns/{cid}/combats/{combat_id}/join")
+def join_campaign_combat(cid: str, combat_id: str, req: Request):
+    user, role = require_auth(req)
+    _require_campaign_access(cid, user, role)
+    doc = join_combat(cid, combat_id, user)
+    if not doc:
+        raise HTTPException(404, "Combat not found")
+    return {"status": "success", "combat": _combat_response_payload(doc)}
+
+
+@router.post("/campaigns/{cid}/combats/{combat_id}/end")
+def end_campaign_combat(cid: str, combat_id: str, req: Request):
+    user, role = require_auth(req)
+    _require_campaign_gm(cid, user, role)
+    doc = end_combat(cid, combat_id)
+    if not doc:
+        raise HTTPException(404, "Combat not found")
+    return {"status": "success", "combat": _combat_response_payload(doc)}
+
+
+@router.patch("/campaigns/{cid}/combats/{combat_id}/participants/{participant_id}")
+def patch_campaign_combat_participant(
+    cid: str, combat_id: str, participant_id: str, req: Request,
+    body: Any = Depends(json_body),
+):
+    user, role = require_auth(req)
+    _require_campaign_gm(cid, user, role)
+    if body is None:
+        body = {}
+    if not isinstance(body, dict):
+        body = {}
+    doc = update_combat_participant(cid, combat_id, participant_id, body)
+    if not doc:
+        raise HTTPException(404, "Combat not found")
+    return {"status": "success", "combat": _combat_response_payload(doc)}
+
+
+@router.delete("/campaigns/{cid}/combats/{combat_id}/participants/{participant_id}")
+def delete_campaign_combat_participant(
+    cid: str, combat_id: str, participant_id: str, req: Request
+):
+    user, role = require_auth(req)
+    _require_campaign_gm(cid, user, role)
+    doc = remove_combat_participant(cid, combat_id, participant_id)
+    if not doc:
+        raise HTTPException(404, "Combat not found")
+    return {"status": "success", "combat": _combat_response_payload(doc)}
@@ -0,0 +1,63 @@
+from db_mongo import get_col
+
+
+_CHARACTER_REF_COLLECTIONS = ("characters", "characters_0_3_5")
+
+def _public_character_ref(field: str, value: str) -> bool:
+    ref_value = str(value or "").strip()
+    if not ref_value:
+        return False
+    for collection_name in _CHARACTER_REF_COLLECTIONS:
+        hit = get_col(collection_name).find_one({field: ref_value, "public": True}, {"_id": 1})
+        if hit:
+            return True
+    return False
+
+def _owned_character_ref(username: str | None, field: str, value: str) -> bool:
+    user = str(username or "").strip()
+    ref_value = str(value or "").strip()
+    if not user or not ref_value:
+        return False
+    for collection_name in _CHARACTER_REF_COLLECTIONS:
+        hit = get_col(collection_name).find_one({"owner": user, field: ref_value}, {"_id": 1})
+        if hit:
+            return True
+    return False
+
+def _claim_linked_resource_owner(resource_collection: str, character_field: str, resource_id: str, username: str | None) -> bool:
+    user = str(username or "").strip()
+    ref_id = str(resource_id or "").strip()
+    if not user or not ref_id:
+        return False
+    if not _owned_character_ref(user, character_field, ref_id):
+        return False
+    col = get_col(resource_collection)
+    doc = col.find_one({"id": ref_id}, {"_id": 1, "owner": 1})
+    if not doc:
+        return False
+    if str(doc.get("owner") or "").strip() == user:
+        return True
+    col.update_one({"id": ref_id}, {"$set": {"owner": user}})
+    return True
+
+def _claim_linked_resource_owner_bulk(resource_collection: str, character_field: str, username: str | None) -> int:
+    user = str(username or "").strip()
+    if not user:
+        return 0
+    linked_ids = set()
+    for collection_name in _CHARACTER_REF_COLLECTIONS:
+        cursor = get_col(collection_name).find(
+            {"owner": user, character_field: {"$exists": True, "$nin": [None, ""]}},
+            {"_id": 0, character_field: 1},
+        )
+        for row in cursor:
+            ref_id = str((row or {}).get(character_field) or "").strip()
+            if ref_id:
+                linked_ids.add(ref_id)
+    if not linked_ids:
+        return 0
+    result = get_col(resource_collection).update_many(
+        {"id": {"$in": list(linked_ids)}, "owner": {"$ne": user}},
+        {"$set": {"owner": user}},
+    )
+    return int(getattr(result, "modified_count", 0) or 0)
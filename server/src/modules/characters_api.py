@@ -0,0 +1,860 @@
+import datetime
+import math
+from typing import Any
+
+import gridfs
+from bson import ObjectId
+from fastapi import APIRouter, Depends, File, HTTPException, Request, UploadFile
+from fastapi.responses import JSONResponse, RedirectResponse, Response
+from pymongo.errors import DuplicateKeyError
+
+from db_mongo import get_col, get_db, next_id_str
+from server.src.modules.authentification_helpers import _optional_auth, require_auth
+from server.src.modules.avatar_helpers import R2_STORAGE, _normalize_avatar_key
+from server.src.modules.character_helpers import _claim_linked_resource_owner
+from server.src.modules.db_async import json_body
+from server.src.modules.fast_json import FastJSONResponse
+
+router = APIRouter()
+
+def _fs():
+    return gridfs.GridFS(get_db())
+
+# ---------- Archetype ranks ----------
+def _archetype_rank_for_level(lvl: int) -> int:
+    target = max(1, int(lvl or 1))
+    rank = 3 + math.ceil(target / 2.0)
+    return min(12, rank)
+
+def _total_from_invest(v: int) -> int:
+    try:
+        return int(v or 0) + 4
+    except Exception:
+        return 0
+
+def _compute_archetype_unlocked(archetype: dict, lvl: int) -> list[str]:
+    eff_rank = _archetype_rank_for_level(lvl)
+    ranks = archetype.get("ranks") or []
+    unlocked = []
+    for r in ranks:
+        if r.get("rank", 0) <= eff_rank:
+            unlocked.append(r)
+    # apply replacements: keep highest version per chain
+    keep_ids = []
+    replaced = set()
+    by_ab = {r["ability_id"]: r for r in unlocked}
+    docs_by_id = {d.get("id"): d for d in _load_abilities_by_id([r["ability_id"] for r in unlocked])}
+    for r in unlocked:
+        rep = r.get("replaces_id")
+        if rep and rep in by_ab:
+            replaced.add(rep)
+        ab = docs_by_id.get(r.get("ability_id"))
+        rep_doc = (ab or {}).get("archetype_replaces")
+        if rep_doc and rep_doc in by_ab:
+            replaced.add(rep_doc)
+    for r in unlocked:
+        if r["ability_id"] in replaced:
+            continue
+        keep_ids.append(r["ability_id"])
+    return keep_ids
+
+def _archetype_prereq_errors(archetype: dict, stats: dict) -> list[str]:
+    rules = archetype.get("prereq_rules") or {}
+    if not rules or not (
+        rules.get("mag_highest")
+        or rules.get("wis_half_mag")
+        or (rules.get("char_order") or [])
+        or (rules.get("char_min") or {})
+    ):
+        return []
+    if not stats:
+        return ["No stats provided for prerequisite check."]
+    errors = []
+    char_keys = ["reflex","dexterity","body","wisdom","presence","magic","willpower","tech"]
+    def mod_for(k):
+        try:
+            return _total_from_invest(stats.get(k,{}).get("invest",0))
+        except Exception:
+            return 0
+    mod_map = {k: mod_for(k) for k in char_keys}
+    if rules.get("mag_highest"):
+        mag = mod_map["magic"]
+        others = [mod_map[k] for k in char_keys if k!="magic"]
+        if not all(mag >= o for o in others):
+            errors.append(f"Magic mod {mag} is not highest (others: {max(others) if others else 0}).")
+    if rules.get("wis_half_mag"):
+        wis = mod_map["wisdom"]
+        mag = mod_map["magic"]
+        if wis < (mag/2):
+            errors.append(f"Wisdom mod {wis} is below half of Magic {mag}.")
+    order_rules = rules.get("char_order") or []
+    if order_rules:
+        vals = [(k, mod_map[k]) for k in char_keys]
+        vals.sort(key=lambda kv: (-kv[1], kv[0]))
+        rank_pos = {k:i+1 for i,(k,_) in enumerate(vals)}  # 1-based
+        for r in order_rules:
+            key = r.get("key")
+            pos = int(r.get("position") or 0)
+            if key not in rank_pos or pos not in (1,2,3):
+                continue
+            my_val = mod_map[key]
+            higher_count = sum(1 for k,v in vals if v > my_val)
+            if pos == 1 and higher_count != 0:
+                errors.append(f"{key.title()} is not highest (mod {my_val}, higher mods exist).")
+            # For 2nd / 3rd place, allow the stat to be higher than required (e.g., being 1st also satisfies "2nd highest").
+            # We only fail if the stat ranks lower than the requested position.
+            if pos == 2 and higher_count > 1:
+                errors.append(f"{key.title()} must be in the top 2 (mod {my_val}, current rank {higher_count+1}).")
+            if pos == 3 and higher_count > 2:
+                errors.append(f"{key.title()} must be in the top 3 (mod {my_val}, current rank {higher_count+1}).")
+    any_rules = rules.get("char_order_any") or []
+    if any_rules:
+        vals = [(k, mod_map[k]) for k in char_keys]
+        vals.sort(key=lambda kv: (-kv[1], kv[0]))
+        for r in any_rules:
+            pos = int(r.get("position") or 0)
+            keys = [str(k).strip() for k in (r.get("keys") or []) if str(k).strip()]
+            if pos not in (1,2,3) or not keys:
+                continue
+            ok = False
+            for key in keys:
+                if key not in mod_map:
+                    continue
+                my_val = mod_map[key]
+                higher_count = sum(1 for k,v in vals if v > my_val)
+                if pos == 1 and higher_count == 0:
+                    ok = True
+                if pos == 2 and higher_count <= 1:
+                    ok = True
+                if pos == 3 and higher_count <= 2:
+                    ok = True
+                if ok:
+                    break
+            if not ok:
+                label = " / ".join([k.title() for k in keys])
+                errors.append(f"{label} must be in the top {pos} (none match).")
+    char_min = rules.get("char_min") or {}
+    for k,v in char_min.items():
+        try:
+            req = int(v)
+            if mod_map.get(k, 0) < req:
+                errors.append(f"{k.title()} mod {mod_map.get(k,0)} below minimum {req}.")
+        except Exception:
+            continue
+    return errors
+
+def _check_archetype_prereqs(archetype: dict, stats: dict) -> bool:
+    return len(_archetype_prereq_errors(archetype, stats)) == 0
+
+
+# ---------- Characters (minimal v1) ----------
+def _bool_from(val):
+    if isinstance(val, bool):
+        return val
+    if isinstance(val, str):
+        return val.strip().lower() in ("1", "true", "yes", "y", "on")
+    if isinstance(val, (int, float)):
+        return bool(val)
+    return False
+
+def _can_view(doc, username, role):
+    if doc.get("public"):
+        return True
+    if role == "admin":
+        return True
+    return doc.get("owner") == username
+
+
+CHARACTERS_0_3_5_COL = "characters_0_3_5"
+
+
+def _utc_now_iso() -> str:
+    return datetime.datetime.utcnow().isoformat() + "Z"
+
+
+def _clone_character_for_0_3_5(cid: str) -> dict | None:
+    target_col = get_col(CHARACTERS_0_3_5_COL)
+    existing = target_col.find_one({"id": cid}, {"_id": 0})
+    if existing:
+        return existing
+    legacy = get_col("characters").find_one({"id": cid}, {"_id": 0})
+    if not legacy:
+        return None
+    now_iso = _utc_now_iso()
+    cloned = dict(legacy)
+    cloned["id"] = cid
+    cloned["legacy_character_id"] = str(legacy.get("id") or cid)
+    cloned["build_version"] = "0.3.5"
+    cloned["cloned_at"] = now_iso
+    cloned["updated_at"] = now_iso
+    if not cloned.get("created_at"):
+        cloned["created_at"] = now_iso
+    try:
+        target_col.insert_one(dict(cloned))
+    except DuplicateKeyError:
+        pass
+    return target_col.find_one({"id": cid}, {"_id": 0})
+
+
+def _find_character_doc(
+    cid: str,
+    collection_name: str = "characters",
+):
+    col = get_col(collection_name)
+    return col.find_one({"id": cid})
+
+@router.get("/characters")
+def list_my_characters(request: Request):
+    username, role = require_auth(request, roles=["user","moderator","admin"])
+    q = {"owner": username}
+    chars = list(get_col("characters").find(q, {"_id": 0}))
+    for ch in chars:
+        lvl = int(ch.get("level") or ch.get("stats",{}).get("level") or 1)
+        ch["archetype_rank"] = _archetype_rank_for_level(lvl)
+    return {"status": "success", "characters": chars}
+
+@router.get("/admin/characters")
+def admin_list_characters(request: Request):
+    require_auth(request, roles=["admin"])
+    chars = list(get_col("characters").find({}, {"_id": 0}))
+    return FastJSONResponse({"status": "success", "characters": chars})
+
+@router.post("/characters")
+def create_character(request: Request, body: Any = Depends(json_body)):
+    username, role = require_auth(request, roles=["user","moderator","admin"])
+    if body is None:
+        body = {}
+    owner = body.get("owner") if (role == "admin" and body.get("owner")) else username
+    name = (body.get("name") or "New Character").strip()
+
+    inv_id = ""
+    try:
+        inv_id = (body.get("inventory_id") or "").strip()
+    except Exception:
+        inv_id = ""
+    if inv_id:
+        inv = get_col("inventories").find_one({"id": inv_id, "owner": owner}, {"_id": 1})
+        if not inv:
+            return JSONResponse({"status": "error", "message": "Inventory not found or not owned by you"}, status_code=400)
+
+    spell_list_id = ""
+    try:
+        spell_list_id = (body.get("spell_list_id") or "").strip()
+    except Exception:
+        spell_list_id = ""
+    if spell_list_id:
+        sl = get_col("spell_lists").find_one({"id": spell_list_id, "owner": owner}, {"_id": 1})
+        if not sl:
+            return JSONResponse({"status": "error", "message": "Spell list not found or not owned by you"}, status_code=400)
+
+    cid = next_id_str("characters", padding=4)
+    public_flag = _bool_from(body.get("public"))
+    xp_val = 0
+    try:
+        xp_val = max(0, int(math.floor(float(body.get("xp") or 0))))
+    except Exception:
+        xp_val = 0
+    level_val = 1
+    try:
+        level_val = max(1, int(body.get("level") or 1))
+    except Exception:
+        level_val = 1
+    xp_ledger = body.get("xp_ledger") or []
+    if not isinstance(xp_ledger, list):
+        xp_ledger = []
+    doc = {
+        "id": cid,
+        "owner": owner,
+        "name": name,
+        "created_at": datetime.datetime.utcnow().isoformat() + "Z",
+        "updated_at": datetime.datetime.utcnow().isoformat() + "Z",
+        "public": public_flag,
+        "level": level_val,
+        "xp": xp_val,
+        "xp_ledger": xp_ledger,
+        "sublimations": body.get("sublimations") or [],
+        "avatar_id": "",
+        "archetype_id": (body.get("archetype_id") or "").strip(),
+        "expertise_ids": body.get("expertise_ids") or [],
+        "divine_manifestation_ids": body.get("divine_manifestation_ids") or [],
+        "awakening_ids": body.get("awakening_ids") or [],
+        "ability_avatars": {},
+    }
+    if inv_id:
+        doc["inventory_id"] = inv_id
+    if spell_list_id:
+        doc["spell_list_id"] = spell_list_id
+    get_col("characters").insert_one(dict(doc))
+    return {"status": "success", "id": cid, "character": {k: v for k, v in doc.items() if k != "_id"}}
+
+def _character_payload_for_view(
+    cid: str,
+    request: Request,
+    collection_name: str = "characters",
+    clone_legacy_for_0_3_5: bool = False,
+):
+    username, role = _optional_auth(request)
+    raw_doc = _find_character_doc(cid, collection_name=collection_name)
+    if not raw_doc and clone_legacy_for_0_3_5 and collection_name == CHARACTERS_0_3_5_COL:
+        legacy_doc = _find_character_doc(cid, collection_name="characters")
+        if not legacy_doc:
+            raise HTTPException(404, "Character not found")
+        legacy_public = dict(legacy_doc)
+        legacy_public.pop("_id", None)
+        if not _can_view(legacy_public, username, role):
+            if not username:
+                raise HTTPException(401, "Not authenticated")
+            raise HTTPException(403, "Forbidden")
+        _clone_character_for_0_3_5(cid)
+        raw_doc = _find_character_doc(cid, collection_name=collection_name)
+    if not raw_doc:
+        raise HTTPException(404, "Character not found")
+    doc = dict(raw_doc)
+    doc.pop("_id", None)
+    if not _can_view(doc, username, role):
+        if not username:
+            raise HTTPException(401, "Not authenticated")
+        raise HTTPException(403, "Forbidden")
+    lvl = int(doc.get("level") or doc.get("stats", {}).get("level") or 1)
+    arc_id = doc.get("archetype_id") or ""
+    arc = get_col("archetypes").find_one({"id": arc_id}, {"_id": 0}) if arc_id else None
+    eff_rank = _archetype_rank_for_level(lvl)
+    doc["archetype_rank"] = eff_rank
+    if arc:
+        doc["computed_archetype_abilities"] = _compute_archetype_unlocked(arc, lvl)
+    return {"status": "success", "character": doc}
+
+
+@router.get("/characters/{cid}")
+def get_character(cid: str, request: Request):
+    return _character_payload_for_view(cid, request, collection_name="characters")
+
+
+@router.get("/characters_0_3_5/{cid}")
+def get_character_0_3_5(cid: str, request: Request):
+    return _character_payload_for_view(
+        cid,
+        request,
+        collection_name=CHARACTERS_0_3_5_COL,
+        clone_legacy_for_0_3_5=True,
+    )
+
+def _update_character_common(
+    cid: str,
+    request: Request,
+    body: Any,
+    collection_name: str = "characters",
+    clone_legacy_for_0_3_5: bool = False,
+):
+    username, role = require_auth(request, roles=["user","moderator","admin"])
+    col = get_col(collection_name)
+    before = _find_character_doc(cid, collection_name=collection_name)
+    if not before and clone_legacy_for_0_3_5 and collection_name == CHARACTERS_0_3_5_COL:
+        legacy_before = _find_character_doc(cid, collection_name="characters")
+        if not legacy_before:
+            return JSONResponse({"status":"error","message":"Character not found"}, status_code=404)
+        if role != "admin" and legacy_before.get("owner") != username:
+            return JSONResponse({"status":"error","message":"Forbidden"}, status_code=403)
+        _clone_character_for_0_3_5(cid)
+        before = _find_character_doc(cid, collection_name=collection_name)
+    if not before:
+        return JSONResponse({"status":"error","message":"Character not found"}, status_code=404)
+    if role != "admin" and before.get("owner") != username:
+        return JSONResponse({"status":"error","message":"Forbidden"}, status_code=403)
+
+    if body is None:
+        return JSONResponse({"status":"error","message":"Invalid JSON"}, status_code=400)
+
+    name  = (body.get("name") or before.get("name","")).strip()
+    stats = body.get("stats", before.get("stats"))
+    abilities_in = body.get("abilities", before.get("abilities"))
+
+    updates = {"name": name, "updated_at": datetime.datetime.utcnow().isoformat() + "Z"}
+    if "public" in body:
+        updates["public"] = _bool_from(body.get("public"))
+    if isinstance(stats, dict):
+        updates["stats"] = stats
+        
+    if isinstance(abilities_in, list):
+        cleaned: list[str] = []
+        for item in abilities_in:
+            if isinstance(item, str):
+                if item.strip():
+                    cleaned.append(item.strip())
+            elif isinstance(item, dict) and item.get("id"):
+                cleaned.append(str(item["id"]).strip())
+        updates["abilities"] = cleaned
+    if "ability_choices" in body:
+        ac = body.get("ability_choices") or {}
+        if isinstance(ac, dict):
+            updates["ability_choices"] = ac
+    if "ability_choice_keys" in body:
+        keys_in = body.get("ability_choice_keys") or []
+        if isinstance(keys_in, list):
+            updates["ability_choice_keys"] = [str(k or "") for k in keys_in]
+    if "item_choices" in body:
+        ic = body.get("item_choices") or {}
+        if isinstance(ic, dict):
+            updates["item_choices"] = ic
+    if "xp" in body:
+        xp_val = 0
+        try:
+            xp_val = max(0, int(math.floor(float(body.get("xp") or 0))))
+        except Exception:
+            xp_val = 0
+        updates["xp"] = xp_val
+    if "level" in body:
+        lvl_val = 1
+        try:
+            lvl_val = max(1, int(body.get("level") or 1))
+        except Exception:
+            lvl_val = 1
+        updates["level"] = lvl_val
+    if "xp_ledger" in body:
+        ledger = body.get("xp_ledger") or []
+        if isinstance(ledger, list):
+            updates["xp_ledger"] = ledger
+
+    if "inventory_id" in body:
+        inv_id = str(body.get("inventory_id") or "").strip()
+        if inv_id:
+            _claim_linked_resource_owner("inventories", "inventory_id", inv_id, before.get("owner"))
+            inv = get_col("inventories").find_one({"id": inv_id, "owner": before.get("owner")}, {"_id": 1})
+            if not inv:
+                return JSONResponse({"status": "error", "message": "Inventory not found or not owned by you"}, status_code=400)
+        updates["inventory_id"] = inv_id
+
+    if "spell_list_id" in body:
+        sl_id = str(body.get("spell_list_id") or "").strip()
+        if sl_id:
+            _claim_linked_resource_owner("spell_lists", "spell_list_id", sl_id, before.get("owner"))
+            sl = get_col("spell_lists").find_one({"id": sl_id, "owner": before.get("owner")}, {"_id": 1})
+            if not sl:
+                return JSONResponse({"status": "error", "message": "Spell list not found or not owned by you"}, status_code=400)
+        updates["spell_list_id"] = sl_id
+
+    if "archetype_id" in body:
+        arc_id = str(body.get("archetype_id") or "").strip()
+        if arc_id:
+            arc = get_col("archetypes").find_one({"id": arc_id}, {"_id":1})
+            if not arc:
+                return JSONResponse({"status":"error","message":"Archetype not found"}, status_code=400)
+            if arc_id != (before.get("archetype_id") or ""):
+                errs = _archetype_prereq_errors(arc, updates.get("stats") or before.get("stats") or {})
+                if errs:
+                    return JSONResponse({"status":"error","message":"Archetype prerequisites not met", "details": errs}, status_code=400)
+        updates["archetype_id"] = arc_id
+
+    if "expertise_ids" in body:
+        exp_ids = body.get("expertise_ids") or []
+        if isinstance(exp_ids, list):
+            updates["expertise_ids"] = [str(x).strip() for x in exp_ids if str(x).strip()]
+
+    if "divine_manifestation_ids" in body:
+        dima_ids = body.get("divine_manifestation_ids") or []
+        if isinstance(dima_ids, list):
+            updates["divine_manifestation_ids"] = [str(x).strip() for x in dima_ids if str(x).strip()]
+
+    if "awakening_ids" in body:
+        awake_ids = body.get("awakening_ids") or []
+        if isinstance(awake_ids, list):
+            updates["awakening_ids"] = [str(x).strip() for x in awake_ids if str(x).strip()]
+
+    if "ability_avatars" in body:
+        avatars_in = body.get("ability_avatars") or {}
+        if isinstance(avatars_in, dict):
+            cleaned = {}
+            for aid, val in avatars_in.items():
+                key = _normalize_avatar_key(val)
+                aid_key = str(aid or "").strip()
+                if not aid_key:
+                    continue
+                if key:
+                    cleaned[aid_key] = key
+            updates["ability_avatars"] = cleaned
+
+    if "sublimations" in body:
+        subs = body.get("sublimations") or []
+        if isinstance(subs, list):
+            updates["sublimations"] = subs
+    if "starting_money" in body:
+        try:
+            money_val = max(0, int(math.floor(float(body.get("starting_money") or 0))))
+        except Exception:
+            money_val = 0
+        updates["starting_money"] = money_val
+    if "starting_gear" in body:
+        gear_val = body.get("starting_gear")
+        if isinstance(gear_val, dict):
+            updates["starting_gear"] = gear_val
+    if "avatar_id" in body:
+        updates["avatar_id"] = str(body.get("avatar_id") or "").strip()
+
+    # Archetype prereq validation is handled client-side for warnings.
+
+    col.update_one({"id": cid}, {"$set": updates})
+    after = col.find_one({"id": cid}, {"_id":0})
+    if after:
+        lvl = int(after.get("level") or after.get("stats",{}).get("level") or 1)
+        arc_id_final = after.get("archetype_id") or ""
+        arc_final = get_col("archetypes").find_one({"id": arc_id_final}, {"_id":0}) if arc_id_final else None
+        after["archetype_rank"] = _archetype_rank_for_level(lvl)
+        if arc_final:
+            after["computed_archetype_abilities"] = _compute_archetype_unlocked(arc_final, lvl)
+    return {"status":"success","character":after}
+
+
+@router.put("/characters/{cid}")
+def update_character(cid: str, request: Request, body: Any = Depends(json_body)):
+    return _update_character_common(
+        cid,
+        request,
+        body,
+        collection_name="characters",
+        clone_legacy_for_0_3_5=False,
+    )
+
+
+@router.put("/characters_0_3_5/{cid}")
+def update_character_0_3_5(cid: str, request: Request, body: Any = Depends(json_body)):
+    return _update_character_common(
+        cid,
+        request,
+        body,
+        collection_name=CHARACTERS_0_3_5_COL,
+        clone_legacy_for_0_3_5=True,
+    )
+
+def _upload_character_avatar_common(
+    cid: str,
+    request: Request,
+    file: UploadFile,
+    collection_name: str = "characters",
+    clone_legacy_for_0_3_5: bool = False,
+):
+    username, role = require_auth(request, roles=["user","moderator","admin"])
+    col = get_col(collection_name)
+    ch = _find_character_doc(cid, collection_name=collection_name)
+    if not ch and clone_legacy_for_0_3_5 and collection_name == CHARACTERS_0_3_5_COL:
+        legacy = _find_character_doc(cid, collection_name="characters")
+        if not legacy:
+            raise HTTPException(status_code=404, detail="Character not found")
+        if role != "admin" and legacy.get("owner") != username:
+            raise HTTPException(status_code=403, detail="Forbidden")
+        _clone_character_for_0_3_5(cid)
+        ch = _find_character_doc(cid, collection_name=collection_name)
+    if not ch:
+        raise HTTPException(status_code=404, detail="Character not found")
+    if role != "admin" and ch.get("owner") != username:
+        raise HTTPException(status_code=403, detail="Forbidden")
+    if not file:
+        raise HTTPException(status_code=400, detail="Missing file")
+    content_type = file.content_type or ""
+    if content_type not in ("image/png","image/jpeg","image/jpg"):
+        raise HTTPException(status_code=400, detail="Only PNG/JPEG allowed")
+    if content_type == "image/jpg":
+        content_type = "image/jpeg"
+    data = file.file.read()
+    if len(data) > 2 * 1024 * 1024:
+        raise HTTPException(status_code=400, detail="Max file size is 2MB")
+    if R2_STORAGE.is_ready():
+        previous_key = str(ch.get("avatar_r2_key") or "").strip()
+        next_key = R2_STORAGE.key_for_character_avatar(collection_name, cid, content_type)
+        R2_STORAGE.put_bytes(
+            next_key,
+            data,
+            content_type=content_type,
+            cache_control="public, max-age=31536000, immutable",
+            metadata={"owner": username, "character_id": cid, "collection": collection_name},
+        )
+        if previous_key and previous_key != next_key:
+            R2_STORAGE.delete(previous_key)
+        col.update_one(
+            {"id": cid},
+            {
+                "$set": {
+                    "avatar_r2_key": next_key,
+                    "avatar_content_type": content_type,
+                    "updated_at": _utc_now_iso(),
+                }
+            },
+        )
+        return {"status":"success","avatar_r2_key": next_key}
+    fs = _fs()
+    # delete previous
+    prev_id = ch.get("avatar_id")
+    if prev_id:
+        shared_with_legacy = False
+        if collection_name == CHARACTERS_0_3_5_COL:
+            legacy = get_col("characters").find_one({"id": cid}, {"_id": 0, "avatar_id": 1})
+            shared_with_legacy = str(legacy.get("avatar_id") or "") == str(prev_id or "")
+        if not shared_with_legacy:
+            try:
+                fs.delete(ObjectId(prev_id))
+            except Exception:
+                pass
+    new_id = fs.put(data, filename=file.filename, content_type=content_type, owner=username, character_id=cid)
+    col.update_one({"id": cid}, {"$set": {"avatar_id": str(new_id), "updated_at": _utc_now_iso()}})
+    return {"status":"success","avatar_id": str(new_id)}
+
+
+@router.post("/characters/{cid}/avatar")
+def upload_avatar(cid: str, request: Request, file: UploadFile = File(...)):
+    return _upload_character_avatar_common(
+        cid,
+        request,
+        file,
+        collection_name="characters",
+        clone_legacy_for_0_3_5=False,
+    )
+
+
+@router.post("/characters_0_3_5/{cid}/avatar")
+def upload_avatar_0_3_5(cid: str, request: Request, file: UploadFile = File(...)):
+    return _upload_character_avatar_common(
+        cid,
+        request,
+        file,
+        collection_name=CHARACTERS_0_3_5_COL,
+        clone_legacy_for_0_3_5=True,
+    )
+
+
+def _get_character_avatar_common(
+    cid: str,
+    collection_name: str = "characters",
+):
+    ch = _find_character_doc(cid, collection_name=collection_name)
+    if not ch:
+        if collection_name == CHARACTERS_0_3_5_COL:
+            legacy = _find_character_doc(cid, collection_name="characters")
+            if legacy:
+                ch = legacy
+        if not ch:
+            raise HTTPException(status_code=404, detail="Character not found")
+    av_r2_key = str(ch.get("avatar_r2_key") or "").strip()
+    av_id = str(ch.get("avatar_id") or "").strip()
+    if not av_id and collection_name == CHARACTERS_0_3_5_COL:
+        legacy = get_col("characters").find_one({"id": cid}, {"_id": 0, "avatar_id": 1, "avatar_r2_key": 1})
+        av_id = str((legacy or {}).get("avatar_id") or "").strip()
+        if not av_r2_key:
+            av_r2_key = str((legacy or {}).get("avatar_r2_key") or "").strip()
+    if av_r2_key and R2_STORAGE.is_ready():
+        public_url = R2_STORAGE.public_url(av_r2_key)
+        if public_url:
+            return RedirectResponse(public_url, status_code=307)
+        try:
+            payload, content_type = R2_STORAGE.get_bytes(av_r2_key)
+            return Response(content=payload, media_type=content_type or "image/png")
+        except Exception:
+            pass
+    if not av_id:
+        raise HTTPException(status_code=404, detail="No avatar")
+    fs = _fs()
+    try:
+        fh = fs.get(ObjectId(av_id))
+    except Exception:
+        raise HTTPException(status_code=404, detail="Not found")
+    data = fh.read()
+    return Response(content=data, media_type=fh.content_type or "image/png")
+
+
+@router.get("/characters/{cid}/avatar")
+def get_avatar(cid: str):
+    return _get_character_avatar_common(cid, collection_name="characters")
+
+
+@router.get("/characters_0_3_5/{cid}/avatar")
+def get_avatar_0_3_5(cid: str):
+    return _get_character_avatar_common(cid, collection_name=CHARACTERS_0_3_5_COL)
+
+def _delete_character_common(
+    cid: str,
+    request: Request,
+    collection_name: str = "characters",
+):
+    username, role = require_auth(request, roles=["user","moderator","admin"])
+    col = get_col(collection_name)
+    doc = _find_character_doc(cid, collection_name=collection_name)
+    if not doc:
+        return {"status":"error","message":"Character not found"}
+    if role != "admin" and doc.get("owner") != username:
+        return {"status":"error","message":"Forbidden"}
+    col.delete_one({"id": cid})
+    return {"status":"success","deleted": cid}
+
+
+@router.delete("/characters/{cid}")
+def delete_character(cid: str, request: Request):
+    return _delete_character_common(cid, request, collection_name="characters")
+
+
+@router.delete("/characters_0_3_5/{cid}")
+def delete_character_0_3_5(cid: str, request: Request):
+    return _delete_character_common(cid, request, collection_name=CHARACTERS_0_3_5_COL)
+
+def _load_abilities_by_id(ids: list[str]) -> list[dict]:
+    if not ids:
+        return []
+    col = get_col("abilities")
+    docs = list(col.find({"id": {"$in": ids}}, {"_id": 0}))
+    # index by id for fast lookup
+    idx = {d["id"]: d for d in docs}
+    # return in the same order as ids when possible
+    out = []
+    for i in ids:
+        d = idx.get(i)
+        if d:
+            out.append(d)
+    return out
+
+def _flatten_passive_modifiers(ability_docs: list[dict], origin_label: str) -> list[dict]:
+    """Extract passive modifiers with their origin info for breakdown."""
+    mods = []
+    for ab in ability_docs:
+        passive = (ab or {}).get("passive") or {}
+        for m in (passive.get("modifiers") or []):
+            if m.get("choice") or str(m.get("target") or "").startswith("choice:"):
+                continue  # skip user-choice modifiers; they are resolved per-character later
+            # Some older ability records stored the target under "key".
+            # Support both so modifiers are not dropped when flattening.
+            target = m.get("target") or m.get("key") or ""
+            mods.append({
+                "target": target,
+                "mode":   (m.get("mode") or "add").lower(),
+                "value":  float(m.get("value") or 0),
+                "note":   m.get("note", ""),
+                "source": ab.get("name", "Ability"),
+                "origin": origin_label,
+                "ability_id": ab.get("id")
+            })
+    return mods
+
+def _apply_modifiers(base: dict, modifiers: list[dict]) -> tuple[dict, dict]:
+
+    import copy
+    final_stats = copy.deepcopy(base)
+    breakdown: dict[str, list[dict]] = {}
+
+    grouped: dict[str, list[dict]] = {}
+    for m in modifiers:
+        t = m.get("target")
+        if not t:
+            continue
+        grouped.setdefault(t, []).append(m)
+
+    def get_ref(obj, dotted, create=True):
+        parts = dotted.split(".")
+        cur = obj
+        for p in parts[:-1]:
+            if p not in cur:
+                if not create: return None, None
+                cur[p] = {}
+            cur = cur[p]
+        return cur, parts[-1]
+
+    for target, arr in grouped.items():
+        sets = [x for x in arr if (x.get("mode") or "add") == "set"]
+        muls = [x for x in arr if (x.get("mode") or "add") == "mul"]
+        adds = [x for x in arr if (x.get("mode") or "add") == "add"]
+        ordered = sets + muls + adds
+
+        breakdown[target] = [{
+            "source": x.get("source"),
+            "origin": x.get("origin"),
+            "mode": x.get("mode"),
+            "value": x.get("value"),
+            "note":  x.get("note"),
+            "ability_id": x.get("ability_id"),
+        } for x in ordered]
+
+        parent, leaf = get_ref(final_stats, target)
+        if parent is None:
+            continue
+        cur_val = parent.get(leaf, 0)
+
+        try:
+            cur_val = float(cur_val)
+        except Exception:
+            cur_val = 0.0
+
+        for m in ordered:
+            mode = (m.get("mode") or "add").lower()
+            val  = float(m.get("value") or 0)
+            if mode == "set":
+                cur_val = val
+            elif mode == "mul":
+                cur_val = cur_val * val
+            else:  # add
+                cur_val = cur_val + val
+
+        parent[leaf] = int(cur_val) if cur_val.is_integer() else cur_val
+
+    return final_stats, breakdown
+
+@router.get("/characters/{cid}/computed")
+def get_character_computed(cid: str, request: Request):
+    username, role = require_auth(request, roles=["user", "moderator", "admin"])
+    col = get_col("characters")
+    ch = col.find_one({"id": cid}, {"_id": 0})
+    if not ch:
+        raise HTTPException(404, "Character not found")
+
+    base_stats = (ch.get("stats") or {}).copy()
+
+    abil = (ch.get("abilities") or {})
+    arch_ids    = [a["id"] for a in (abil.get("archetype") or [])]
+    passive_ids = [a["id"] for a in (abil.get("passive") or [])]
+    active_ids  = [a["id"] for a in (abil.get("active") or [])]
+
+    arch_docs    = _load_abilities_by_id(arch_ids)
+    passive_docs = _load_abilities_by_id(passive_ids)
+    active_docs  = _load_abilities_by_id(active_ids)
+
+    mods = []
+    mods += _flatten_passive_modifiers(arch_docs,    "Archetype")
+    mods += _flatten_passive_modifiers(passive_docs, "Passive")
+    mods += _flatten_passive_modifiers(active_docs,  "Active")
+
+    # 3) apply
+    final_stats, breakdown = _apply_modifiers(base_stats, mods)
+
+    return {
+        "status": "success",
+        "base": base_stats,
+        "final": final_stats,
+        "breakdown": breakdown,
+    }
+
+@router.get("/characters/{cid}/computed")
+def get_character_computed(cid: str, request: Request):
+    username, role = require_auth(request, roles=["user", "moderator", "admin"])
+    col = get_col("characters")
+    ch = col.find_one({"id": cid}, {"_id": 0})
+    if not ch:
+        raise HTTPException(404, "Character not found")
+
+    base_stats = (ch.get("stats") or {}).copy()
+
+    abil = (ch.get("abilities") or {})
+    arch_ids    = [a["id"] for a in (abil.get("archetype") or [])]
+    passive_ids = [a["id"] for a in (abil.get("passive") or [])]
+    active_ids  = [a["id"] for a in (abil.get("active") or [])]
+
+    arch_docs    = _load_abilities_by_id(arch_ids)
+    passive_docs = _load_abilities_by_id(passive_ids)
+    active_docs  = _load_abilities_by_id(active_ids)
+
+    mods = []
+    mods += _flatten_passive_modifiers(arch_docs,    "Archetype")
+    mods += _flatten_passive_modifiers(passive_docs, "Passive")
+    mods += _flatten_passive_modifiers(active_docs,  "Active")   # only passive blocks inside mixed actives
+
+    final_stats, breakdown = _apply_modifiers(base_stats, mods)
+
+    return {
+        "status": "success",
+        "base": base_stats,
+        "final": final_stats,
+        "breakdown": breakdown,
+    }
@@ -0,0 +1,158 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import socket
+import threading
+from typing import Any, Awaitable, Callable
+
+from bson import ObjectId
+from pymongo import CursorType
+from pymongo.errors import CollectionInvalid, PyMongoError
+
+from db_mongo import get_db, is_mongomock
+from server.src.modules.db_async import run_db
+from settings import settings
+
+logger = logging.getLogger("noe.chat")
+
+CHAT_EVENTS_COL = "chat_events"
+CHAT_BUS_BACKENDS = ("auto", "memory", "mongo")
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+# deliver(cid, payload): push a payload to the sockets this process holds.
+Deliver = Callable[[str, dict], Awaitable[None]]
+
+
+class InProcessChatBus:
+    """Single-process bus: publishing is local delivery. Used on mongomock and in tests."""
+
+    def __init__(self, deliver: Deliver):
+        self.deliver = deliver
+
+    async def start(self) -> None:
+        return None
+
+    async def stop(self) -> None:
+        return None
+
+    async def publish(self, cid: str, payload: dict) -> None:
+        await self.deliver(cid, payload)
+
+
+class MongoChatBus:
+    """
+    Cross-worker bus over a capped `chat_events` collection. A publish is
+    delivered to local sockets straight away and appended to the collection;
+    every worker tails it with a tailable/await cursor on a daemon thread and
+    delivers events that other workers published. Capped collections and
+    tailable cursors work on a standalone mongod, which change streams do not.
+    """
+
+    def __init__(self, deliver: Deliver, capped_bytes: int | None = None, collection: str = CHAT_EVENTS_COL):
+        self.deliver = deliver
+        self.capped_bytes = capped_bytes or settings.chat_bus_capped_mb * 1024 * 1024
+        self.collection = collection
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._thread: threading.Thread | None = None
+        self._stopping = threading.Event()
+
+    def _col(self):
+        return get_db()[self.collection]
+
+    def ensure_collection(self) -> None:
+        db = get_db()
+        try:
+            db.create_collection(self.collection, capped=True, size=self.capped_bytes)
+        except CollectionInvalid:
+            options = db[self.collection].options()
+            if not options.get("capped"):
+                raise RuntimeError(f"{self.collection} exists but is not capped; drop it or set CHAT_BUS=memory")
+
+    async def start(self) -> None:
+        await run_db(self.ensure_collection)
+        self._loop = asyncio.get_running_loop()
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._tail, name="chat-bus-tail", daemon=True)
+        self._thread.start()
+
+    async def stop(self) -> None:
+        self._stopping.set()
+        thread, self._thread = self._thread, None
+        if thread is not None:
+            await asyncio.to_thread(thread.join, 5)
+
+    async def publish(self, cid: str, payload: dict) -> None:
+        event = {"_id": ObjectId(), "campaign_id": cid, "origin": WORKER_ID, "payload": payload}
+        await self.deliver(cid, payload)
+        try:
+            await run_db(self._col().insert_one, event)
+        except PyMongoError:
+            logger.exception("Publishing chat event for campaign %s failed; other workers will miss it", cid)
+
+    async def dispatch(self, event: dict) -> None:
+        """Deliver one tailed event unless this worker published it."""
+        if event.get("origin") == WORKER_ID:
+            return
+        cid = str(event.get("campaign_id") or "")
+        payload = event.get("payload")
+        if cid and isinstance(payload, dict):
+            await self.deliver(cid, payload)
+
+    def _emit(self, event: dict) -> None:
+        if self._loop is not None:
+            asyncio.run_coroutine_threadsafe(self.dispatch(event), self._loop)
+
+    def _tail(self) -> None:
+        # Events are read in insertion ($natural) order and resumed by
+        # position, never by comparing _ids: ObjectIds minted on other hosts
+        # are only ordered to the second and follow each host's clock.
+        col = self._col()
+        newest = col.find_one({}, {"_id": 1}, sort=[("$natural", -1)])
+        last_id = newest["_id"] if newest else None
+        while not self._stopping.is_set():
+            try:
+                # Skip up to the last event seen, unless the capped collection
+                # has already rolled it off (then everything left is newer).
+                skipping = last_id is not None and col.find_one({"_id": last_id}, {"_id": 1}) is not None
+                cursor = col.find({}, cursor_type=CursorType.TAILABLE_AWAIT, max_await_time_ms=1000)
+                while cursor.alive and not self._stopping.is_set():
+                    for event in cursor:
+                        if skipping:
+                            skipping = event["_id"] != last_id
+                            continue
+                        last_id = event["_id"]
+                        self._emit(event)
+                        if self._stopping.is_set():
+                            break
+            except PyMongoError:
+                logger.exception("Chat bus tail cursor failed; reconnecting")
+            # A tailable cursor on an empty capped collection dies at once.
+            self._stopping.wait(0.5)
+
+
+_BUS: Any = None
+_BUS_LOCK = threading.Lock()
+
+
+def get_chat_bus(deliver: Deliver):
+    """CHAT_BUS=auto|memory|mongo; auto means in-process on mongomock, Mongo otherwise."""
+    global _BUS
+    with _BUS_LOCK:
+        if _BUS is None:
+            backend = settings.chat_bus.strip().lower()
+            if backend not in CHAT_BUS_BACKENDS:
+                raise RuntimeError(f"CHAT_BUS must be one of {', '.join(CHAT_BUS_BACKENDS)}")
+            if backend == "memory" or (backend == "auto" and is_mongomock()):
+                _BUS = InProcessChatBus(deliver)
+            else:
+                _BUS = MongoChatBus(deliver)
+        return _BUS
+
+
+def set_chat_bus(bus) -> None:
+    """Swap the bus (tests); None makes the next get_chat_bus() pick again."""
+    global _BUS
+    with _BUS_LOCK:
+        _BUS = bus
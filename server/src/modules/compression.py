@@ -0,0 +1,164 @@
+from __future__ import annotations
+
+import gzip
+import zlib
+from typing import Optional, Sequence
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+# Already-compressed or streamed-to-the-user payloads are passed through.
+SKIP_CONTENT_TYPES = ("image/", "video/", "audio/", "font/woff", "application/zip", "application/gzip", "text/event-stream")
+
+
+def negotiate_encoding(
+    accept_encoding: str,
+    brotli_enabled: bool = True,
+    candidates: Optional[Sequence[str]] = None,
+) -> Optional[str]:
+    """
+    Pick "br" or "gzip" from an Accept-Encoding header (q-values honoured), or
+    None. `candidates` restricts the choice, in preference order, to encodings
+    that already exist (e.g. precompressed files on disk).
+    """
+    offered: dict[str, float] = {}
+    for part in (accept_encoding or "").split(","):
+        token, _, params = part.strip().partition(";")
+        token = token.strip().lower()
+        if not token:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        offered[token] = q
+    if candidates is None:
+        candidates = (["br"] if brotli is not None and brotli_enabled else []) + ["gzip"]
+    best, best_q = None, 0.0
+    for enc in candidates:
+        q = offered.get(enc, offered.get("*", 0.0))
+        if q > best_q:
+            best, best_q = enc, q
+    return best
+
+
+class _Compressor:
+    def __init__(self, encoding: str, gzip_level: int, brotli_quality: int):
+        self.encoding = encoding
+        if encoding == "br":
+            self._br = brotli.Compressor(quality=brotli_quality)
+        else:
+            self._gz = zlib.compressobj(gzip_level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data: bytes) -> bytes:
+        if self.encoding == "br":
+            return self._br.process(data)
+        return self._gz.compress(data)
+
+    def flush(self) -> bytes:
+        if self.encoding == "br":
+            return self._br.finish()
+        return self._gz.flush()
+
+
+def compress_bytes(data: bytes, encoding: str, gzip_level: int = 6, brotli_quality: int = 4) -> bytes:
+    if encoding == "br":
+        return brotli.compress(data, quality=brotli_quality)
+    return gzip.compress(data, compresslevel=gzip_level, mtime=0)
+
+
+class CompressionMiddleware:
+    """
+    Negotiated br/gzip for responses of at least `minimum_size` bytes. Bodies
+    sent in one message (JSONResponse and friends) are compressed in one shot;
+    streamed bodies are compressed chunk by chunk. Responses that already
+    carry a Content-Encoding are left alone.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: int = 1024,
+        gzip_level: int = 6,
+        brotli_quality: int = 4,
+        brotli_enabled: bool = True,
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.brotli_enabled = brotli_enabled
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope.get("method") == "HEAD":
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding", ""), self.brotli_enabled)
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        responder = _CompressingResponder(self, encoding, send)
+        await self.app(scope, receive, responder)
+
+
+class _CompressingResponder:
+    def __init__(self, mw: CompressionMiddleware, encoding: str, send: Send):
+        self.mw = mw
+        self.encoding = encoding
+        self.send = send
+        self.start: Message | None = None
+        self.compressor: _Compressor | None = None
+        self.passthrough = False
+
+    async def __call__(self, message: Message) -> None:
+        kind = message["type"]
+        if kind == "http.response.start":
+            self.start = message
+            headers = Headers(raw=message.get("headers") or [])
+            content_type = headers.get("content-type", "")
+            self.passthrough = (
+                "content-encoding" in headers
+                or message.get("status", 200) in (204, 206, 304)
+                or any(content_type.startswith(prefix) for prefix in SKIP_CONTENT_TYPES)
+            )
+            return
+        if kind != "http.response.body":
+            await self.send(message)
+            return
+        body = message.get("body", b"")
+        more = message.get("more_body", False)
+        if self.start is not None:
+            start, self.start = self.start, None
+            if self.passthrough or (not more and len(body) < self.mw.minimum_size):
+                self.passthrough = True
+                await self.send(start)
+                await self.send(message)
+                return
+            headers = MutableHeaders(raw=start["headers"])
+            headers["Content-Encoding"] = self.encoding
+            headers.add_vary_header("Accept-Encoding")
+            if not more:
+                body = compress_bytes(body, self.encoding, self.mw.gzip_level, self.mw.brotli_quality)
+                headers["Content-Length"] = str(len(body))
+                await self.send(start)
+                await self.send({"type": "http.response.body", "body": body})
+                return
+            del headers["Content-Length"]
+            self.compressor = _Compressor(self.encoding, self.mw.gzip_level, self.mw.brotli_quality)
+            await self.send(start)
+        if self.passthrough or self.compressor is None:
+            await self.send(message)
+            return
+        chunk = self.compressor.compress(body)
+        if not more:
+            chunk += self.compressor.flush()
+        if chunk or not more:
+            await self.send({"type": "http.response.body", "body": chunk, "more_body": more})
@@ -0,0 +1,208 @@
+from __future__ import annotations
+
+from bisect import bisect_left
+from typing import Iterable
+
+from server.src.modules.category_table import CATEGORY_BY_MAX_MP, DEFAULT_CATEGORY
+from server.src.modules.cost_tables import ACTIVATION_COSTS, AOE_COSTS, DURATION_COSTS, RANGE_COSTS
+from server.src.modules.spell_catalog import SpellCatalog, get_spell_catalog
+
+TYPE_ORDER = {"A": 1, "B": 2, "C": 3}
+_TYPES = ("A", "B", "C")
+
+# ---- Precompiled tables -------------------------------------------------------
+# Flat (type, value) keyed lookups so a knob costs one dict probe.
+_ACTIVATION: dict[str, tuple[int, int]] = dict(ACTIVATION_COSTS)
+_RANGE: dict[tuple[str, int], tuple[int, int]] = {
+    (t, int(v)): cost for t, rows in RANGE_COSTS.items() for v, cost in rows.items()
+}
+_AOE: dict[tuple[str, str], tuple[int, int]] = {
+    (t, str(v)): cost for t, rows in AOE_COSTS.items() for v, cost in rows.items()
+}
+_DURATION: dict[int, tuple[int, int]] = {int(v): cost for v, cost in DURATION_COSTS.items()}
+
+# Sorted category ceilings; category_for_mp(mp) is the first ceiling >= mp.
+_CATEGORY_MAX: list[int] = [int(max_mp) for _, max_mp in CATEGORY_BY_MAX_MP]
+_CATEGORY_NAMES: list[str] = [name for name, _ in CATEGORY_BY_MAX_MP] + [DEFAULT_CATEGORY]
+
+_ZERO = (0, 0)
+
+
+def category_index(mp: int) -> int:
+    return bisect_left(_CATEGORY_MAX, int(mp))
+
+
+def category_for(mp: int) -> str:
+    return _CATEGORY_NAMES[category_index(mp)]
+
+
+def mp_to_next_category(mp: int) -> int:
+    """MP to add before the category changes; 0 once past the last ceiling."""
+    mp = int(mp or 0)
+    idx = category_index(mp)
+    if idx >= len(_CATEGORY_MAX):
+        return 0
+    return _CATEGORY_MAX[idx] + 1 - mp
+
+
+def _pick_max_type(types: Iterable[str]) -> str:
+    best = "A"
+    for t in types or []:
+        tt = (t or "A").upper()
+        if TYPE_ORDER.get(tt, 1) > TYPE_ORDER.get(best, 1):
+            best = tt
+    return best
+
+
+def _norm_type(value: str | None) -> str | None:
+    up = (value or "").strip().upper()
+    return up if up in _TYPES else None
+
+
+class CostEngine:
+    """
+    Spell cost rules evaluated against one catalog snapshot.
+    Every route (and Spell.compute_cost) goes through here so costs agree.
+    """
+
+    def __init__(self, catalog: SpellCatalog):
+        self.catalog = catalog
+        self._types_cache: dict[frozenset, tuple[str, str]] = {}
+
+    # ---- lookups ------------------------------------------------------------
+    def school_ids(self, effect_ids: Iterable[str]) -> frozenset:
+        catalog = self.catalog
+        out = set()
+        for eid in effect_ids or []:
+            sch = catalog.school_of(eid)
+            if sch:
+                out.add(sch.id)
+        return frozenset(out)
+
+    def types_for(self, effect_ids: Iterable[str]) -> tuple[str, str]:
+        key = self.school_ids(effect_ids)
+        hit = self._types_cache.get(key)
+        if hit is None:
+            schools = [self.catalog.schools[sid] for sid in key]
+            hit = (
+                _pick_max_type([s.range_type for s in schools]),
+                _pick_max_type([s.aoe_type for s in schools]),
+            )
+            self._types_cache[key] = hit
+        return hit
+
+    def effect_sums(self, effect_ids: Iterable[str]) -> tuple[int, int]:
+        # Intentional duplicates count once per occurrence.
+        effects = self.catalog.effects
+        mp = en = 0
+        for eid in effect_ids or []:
+            eff = effects.get(eid)
+            if eff:
+                mp += eff.mp_cost
+                en += eff.en_cost
+        return mp, en
+
+    @staticmethod
+    def knobs(activation, rt, range_val, at, aoe, duration, *, strict: bool = False) -> tuple:
+        act = _ACTIVATION.get(activation)
+        rng = _RANGE.get((rt, int(range_val)))
+        if rng is None and rt not in _TYPES:
+            rng = _RANGE.get(("A", int(range_val)))
+        area = _AOE.get((at, str(aoe)))
+        if area is None and at not in _TYPES:
+            area = _AOE.get(("A", str(aoe)))
+        dur = _DURATION.get(int(duration))
+        if strict:
+            if act is None:
+                raise ValueError(f"Unknown activation '{activation}'")
+            if rng is None:
+                raise ValueError(f"Invalid range '{range_val}' for type '{rt}'")
+            if area is None:
+                raise ValueError(f"Invalid AoE '{aoe}' for type '{at}'")
+            if dur is None:
+                raise ValueError(f"Invalid duration '{duration}'")
+        return (act or _ZERO, rng or _ZERO, area or _ZERO, dur or _ZERO)
+
+    # ---- evaluation ---------------------------------------------------------
+    def compute(
+        self,
+        activation: str,
+        range_val: int,
+        aoe: str,
+        duration: int,
+        effect_ids: Iterable[str],
+        *,
+        range_type: str | None = None,
+        aoe_type: str | None = None,
+        strict: bool = False,
+    ) -> dict:
+        effect_ids = [str(e).strip() for e in (effect_ids or []) if str(e).strip()]
+
+        # An explicit range type pins the range table; the AoE type falls back
+        # to the effects' schools unless given too.
+        rt = _norm_type(range_type)
+        if rt is None:
+            rt, at = self.types_for(effect_ids)
+        else:
+            at = (aoe_type or "A").upper() if aoe_type else self.types_for(effect_ids)[1]
+
+        eff_mp, eff_en = self.effect_sums(effect_ids)
+        knobs = self.knobs(activation, rt, range_val, at, aoe, duration, strict=strict)
+        return self._assemble(knobs, rt, at, eff_mp, eff_en)
+
+    def compute_many(self, items: Iterable[dict]) -> list[dict]:
+        """
+        Evaluate many coerced cost requests (activation, range, aoe, duration,
+        effects, range_type, aoe_type). Each distinct knob combination is
+        looked up once per batch.
+        """
+        knob_cache: dict[tuple, tuple] = {}
+        out = []
+        for it in items:
+            effect_ids = [str(e) for e in (it.get("effects") or [])]
+            rt = _norm_type(it.get("range_type"))
+            if rt is None:
+                rt, at = self.types_for(effect_ids)
+            else:
+                aoe_type = it.get("aoe_type")
+                at = aoe_type.upper() if aoe_type else self.types_for(effect_ids)[1]
+            key = (it.get("activation"), rt, int(it.get("range", 0)), at, str(it.get("aoe")), int(it.get("duration", 1)))
+            knobs = knob_cache.get(key)
+            if knobs is None:
+                knobs = knob_cache[key] = self.knobs(*key)
+            eff_mp, eff_en = self.effect_sums(effect_ids)
+            out.append(self._assemble(knobs, rt, at, eff_mp, eff_en))
+        return out
+
+    @staticmethod
+    def _assemble(knobs, rt, at, eff_mp, eff_en) -> dict:
+        (act_mp, act_en), (rng_mp, rng_en), (aoe_mp, aoe_en), (dur_mp, dur_en) = knobs
+        mp_cost = eff_mp + act_mp + rng_mp + aoe_mp + dur_mp
+        en_cost = eff_en + act_en + rng_en + aoe_en + dur_en
+        return {
+            "mp_cost": mp_cost,
+            "en_cost": en_cost,
+            "category": category_for(mp_cost),
+            "mp_to_next_category": mp_to_next_category(mp_cost),
+            "breakdown": {
+                "activation": {"mp": act_mp, "en": act_en},
+                "range":      {"mp": rng_mp, "en": rng_en, "type": rt},
+                "aoe":        {"mp": aoe_mp, "en": aoe_en, "type": at},
+                "duration":   {"mp": dur_mp, "en": dur_en},
+                "effects":    {"mp": eff_mp, "en": eff_en},
+            },
+        }
+
+
+_ENGINE: CostEngine | None = None
+
+
+def get_cost_engine(catalog: SpellCatalog | None = None) -> CostEngine:
+    """Engine for the given (or current) catalog; reused while the snapshot is unchanged."""
+    global _ENGINE
+    catalog = catalog or get_spell_catalog()
+    engine = _ENGINE
+    if engine is None or engine.catalog is not catalog:
+        engine = CostEngine(catalog)
+        _ENGINE = engine
+    return engine
@@ -0,0 +1,99 @@
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, TypeVar
+
+from fastapi import Request
+
+from db_mongo import get_col
+from settings import settings
+
+T = TypeVar("T")
+
+
+_EXECUTOR: ThreadPoolExecutor | None = None
+_EXECUTOR_LOCK = threading.Lock()
+
+
+def _executor() -> ThreadPoolExecutor:
+    global _EXECUTOR
+    with _EXECUTOR_LOCK:
+        if _EXECUTOR is None:
+            _EXECUTOR = ThreadPoolExecutor(
+                max_workers=settings.db_max_workers,
+                thread_name_prefix="noe-db",
+            )
+        return _EXECUTOR
+
+
+async def run_db(fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """
+    Run blocking pymongo work on the bounded DB pool and await the result.
+    Context variables (request-scoped state) follow the call into the worker.
+    """
+    ctx = contextvars.copy_context()
+    call = functools.partial(ctx.run, fn, *args, **kwargs)
+    return await asyncio.get_running_loop().run_in_executor(_executor(), call)
+
+
+class AsyncCollection:
+    """
+    Awaitable facade over a pymongo collection: every method call runs on the
+    DB pool. Cursors cannot cross threads lazily, so `find`/`aggregate` return
+    lists.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._col = get_col(name)
+
+    async def find(self, *args: Any, sort: Any = None, limit: int = 0, **kwargs: Any) -> list:
+        def _fetch() -> list:
+            cur = self._col.find(*args, **kwargs)
+            if sort:
+                cur = cur.sort(sort)
+            if limit:
+                cur = cur.limit(limit)
+            return list(cur)
+        return await run_db(_fetch)
+
+    async def aggregate(self, pipeline: list, **kwargs: Any) -> list:
+        return await run_db(lambda: list(self._col.aggregate(pipeline, **kwargs)))
+
+    def __getattr__(self, attr: str):
+        method = getattr(self._col, attr)
+        if not callable(method):
+            return method
+
+        async def call(*args: Any, **kwargs: Any):
+            return await run_db(method, *args, **kwargs)
+        call.__name__ = attr
+        return call
+
+
+def aget_col(name: str) -> AsyncCollection:
+    return AsyncCollection(name)
+
+
+async def json_body(request: Request) -> Any:
+    """
+    Dependency: read and parse the JSON body on the event loop so the handler
+    can be a plain `def` (run in the worker pool). Empty or malformed bodies
+    come through as None.
+    """
+    try:
+        return await request.json()
+    except Exception:
+        return None
+
+
+def shutdown_db_executor() -> None:
+    global _EXECUTOR
+    with _EXECUTOR_LOCK:
+        executor, _EXECUTOR = _EXECUTOR, None
+    if executor is not None:
+        executor.shutdown(wait=False)
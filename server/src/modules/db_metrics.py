@@ -0,0 +1,199 @@
+from __future__ import annotations
+
+import contextvars
+import logging
+import threading
+import time
+from collections import Counter
+from typing import Any, Optional
+
+import bson
+from pymongo import monitoring
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# Not logging_helpers.logger: that module imports db_mongo, which imports this one.
+logger = logging.getLogger("noe.db")
+
+# Commands that are driver housekeeping rather than work done for a request.
+_IGNORED_COMMANDS = frozenset({"hello", "ismaster", "isMaster", "ping", "saslStart", "saslContinue", "endSessions", "killCursors"})
+
+
+class RequestDBStats:
+    """Mongo commands issued while serving one request (any thread it fans out to)."""
+
+    __slots__ = ("commands", "duration_s", "bytes_out", "bytes_in", "targets", "_lock")
+
+    def __init__(self):
+        self.commands = 0
+        self.duration_s = 0.0
+        self.bytes_out = 0
+        self.bytes_in = 0
+        self.targets: Counter[str] = Counter()
+        self._lock = threading.Lock()
+
+    def add(self, command: str, collection: str, duration_s: float, bytes_out: int = 0, bytes_in: int = 0) -> None:
+        with self._lock:
+            self.commands += 1
+            self.duration_s += duration_s
+            self.bytes_out += bytes_out
+            self.bytes_in += bytes_in
+            self.targets[f"{command} {collection}" if collection else command] += 1
+
+    def server_timing(self) -> str:
+        return f'db;dur={self.duration_s * 1000:.1f};desc="{self.commands} queries"'
+
+
+CURRENT_DB_STATS: contextvars.ContextVar[Optional[RequestDBStats]] = contextvars.ContextVar("current_db_stats", default=None)
+
+
+def record_command(command: str, collection: str, duration_s: float, bytes_out: int = 0, bytes_in: int = 0) -> None:
+    """Attribute one command to the request being served, if any."""
+    stats = CURRENT_DB_STATS.get()
+    if stats is not None:
+        stats.add(command, collection, duration_s, bytes_out, bytes_in)
+
+
+def _bson_size(doc: Any) -> int:
+    raw = getattr(doc, "raw", None)
+    if raw is not None:
+        return len(raw)
+    try:
+        return len(bson.encode(doc))
+    except Exception:
+        return 0
+
+
+class MongoCommandListener(monitoring.CommandListener):
+    """
+    pymongo calls listeners synchronously on the thread that runs the command,
+    so the request's contextvar is visible here (run_db copies the context into
+    the DB pool). Commands outside a request are ignored.
+    """
+
+    def __init__(self, track_bytes: bool = False):
+        self.track_bytes = track_bytes
+        self._pending: dict[tuple[Any, int], tuple[str, int]] = {}
+        self._lock = threading.Lock()
+
+    def started(self, event: monitoring.CommandStartedEvent) -> None:
+        if CURRENT_DB_STATS.get() is None or event.command_name in _IGNORED_COMMANDS:
+            return
+        target = event.command.get(event.command_name)
+        collection = target if isinstance(target, str) else ""
+        size = _bson_size(event.command) if self.track_bytes else 0
+        with self._lock:
+            self._pending[(event.connection_id, event.request_id)] = (collection, size)
+
+    def _finish(self, event, reply: Any) -> None:
+        with self._lock:
+            pending = self._pending.pop((event.connection_id, event.request_id), None)
+        if pending is None:
+            return
+        collection, bytes_out = pending
+        bytes_in = _bson_size(reply) if self.track_bytes and reply is not None else 0
+        record_command(event.command_name, collection, event.duration_micros / 1e6, bytes_out, bytes_in)
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent) -> None:
+        self._finish(event, event.reply)
+
+    def failed(self, event: monitoring.CommandFailedEvent) -> None:
+        self._finish(event, None)
+
+
+class RouteDBMetrics:
+    """Process-wide totals per route, served by /admin/metrics."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._routes: dict[str, dict[str, Any]] = {}
+        self.started_at = time.time()
+
+    def observe(self, route: str, stats: RequestDBStats, elapsed_s: float, over_budget: bool) -> None:
+        with self._lock:
+            row = self._routes.get(route)
+            if row is None:
+                row = self._routes[route] = {
+                    "requests": 0, "commands": 0, "max_commands": 0, "db_ms": 0.0, "request_ms": 0.0,
+                    "bytes_out": 0, "bytes_in": 0, "over_budget": 0,
+                }
+            row["requests"] += 1
+            row["commands"] += stats.commands
+            row["max_commands"] = max(row["max_commands"], stats.commands)
+            row["db_ms"] += stats.duration_s * 1000
+            row["request_ms"] += elapsed_s * 1000
+            row["bytes_out"] += stats.bytes_out
+            row["bytes_in"] += stats.bytes_in
+            row["over_budget"] += int(over_budget)
+
+    def snapshot(self) -> dict[str, Any]:
+        with self._lock:
+            routes = {}
+            for route, row in self._routes.items():
+                n = row["requests"] or 1
+                routes[route] = {
+                    **row,
+                    "db_ms": round(row["db_ms"], 3),
+                    "request_ms": round(row["request_ms"], 3),
+                    "avg_commands": round(row["commands"] / n, 2),
+                    "avg_db_ms": round(row["db_ms"] / n, 3),
+                }
+        return {"since": self.started_at, "routes": dict(sorted(routes.items()))}
+
+    def reset(self) -> None:
+        with self._lock:
+            self._routes.clear()
+            self.started_at = time.time()
+
+
+ROUTE_METRICS = RouteDBMetrics()
+
+
+def _route_label(scope: Scope) -> str:
+    # FastAPI puts the matched route in the scope; plain Starlette routes only
+    # leave the endpoint behind.
+    route = scope.get("route")
+    label = getattr(route, "path_format", None) or getattr(scope.get("endpoint"), "__name__", None)
+    return f"{scope.get('method', 'GET')} {label or '(unrouted)'}"
+
+
+class DBMetricsMiddleware:
+    """
+    Opens a RequestDBStats for every HTTP request, adds a `Server-Timing: db`
+    header, folds the totals into ROUTE_METRICS and warns when a request issues
+    more than `query_budget` commands (the usual sign of a per-item lookup loop).
+    """
+
+    def __init__(self, app: ASGIApp, query_budget: int = 50, server_timing: bool = True):
+        self.app = app
+        self.query_budget = query_budget
+        self.server_timing = server_timing
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        stats = RequestDBStats()
+        token = CURRENT_DB_STATS.set(stats)
+        started = time.perf_counter()
+
+        async def send_with_timing(message: Message) -> None:
+            if message["type"] == "http.response.start" and self.server_timing:
+                headers = MutableHeaders(scope=message)
+                headers.append("Server-Timing", stats.server_timing())
+                headers.append("Server-Timing", f"app;dur={(time.perf_counter() - started) * 1000:.1f}")
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            CURRENT_DB_STATS.reset(token)
+            route = _route_label(scope)
+            over_budget = 0 < self.query_budget < stats.commands
+            if over_budget:
+                top = ", ".join(f"{target} x{n}" for target, n in stats.targets.most_common(3))
+                logger.warning(
+                    "%s issued %d Mongo commands (budget %d, %.1f ms): %s",
+                    route, stats.commands, self.query_budget, stats.duration_s * 1000, top,
+                )
+            ROUTE_METRICS.observe(route, stats, time.perf_counter() - started, over_budget)
@@ -0,0 +1,917 @@
+import math
+import re
+from typing import Any
+
+from fastapi import APIRouter, Body, HTTPException, Query, Request
+
+from db_mongo import get_col, next_id_str, norm_key
+from server.src.modules.authentification_helpers import require_auth
+from server.src.modules.fast_json import FastJSONResponse
+from server.src.modules.item_helpers import _safe_int
+from server.src.modules.name_search import add_name_filter, ranked_name_rows, touch_name_index
+from server.src.modules.submission_helpers import _now_iso
+
+router = APIRouter()
+
+ECONOMY_ENTITIES_0_3_5_COL = "economy_entities_0_3_5"
+ECONOMY_SERVICES_0_3_5_COL = "economy_services_0_3_5"
+ECONOMY_ITEM_META_0_3_5_COL = "economy_item_meta_0_3_5"
+ITEM_WEAPONS_0_3_5_COL = "item_weapons_0_3_5"
+ECONOMY_ITEM_KIND_TO_COLLECTION = {
+    "object": "objects",
+    "equipment": "equipment",
+    "weapon": ITEM_WEAPONS_0_3_5_COL,
+    "tool": "tools",
+}
+ECONOMY_AVAILABILITIES = ["Very Common", "Common", "Uncommon", "Rare", "Very Rare", "Legendary", "Unique"]
+ECONOMY_MARKUP_BY_AVAILABILITY = {
+    "Very Common": 5,
+    "Common": 10,
+    "Uncommon": 30,
+    "Rare": 75,
+    "Very Rare": 150,
+    "Legendary": 300,
+    "Unique": 1000,
+}
+ITEM_WEAPON_TRAITS_POSITIVE = {
+    "accurate",
+    "defensive",
+    "concealable",
+    "reach",
+    "chain/cord",
+    "free hand",
+    "heavy",
+    "shooting",
+    "melee shot",
+    "dual-damage",
+    "versatile",
+    "throwable",
+}
+ITEM_WEAPON_TRAITS_NEGATIVE = {"ammo", "reload", "solo-damage"}
+ITEM_WEAPON_SKILLS_ALLOWED = {"Brutality", "Accuracy", "Technicity"}
+ITEM_WEAPON_CHARACTERISTICS_ALLOWED = {"AGI", "BOD", "DEX"}
+ITEM_WEAPON_DEFAULT_SKILL_BY_CHARACTERISTIC = {
+    "AGI": "Technicity",
+    "BOD": "Brutality",
+    "DEX": "Accuracy",
+}
+ITEM_WEAPON_DEFAULT_CHARACTERISTIC_BY_SKILL = {
+    "Technicity": "AGI",
+    "Brutality": "BOD",
+    "Accuracy": "DEX",
+}
+
+def _economy_allowed_source_kinds() -> set[str]:
+    return {"entity", "service", *ECONOMY_ITEM_KIND_TO_COLLECTION.keys()}
+
+def _economy_allowed_meta_source_kinds() -> set[str]:
+    return {"entity", "service", *ECONOMY_ITEM_KIND_TO_COLLECTION.keys()}
+
+def _economy_sanitize_availability(value: Any, allow_empty: bool = False) -> str:
+    raw = str(value or "").strip()
+    if allow_empty and not raw:
+        return ""
+    if raw not in ECONOMY_AVAILABILITIES:
+        if allow_empty:
+            raise HTTPException(status_code=400, detail="Invalid availability")
+        return "Common"
+    return raw
+
+def _economy_entity_from_body(body: dict) -> dict:
+    if not isinstance(body, dict):
+        raise HTTPException(status_code=400, detail="Invalid entity payload")
+    name = str(body.get("name") or "").strip()
+    if not name:
+        raise HTTPException(status_code=400, detail="Entity name is required")
+    entity_type = str(body.get("type") or "").strip()
+    allowed_types = {"Manpower (hourly)", "Primary Resource", "Manufactured Resource", "Item"}
+    if entity_type not in allowed_types:
+        raise HTTPException(status_code=400, detail="Invalid entity type")
+    try:
+        value_per_unit = float(body.get("value_per_unit"))
+    except Exception:
+        raise HTTPException(status_code=400, detail="value_per_unit must be a number")
+    if value_per_unit < 0:
+        raise HTTPException(status_code=400, detail="value_per_unit must be >= 0")
+    availability = _economy_sanitize_availability(body.get("availability"))
+    return {
+        "name": name,
+        "name_key": norm_key(name),
+        "type": entity_type,
+        "value_per_unit": value_per_unit,
+        "availability": availability,
+    }
+
+def _economy_service_from_body(body: dict) -> dict:
+    if not isinstance(body, dict):
+        raise HTTPException(status_code=400, detail="Invalid service payload")
+    name = str(body.get("name") or "").strip()
+    if not name:
+        raise HTTPException(status_code=400, detail="Service name is required")
+    try:
+        fixed_price = float(body.get("fixed_price"))
+    except Exception:
+        raise HTTPException(status_code=400, detail="fixed_price must be a number")
+    if fixed_price < 0:
+        raise HTTPException(status_code=400, detail="fixed_price must be >= 0")
+    return {
+        "name": name,
+        "name_key": norm_key(name),
+        "fixed_price": fixed_price,
+    }
+
+def _economy_meta_from_body(body: dict) -> dict:
+    if not isinstance(body, dict):
+        raise HTTPException(status_code=400, detail="Invalid metadata payload")
+    requirements = body.get("requirements") or []
+    if not isinstance(requirements, list):
+        raise HTTPException(status_code=400, detail="requirements must be a list")
+
+    normalized_requirements: list[dict[str, Any]] = []
+    allowed_source_kinds = _economy_allowed_source_kinds()
+    for idx, raw in enumerate(requirements):
+        if not isinstance(raw, dict):
+            raise HTTPException(status_code=400, detail=f"requirements[{idx}] must be an object")
+        source_kind = str(raw.get("source_kind") or "").strip().lower()
+        source_id = str(raw.get("source_id") or "").strip()
+        if source_kind not in allowed_source_kinds:
+            raise HTTPException(status_code=400, detail=f"requirements[{idx}] has invalid source_kind")
+        if not source_id:
+            raise HTTPException(status_code=400, detail=f"requirements[{idx}] is missing source_id")
+        try:
+            quantity = float(raw.get("quantity"))
+        except Exception:
+            raise HTTPException(status_code=400, detail=f"requirements[{idx}].quantity must be a number")
+        if quantity <= 0:
+            raise HTTPException(status_code=400, detail=f"requirements[{idx}].quantity must be > 0")
+        normalized_requirements.append(
+            {
+                "source_kind": source_kind,
+                "source_id": source_id,
+                "quantity": quantity,
+            }
+        )
+
+    availability_override = _economy_sanitize_availability(body.get("availability_override"), allow_empty=True)
+
+    markup_raw = body.get("markup_pct_override")
+    if markup_raw in (None, ""):
+        markup_pct_override: float | None = None
+    else:
+        try:
+            markup_pct_override = float(markup_raw)
+        except Exception:
+            raise HTTPException(status_code=400, detail="markup_pct_override must be a number")
+        if markup_pct_override < 0:
+            raise HTTPException(status_code=400, detail="markup_pct_override must be >= 0")
+
+    return {
+        "requirements": normalized_requirements,
+        "availability_override": availability_override,
+        "markup_pct_override": markup_pct_override,
+    }
+
+def _economy_item_exists(source_kind: str, source_id: str) -> bool:
+    if source_kind == "entity":
+        return bool(get_col(ECONOMY_ENTITIES_0_3_5_COL).find_one({"id": source_id}, {"_id": 1}))
+    if source_kind == "service":
+        return bool(get_col(ECONOMY_SERVICES_0_3_5_COL).find_one({"id": source_id}, {"_id": 1}))
+    collection = ECONOMY_ITEM_KIND_TO_COLLECTION.get(source_kind)
+    if not collection:
+        return False
+    return bool(get_col(collection).find_one({"id": source_id}, {"_id": 1}))
+
+def _economy_catalog_rows(source_kind: str, q: str, per_kind_limit: int) -> list[dict]:
+    if source_kind not in ECONOMY_ITEM_KIND_TO_COLLECTION:
+        return []
+    target_collection = ECONOMY_ITEM_KIND_TO_COLLECTION[source_kind]
+    col = get_col(target_collection)
+    projection = {
+        "_id": 0,
+        "id": 1,
+        "name": 1,
+        "price": 1,
+        "enc": 1,
+        "category": 1,
+        "slot": 1,
+        "subcategory": 1,
+        "tier": 1,
+        "method": 1,
+    }
+    if source_kind == "weapon" and target_collection == ITEM_WEAPONS_0_3_5_COL:
+        projection = {
+            "_id": 0,
+            "id": 1,
+            "name": 1,
+            "fixed_price": 1,
+            "price": 1,
+            "hands": 1,
+            "preferred_damage_type": 1,
+            "skill_used": 1,
+            "range": 1,
+            "magazine_size": 1,
+        }
+    if (q or "").strip():
+        rows = ranked_name_rows(target_collection, q, {}, projection, per_kind_limit)
+    else:
+        rows = list(col.find({}, projection).limit(per_kind_limit))
+    out = []
+    for row in rows:
+        rid = str(row.get("id") or "").strip()
+        if not rid:
+            continue
+        out.append(
+            {
+                "uid": f"{source_kind}:{rid}",
+                "source_kind": source_kind,
+                "source_id": rid,
+                "name": str(row.get("name") or rid),
+                "fixed_price": float(row.get("fixed_price") if row.get("fixed_price") is not None else row.get("price") or 0),
+                "enc": float(row.get("enc") or 0),
+                "category": row.get("category") or row.get("subcategory") or "",
+                "slot": row.get("slot") or "",
+                "tier": row.get("tier") or "",
+                "method": row.get("method") or "",
+            }
+        )
+        if source_kind == "weapon" and target_collection == ITEM_WEAPONS_0_3_5_COL:
+            out[-1]["category"] = out[-1]["category"] or "Weapon 0.3.5"
+            out[-1]["method"] = str(row.get("skill_used") or "")
+            out[-1]["hands"] = _safe_int(row.get("hands"), 0)
+            out[-1]["preferred_damage_type"] = str(row.get("preferred_damage_type") or "")
+            out[-1]["range"] = _safe_int(row.get("range"), 0)
+            out[-1]["magazine_size"] = _safe_int(row.get("magazine_size"), 0)
+    return out
+
+def _economy_primary_resource_catalog_rows(q: str, per_kind_limit: int) -> list[dict]:
+    col = get_col(ECONOMY_ENTITIES_0_3_5_COL)
+    filt: dict[str, Any] = {"type": "Primary Resource"}
+    projection = {
+        "_id": 0,
+        "id": 1,
+        "name": 1,
+        "value_per_unit": 1,
+        "availability": 1,
+        "type": 1,
+    }
+    if (q or "").strip():
+        rows = ranked_name_rows(ECONOMY_ENTITIES_0_3_5_COL, q, filt, projection, per_kind_limit)
+    else:
+        rows = list(col.find(filt, projection).limit(per_kind_limit))
+    out = []
+    for row in rows:
+        rid = str(row.get("id") or "").strip()
+        if not rid:
+            continue
+        out.append(
+            {
+                "uid": f"entity:{rid}",
+                "source_kind": "entity",
+                "source_id": rid,
+                "name": str(row.get("name") or rid),
+                "fixed_price": float(row.get("value_per_unit") or 0),
+                "enc": 0,
+                "category": "Primary Resource",
+                "slot": "",
+                "tier": "",
+                "method": "",
+                "entity_type": str(row.get("type") or "Primary Resource"),
+                "entity_availability": str(row.get("availability") or "Common"),
+            }
+        )
+    return out
+
+def _sanitize_rich_text_html(value: Any) -> str:
+    raw = str(value or "").strip()
+    if not raw:
+        return ""
+    raw = re.sub(r"(?is)<(script|style).*?>.*?</\1>", "", raw)
+    raw = re.sub(r"(?i)\son\w+\s*=\s*(\".*?\"|'.*?')", "", raw)
+    raw = re.sub(r"(?i)javascript:", "", raw)
+    return raw
+
+def _html_to_plain_text(value: Any) -> str:
+    raw = str(value or "")
+    if not raw:
+        return ""
+    text = re.sub(r"(?is)<br\s*/?>", "\n", raw)
+    text = re.sub(r"(?is)<[^>]+>", "", text)
+    text = re.sub(r"\r\n?", "\n", text)
+    text = re.sub(r"[ \t]+", " ", text)
+    text = re.sub(r"\n{3,}", "\n\n", text)
+    return text.strip()
+
+def _normalize_item_weapon_trait_label(value: Any) -> str:
+    trait = str(value or "").strip()
+    trait = re.sub(r"\s+", " ", trait)
+    return trait
+
+def _item_weapon_trait_score(trait_label: str) -> int | None:
+    key = _normalize_item_weapon_trait_label(trait_label).lower()
+    key = key.replace("—", "-").replace("–", "-").replace("_", "-")
+    key = re.sub(r"\s+", " ", key).strip()
+    if not key:
+        return None
+    if key.startswith("shooting"):
+        return 1
+    if key.startswith("reload"):
+        return -1
+    compact = key.replace(" ", "")
+    if compact == "solodamage":
+        key = "solo-damage"
+    if key in ITEM_WEAPON_TRAITS_POSITIVE:
+        return 1
+    if key in ITEM_WEAPON_TRAITS_NEGATIVE:
+        return -1
+    return None
+
+def _item_weapon_trait_value(trait_label: str, trait_kind: str) -> int | None:
+    label = _normalize_item_weapon_trait_label(trait_label)
+    kind = str(trait_kind or "").strip().lower()
+    if kind not in {"shooting", "reload"}:
+        return None
+    m = re.match(rf"(?i)^{re.escape(kind)}\s*\(\s*(\d+)\s*\)\s*$", label)
+    if not m:
+        return None
+    try:
+        return int(m.group(1))
+    except Exception:
+        return None
+
+def _item_weapon_auto_stats_from_traits(traits: list[str], body: dict) -> tuple[list[str], int, int]:
+    has_shooting = False
+    has_reload = False
+    shooting_values: list[int] = []
+    reload_values: list[int] = []
+
+    for trait in traits:
+        key = _normalize_item_weapon_trait_label(trait).lower()
+        if key.startswith("shooting"):
+            has_shooting = True
+            val = _item_weapon_trait_value(trait, "shooting")
+            if val is not None:
+                if val <= 0:
+                    raise HTTPException(status_code=400, detail="Shooting (X) requires X > 0")
+                shooting_values.append(val)
+        if key.startswith("reload"):
+            has_reload = True
+            val = _item_weapon_trait_value(trait, "reload")
+            if val is not None:
+                if val <= 0:
+                    raise HTTPException(status_code=400, detail="Reload (X) requires X > 0")
+                reload_values.append(val)
+
+    shooting_x = shooting_values[0] if shooting_values else 0
+    if has_shooting and not shooting_x:
+        shooting_x = _safe_int(body.get("shooting_range") or body.get("range"), 0)
+    if has_shooting and shooting_x <= 0:
+        raise HTTPException(status_code=400, detail="Shooting (X) requires a numeric X > 0")
+
+    reload_x = reload_values[0] if reload_values else 0
+    if has_reload and not reload_x:
+        reload_x = _safe_int(body.get("reload_x") or body.get("magazine_size") or body.get("magazine"), 0)
+    if has_reload and reload_x <= 0:
+        raise HTTPException(status_code=400, detail="Reload (X) requires a numeric X > 0")
+
+    if len(set(shooting_values)) > 1:
+        raise HTTPException(status_code=400, detail="Shooting (X) traits must use the same X value")
+    if len(set(reload_values)) > 1:
+        raise HTTPException(status_code=400, detail="Reload (X) traits must use the same X value")
+
+    normalized_traits: list[str] = []
+    for trait in traits:
+        key = _normalize_item_weapon_trait_label(trait).lower()
+        if key.startswith("shooting"):
+            normalized_traits.append(f"Shooting ({shooting_x})")
+            continue
+        if key.startswith("reload"):
+            normalized_traits.append(f"Reload ({reload_x})")
+            continue
+        if key.replace(" ", "") == "solodamage":
+            normalized_traits.append("Solo-Damage")
+            continue
+        normalized_traits.append(_normalize_item_weapon_trait_label(trait))
+
+    return normalized_traits, (shooting_x if has_shooting else 0), (reload_x if has_reload else 0)
+
+def _item_weapon_traits_from_body(body: dict) -> tuple[list[str], int]:
+    raw = body.get("traits")
+    if isinstance(raw, str):
+        traits = [part.strip() for part in raw.split(",") if part.strip()]
+    elif isinstance(raw, list):
+        traits = [_normalize_item_weapon_trait_label(part) for part in raw if str(part or "").strip()]
+    else:
+        traits = []
+    if not traits:
+        raise HTTPException(status_code=400, detail="At least one trait is required")
+    net = 0
+    for trait in traits:
+        score = _item_weapon_trait_score(trait)
+        if score is None:
+            raise HTTPException(status_code=400, detail=f"Unknown trait: {trait}")
+        net += score
+    return traits, net
+
+def _item_weapon_examples_from_body(body: dict) -> list[str]:
+    raw = body.get("examples")
+    if isinstance(raw, str):
+        vals = [part.strip() for part in raw.split(",") if part.strip()]
+    elif isinstance(raw, list):
+        vals = [str(part or "").strip() for part in raw if str(part or "").strip()]
+    else:
+        vals = []
+    deduped: list[str] = []
+    seen = set()
+    for entry in vals:
+        key = entry.lower()
+        if key in seen:
+            continue
+        seen.add(key)
+        deduped.append(entry)
+    return deduped
+
+def _item_weapon_scope_from_body(body: dict, allow_general: bool) -> str:
+    raw = str((body or {}).get("visibility") or "").strip().lower()
+    if allow_general and raw == "general":
+        return "general"
+    return "user"
+
+def _item_weapon_from_body(body: dict, allow_general: bool = False) -> dict:
+    if not isinstance(body, dict):
+        raise HTTPException(status_code=400, detail="Invalid weapon payload")
+    name = str(body.get("name") or "").strip()
+    if not name:
+        raise HTTPException(status_code=400, detail="Weapon name is required")
+    hands = _safe_int(body.get("hands"), 1)
+    if hands not in (1, 2):
+        raise HTTPException(status_code=400, detail="hands must be 1 or 2")
+    preferred_damage_type = str(
+        body.get("preferred_damage_type")
+        or body.get("damage_type")
+        or "Rending"
+    ).strip()
+    if not preferred_damage_type:
+        preferred_damage_type = "Rending"
+
+    traits, trait_net = _item_weapon_traits_from_body(body)
+    traits, auto_range, auto_magazine = _item_weapon_auto_stats_from_traits(traits, body)
+    bonus_damage_from_trait_sacrifice = bool(body.get("bonus_damage_from_trait_sacrifice") or body.get("sacrifice_trait_for_damage"))
+    expected_net = 2 if hands == 1 else 3
+    if bonus_damage_from_trait_sacrifice:
+        expected_net -= 1
+    if trait_net != expected_net:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Trait balance mismatch: got {trait_net}, expected {expected_net} for {hands}-hand weapon",
+        )
+
+    skill_raw = str(body.get("skill_used") or body.get("skill") or "").strip().title()
+    characteristic_raw = str(body.get("characteristic") or "").strip().upper()
+
+    if characteristic_raw and characteristic_raw not in ITEM_WEAPON_CHARACTERISTICS_ALLOWED:
+        raise HTTPException(status_code=400, detail="characteristic must be AGI, BOD, or DEX")
+    if skill_raw and skill_raw not in ITEM_WEAPON_SKILLS_ALLOWED:
+        raise HTTPException(status_code=400, detail="skill_used must be Brutality, Accuracy, or Technicity")
+
+    if not characteristic_raw and skill_raw:
+        characteristic_raw = ITEM_WEAPON_DEFAULT_CHARACTERISTIC_BY_SKILL.get(skill_raw, "AGI")
+    if not skill_raw and characteristic_raw:
+        skill_raw = ITEM_WEAPON_DEFAULT_SKILL_BY_CHARACTERISTIC.get(characteristic_raw, "Technicity")
+    if not characteristic_raw:
+        characteristic_raw = "AGI"
+    if not skill_raw:
+        skill_raw = ITEM_WEAPON_DEFAULT_SKILL_BY_CHARACTERISTIC.get(characteristic_raw, "Technicity")
+
+    desc_html = _sanitize_rich_text_html(body.get("description_html") or body.get("description") or "")
+    desc_text = str(body.get("description_text") or "").strip() or _html_to_plain_text(desc_html)
+    if len(desc_text) > 5000:
+        raise HTTPException(status_code=400, detail="description is too long")
+
+    examples = _item_weapon_examples_from_body(body)
+    visibility = _item_weapon_scope_from_body(body, allow_general=allow_general)
+
+    damage_formula = f"2d6 + Lvl + {characteristic_raw}"
+    if bonus_damage_from_trait_sacrifice:
+        damage_formula = f"{damage_formula} + 2"
+
+    return {
+        "name": name,
+        "name_key": norm_key(name),
+        "hands": hands,
+        "preferred_damage_type": preferred_damage_type,
+        "range": auto_range,
+        "magazine_size": auto_magazine,
+        "traits": traits,
+        "trait_net": trait_net,
+        "required_trait_net": expected_net,
+        "bonus_damage_from_trait_sacrifice": bonus_damage_from_trait_sacrifice,
+        "skill_used": skill_raw,
+        "characteristic": characteristic_raw,
+        "damage_formula": damage_formula,
+        "description_html": desc_html,
+        "description_text": desc_text,
+        "examples": examples,
+        "visibility": visibility,
+    }
+
+def _item_weapon_view(doc: dict) -> dict:
+    out = dict(doc or {})
+    out.pop("_id", None)
+    return out
+
+@router.get("/economy-0-3-5/bootstrap")
+def economy_0_3_5_bootstrap(request: Request):
+    require_auth(request, roles=["moderator", "admin"])
+    entities = list(get_col(ECONOMY_ENTITIES_0_3_5_COL).find({}, {"_id": 0}))
+    services = list(get_col(ECONOMY_SERVICES_0_3_5_COL).find({}, {"_id": 0}))
+    entities.sort(key=lambda row: str(row.get("name") or "").lower())
+    services.sort(key=lambda row: str(row.get("name") or "").lower())
+    return {
+        "status": "success",
+        "entities": entities,
+        "services": services,
+        "availabilities": ECONOMY_AVAILABILITIES,
+        "markup_by_availability": ECONOMY_MARKUP_BY_AVAILABILITY,
+    }
+
+@router.get("/economy-0-3-5/entities")
+def economy_0_3_5_list_entities(request: Request, q: str = ""):
+    require_auth(request, roles=["moderator", "admin"])
+    col = get_col(ECONOMY_ENTITIES_0_3_5_COL)
+    filt = add_name_filter({}, ECONOMY_ENTITIES_0_3_5_COL, q) if (q or "").strip() else {}
+    rows = list(col.find(filt, {"_id": 0}))
+    rows.sort(key=lambda row: str(row.get("name") or "").lower())
+    return {"status": "success", "entities": rows}
+
+@router.post("/economy-0-3-5/entities")
+def economy_0_3_5_create_entity(request: Request, body: dict = Body(...)):
+    username, _role = require_auth(request, roles=["moderator", "admin"])
+    col = get_col(ECONOMY_ENTITIES_0_3_5_COL)
+    doc = _economy_entity_from_body(body)
+    if col.find_one({"name_key": doc["name_key"], "type": doc["type"]}):
+        raise HTTPException(status_code=409, detail="Duplicate economy entity")
+    now = _now_iso()
+    doc["id"] = next_id_str(ECONOMY_ENTITIES_0_3_5_COL, padding=4)
+    doc["created_at"] = now
+    doc["updated_at"] = now
+    doc["created_by"] = username
+    doc["updated_by"] = username
+    col.insert_one(dict(doc))
+    touch_name_index(ECONOMY_ENTITIES_0_3_5_COL, [doc["id"]])
+    return {"status": "success", "entity": {k: v for k, v in doc.items() if k != "_id"}}
+
+@router.put("/economy-0-3-5/entities/{entity_id}")
+def economy_0_3_5_update_entity(entity_id: str, request: Request, body: dict = Body(...)):
+    username, _role = require_auth(request, roles=["moderator", "admin"])
+    eid = str(entity_id or "").strip()
+    if not eid:
+        raise HTTPException(status_code=400, detail="entity_id is required")
+    col = get_col(ECONOMY_ENTITIES_0_3_5_COL)
+    before = col.find_one({"id": eid})
+    if not before:
+        raise HTTPException(status_code=404, detail="Entity not found")
+    updates = _economy_entity_from_body(body)
+    if col.find_one({"id": {"$ne": eid}, "name_key": updates["name_key"], "type": updates["type"]}):
+        raise HTTPException(status_code=409, detail="Duplicate economy entity")
+    updates["updated_at"] = _now_iso()
+    updates["updated_by"] = username
+    col.update_one({"id": eid}, {"$set": updates})
+    touch_name_index(ECONOMY_ENTITIES_0_3_5_COL, [eid])
+    after = col.find_one({"id": eid}, {"_id": 0})
+    return {"status": "success", "entity": after}
+
+@router.delete("/economy-0-3-5/entities/{entity_id}")
+def economy_0_3_5_delete_entity(entity_id: str, request: Request):
+    require_auth(request, roles=["moderator", "admin"])
+    eid = str(entity_id or "").strip()
+    if not eid:
+        raise HTTPException(status_code=400, detail="entity_id is required")
+    col = get_col(ECONOMY_ENTITIES_0_3_5_COL)
+    res = col.delete_one({"id": eid})
+    touch_name_index(ECONOMY_ENTITIES_0_3_5_COL, [eid])
+    if res.deleted_count == 0:
+        raise HTTPException(status_code=404, detail="Entity not found")
+    get_col(ECONOMY_ITEM_META_0_3_5_COL).update_many(
+        {},
+        {"$pull": {"requirements": {"source_kind": "entity", "source_id": eid}}},
+    )
+    return {"status": "success", "deleted": eid}
+
+@router.get("/economy-0-3-5/services")
+def economy_0_3_5_list_services(request: Request, q: str = ""):
+    require_auth(request, roles=["moderator", "admin"])
+    col = get_col(ECONOMY_SERVICES_0_3_5_COL)
+    filt = add_name_filter({}, ECONOMY_SERVICES_0_3_5_COL, q) if (q or "").strip() else {}
+    rows = list(col.find(filt, {"_id": 0}))
+    rows.sort(key=lambda row: str(row.get("name") or "").lower())
+    return {"status": "success", "services": rows}
+
+@router.post("/economy-0-3-5/services")
+def economy_0_3_5_create_service(request: Request, body: dict = Body(...)):
+    username, _role = require_auth(request, roles=["moderator", "admin"])
+    col = get_col(ECONOMY_SERVICES_0_3_5_COL)
+    doc = _economy_service_from_body(body)
+    if col.find_one({"name_key": doc["name_key"]}):
+        raise HTTPException(status_code=409, detail="Duplicate service")
+    now = _now_iso()
+    doc["id"] = next_id_str(ECONOMY_SERVICES_0_3_5_COL, padding=4)
+    doc["created_at"] = now
+    doc["updated_at"] = now
+    doc["created_by"] = username
+    doc["updated_by"] = username
+    col.insert_one(dict(doc))
+    touch_name_index(ECONOMY_SERVICES_0_3_5_COL, [doc["id"]])
+    return {"status": "success", "service": {k: v for k, v in doc.items() if k != "_id"}}
+
+@router.put("/economy-0-3-5/services/{service_id}")
+def economy_0_3_5_update_service(service_id: str, request: Request, body: dict = Body(...)):
+    username, _role = require_auth(request, roles=["moderator", "admin"])
+    sid = str(service_id or "").strip()
+    if not sid:
+        raise HTTPException(status_code=400, detail="service_id is required")
+    col = get_col(ECONOMY_SERVICES_0_3_5_COL)
+    before = col.find_one({"id": sid})
+    if not before:
+        raise HTTPException(status_code=404, detail="Service not found")
+    updates = _economy_service_from_body(body)
+    if col.find_one({"id": {"$ne": sid}, "name_key": updates["name_key"]}):
+        raise HTTPException(status_code=409, detail="Duplicate service")
+    updates["updated_at"] = _now_iso()
+    updates["updated_by"] = username
+    col.update_one({"id": sid}, {"$set": updates})
+    touch_name_index(ECONOMY_SERVICES_0_3_5_COL, [sid])
+    after = col.find_one({"id": sid}, {"_id": 0})
+    return {"status": "success", "service": after}
+
+@router.delete("/economy-0-3-5/services/{service_id}")
+def economy_0_3_5_delete_service(service_id: str, request: Request):
+    require_auth(request, roles=["moderator", "admin"])
+    sid = str(service_id or "").strip()
+    if not sid:
+        raise HTTPException(status_code=400, detail="service_id is required")
+    col = get_col(ECONOMY_SERVICES_0_3_5_COL)
+    res = col.delete_one({"id": sid})
+    touch_name_index(ECONOMY_SERVICES_0_3_5_COL, [sid])
+    if res.deleted_count == 0:
+        raise HTTPException(status_code=404, detail="Service not found")
+    meta_col = get_col(ECONOMY_ITEM_META_0_3_5_COL)
+    meta_col.delete_one({"source_kind": "service", "source_id": sid})
+    meta_col.update_many({}, {"$pull": {"requirements": {"source_kind": "service", "source_id": sid}}})
+    return {"status": "success", "deleted": sid}
+
+@router.get("/economy-0-3-5/item-meta")
+def economy_0_3_5_list_item_meta(
+    request: Request,
+    source_kind: str | None = Query(default=None),
+    source_id: str | None = Query(default=None),
+):
+    require_auth(request, roles=["moderator", "admin"])
+    allowed_meta_sources = _economy_allowed_meta_source_kinds()
+    filt: dict[str, Any] = {}
+    if source_kind is not None:
+        sk = str(source_kind).strip().lower()
+        if sk not in allowed_meta_sources:
+            raise HTTPException(status_code=400, detail="Invalid source_kind")
+        filt["source_kind"] = sk
+    if source_id is not None:
+        sid = str(source_id).strip()
+        if not sid:
+            raise HTTPException(status_code=400, detail="source_id cannot be empty")
+        filt["source_id"] = sid
+    rows = list(get_col(ECONOMY_ITEM_META_0_3_5_COL).find(filt, {"_id": 0}))
+    return {"status": "success", "meta": rows}
+
+@router.put("/economy-0-3-5/item-meta/{source_kind}/{source_id}")
+def economy_0_3_5_upsert_item_meta(source_kind: str, source_id: str, request: Request, body: dict = Body(...)):
+    username, _role = require_auth(request, roles=["moderator", "admin"])
+    sk = str(source_kind or "").strip().lower()
+    sid = str(source_id or "").strip()
+    if sk not in _economy_allowed_meta_source_kinds():
+        raise HTTPException(status_code=400, detail="Invalid source_kind")
+    if not sid:
+        raise HTTPException(status_code=400, detail="source_id is required")
+    if not _economy_item_exists(sk, sid):
+        raise HTTPException(status_code=404, detail="Source item/service not found")
+
+    payload = _economy_meta_from_body(body)
+    now = _now_iso()
+    col = get_col(ECONOMY_ITEM_META_0_3_5_COL)
+    col.update_one(
+        {"source_kind": sk, "source_id": sid},
+        {
+            "$set": {
+                "source_kind": sk,
+                "source_id": sid,
+                "requirements": payload["requirements"],
+                "availability_override": payload["availability_override"],
+                "markup_pct_override": payload["markup_pct_override"],
+                "updated_at": now,
+                "updated_by": username,
+            },
+            "$setOnInsert": {"created_at": now, "created_by": username},
+        },
+        upsert=True,
+    )
+    doc = col.find_one({"source_kind": sk, "source_id": sid}, {"_id": 0})
+    return {"status": "success", "meta": doc}
+
+@router.delete("/economy-0-3-5/item-meta/{source_kind}/{source_id}")
+def economy_0_3_5_delete_item_meta(source_kind: str, source_id: str, request: Request):
+    require_auth(request, roles=["moderator", "admin"])
+    sk = str(source_kind or "").strip().lower()
+    sid = str(source_id or "").strip()
+    if sk not in _economy_allowed_meta_source_kinds():
+        raise HTTPException(status_code=400, detail="Invalid source_kind")
+    if not sid:
+        raise HTTPException(status_code=400, detail="source_id is required")
+    res = get_col(ECONOMY_ITEM_META_0_3_5_COL).delete_one({"source_kind": sk, "source_id": sid})
+    return {"status": "success", "deleted": sid, "removed": int(res.deleted_count)}
+
+@router.get("/economy-0-3-5/catalog")
+def economy_0_3_5_catalog(request: Request, q: str = "", item_type: str = "all", limit: int = 200):
+    require_auth(request, roles=["moderator", "admin"])
+    kind = str(item_type or "all").strip().lower() or "all"
+    allowed_types = {"all", "object", "equipment", "weapon", "tool", "service", "primary_resource"}
+    if kind not in allowed_types:
+        raise HTTPException(
+            status_code=400,
+            detail="item_type must be one of all/object/equipment/weapon/tool/service/primary_resource",
+        )
+    try:
+        limit_int = int(limit)
+    except Exception:
+        limit_int = 200
+    limit_int = max(1, min(limit_int, 500))
+
+    item_kinds: list[str] = []
+    if kind == "all":
+        item_kinds = ["object", "equipment", "weapon", "tool"]
+    elif kind in ECONOMY_ITEM_KIND_TO_COLLECTION:
+        item_kinds = [kind]
+
+    dynamic_group_count = max(1, len(item_kinds) + (1 if kind in ("all", "service") else 0) + (1 if kind in ("all", "primary_resource") else 0))
+    per_kind_limit = max(1, min(250, int(math.ceil(limit_int / dynamic_group_count) * 2)))
+    rows: list[dict[str, Any]] = []
+    for source_kind in item_kinds:
+        rows.extend(_economy_catalog_rows(source_kind, q, per_kind_limit))
+
+    if kind in ("all", "service"):
+        service_col = get_col(ECONOMY_SERVICES_0_3_5_COL)
+        service_filter = {"name": {"$regex": re.escape((q or "").strip()), "$options": "i"}} if (q or "").strip() else {}
+        service_rows = list(
+            service_col.find(service_filter, {"_id": 0, "id": 1, "name": 1, "fixed_price": 1}).limit(per_kind_limit)
+        )
+        for row in service_rows:
+            sid = str(row.get("id") or "").strip()
+            if not sid:
+                continue
+            rows.append(
+                {
+                    "uid": f"service:{sid}",
+                    "source_kind": "service",
+                    "source_id": sid,
+                    "name": str(row.get("name") or sid),
+                    "fixed_price": float(row.get("fixed_price") or 0),
+                    "enc": 0,
+                    "category": "",
+                    "slot": "",
+                    "tier": "",
+                    "method": "",
+                }
+            )
+
+    if kind in ("all", "primary_resource"):
+        rows.extend(_economy_primary_resource_catalog_rows(q, per_kind_limit))
+
+    rows.sort(key=lambda row: (str(row.get("name") or "").lower(), str(row.get("source_kind") or "")))
+    rows = rows[:limit_int]
+
+    meta_map: dict[tuple[str, str], dict] = {}
+    if rows:
+        meta_col = get_col(ECONOMY_ITEM_META_0_3_5_COL)
+        lookups = [{"source_kind": row["source_kind"], "source_id": row["source_id"]} for row in rows]
+        meta_docs = list(meta_col.find({"$or": lookups}, {"_id": 0}))
+        meta_map = {
+            (str(doc.get("source_kind") or ""), str(doc.get("source_id") or "")): doc
+            for doc in meta_docs
+        }
+
+    for row in rows:
+        doc = meta_map.get((row["source_kind"], row["source_id"])) or {}
+        row["meta"] = {
+            "requirements": doc.get("requirements") or [],
+            "availability_override": doc.get("availability_override") or "",
+            "markup_pct_override": doc.get("markup_pct_override"),
+        }
+
+    return FastJSONResponse({"status": "success", "items": rows})
+
+@router.get("/items-0-3-5/weapons")
+def items_0_3_5_list_weapons(request: Request, q: str = "", scope: str = "all", limit: int = 300):
+    username, _role = require_auth(request, roles=["user", "moderator", "admin"])
+    scope_clean = str(scope or "all").strip().lower() or "all"
+    if scope_clean not in {"all", "mine"}:
+        raise HTTPException(status_code=400, detail="scope must be all or mine")
+    try:
+        limit_int = int(limit)
+    except Exception:
+        limit_int = 300
+    limit_int = max(1, min(limit_int, 500))
+
+    filt: dict[str, Any] = {}
+    if scope_clean == "mine":
+        filt["owner"] = username
+    else:
+        filt["$or"] = [{"visibility": "general"}, {"owner": username}]
+    q_clean = str(q or "").strip()
+    if q_clean:
+        add_name_filter(filt, ITEM_WEAPONS_0_3_5_COL, q_clean)
+
+    col = get_col(ITEM_WEAPONS_0_3_5_COL)
+    rows = list(col.find(filt, {"_id": 0}).sort("name_key", 1).limit(limit_int))
+    for row in rows:
+        row["is_mine"] = str(row.get("owner") or "") == username
+    return {"status": "success", "weapons": rows}
+
+@router.post("/items-0-3-5/weapons")
+def items_0_3_5_create_weapon(request: Request, body: dict = Body(...)):
+    username, _role = require_auth(request, roles=["user", "moderator", "admin"])
+    col = get_col(ITEM_WEAPONS_0_3_5_COL)
+    doc = _item_weapon_from_body(body, allow_general=False)
+    if col.find_one({"owner": username, "name_key": doc["name_key"]}, {"_id": 1}):
+        raise HTTPException(status_code=409, detail="You already created a weapon with this name")
+    now = _now_iso()
+    doc["id"] = next_id_str(ITEM_WEAPONS_0_3_5_COL, padding=4)
+    doc["owner"] = username
+    doc["created_by"] = username
+    doc["updated_by"] = username
+    doc["created_at"] = now
+    doc["updated_at"] = now
+    doc["source"] = "user"
+    doc["visibility"] = "user"
+    col.insert_one(dict(doc))
+    touch_name_index(ITEM_WEAPONS_0_3_5_COL, [doc["id"]])
+    return {"status": "success", "weapon": _item_weapon_view(doc)}
+
+@router.post("/items-0-3-5/weapons/import")
+def items_0_3_5_import_weapons(request: Request, body: dict = Body(...)):
+    username, _role = require_auth(request, roles=["moderator", "admin"])
+    payload = body if isinstance(body, dict) else {}
+    raw_items = payload.get("weapons")
+    if isinstance(raw_items, dict):
+        raw_items = [raw_items]
+    if not isinstance(raw_items, list) or not raw_items:
+        raise HTTPException(status_code=400, detail="weapons must be a non-empty list")
+    replace_duplicates = bool(payload.get("replace_duplicates") or False)
+
+    col = get_col(ITEM_WEAPONS_0_3_5_COL)
+    now = _now_iso()
+    created: list[dict[str, Any]] = []
+    skipped: list[dict[str, Any]] = []
+    errors: list[dict[str, Any]] = []
+
+    for idx, raw in enumerate(raw_items):
+        if not isinstance(raw, dict):
+            errors.append({"index": idx, "message": "weapon payload must be an object"})
+            continue
+        try:
+            doc = _item_weapon_from_body(raw, allow_general=True)
+            doc["visibility"] = "general"
+            doc["owner"] = ""
+            doc["source"] = "import"
+            doc["imported_by"] = username
+            doc["updated_by"] = username
+            doc["updated_at"] = now
+        except HTTPException as exc:
+            errors.append({"index": idx, "message": str(exc.detail)})
+            continue
+
+        existing = col.find_one({"name_key": doc["name_key"], "visibility": "general"})
+        if existing:
+            if not replace_duplicates:
+                skipped.append({"index": idx, "name": doc["name"], "reason": "duplicate"})
+                continue
+            col.update_one(
+                {"_id": existing["_id"]},
+                {"$set": doc, "$setOnInsert": {"created_at": now, "created_by": username}},
+                upsert=False,
+            )
+            merged = dict(existing)
+            merged.update(doc)
+            merged["id"] = existing.get("id")
+            created.append(_item_weapon_view(merged))
+            continue
+
+        doc["id"] = next_id_str(ITEM_WEAPONS_0_3_5_COL, padding=4)
+        doc["created_at"] = now
+        doc["created_by"] = username
+        col.insert_one(dict(doc))
+        created.append(_item_weapon_view(doc))
+
+    touch_name_index(ITEM_WEAPONS_0_3_5_COL, [d["id"] for d in created])
+    return {
+        "status": "success",
+        "created": created,
+        "skipped": skipped,
+        "errors": errors,
+    }
@@ -0,0 +1,49 @@
+from __future__ import annotations
+
+import json
+from typing import Any
+
+from bson import ObjectId
+from fastapi.encoders import jsonable_encoder
+from starlette.responses import JSONResponse
+
+from settings import settings
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+_ENCODERS = {ObjectId: str}
+
+
+def _default(obj: Any) -> Any:
+    # Whatever orjson cannot encode natively (ObjectId, Decimal, sets, bytes,
+    # pydantic models...) gets FastAPI's usual treatment.
+    return jsonable_encoder(obj, custom_encoder=_ENCODERS)
+
+
+def dumps(content: Any) -> bytes:
+    """Serialize to compact UTF-8 JSON; orjson when enabled, stdlib otherwise."""
+    if orjson is not None and settings.json_fast_serializer:
+        try:
+            return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+        except TypeError:
+            # e.g. ints beyond 64 bits; the stdlib path below handles them.
+            pass
+    return json.dumps(
+        jsonable_encoder(content, custom_encoder=_ENCODERS),
+        ensure_ascii=False,
+        allow_nan=False,
+        separators=(",", ":"),
+    ).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSONResponse rendered with orjson. Returning it directly from a route also
+    skips FastAPI's jsonable_encoder pass, which dominates on large lists.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
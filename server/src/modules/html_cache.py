@@ -0,0 +1,102 @@
+from __future__ import annotations
+
+import hashlib
+import threading
+from pathlib import Path
+from typing import Callable
+
+from starlette.datastructures import Headers
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+
+from server.src.modules.compression import brotli, compress_bytes, negotiate_encoding
+from settings import settings
+
+HTML_CACHE_CONTROL = "no-cache"
+
+
+class HTMLAsset:
+    """One rendered page: the body plus precompressed variants and a strong ETag."""
+
+    __slots__ = ("path", "stamp", "body", "variants", "etag")
+
+    def __init__(self, path: Path, stamp: tuple[int, int], body: bytes):
+        self.path = path
+        self.stamp = stamp
+        self.body = body
+        self.etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+        self.variants: dict[str, bytes] = {"gzip": compress_bytes(body, "gzip", gzip_level=9)}
+        if brotli is not None and settings.compression_brotli:
+            self.variants["br"] = compress_bytes(body, "br", brotli_quality=settings.html_brotli_quality)
+
+
+_CACHE: dict[Path, HTMLAsset] = {}
+_LOCK = threading.Lock()
+
+
+def _stamp(path: Path) -> tuple[int, int]:
+    st = path.stat()
+    return st.st_mtime_ns, st.st_size
+
+
+def load_html(path: Path, render: Callable[[str], str]) -> HTMLAsset:
+    """
+    Return the cached page for `path`, re-reading and re-rendering only when
+    its mtime or size changed. A stat per call keeps edits visible in dev.
+    """
+    stamp = _stamp(path)
+    asset = _CACHE.get(path)
+    if asset is not None and asset.stamp == stamp:
+        return asset
+    with _LOCK:
+        asset = _CACHE.get(path)
+        if asset is not None and asset.stamp == stamp:
+            return asset
+        html = render(path.read_text(encoding="utf-8"))
+        asset = HTMLAsset(path, stamp, html.encode("utf-8"))
+        _CACHE[path] = asset
+        return asset
+
+
+def clear_html_cache() -> None:
+    with _LOCK:
+        _CACHE.clear()
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return etag in tags
+
+
+class CachedHTMLResponse(Response):
+    """
+    Serves an HTMLAsset. The variant (br/gzip/identity) and a 304 for a
+    matching If-None-Match are decided per request from the ASGI scope, so
+    callers don't need the Request.
+    """
+
+    media_type = "text/html"
+
+    def __init__(self, asset: HTMLAsset, status_code: int = 200):
+        self.asset = asset
+        super().__init__(content=asset.body, status_code=status_code, media_type=self.media_type)
+        self.headers["ETag"] = asset.etag
+        self.headers["Cache-Control"] = HTML_CACHE_CONTROL
+        self.headers["Vary"] = "Accept-Encoding"
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        request_headers = Headers(scope=scope)
+        if _etag_matches(request_headers.get("if-none-match", ""), self.asset.etag):
+            headers = {"ETag": self.asset.etag, "Cache-Control": HTML_CACHE_CONTROL, "Vary": "Accept-Encoding"}
+            await Response(status_code=304, headers=headers)(scope, receive, send)
+            return
+        encoding = negotiate_encoding(request_headers.get("accept-encoding", ""), "br" in self.asset.variants)
+        if encoding in self.asset.variants:
+            self.body = self.asset.variants[encoding]
+            self.headers["Content-Encoding"] = encoding
+            self.headers["Content-Length"] = str(len(self.body))
+        await super().__call__(scope, receive, send)
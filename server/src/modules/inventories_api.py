@@ -0,0 +1,2770 @@
+import datetime
+import math
+import re
+from decimal import Decimal, InvalidOperation
+from typing import Any
+
+from fastapi import APIRouter, Body, HTTPException, Query, Request
+
+from db_mongo import get_col, get_db, next_id_str, next_ids, norm_key
+from server.src.modules.authentification_helpers import _optional_auth, require_auth
+from server.src.modules.avatar_helpers import _avatar_field
+from server.src.modules.character_helpers import (
+    _claim_linked_resource_owner,
+    _claim_linked_resource_owner_bulk,
+    _public_character_ref,
+)
+from server.src.modules.currency_wallet import (
+    DEFAULT_CURRENCIES as MONEY_DEFAULT_CURRENCIES,
+    DEFAULT_EXCHANGE_FEE_PCT,
+    canonical_currency_name,
+    carried_coin_enc,
+    coin_breakdown,
+    currency_precision,
+    currency_value_gc,
+    gc_to_minor,
+    major_to_minor,
+    minor_to_gc,
+    minor_to_major,
+)
+from server.src.modules.fast_json import FastJSONResponse
+from server.src.modules.inventory_helpers import (
+    ARMOR_UPGRADES,
+    QUALITY_ORDER,
+    WEAPON_UPGRADES,
+    _compose_variant,
+    _pick_currency,
+    _qprice,
+    _slots_for_quality,
+    _upgrade_fee_for_range,
+    craftomancy_category_index,
+    craftomancy_next_category,
+    craftomancy_row_for_quality,
+)
+from server.src.modules.item_helpers import (
+    _equipment_from_body,
+    _make_animarma,
+    _safe_float,
+    _safe_int,
+    _tool_from_body,
+    _upgrade_from_body,
+    _weapon_from_body,
+)
+from server.src.modules.logging_helpers import logger
+from server.src.modules.name_search import add_name_filter, ranked_name_rows, touch_name_index
+from server.src.modules.objects_helpers import _object_from_body
+from server.src.modules.submission_helpers import _create_pending_submission, _now_iso
+
+router = APIRouter()
+
+AMMO_PACK_DEFAULT = 10
+
+# ---------- Objects (inventory) ----------
+@router.get("/objects")
+def list_objects(q: str | None = Query(None)):
+    col = get_col("objects")
+    filt = {}
+    if q:
+        add_name_filter(filt, "objects", q)
+    return {"status": "success", "objects": list(col.find(filt, {"_id": 0}))}
+
+@router.post("/objects")
+def create_object(request: Request, body: dict = Body(...)):
+    username, role = require_auth(request, roles=["user","moderator","admin"])
+    col = get_col("objects")
+    doc = _object_from_body(body)
+    avatar_key, _ = _avatar_field(body)
+    if avatar_key:
+        doc["default_avatar"] = avatar_key
+    if role not in ("moderator","admin"):
+        pending = _create_pending_submission(username, role, "item", doc, kind="object")
+        return {"status":"pending","submission": pending}
+    doc["id"] = next_id_str("objects", padding=4)
+    doc["created_at"] = _now_iso()
+    col.insert_one(dict(doc))
+    touch_name_index("objects", [doc["id"]])
+    return {"status": "success", "object": {k:v for k,v in doc.items() if k != "_id"}}
+
+@router.put("/objects/{oid}")
+def update_object(oid: str, request: Request, body: dict = Body(...)):
+    username, role = require_auth(request, roles=["moderator","admin"])
+    col = get_col("objects")
+    old = col.find_one({"id": oid})
+    if not old:
+        raise HTTPException(status_code=404, detail="Not found")
+    upd = _object_from_body(body)
+    upd["updated_at"] = datetime.datetime.utcnow().isoformat() + "Z"
+    avatar_key, avatar_unset = _avatar_field(body)
+    unset_fields = {}
+    if avatar_key:
+        upd["default_avatar"] = avatar_key
+    elif avatar_unset:
+        unset_fields["default_avatar"] = ""
+    ops = {"$set": upd}
+    if unset_fields:
+        ops["$unset"] = unset_fields
+    col.update_one({"id": oid}, ops)
+    touch_name_index("objects", [oid])
+    new = col.find_one({"id": oid}, {"_id": 0})
+    return {"status": "success", "object": new}
+
+@router.delete("/objects/{oid}")
+def delete_object(oid: str, request: Request):
+    username, role = require_auth(request, roles=["moderator","admin"])
+    col = get_col("objects")
+    r = col.delete_one({"id": oid})
+    touch_name_index("objects", [oid])
+    if r.deleted_count == 0:
+        raise HTTPException(status_code=404, detail="Not found")
+    return {"status": "success", "deleted": oid}
+
+@router.post("/objects/bulk_create")
+def bulk_create_objects(request: Request, payload: dict = Body(...)):
+    username, role = require_auth(request, roles=["moderator","admin"])
+    items = payload.get("items") or []
+    if not isinstance(items, list) or not items:
+        raise HTTPException(status_code=400, detail="items must be a non-empty list")
+
+    col = get_col("objects")
+    created = []
+    for b in items:
+        doc = _object_from_body(b)
+        avatar_key, _ = _avatar_field(b)
+        if avatar_key:
+            doc["default_avatar"] = avatar_key
+        doc["id"] = next_id_str("objects", padding=4)
+        doc["created_at"] = datetime.datetime.utcnow().isoformat() + "Z"
+        col.insert_one(dict(doc))
+        created.append({k:v for k,v in doc.items() if k != "_id"})
+
+    touch_name_index("objects", [d["id"] for d in created])
+    return {"status":"success","created": created}
+
+def _ensure_alchemy_tools_consumable():
+    col = get_col("tools")
+    col.update_many(
+        {"method": "alchemy", "consumable": {"$ne": True}},
+        {"$set": {"consumable": True, "updated_at": _now_iso()}}
+    )
+
+# ---------- Tools (inventory) ----------
+@router.get("/tools")
+def list_tools(q: str | None = Query(None)):
+    col = get_col("tools")
+    _ensure_alchemy_tools_consumable()
+    filt = {}
+    if q: add_name_filter(filt, "tools", q)
+    return {"status":"success","tools": list(col.find(filt, {"_id":0}))}
+
+@router.post("/tools")
+def create_tool(request: Request, body: dict = Body(...)):
+    username, role = require_auth(request, roles=["user","moderator","admin"])
+    col = get_col("tools")
+    doc = _tool_from_body(body)
+    if role not in ("moderator","admin"):
+        pending = _create_pending_submission(username, role, "item", doc, kind="tool")
+        return {"status":"pending","submission": pending}
+    # duplicate protection by name_key
+    if col.find_one({"name_key": doc["name_key"]}):
+        raise HTTPException(status_code=409, detail="Tool with same name already exists")
+    doc["id"] = next_id_str("tools", padding=4)
+    doc["created_at"] = _now_iso()
+    col.insert_one(dict(doc))
+    touch_name_index("tools", [doc["id"]])
+    return {"status":"success","tool": {k:v for k,v in doc.items() if k!="_id"}}
+
+@router.put("/tools/{tid}")
+def update_tool(tid: str, request: Request, body: dict = Body(...)):
+    require_auth(request, roles=["moderator","admin"])
+    col = get_col("tools")
+    old = col.find_one({"id": tid})
+    if not old: raise HTTPException(status_code=404, detail="Not found")
+    upd = _tool_from_body(body)
+    # if name changed, ensure no duplicate
+    if upd["name_key"] != old.get("name_key"):
+        if col.find_one({"name_key": upd["name_key"]}):
+            raise HTTPException(status_code=409, detail="Tool with same name already exists")
+    upd["updated_at"] = datetime.datetime.utcnow().isoformat()+"Z"
+    col.update_one({"id": tid}, {"$set": upd})
+    touch_name_index("tools", [tid])
+    return {"status":"success","tool": col.find_one({"id": tid},{"_id":0})}
+
+@router.delete("/tools/{tid}")
+def delete_tool(tid: str, request: Request):
+    require_auth(request, roles=["moderator","admin"])
+    col = get_col("tools")
+    r = col.delete_one({"id": tid})
+    touch_name_index("tools", [tid])
+    if r.deleted_count == 0: raise HTTPException(status_code=404, detail="Not found")
+    return {"status":"success","deleted": tid}
+
+@router.post("/tools/bulk_create")
+def bulk_create_tools(request: Request, payload: dict = Body(...)):
+    require_auth(request, roles=["moderator","admin"])
+    method = (payload.get("method") or "crafting").strip().lower()
+    if method not in ("crafting","alchemy"): method = "crafting"
+    items = payload.get("items") or []
+    if not isinstance(items, list) or not items:
+        raise HTTPException(status_code=400, detail="items must be a non-empty list")
+
+    col = get_col("tools")
+    created, skipped = [], []
+    for b in items:
+        b = dict(b)
+        b["method"] = method
+        doc = _tool_from_body(b)
+        if col.find_one({"name_key": doc["name_key"]}):
+            skipped.append(doc["name"])  # duplicate protection
+            continue
+        doc["id"] = next_id_str("tools", padding=4)
+        doc["created_at"] = datetime.datetime.utcnow().isoformat()+"Z"
+        col.insert_one(dict(doc))
+        created.append({k:v for k,v in doc.items() if k!="_id"})
+    touch_name_index("tools", [d["id"] for d in created])
+    return {"status":"success","created": created, "skipped": skipped}
+
+# ---------- Weapons (inventory) ----------
+
+QUAL_PRICE_DIFF = {
+    "Mediocre": -100, "Adequate": 0, "Good": 167, "Very Good": 1390,
+    "Excellent": 5280, "Legendary": 15300, "Mythical": 38760,
+    "Epic": 128000, "Divine": 614400, "Unreal": 921600,
+}
+
+@router.get("/weapons")
+def list_weapons(q: str | None = Query(None)):
+    col = get_col("weapons")
+    filt = {}
+    if q:
+        add_name_filter(filt, "weapons", q)
+    return {"status":"success","weapons": list(col.find(filt, {"_id":0}))}
+
+@router.post("/weapons")
+def create_weapon(request: Request, body: dict = Body(...)):
+    username, role = require_auth(request, roles=["user","moderator","admin"])
+    col = get_col("weapons")
+
+    base = _weapon_from_body(body)
+    if role not in ("moderator","admin"):
+        pending = _create_pending_submission(username, role, "item", base, kind="weapon")
+        return {"status":"pending","submission": pending}
+    if col.find_one({"name_key": base["name_key"]}):
+        raise HTTPException(status_code=409, detail="Weapon with same name already exists")
+
+    base["id"] = next_id_str("weapons", padding=4)
+    now = _now_iso()
+    base["created_at"] = now
+    col.insert_one(dict(base))
+    touch_name_index("weapons", [base["id"]])
+
+    # auto-create animarma
+    anim = _make_animarma(base)
+    if not col.find_one({"name_key": anim["name_key"]}):
+        anim["id"] = next_id_str("weapons", padding=4)
+        anim["created_at"] = now
+        col.insert_one(dict(anim))
+        touch_name_index("weapons", [anim["id"]])
+
+    out = {k:v for k,v in base.items() if k!="_id"}
+    return {"status":"success","weapon": out}
+
+@router.put("/weapons/{wid}")
+def update_weapon(wid: str, request: Request, body: dict = Body(...)):
+    require_auth(request, roles=["moderator","admin"])
+    col = get_col("weapons")
+    old = col.find_one({"id": wid})
+    if not old: raise HTTPException(status_code=404, detail="Not found")
+
+    upd = _weapon_from_body(body)
+    # if renaming, prevent duplicates
+    if upd["name_key"] != old.get("name_key"):
+        if col.find_one({"name_key": upd["name_key"]}):
+            raise HTTPException(status_code=409, detail="Weapon with same name already exists")
+    upd["updated_at"] = datetime.datetime.utcnow().isoformat()+"Z"
+    col.update_one({"id": wid}, {"$set": upd})
+    touch_name_index("weapons", [wid])
+    return {"status":"success","weapon": col.find_one({"id": wid},{"_id":0})}
+
+@router.delete("/weapons/{wid}")
+def delete_weapon(wid: str, request: Request):
+    require_auth(request, roles=["moderator","admin"])
+    col = get_col("weapons")
+    r = col.delete_one({"id": wid})
+    touch_name_index("weapons", [wid])
+    if r.deleted_count == 0: raise HTTPException(status_code=404, detail="Not found")
+    return {"status":"success","deleted": wid}
+
+@router.post("/weapons/bulk_create")
+def bulk_create_weapons(request: Request, payload: dict = Body(...)):
+    require_auth(request, roles=["moderator","admin"])
+    skill = (payload.get("skill") or "Technicity").strip().title()
+    items = payload.get("items") or []
+    replace_dup = bool(payload.get("replace_duplicates") or payload.get("replace_dup") or False)
+    if not isinstance(items, list) or not items:
+        raise HTTPException(status_code=400, detail="items must be a non-empty list")
+
+    col = get_col("weapons")
+    created, skipped = [], []
+    now = datetime.datetime.utcnow().isoformat()+"Z"
+
+    for idx, b in enumerate(items):
+        if not isinstance(b, dict):
+            raise HTTPException(status_code=400, detail=f"item {idx+1} is not an object")
+        base = _weapon_from_body({**b, "skill": skill, "is_animarma": False})
+        existing = col.find_one({"name_key": base["name_key"]})
+        if existing:
+            if not replace_dup:
+                skipped.append(base["name"]); continue
+            col.update_one({"_id": existing["_id"]}, {"$set": {**base, "updated_at": now}})
+            base["id"] = existing.get("id")
+            created.append({k:v for k,v in base.items() if k!="_id"})
+        else:
+            base["id"] = next_id_str("weapons", padding=4)
+            base["created_at"] = now
+            col.insert_one(dict(base))
+            created.append({k:v for k,v in base.items() if k!="_id"})
+
+        # auto-create animarma twin
+        anim = _make_animarma(base)
+        existing_anim = col.find_one({"name_key": anim["name_key"]})
+        if existing_anim:
+            if replace_dup:
+                col.update_one({"_id": existing_anim["_id"]}, {"$set": {**anim, "updated_at": now}})
+                anim["id"] = existing_anim.get("id")
+                created.append({k:v for k,v in anim.items() if k!="_id"})
+        else:
+            anim["id"] = next_id_str("weapons", padding=4)
+            anim["created_at"] = now
+            col.insert_one(dict(anim))
+            created.append({k:v for k,v in anim.items() if k!="_id"})
+
+    touch_name_index("weapons", [d["id"] for d in created])
+    return {"status":"success","created": created, "skipped": skipped}
+
+@router.post("/admin/weapons/clear")
+def clear_weapons(request: Request, payload: dict = Body(...)):
+    require_auth(request, roles=["admin"])
+    confirm = (payload or {}).get("confirm") or ""
+    if confirm != "DELETE_ALL_WEAPONS":
+        raise HTTPException(status_code=400, detail="confirm must be DELETE_ALL_WEAPONS")
+    col = get_col("weapons")
+    res = col.delete_many({})
+    get_col("counters").update_one({"_id": "weapons"}, {"$set": {"seq": 0}}, upsert=True)
+    touch_name_index("weapons")
+    return {"status": "success", "deleted": res.deleted_count}
+
+# ---------- Equipment ----------
+@router.get("/equipment")
+def list_equipment(q: str | None = Query(None), category: str | None = Query(None)):
+    col = get_col("equipment")
+    filt = {}
+    if q: add_name_filter(filt, "equipment", q)
+    if category: filt["category"] = category
+    return {"status":"success","equipment": list(col.find(filt, {"_id":0}))}
+
+@router.post("/equipment")
+def create_equipment(request: Request, body: dict = Body(...)):
+    username, role = require_auth(request, roles=["user","moderator","admin"])
+    col = get_col("equipment")
+    doc = _equipment_from_body(body)
+    if role not in ("moderator","admin"):
+        pending = _create_pending_submission(username, role, "item", doc, kind="equipment")
+        return {"status":"pending","submission": pending}
+    if col.find_one({"category": doc["category"], "name_key": doc["name_key"]}):
+        raise HTTPException(status_code=409, detail="Duplicate equipment")
+    doc["id"] = next_id_str("equipment", padding=4)
+    doc["created_at"] = _now_iso()
+    col.insert_one(dict(doc))
+    touch_name_index("equipment", [doc["id"]])
+    return {"status":"success","equipment": {k:v for k,v in doc.items() if k!="_id"}}
+
+@router.put("/equipment/{eid}")
+def update_equipment(eid: str, request: Request, body: dict = Body(...)):
+    require_auth(request, roles=["moderator","admin"])
+    col = get_col("equipment")
+    old = col.find_one({"id": eid})
+    if not old: raise HTTPException(status_code=404, detail="Not found")
+    upd = _equipment_from_body(body)
+    if upd["name_key"] != old.get("name_key") or upd["category"] != old.get("category"):
+        if col.find_one({"category": upd["category"], "name_key": upd["name_key"]}):
+            raise HTTPException(status_code=409, detail="Duplicate equipment")
+    upd["updated_at"] = datetime.datetime.utcnow().isoformat()+"Z"
+    col.update_one({"id": eid}, {"$set": upd})
+    touch_name_index("equipment", [eid])
+    return {"status":"success","equipment": col.find_one({"id": eid}, {"_id":0})}
+
+@router.delete("/equipment/{eid}")
+def delete_equipment(eid: str, request: Request):
+    require_auth(request, roles=["moderator","admin"])
+    col = get_col("equipment")
+    r = col.delete_one({"id": eid})
+    touch_name_index("equipment", [eid])
+    if r.deleted_count == 0: raise HTTPException(status_code=404, detail="Not found")
+    return {"status":"success","deleted": eid}
+
+@router.post("/equipment/bulk_create")
+def bulk_create_equipment(request: Request, payload: dict = Body(...)):
+    require_auth(request, roles=["moderator","admin"])
+    kind = (payload.get("kind") or "").strip().lower()
+    items = payload.get("items") or []
+    if kind not in ("special","slot","armor") or not isinstance(items, list) or not items:
+        raise HTTPException(status_code=400, detail="Provide kind (special|slot|armor) and items[]")
+
+    col = get_col("equipment")
+    created, skipped = [], []
+    now = datetime.datetime.utcnow().isoformat()+"Z"
+
+    for b in items:
+        b = dict(b); b["category"] = kind
+        doc = _equipment_from_body(b)
+        if col.find_one({"category": doc["category"], "name_key": doc["name_key"]}):
+            skipped.append(doc.get("name") or doc.get("type") or doc.get("style")); continue
+        doc["id"] = next_id_str("equipment", padding=4)
+        doc["created_at"] = now
+        col.insert_one(dict(doc))
+        created.append({k:v for k,v in doc.items() if k!="_id"})
+
+    touch_name_index("equipment", [d["id"] for d in created])
+    return {"status":"success","created": created, "skipped": skipped}
+
+# ---------- Upgrades Catalog ----------
+@router.get("/upgrades")
+def list_upgrades(request: Request, kind: str = "", slot: str = ""):
+    require_auth(request)
+    col = get_col("upgrades")
+    filt = {}
+    if kind.strip():
+        filt["kind"] = kind.strip().lower()
+    if slot.strip():
+        filt["slot"] = slot.strip().lower()
+    rows = list(col.find(filt, {"_id":0}))
+    for row in rows:
+        tags = row.get("tags")
+        if not tags:
+            row["tags"] = ["phb"]
+            col.update_one({"id": row.get("id")}, {"$set": {"tags": row["tags"]}})
+    rows.sort(key=lambda r: r.get("name","").lower())
+    return {"status":"success","upgrades": rows}
+
+@router.post("/upgrades")
+def create_upgrade(request: Request, body: dict = Body(...)):
+    username, role = require_auth(request, roles=["user","moderator","admin"])
+    col = get_col("upgrades")
+    doc = _upgrade_from_body(body)
+    if role not in ("moderator","admin"):
+        pending = _create_pending_submission(username, role, "upgrade", doc)
+        return {"status":"pending","submission": pending}
+    if col.find_one({"name_key": doc["name_key"], "kind": doc["kind"], "slot": doc.get("slot","")}):
+        raise HTTPException(status_code=409, detail="Duplicate upgrade")
+    doc["id"] = next_id_str("upgrade", padding=4)
+    col.insert_one(dict(doc))
+    return {"status":"success","upgrade": {k:v for k,v in doc.items() if k!="_id"}}
+
+@router.put("/upgrades/{uid}")
+def update_upgrade(uid: str, request: Request, body: dict = Body(...)):
+    require_auth(request, roles=["moderator","admin"])
+    col = get_col("upgrades")
+    before = col.find_one({"id": uid})
+    if not before:
+        raise HTTPException(status_code=404, detail="Not found")
+    doc = _upgrade_from_body(body)
+    if "created_at" in before:
+        doc["created_at"] = before.get("created_at")
+    if col.find_one({"id": {"$ne": uid}, "name_key": doc["name_key"], "kind": doc["kind"], "slot": doc.get("slot","")}):
+        raise HTTPException(status_code=409, detail="Duplicate upgrade")
+    doc["updated_at"] = datetime.datetime.utcnow().isoformat()+"Z"
+    col.update_one({"id": uid}, {"$set": doc})
+    after = col.find_one({"id": uid}, {"_id":0})
+    return {"status":"success","upgrade": after}
+
+@router.delete("/upgrades/{uid}")
+def delete_upgrade(uid: str, request: Request):
+    require_auth(request, roles=["moderator","admin"])
+    col = get_col("upgrades")
+    res = col.delete_one({"id": uid})
+    if res.deleted_count == 0:
+        raise HTTPException(status_code=404, detail="Not found")
+    return {"status":"success","deleted": uid}
+
+# ---------- Inventories ----------
+
+def _new_container(name: str) -> dict:
+    return {
+        "id": next_id_str("container", padding=3),
+        "name": (name or "Container").strip(),
+        "include": True,        # counts into inventory.enc_total?
+        "enc_total": 0.0        # running encumbrance stored in this container
+    }
+
+# Special bucket to host equipped items directly on the character
+SELF_CONTAINER_ID = "self"
+SELF_CONTAINER_NAME = "Self"
+
+
+def _coerce_int(value: Any, default: int = 0) -> int:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        try:
+            return int(Decimal(str(value)))
+        except (InvalidOperation, TypeError, ValueError):
+            return int(default)
+
+
+def _coerce_float(value: Any, default: float = 0.0) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return float(default)
+
+
+def _ensure_self_container(containers: list[dict]) -> list[dict]:
+    raw_containers = containers if isinstance(containers, list) else []
+    normalized: list[dict] = []
+    for raw in raw_containers:
+        if not isinstance(raw, dict):
+            continue
+        c = dict(raw)
+        cid = str(c.get("id") or "").strip()
+        if not cid:
+            cid = next_id_str("container", padding=3)
+        c["id"] = cid
+        c["name"] = str(c.get("name") or "Container").strip() or "Container"
+        c["include"] = bool(c.get("include", True))
+        c["enc_total"] = _coerce_float(c.get("enc_total", 0.0), 0.0)
+        normalized.append(c)
+    found = next((c for c in normalized if c.get("id") == SELF_CONTAINER_ID), None)
+    if found:
+        found["name"] = found.get("name") or SELF_CONTAINER_NAME
+        found["include"] = bool(found.get("include", True))
+        found["enc_total"] = _coerce_float(found.get("enc_total", 0.0), 0.0)
+        found["built_in"] = True
+        return normalized
+    # keep Self first for visibility
+    self_c = {
+        "id": SELF_CONTAINER_ID,
+        "name": SELF_CONTAINER_NAME,
+        "include": True,
+        "enc_total": 0.0,
+        "built_in": True,
+    }
+    return [self_c, *normalized]
+
+
+def _default_stow_container(containers: list[dict]) -> str:
+    for c in (containers if isinstance(containers, list) else []):
+        if not isinstance(c, dict):
+            continue
+        if c.get("id") != SELF_CONTAINER_ID:
+            return str(c.get("id") or "")
+    return SELF_CONTAINER_ID
+
+
+def _money_bucket_name(raw: Any) -> str:
+    val = str(raw or "").strip().lower()
+    if val in ("bank", "stored", "storage"):
+        return "bank"
+    return "carried"
+
+
+def _to_decimal_or_zero(value: Any) -> Decimal:
+    if isinstance(value, Decimal):
+        return value
+    try:
+        return Decimal(str(value))
+    except (InvalidOperation, TypeError, ValueError):
+        return Decimal("0")
+
+
+def _format_money_major(currency: str, minor_value: int) -> float | int:
+    major = minor_to_major(currency, minor_value)
+    if currency_precision(currency) <= 1:
+        return int(major)
+    return float(major.quantize(Decimal("0.01")))
+
+
+def _wallet_currency_keys(inv: dict) -> list[str]:
+    keys = set(MONEY_DEFAULT_CURRENCIES)
+    currencies = inv.get("currencies")
+    if isinstance(currencies, dict):
+        for k in currencies.keys():
+            keys.add(canonical_currency_name(k))
+    wallet = inv.get("wallet")
+    if isinstance(wallet, dict):
+        for k in wallet.keys():
+            keys.add(canonical_currency_name(k))
+    return sorted(keys)
+
+
+def _coin_minor_from_payload(currency: str, value: Any) -> int:
+    if isinstance(value, dict):
+        # Expected keys for coin currencies.
+        if currency != "Jelly":
+            pc = max(0, _coerce_int(value.get("pc"), 0))
+            gc = max(0, _coerce_int(value.get("gc"), 0))
+            sc = max(0, _coerce_int(value.get("sc"), 0))
+            bc = max(0, _coerce_int(value.get("bc"), 0))
+            total = (pc * 1000) + (gc * 100) + (sc * 10) + bc
+            return int(max(0, total))
+        amount = _coerce_int(value.get("amount") or value.get("units"), 0)
+        return int(max(0, amount))
+    if isinstance(value, (int, float, Decimal, str)):
+        try:
+            return max(0, major_to_minor(currency, value, rounding="half_up"))
+        except Exception:
+            return 0
+    return 0
+
+
+def _sync_inventory_currencies(inv: dict) -> dict:
+    wallet = inv.get("wallet") if isinstance(inv.get("wallet"), dict) else {}
+    cur = {}
+    for currency in _wallet_currency_keys(inv):
+        entry = wallet.get(currency) if isinstance(wallet, dict) else None
+        if not isinstance(entry, dict):
+            entry = {"carried": 0, "bank": 0}
+        carried = _coerce_int(entry.get("carried"), 0)
+        bank = _coerce_int(entry.get("bank"), 0)
+        total_minor = carried + bank
+        cur[currency] = _format_money_major(currency, total_minor)
+    inv["currencies"] = cur
+    return cur
+
+
+def _wallet_summary(inv: dict) -> dict:
+    wallet = inv.get("wallet") if isinstance(inv.get("wallet"), dict) else {}
+    out: dict[str, dict] = {}
+    for currency in _wallet_currency_keys(inv):
+        cur = canonical_currency_name(currency)
+        entry = wallet.get(cur) if isinstance(wallet, dict) else None
+        if not isinstance(entry, dict):
+            entry = {"carried": 0, "bank": 0}
+        carried_minor = _coerce_int(entry.get("carried"), 0)
+        bank_minor = _coerce_int(entry.get("bank"), 0)
+        total_minor = carried_minor + bank_minor
+        carried_major = _format_money_major(cur, carried_minor)
+        bank_major = _format_money_major(cur, bank_minor)
+        total_major = _format_money_major(cur, total_minor)
+        carried_coins = coin_breakdown(cur, carried_minor)
+        bank_coins = coin_breakdown(cur, bank_minor)
+        total_coins = coin_breakdown(cur, total_minor)
+        value_gc = currency_value_gc(cur)
+        out[cur] = {
+            "value_gc": float(value_gc) if value_gc is not None else None,
+            "carried": {
+                "minor": carried_minor,
+                "amount": carried_major,
+                "coins": carried_coins.get("coins") or {},
+                "coin_count": int(carried_coins.get("coin_count") or 0),
+            },
+            "bank": {
+                "minor": bank_minor,
+                "amount": bank_major,
+                "coins": bank_coins.get("coins") or {},
+                "coin_count": int(bank_coins.get("coin_count") or 0),
+            },
+            "total": {
+                "minor": total_minor,
+                "amount": total_major,
+                "coins": total_coins.get("coins") or {},
+                "coin_count": int(total_coins.get("coin_count") or 0),
+            },
+        }
+    return out
+
+
+def _ensure_inventory_wallet(inv: dict) -> bool:
+    changed = False
+    raw_wallet = inv.get("wallet")
+    legacy_cur_raw = inv.get("currencies")
+    legacy_cur = legacy_cur_raw if isinstance(legacy_cur_raw, dict) else {}
+    if legacy_cur_raw is not None and not isinstance(legacy_cur_raw, dict):
+        changed = True
+    had_wallet = isinstance(raw_wallet, dict) and bool(raw_wallet)
+
+    wallet: dict[str, dict] = {}
+    if isinstance(raw_wallet, dict):
+        for key, row in raw_wallet.items():
+            cur = canonical_currency_name(key)
+            if not isinstance(row, dict):
+                row = {}
+            carried_minor = _coin_minor_from_payload(cur, row.get("carried", row.get("inventory", 0)))
+            bank_minor = _coin_minor_from_payload(cur, row.get("bank", row.get("stored", 0)))
+            prev = wallet.get(cur) or {"carried": 0, "bank": 0}
+            prev["carried"] += carried_minor
+            prev["bank"] += bank_minor
+            wallet[cur] = prev
+
+    for key, val in legacy_cur.items():
+        cur = canonical_currency_name(key)
+        if had_wallet and cur in wallet:
+            continue
+        prev = wallet.get(cur) or {"carried": 0, "bank": 0}
+        try:
+            prev["carried"] += major_to_minor(cur, val, rounding="half_up")
+        except Exception:
+            changed = True
+            continue
+        wallet[cur] = prev
+
+    for cur in _wallet_currency_keys({"wallet": wallet, "currencies": legacy_cur}):
+        if cur not in wallet:
+            wallet[cur] = {"carried": 0, "bank": 0}
+
+    if inv.get("wallet") != wallet:
+        inv["wallet"] = wallet
+        changed = True
+
+    current_fee = _to_decimal_or_zero(inv.get("exchange_fee_pct", DEFAULT_EXCHANGE_FEE_PCT))
+    fee = max(Decimal("0"), min(Decimal("100"), current_fee))
+    fee_float = float(fee.quantize(Decimal("0.01")))
+    if inv.get("exchange_fee_pct") != fee_float:
+        inv["exchange_fee_pct"] = fee_float
+        changed = True
+
+    before_cur = dict(legacy_cur)
+    after_cur = _sync_inventory_currencies(inv)
+    if before_cur != after_cur:
+        changed = True
+    inv["currency_details"] = _wallet_summary(inv)
+    return changed
+
+
+def _wallet_minor(inv: dict, currency: str, bucket: str = "carried") -> int:
+    cur = canonical_currency_name(currency)
+    b = _money_bucket_name(bucket)
+    wallet = inv.get("wallet") or {}
+    row = wallet.get(cur) if isinstance(wallet, dict) else None
+    if not isinstance(row, dict):
+        return 0
+    return int(row.get(b) or 0)
+
+
+def _wallet_major(inv: dict, currency: str, bucket: str = "carried") -> float | int:
+    return _format_money_major(currency, _wallet_minor(inv, currency, bucket))
+
+
+def _wallet_apply_minor_delta(inv: dict, currency: str, delta_minor: int, bucket: str = "carried", *, allow_negative: bool = False):
+    cur = canonical_currency_name(currency)
+    b = _money_bucket_name(bucket)
+    wallet = inv.get("wallet")
+    if not isinstance(wallet, dict):
+        wallet = {}
+        inv["wallet"] = wallet
+    row = wallet.get(cur)
+    if not isinstance(row, dict):
+        row = {"carried": 0, "bank": 0}
+        wallet[cur] = row
+    before_minor = int(row.get(b) or 0)
+    after_minor = before_minor + int(delta_minor or 0)
+    if not allow_negative and after_minor < 0:
+        raise HTTPException(400, f"Insufficient {cur} in {b}")
+    row[b] = after_minor
+    _sync_inventory_currencies(inv)
+    inv["currency_details"] = _wallet_summary(inv)
+    return {
+        "currency": cur,
+        "bucket": b,
+        "before_minor": before_minor,
+        "after_minor": after_minor,
+        "delta_minor": int(delta_minor or 0),
+        "delta_major": _format_money_major(cur, int(delta_minor or 0)),
+    }
+
+
+def _wallet_spend_gc(inv: dict, currency: str, gc_cost: int | float | Decimal, bucket: str = "carried"):
+    cur = canonical_currency_name(currency)
+    try:
+        required_minor = gc_to_minor(cur, _to_decimal_or_zero(gc_cost), rounding="ceil")
+    except ValueError as exc:
+        raise HTTPException(400, str(exc))
+    if required_minor <= 0:
+        return {"currency": cur, "bucket": _money_bucket_name(bucket), "required_minor": 0, "required_major": _format_money_major(cur, 0)}
+    available = _wallet_minor(inv, cur, bucket)
+    if required_minor > available:
+        need = _format_money_major(cur, required_minor)
+        have = _format_money_major(cur, available)
+        raise HTTPException(400, f"Insufficient funds in {cur} ({bucket}). Required {need}, available {have}.")
+    _wallet_apply_minor_delta(inv, cur, -required_minor, bucket=bucket, allow_negative=False)
+    return {
+        "currency": cur,
+        "bucket": _money_bucket_name(bucket),
+        "required_minor": required_minor,
+        "required_major": _format_money_major(cur, required_minor),
+    }
+
+
+def _wallet_credit_gc(inv: dict, currency: str, gc_amount: int | float | Decimal, bucket: str = "carried"):
+    cur = canonical_currency_name(currency)
+    try:
+        credit_minor = gc_to_minor(cur, _to_decimal_or_zero(gc_amount), rounding="half_up")
+    except ValueError as exc:
+        raise HTTPException(400, str(exc))
+    if credit_minor <= 0:
+        return {"currency": cur, "bucket": _money_bucket_name(bucket), "credit_minor": 0, "credit_major": _format_money_major(cur, 0)}
+    _wallet_apply_minor_delta(inv, cur, credit_minor, bucket=bucket, allow_negative=True)
+    return {
+        "currency": cur,
+        "bucket": _money_bucket_name(bucket),
+        "credit_minor": credit_minor,
+        "credit_major": _format_money_major(cur, credit_minor),
+    }
+
+
+def _recompute_encumbrance(items: list[dict], containers: list[dict], wallet: dict | None = None) -> tuple[list[dict], float]:
+    """Recalculate per-container and inventory encumbrance from items."""
+    containers = _ensure_self_container(containers or [])
+    cont_map = {str(c.get("id")): c for c in containers if isinstance(c, dict) and c.get("id")}
+    for c in containers:
+        c["enc_total"] = 0.0
+    inv_total = 0.0
+
+    for it in (items if isinstance(items, list) else []):
+        if not isinstance(it, dict):
+            continue
+        qty = max(0, _coerce_int(it.get("quantity"), 1))
+        enc_val = _coerce_float(it.get("enc"), 0.0) * qty
+        cid = str(it.get("container_id") or SELF_CONTAINER_ID).strip() or SELF_CONTAINER_ID
+        if it.get("equipped") is not False:
+            cid = SELF_CONTAINER_ID
+        elif cid == SELF_CONTAINER_ID:
+            stowed = str(it.get("stowed_container_id") or "").strip()
+            cid = stowed or _default_stow_container(containers)
+        dest = cont_map.get(cid) or cont_map.get(SELF_CONTAINER_ID)
+        if dest is None and containers:
+            dest = containers[0]
+        if dest is None:
+            continue
+        dest["enc_total"] = _coerce_float(dest.get("enc_total", 0.0), 0.0) + enc_val
+        if bool(dest.get("include", True)):
+            inv_total += enc_val
+
+    if wallet is not None:
+        try:
+            coin_enc = _coerce_float(carried_coin_enc(wallet if isinstance(wallet, dict) else {}), 0.0)
+        except Exception:
+            coin_enc = 0.0
+        self_cont = cont_map.get(SELF_CONTAINER_ID)
+        if self_cont is not None:
+            self_cont["enc_total"] = _coerce_float(self_cont.get("enc_total", 0.0), 0.0) + coin_enc
+            if bool(self_cont.get("include", True)):
+                inv_total += coin_enc
+        else:
+            inv_total += coin_enc
+
+    return containers, inv_total
+
+@router.post("/inventories")
+def create_inventory(request: Request, payload: dict = Body(...)):
+    user, role = require_auth(request)
+    db = get_db()
+    name = (payload.get("name") or "Inventory").strip()
+    currencies_raw = payload.get("currencies")
+    currencies = currencies_raw if isinstance(currencies_raw, dict) else {}
+    containers = payload.get("containers") or []
+    containers = [_new_container(c.get("name")) for c in containers if isinstance(c, dict)] or [_new_container("Backpack")]
+    containers = _ensure_self_container(containers)
+    inv = {
+        "id": next_id_str("inventory", padding=4),
+        "name": name,
+        "owner": user,
+        "currencies": {k: _format_money_major(k, major_to_minor(k, v, rounding="half_up")) for k, v in currencies.items()},
+        "containers": containers,
+        "items": [],
+        "transactions": [],
+        "wallet": {},
+        "exchange_fee_pct": float(DEFAULT_EXCHANGE_FEE_PCT),
+        "enc_total": 0.0,   # NEW
+        "created_at": datetime.datetime.utcnow().isoformat() + "Z",
+    }
+    _ensure_inventory_wallet(inv)
+    containers, inv_total = _recompute_encumbrance(inv.get("items") or [], containers, inv.get("wallet") or {})
+    inv["containers"] = containers
+    inv["enc_total"] = inv_total
+    db.inventories.insert_one(dict(inv))
+    return {"status": "success", "inventory": inv}
+
+@router.get("/inventories")
+def list_inventories(request: Request):
+    user, role = require_auth(request)
+    db = get_db()
+    _claim_linked_resource_owner_bulk("inventories", "inventory_id", user)
+    invs = []
+    for inv in db.inventories.find({"owner": user}, {"_id":0}):
+        if not isinstance(inv, dict):
+            continue
+        try:
+            changed = _ensure_inventory_wallet(inv)
+            containers = _ensure_self_container(inv.get("containers") or [])
+            containers, inv_total = _recompute_encumbrance(inv.get("items") or [], containers, inv.get("wallet") or {})
+            if changed or containers != (inv.get("containers") or []) or inv.get("enc_total") != inv_total:
+                db.inventories.update_one({"id": inv.get("id")}, {"$set": {"containers": containers, "enc_total": inv_total, "wallet": inv.get("wallet") or {}, "currencies": inv.get("currencies") or {}, "exchange_fee_pct": inv.get("exchange_fee_pct", float(DEFAULT_EXCHANGE_FEE_PCT))}})
+            inv["containers"] = containers
+            inv["enc_total"] = inv_total
+            inv["currency_details"] = _wallet_summary(inv)
+            invs.append(inv)
+        except Exception:
+            logger.exception("Failed to render inventory for list (inventory_id=%s)", str(inv.get("id") or ""))
+    return FastJSONResponse({"status":"success","inventories": invs})
+
+@router.get("/inventories/{inv_id}")
+def read_inventory(request: Request, inv_id: str):
+    user, role = _optional_auth(request)
+    db = get_db()
+    inv = None
+    if user:
+        inv = db.inventories.find_one({"id": inv_id, "owner": user}, {"_id":0})
+        if not inv and _claim_linked_resource_owner("inventories", "inventory_id", inv_id, user):
+            inv = db.inventories.find_one({"id": inv_id, "owner": user}, {"_id":0})
+    if not inv and _public_character_ref("inventory_id", inv_id):
+        inv = db.inventories.find_one({"id": inv_id}, {"_id":0})
+    if not inv:
+        raise HTTPException(404, "Not found")
+    wallet_changed = _ensure_inventory_wallet(inv)
+    # Every repair below is folded into a single update_one at the end.
+    inv, refresh_report = _refresh_inventory_items_from_catalog(inv_id, inv, write=False)
+    # Only the owner's read backfills upgrade choice ids; public views stay read-only.
+    is_owner = bool(user) and inv.get("owner") == user
+    upgrades_changed = is_owner and _ensure_upgrade_choice_ids(inv_id, inv, allow_write=False)
+    containers = _ensure_self_container(inv.get("containers") or [])
+    recomputed_containers, inv_total = _recompute_encumbrance(inv.get("items") or [], containers, inv.get("wallet") or {})
+    needs_update = (inv.get("enc_total") != inv_total) or ((inv.get("containers") or []) != recomputed_containers)
+    inv["containers"] = recomputed_containers
+    inv["enc_total"] = inv_total
+    updates = {}
+    if refresh_report["count"] or upgrades_changed:
+        updates["items"] = inv.get("items") or []
+    if needs_update:
+        updates.update({"containers": recomputed_containers, "enc_total": inv_total})
+    if needs_update or wallet_changed:
+        updates.update({"wallet": inv.get("wallet") or {}, "currencies": inv.get("currencies") or {}, "exchange_fee_pct": inv.get("exchange_fee_pct", float(DEFAULT_EXCHANGE_FEE_PCT))})
+    if updates:
+        db.inventories.update_one({"id": inv_id}, {"$set": updates})
+    inv["currency_details"] = _wallet_summary(inv)
+    return {"status":"success","inventory": inv, "refresh_report": refresh_report}
+
+@router.post("/inventories/{inv_id}/duplicate")
+def duplicate_inventory(request: Request, inv_id: str, payload: dict = Body(...)):
+    user, role = require_auth(request)
+    db = get_db()
+    inv = db.inventories.find_one({"id": inv_id, "owner": user}, {"_id":0})
+    if not inv:
+        raise HTTPException(404, "Not found")
+    name = (payload.get("name") or "").strip()
+    base_name = name or (inv.get("name") or "Inventory").strip() or "Inventory"
+    now = datetime.datetime.utcnow().isoformat() + "Z"
+    dup = {k: v for k, v in inv.items()}
+    dup["id"] = next_id_str("inventory", padding=4)
+    dup["name"] = base_name
+    dup["owner"] = user
+    dup["created_at"] = now
+    _ensure_inventory_wallet(dup)
+    containers = _ensure_self_container(dup.get("containers") or [])
+    containers, inv_total = _recompute_encumbrance(dup.get("items") or [], containers, dup.get("wallet") or {})
+    dup["containers"] = containers
+    dup["enc_total"] = inv_total
+    db.inventories.insert_one(dict(dup))
+    return {"status": "success", "inventory": dup}
+
+@router.post("/inventories/{inv_id}/containers")
+def add_container(request: Request, inv_id: str, payload: dict = Body(...)):
+    user, role = require_auth(request)
+    db = get_db()
+    inv = db.inventories.find_one({"id": inv_id, "owner": user})
+    if not inv:
+        raise HTTPException(404, "Inventory not found")
+    containers = _ensure_self_container(inv.get("containers") or [])
+    cont = _new_container(payload.get("name"))
+    containers.append(cont)
+    _ensure_inventory_wallet(inv)
+    containers, inv_total = _recompute_encumbrance(inv.get("items") or [], containers, inv.get("wallet") or {})
+    db.inventories.update_one({"id": inv_id}, {"$set": {"containers": containers, "enc_total": inv_total, "wallet": inv.get("wallet") or {}, "currencies": inv.get("currencies") or {}, "exchange_fee_pct": inv.get("exchange_fee_pct", float(DEFAULT_EXCHANGE_FEE_PCT))}})
+    inv2 = db.inventories.find_one({"id": inv_id}, {"_id": 0})
+    _ensure_inventory_wallet(inv2)
+    inv2["currency_details"] = _wallet_summary(inv2)
+    return {"status": "success", "inventory": inv2}
+
+
+@router.patch("/inventories/{inv_id}/containers/{cid}")
+def patch_container(request: Request, inv_id: str, cid: str, payload: dict = Body(...)):
+    user, role = require_auth(request)
+    db = get_db()
+    inv = db.inventories.find_one({"id": inv_id, "owner": user})
+    if not inv:
+        raise HTTPException(404, "Inventory not found")
+
+    containers = _ensure_self_container(inv.get("containers") or [])
+    found = next((c for c in containers if c.get("id") == cid), None)
+    if not found:
+        raise HTTPException(404, "Container not found")
+
+    if "name" in payload and not found.get("built_in"):
+        found["name"] = (payload.get("name") or "Container").strip()
+    if "include" in payload:
+        include_val = bool(payload.get("include"))
+        found["include"] = True if found.get("id") == SELF_CONTAINER_ID else include_val
+
+    _ensure_inventory_wallet(inv)
+    containers, inv_total = _recompute_encumbrance(inv.get("items") or [], containers, inv.get("wallet") or {})
+    db.inventories.update_one({"id": inv_id}, {"$set": {"containers": containers, "enc_total": inv_total, "wallet": inv.get("wallet") or {}, "currencies": inv.get("currencies") or {}, "exchange_fee_pct": inv.get("exchange_fee_pct", float(DEFAULT_EXCHANGE_FEE_PCT))}})
+    inv2 = db.inventories.find_one({"id": inv_id}, {"_id": 0})
+    _ensure_inventory_wallet(inv2)
+    inv2["currency_details"] = _wallet_summary(inv2)
+    return {"status": "success", "inventory": inv2}
+
+
+@router.delete("/inventories/{inv_id}/containers/{cid}")
+def delete_container(request: Request, inv_id: str, cid: str):
+    user, role = require_auth(request)
+    db = get_db()
+    inv = db.inventories.find_one({"id": inv_id, "owner": user})
+    if not inv:
+        raise HTTPException(404, "Inventory not found")
+
+    containers = _ensure_self_container(inv.get("containers") or [])
+    target = next((c for c in containers if c.get("id") == cid), None)
+    if not target:
+        raise HTTPException(404, "Container not found")
+    if target.get("built_in"):
+        raise HTTPException(400, "Cannot delete this container")
+
+    remaining = [c for c in containers if c.get("id") != cid]
+    items = inv.get("items") or []
+    non_self = [c for c in remaining if c.get("id") != SELF_CONTAINER_ID]
+    if not non_self:
+        extra = _new_container("Storage")
+        remaining.append(extra)
+    fallback = _default_stow_container(remaining)
+
+    for it in items:
+        if it.get("container_id") == cid and not it.get("equipped"):
+            it["container_id"] = fallback
+            it["stowed_container_id"] = it.get("stowed_container_id") or fallback
+        if it.get("stowed_container_id") == cid:
+            it["stowed_container_id"] = fallback
+
+    _ensure_inventory_wallet(inv)
+    remaining, inv_total = _recompute_encumbrance(items, remaining, inv.get("wallet") or {})
+    db.inventories.update_one(
+        {"id": inv_id, "owner": user},
+        {"$set": {"containers": remaining, "items": items, "enc_total": inv_total, "wallet": inv.get("wallet") or {}, "currencies": inv.get("currencies") or {}, "exchange_fee_pct": inv.get("exchange_fee_pct", float(DEFAULT_EXCHANGE_FEE_PCT))}}
+    )
+    inv2 = db.inventories.find_one({"id": inv_id}, {"_id": 0})
+    _ensure_inventory_wallet(inv2)
+    inv2["currency_details"] = _wallet_summary(inv2)
+    return {"status": "success", "inventory": inv2}
+
+@router.post("/inventories/{inv_id}/money/transaction")
+def add_transaction(request: Request, inv_id: str, payload: dict = Body(...)):
+    user, role = require_auth(request)
+    db = get_db()
+    inv = db.inventories.find_one({"id": inv_id, "owner": user})
+    if not inv: raise HTTPException(404, "Not found")
+    _ensure_inventory_wallet(inv)
+    currency = canonical_currency_name((payload.get("currency") or "Jelly").strip())
+    amount_major = _to_decimal_or_zero(payload.get("amount") or 0)
+    amount_minor = major_to_minor(currency, amount_major, rounding="half_up")
+    if amount_minor == 0:
+        raise HTTPException(400, "Amount must be non-zero")
+    balance_source = _money_bucket_name(payload.get("balance_source") or payload.get("bucket"))
+    note     = (payload.get("note") or "").strip()
+    source   = (payload.get("source") or "manual").strip()
+    _wallet_apply_minor_delta(inv, currency, amount_minor, bucket=balance_source, allow_negative=False)
+    tx = {
+        "ts": datetime.datetime.utcnow().isoformat() + "Z",
+        "currency": currency,
+        "amount": _format_money_major(currency, amount_minor),
+        "amount_minor": amount_minor,
+        "balance_source": balance_source,
+        "note": note,
+        "source": source
+    }
+    db.inventories.update_one({"id":inv_id},
+        {"$set":{"currencies": inv.get("currencies") or {}, "wallet": inv.get("wallet") or {}, "exchange_fee_pct": inv.get("exchange_fee_pct", float(DEFAULT_EXCHANGE_FEE_PCT))}, "$push":{"transactions": tx}})
+    inv["currency_details"] = _wallet_summary(inv)
+    return {"status":"success","currencies": inv.get("currencies") or {}, "inventory": inv, "transaction": tx}
+
+def _build_weapon_ammo_entry(ref_id: str, weapon: dict) -> dict | None:
+    if not weapon:
+        return None
+    ammo_name = (weapon.get("ammo_name") or "").strip()
+    if not ammo_name:
+        return None
+    price = int(weapon.get("ammo_price") or 0)
+    enc = float(weapon.get("ammo_enc") or 0.0)
+    tags = [t.strip().lower() for t in (weapon.get("tags") or []) if (t or "").strip()]
+    if "ammo" not in tags:
+        tags.append("ammo")
+    return {
+        "id": ref_id,
+        "name": ammo_name,
+        "price": price,
+        "enc": enc,
+        "category": "weapon",
+        "tags": tags,
+        "kind": "ammo",
+        "weapon_id": weapon.get("id"),
+        "weapon_name": weapon.get("name"),
+        "description": weapon.get("description"),
+        "description_html": weapon.get("description_html"),
+        "ammo_name": ammo_name,
+        "ammo_price": price,
+        "ammo_enc": enc,
+        "magazine_size": weapon.get("magazine_size") or weapon.get("magazine"),
+        "modifiers": weapon.get("modifiers") or [],
+        "default_avatar": weapon.get("default_avatar"),
+        "consumable": bool(weapon.get("consumable")),
+        "alchemy_tool": bool(weapon.get("alchemy_tool")),
+    }
+
+def _find_weapon_for_ammo_ref(ref_id: str, db) -> dict | None:
+    if not ref_id.startswith("weapon-ammo-"):
+        return None
+    weapon_ref = ref_id[len("weapon-ammo-"):].strip()
+    if not weapon_ref:
+        return None
+    weapon = db.weapons.find_one({"id": weapon_ref})
+    if weapon:
+        return weapon
+    target_key = norm_key(weapon_ref)
+    for w in db.weapons.find({"ammo_name": {"$type": "string", "$ne": ""}}):
+        ammo_name = (w.get("ammo_name") or "").strip()
+        if norm_key(ammo_name) == target_key:
+            return w
+    return None
+
+_CATALOG_COLLECTIONS = {"weapon": "weapons", "equipment": "equipment", "tool": "tools", "object": "objects", "ammo": "objects"}
+
+def _fetch_catalog_item(kind: str, ref_id: str) -> dict | None:
+    db = get_db()
+    if (kind or "").lower() == "ammo":
+        ammo_obj = db.objects.find_one({"id": ref_id})
+        if ammo_obj:
+            return ammo_obj
+        weapon = _find_weapon_for_ammo_ref(ref_id, db)
+        if weapon:
+            return _build_weapon_ammo_entry(ref_id, weapon)
+        return None
+    col = _CATALOG_COLLECTIONS.get(kind)
+    if not col:
+        return None
+    return db[col].find_one({"id": ref_id})
+
+def _fetch_catalog_items(refs: list[tuple[str, str]]) -> dict[tuple[str, str], dict]:
+    """
+    Batched _fetch_catalog_item: one `$in` query per catalog collection instead
+    of one round-trip per inventory item. Ammo that isn't an object falls back
+    to the per-item weapon lookup.
+    """
+    db = get_db()
+    by_col: dict[str, set[str]] = {}
+    for kind, ref_id in refs:
+        col = _CATALOG_COLLECTIONS.get(kind)
+        if col:
+            by_col.setdefault(col, set()).add(ref_id)
+    docs_by_col = {
+        col: {d.get("id"): d for d in db[col].find({"id": {"$in": sorted(ids)}})}
+        for col, ids in by_col.items()
+    }
+    found: dict[tuple[str, str], dict] = {}
+    for kind, ref_id in refs:
+        if (kind, ref_id) in found:
+            continue
+        col = _CATALOG_COLLECTIONS.get(kind)
+        src = docs_by_col.get(col, {}).get(ref_id) if col else None
+        if src is None and kind == "ammo":
+            weapon = _find_weapon_for_ammo_ref(ref_id, db)
+            src = _build_weapon_ammo_entry(ref_id, weapon) if weapon else None
+        if src:
+            found[(kind, ref_id)] = src
+    return found
+
+def _extract_item_description(src: dict) -> tuple[str | None, str | None]:
+    desc_html = src.get("description_html")
+    desc = src.get("description") or src.get("desc")
+    return desc, desc_html
+
+def _refresh_inventory_items_from_catalog(inv_id: str, inv: dict, write: bool = True) -> tuple[dict, dict]:
+    items = inv.get("items") or []
+    updated = False
+    changed = []
+    refs = [((it.get("kind") or "").strip().lower(), (it.get("ref_id") or "").strip()) for it in items]
+    sources = _fetch_catalog_items([(kind, ref_id) for kind, ref_id in refs if kind and ref_id])
+    for it, (kind, ref_id) in zip(items, refs):
+        if not ref_id or not kind:
+            continue
+        src = sources.get((kind, ref_id))
+        if not src:
+            continue
+
+        subcat = src.get("category") if kind == "equipment" else None
+        eq_slot = src.get("slot") if kind == "equipment" else None
+        name = src.get("name") or (subcat == "armor" and f"Armor - {src.get('type')}") or src.get("style") or "Item"
+        enc = float(src.get("enc") or 0.0)
+        base_price = int(src.get("price") or 0)
+        modifiers = src.get("modifiers") or []
+        tags = src.get("tags") or []
+        desc, desc_html = _extract_item_description(src)
+        consumable = bool(src.get("consumable"))
+        alchemy_tool = bool(src.get("alchemy_tool"))
+
+        updates = {}
+        def set_if_diff(key, val):
+            if it.get(key) != val:
+                updates[key] = val
+
+        set_if_diff("name", name)
+        set_if_diff("subcategory", subcat)
+        set_if_diff("equipment_slot", eq_slot)
+        set_if_diff("enc", enc)
+        set_if_diff("base_price", base_price)
+        set_if_diff("modifiers", modifiers)
+        set_if_diff("tags", tags)
+        set_if_diff("description", desc)
+        set_if_diff("description_html", desc_html)
+        set_if_diff("consumable", consumable)
+        set_if_diff("alchemy_tool", alchemy_tool)
+        set_if_diff("default_avatar", src.get("default_avatar"))
+        set_if_diff("is_animarma", bool(src.get("is_animarma")))
+        set_if_diff("magazine_size", _safe_int(src.get("magazine_size") or src.get("magazine"), 0))
+        set_if_diff("ammo_name", (src.get("ammo_name") or src.get("ammo") or "").strip())
+        set_if_diff("ammo_price", _safe_int(src.get("ammo_price"), 0))
+        set_if_diff("ammo_enc", _safe_float(src.get("ammo_enc"), 0.0))
+
+        if updates:
+            it.update(updates)
+            updated = True
+            changed.append({
+                "item_id": it.get("item_id"),
+                "ref_id": ref_id,
+                "name": name,
+                "fields": sorted(list(updates.keys()))
+            })
+    if updated:
+        if write:
+            get_db().inventories.update_one({"id": inv_id}, {"$set": {"items": items}})
+        inv["items"] = items
+    return inv, {"count": len(changed), "changed_items": changed}
+
+def _ensure_upgrade_choice_ids(inv_id: str, inv: dict, allow_write: bool) -> bool:
+    items = inv.get("items") or []
+    missing = [
+        u
+        for it in items
+        if isinstance(it.get("upgrades"), list)
+        for u in it["upgrades"]
+        if isinstance(u, dict) and not u.get("choice_id")
+    ]
+    for u, choice_id in zip(missing, next_ids("invupg", len(missing), padding=6)):
+        u["choice_id"] = choice_id
+    updated = bool(missing)
+    if updated and allow_write:
+        get_db().inventories.update_one({"id": inv_id}, {"$set": {"items": items}})
+    return updated
+
+def _tags_filter(tags: str) -> dict:
+    raw = [t.strip() for t in (tags or "").split(",") if t.strip()]
+    if not raw:
+        return {}
+    regexes = [re.compile(rf"^{re.escape(t)}$", re.IGNORECASE) for t in raw]
+    return {"tags": {"$in": regexes}}
+
+def _validate_upgrades(kind: str, subcat: str | None, quality: str, existing: list[dict], add: list[dict]) -> tuple[list[dict], int, list[dict]]:
+    """Validate and compute fees. Returns (new_upgrades_list, total_fee, steps)"""
+    exist = existing or []
+    add = add or []
+    # allowed only for weapon or armor
+    allow = (kind == "weapon") or (kind == "equipment" and subcat == "armor")
+    if not allow: return (exist, 0, [])
+    # unique rules and slots
+    slots = _slots_for_quality(quality)
+    # current counts per key
+    from collections import Counter
+    cnt = Counter([u["key"] for u in exist])
+    new = exist[:]
+    for u in add:
+        key = u.get("key")
+        table = WEAPON_UPGRADES if kind=="weapon" else ARMOR_UPGRADES
+        meta = next((x for x in table if x["key"]==key), None)
+        if not meta: continue
+        if meta["unique"] and cnt.get(key,0)>=1:  # unique already there
+            continue
+        new.append({"key": key, "name": meta["name"], "unique": meta["unique"]})
+        cnt[key]+=1
+        if len(new) >= slots: break
+    # fees according to final number
+    fee, steps = _upgrade_fee_for_range(len(exist), len(new)-len(exist))
+    return (new, fee, steps)
+
+def _normalize_upgrade_target_list(val):
+    if isinstance(val, str):
+        return [t.strip().lower() for t in val.split(",") if t.strip()]
+    if isinstance(val, list):
+        return [str(t).strip().lower() for t in val if str(t).strip()]
+    return []
+
+def _normalize_upgrade_payload(add_list):
+    out = []
+    for a in add_list or []:
+        if isinstance(a, str):
+            text = a.strip()
+            target = ""
+            for sep in ("|","@",":"):
+                if sep in text:
+                    text, target = text.split(sep,1)
+                    target = target.strip()
+                    break
+            out.append({"id": text, "target": target})
+        elif isinstance(a, dict):
+            entry = {"id": str(a.get("id") or a.get("upgrade_id") or a.get("upgrade") or "").strip()}
+            if "target" in a:
+                entry["target"] = str(a.get("target") or "").strip()
+            out.append(entry)
+    return [x for x in out if x.get("id")]
+
+def _fetch_upgrade_docs(ids: list[str]) -> list[dict]:
+    if not ids:
+        return []
+    docs = list(get_col("upgrades").find({"id": {"$in": ids}}, {"_id": 0}))
+    by_id = {d["id"]: d for d in docs}
+    return [by_id[i] for i in ids if i in by_id]
+
+def _prepare_new_upgrades(existing: list[dict], add_payload: list, kind: str, slot: str | None, quality: str) -> tuple[list[dict], int, list[dict]]:
+    existing = existing or []
+    add_list = _normalize_upgrade_payload(add_payload)
+    if not add_list:
+        return [], 0, []
+    slot = (slot or "").strip().lower()
+    docs = _fetch_upgrade_docs([x["id"] for x in add_list])
+    by_id = {d["id"]: d for d in docs}
+    new_docs = []
+    total_fee = 0
+    for payload in add_list:
+        doc = by_id.get(payload["id"])
+        if not doc:
+            raise HTTPException(404, f"Upgrade not found: {payload['id']}")
+        if doc.get("kind") != kind:
+            raise HTTPException(400, "Upgrade kind mismatch")
+        if kind == "equipment":
+            slot_req = (doc.get("slot") or "").strip().lower()
+            if slot_req and slot and slot_req != slot:
+                raise HTTPException(400, "Upgrade not allowed for this equipment slot")
+
+        # exclusivity / unique
+        if doc.get("unique"):
+            if any(x.get("id") == doc["id"] for x in existing+new_docs):
+                raise HTTPException(400, "Upgrade already installed (unique)")
+        excl = (doc.get("exclusive_group") or "").strip().lower()
+        if excl and any((u.get("exclusive_group") or "").strip().lower() == excl for u in existing+new_docs):
+            raise HTTPException(400, f"Exclusive upgrade conflict: {excl}")
+
+        # target selection and limit (max 2 per target)
+        targets = _normalize_upgrade_target_list(doc.get("targets"))
+        chosen_target = (payload.get("target") or "").strip().lower()
+        if targets:
+            if not chosen_target:
+                raise HTTPException(400, f"Upgrade {doc.get('name','Upgrade')} requires a target selection")
+            if chosen_target not in targets:
+                raise HTTPException(400, f"Invalid target for upgrade {doc.get('name','Upgrade')}")
+            cnt = sum(1 for u in existing+new_docs if (u.get("target") or "").strip().lower() == chosen_target)
+            if cnt >= 2:
+                raise HTTPException(400, f"Target {chosen_target} already has two upgrades applied")
+        else:
+            chosen_target = ""
+
+        ndoc = {
+            "id": doc.get("id"),
+            "name": doc.get("name"),
+            "unique": bool(doc.get("unique")),
+            "slot": doc.get("slot"),
+            "kind": doc.get("kind"),
+            "exclusive_group": doc.get("exclusive_group") or "",
+            "targets": targets,
+            "target": chosen_target,
+            "modifiers": doc.get("modifiers") or [],
+            "choice_id": next_id_str("invupg", padding=6),
+        }
+        new_docs.append(ndoc)
+
+    slots_limit = _slots_for_quality(quality)
+    if slots_limit and (len(existing) + len(new_docs)) > slots_limit:
+        raise HTTPException(400, "Upgrade slots exceeded for current quality")
+    fee, steps = _upgrade_fee_for_range(len(existing), len(new_docs))
+    total_fee += fee
+    return new_docs, total_fee, steps
+
+@router.post("/inventories/{inv_id}/purchase")
+def purchase_item(request: Request, inv_id: str, payload: dict = Body(...)):
+    user, role = require_auth(request)
+    db = get_db()
+    inv = db.inventories.find_one({"id": inv_id, "owner": user})
+    if not inv:
+        raise HTTPException(404, "Not found")
+    _ensure_inventory_wallet(inv)
+
+    kind = (payload.get("kind") or "").strip().lower()
+    ref_id = (payload.get("ref_id") or "").strip()
+    qty = max(1, int(payload.get("quantity") or 1))
+    quality = (payload.get("quality") or "Adequate").strip()  # kept for future-proof; ignored for objects
+    container_id = (payload.get("container_id") or None)
+    upgrades_req = payload.get("upgrades") or []
+    currency = canonical_currency_name((payload.get("currency") or "Jelly").strip())
+    balance_source = _money_bucket_name(payload.get("balance_source") or payload.get("bucket"))
+    is_equipped = bool(payload.get("equipped", True))
+
+    src = _fetch_catalog_item(kind, ref_id)
+    if not src:
+        raise HTTPException(404, "Catalog item not found")
+    pack_size = 1
+    pack_count = qty
+    if kind == "ammo":
+        pack_size = max(1, int(src.get("pack_size") or AMMO_PACK_DEFAULT))
+        pack_count = max(1, math.ceil(qty / pack_size))
+        qty = pack_count * pack_size
+
+    base_price = int(src.get("price") or 0)
+    enc = float(src.get("enc") or 0.0)
+    enc_per_unit = enc
+    if kind == "ammo" and pack_size:
+        enc_per_unit = enc / pack_size
+    subcat = src.get("category") if kind == "equipment" else None
+    name = src.get("name") or (subcat == "armor" and f"Armor - {src.get('type')}") or src.get("style") or "Item"
+    eq_slot = src.get("slot") if kind == "equipment" else None
+    magazine_size = _safe_int(src.get("magazine_size") or src.get("magazine"), 0)
+    ammo_name = (src.get("ammo_name") or src.get("ammo") or "").strip()
+    ammo_price = _safe_int(src.get("ammo_price"), 0)
+    ammo_enc = _safe_float(src.get("ammo_enc"), 0.0)
+    pricing_mode = (payload.get("pricing_mode") or "market").strip().lower()
+    raw_price_modifier = payload.get("price_modifier", None)
+    raw_custom_price = payload.get("custom_price", None)
+    try:
+        price_modifier = float(raw_price_modifier)
+    except Exception:
+        price_modifier = None
+    try:
+        custom_price = float(raw_custom_price)
+    except Exception:
+        custom_price = None
+
+    unit_price = base_price
+    base_upgrades: list[dict] = []
+    add_upgrades: list[dict] = []
+    fee = 0
+    if kind in ("weapon", "equipment"):
+        unit_price = _qprice(base_price, quality)
+        # base (pre-installed) upgrades from catalog
+        try:
+            base_upgrades, _fee0, _steps0 = _prepare_new_upgrades([], src.get("upgrades") or [], kind, eq_slot, quality)
+        except HTTPException as e:
+            # user visible error
+            raise
+        add_upgrades, fee, _steps = _prepare_new_upgrades(base_upgrades, upgrades_req, kind, eq_slot, quality)
+        unit_price += fee
+
+    if pricing_mode not in ("market", "custom", "take"):
+        if custom_price is not None or (price_modifier is not None and price_modifier != 1):
+            pricing_mode = "custom"
+        else:
+            pricing_mode = "market"
+
+    note_tag = "market price"
+    if pricing_mode == "take":
+        unit_price = 0
+        note_tag = "take"
+    elif pricing_mode == "custom":
+        if custom_price is not None:
+            unit_price = max(0, int(round(custom_price)))
+            note_tag = "custom price"
+        elif price_modifier is not None:
+            unit_price = max(0, int(round(unit_price * price_modifier)))
+            note_tag = f"{int(round(price_modifier * 100))}%"
+        else:
+            unit_price = max(0, int(round(unit_price)))
+            note_tag = "custom price"
+    else:
+        unit_price = max(0, int(round(unit_price)))
+
+    if kind == "ammo":
+        total = int(unit_price * pack_count)
+    else:
+        total = int(unit_price * qty)
+
+    spend = _wallet_spend_gc(inv, currency, total, bucket=balance_source)
+
+    containers = _ensure_self_container(inv.get("containers") or [])
+    valid_container_ids = {c.get("id") for c in containers}
+    if container_id not in valid_container_ids:
+        container_id = _default_stow_container(containers)
+    stowed_container_id = container_id or _default_stow_container(containers)
+    container_id = SELF_CONTAINER_ID if is_equipped else (container_id or SELF_CONTAINER_ID)
+
+    # store item + transaction
+    desc, desc_html = _extract_item_description(src)
+    item = {
+        "item_id": next_id_str("invitem", padding=5),
+        "kind": kind,
+        "subcategory": subcat,
+        "equipment_slot": eq_slot,
+        "ref_id": ref_id,
+        "name": name,
+        "description": desc,
+        "description_html": desc_html,
+        "quantity": qty,
+        "quality": (quality if kind in ("weapon", "equipment") else None),
+        "enc": enc_per_unit,
+        "base_price": base_price,
+        "paid_unit": unit_price,
+        "upgrades": base_upgrades + add_upgrades,
+        "container_id": container_id,
+        "stowed_container_id": stowed_container_id,
+        "modifiers": src.get("modifiers") or [],
+        "tags": src.get("tags") or [],
+        "equipped": is_equipped,
+        "consumable": bool(src.get("consumable")),
+        "alchemy_tool": bool(src.get("alchemy_tool")),
+        "craftomancies": [],
+        "magazine_size": magazine_size,
+        "ammo_name": ammo_name,
+        "ammo_price": ammo_price,
+        "ammo_enc": ammo_enc,
+        "pack_size": pack_size,
+    }
+    if kind == "ammo":
+        item["consumable"] = True
+    tx = {
+        "ts": datetime.datetime.utcnow().isoformat() + "Z",
+        "currency": currency,
+        "amount": -_format_money_major(currency, int(spend.get("required_minor") or 0)),
+        "amount_minor": -int(spend.get("required_minor") or 0),
+        "balance_source": balance_source,
+        "gc_amount": total,
+        "note": f"{'Take' if pricing_mode == 'take' else 'Purchase'} {name} x{qty} ({note_tag})",
+        "source": "purchase",
+        "item_id": item["item_id"]
+    }
+
+    items = inv.get("items") or []
+    items = items + [item]
+    containers, inv_enc_total = _recompute_encumbrance(items, containers, inv.get("wallet") or {})
+    db.inventories.update_one({"id": inv_id}, {
+        "$set": {"currencies": inv.get("currencies") or {}, "wallet": inv.get("wallet") or {}, "exchange_fee_pct": inv.get("exchange_fee_pct", float(DEFAULT_EXCHANGE_FEE_PCT)), "containers": containers, "enc_total": inv_enc_total, "items": items},
+        "$push": {"transactions": tx}
+    })
+    inv2 = db.inventories.find_one({"id": inv_id}, {"_id": 0})
+    _ensure_inventory_wallet(inv2)
+    inv2["currency_details"] = _wallet_summary(inv2)
+    return {"status": "success", "inventory": inv2, "transaction": tx}
+
+@router.post("/inventories/{inv_id}/items/{item_id}/improve")
+def improve_item(request: Request, inv_id: str, item_id: str, payload: dict = Body(...)):
+    user, role = require_auth(request)
+    db = get_db()
+    inv = db.inventories.find_one({"id": inv_id, "owner": user})
+    if not inv: raise HTTPException(404, "Not found")
+    _ensure_inventory_wallet(inv)
+    currency = canonical_currency_name((payload.get("currency") or "Jelly").strip())
+    balance_source = _money_bucket_name(payload.get("balance_source") or payload.get("bucket"))
+
+    items = inv.get("items", [])
+    idx = next((i for i,x in enumerate(items) if x["item_id"]==item_id), -1)
+    if idx < 0: raise HTTPException(404, "Item not found")
+    it = items[idx]
+    kind = it["kind"]; subcat = it.get("subcategory")
+
+    # quality upgrade cost = (newQ - oldQ) diff per unit * qty
+    new_q = payload.get("new_quality")
+    add_keys = payload.get("add_upgrades") or []
+
+    total_cost = 0
+    note_parts = []
+
+    # quality
+    if new_q and kind in ("weapon","equipment"):
+      old_q = it.get("quality") or "Adequate"
+      base = it.get("base_price") or 0
+      delta = _qprice(base, new_q) - _qprice(base, old_q)
+      if delta < 0: delta = 0  # no refund by default
+      total_cost += delta * int(it.get("quantity") or 1)
+      it["quality"] = new_q
+      note_parts.append(f"quality → {new_q}")
+
+    # upgrades
+    existing_upgs = it.get("upgrades") or []
+    try:
+        add_upgrades, fee, steps = _prepare_new_upgrades(existing_upgs, add_keys, kind, it.get("equipment_slot") or it.get("slot") or None, it.get("quality") or "Adequate")
+    except HTTPException:
+        raise
+    if len(add_upgrades) > 0:
+        it["upgrades"] = existing_upgs + add_upgrades
+        total_cost += fee
+        note_parts.append(f"+{len(add_upgrades)} upgrade(s)")
+
+    # persist + money
+    if total_cost > 0:
+        spend = _wallet_spend_gc(inv, currency, total_cost, bucket=balance_source)
+        tx = {
+            "ts": datetime.datetime.utcnow().isoformat()+"Z",
+            "currency": currency,
+            "amount": -_format_money_major(currency, int(spend.get("required_minor") or 0)),
+            "amount_minor": -int(spend.get("required_minor") or 0),
+            "balance_source": balance_source,
+            "gc_amount": total_cost,
+            "note": f"Improve {it['name']}: " + ", ".join(note_parts),
+            "source": "upgrade"
+        }
+        items[idx] = it
+        containers = _ensure_self_container(inv.get("containers") or [])
+        containers, inv_enc_total = _recompute_encumbrance(items, containers, inv.get("wallet") or {})
+        db.inventories.update_one({"id": inv_id}, {"$set":{"items": items, "currencies": inv.get("currencies") or {}, "wallet": inv.get("wallet") or {}, "exchange_fee_pct": inv.get("exchange_fee_pct", float(DEFAULT_EXCHANGE_FEE_PCT)), "containers": containers, "enc_total": inv_enc_total}, "$push":{"transactions": tx}})
+    else:
+        db.inventories.update_one({"id": inv_id}, {"$set":{"items": items}})
+
+    inv2 = db.inventories.find_one({"id": inv_id}, {"_id":0})
+    _ensure_inventory_wallet(inv2)
+    inv2["currency_details"] = _wallet_summary(inv2)
+    return {"status":"success","inventory": inv2}
+
+@router.get("/catalog/objects")
+def catalog_objects(request: Request, q: str = "", tags: str = "", limit: int = 25):
+    require_auth(request)
+    filt = _tags_filter(tags) if tags.strip() else {}
+    projection = {"_id": 0, "id": 1, "name": 1, "price": 1, "enc": 1}
+    if q.strip():
+        rows = ranked_name_rows("objects", q, filt, projection, int(limit))
+    else:
+        rows = list(get_col("objects").find(filt, projection).limit(int(limit)))
+    return {"status": "success", "objects": rows}
+
+
+@router.get("/catalog/ammo")
+def catalog_ammo(request: Request, q: str = "", tags: str = "", limit: int = 25):
+    require_auth(request)
+    col = get_col("objects")
+    base_cond = {"$or": [
+        {"category": "ammo"},
+        {"tags": {"$in": ["ammo"]}}
+    ]}
+    filters = [base_cond]
+    extra_tags = _tags_filter(tags)
+    if extra_tags:
+        filters.append(extra_tags)
+    filt = filters[0] if len(filters) == 1 else {"$and": filters}
+    projection = {"_id": 0, "id": 1, "name": 1, "price": 1, "enc": 1, "category": 1, "tags": 1, "pack_size": 1}
+    if q.strip():
+        rows = ranked_name_rows("objects", q, filt, projection, int(limit))
+    else:
+        rows = list(col.find(filt, projection).limit(int(limit)))
+    for row in rows:
+        row["pack_size"] = max(1, int(row.get("pack_size") or AMMO_PACK_DEFAULT))
+    existing_keys = {norm_key(str(row.get("name") or "")) for row in rows if row.get("name")}
+    weapon_col = get_col("weapons")
+    ammo_name_query = (q or "").strip().lower()
+    tag_filters = [t.strip().lower() for t in (tags or "").split(",") if t.strip()]
+    ammo_rows = []
+    for weapon in weapon_col.find({"ammo_name": {"$type": "string", "$ne": ""}}):
+        ammo_name = (weapon.get("ammo_name") or "").strip()
+        if not ammo_name:
+            continue
+        key = norm_key(ammo_name)
+        if key in existing_keys:
+            continue
+        if ammo_name_query and ammo_name_query not in ammo_name.lower():
+            continue
+        entry_tags = [(t or "").strip().lower() for t in (weapon.get("tags") or [])]
+        entry_tags.append("ammo")
+        if tag_filters:
+            if not all(any(entry_tag == f or entry_tag.startswith(f + ":") or f in entry_tag for entry_tag in entry_tags) for f in tag_filters):
+                continue
+        ammo_entry = {
+            "id": f"weapon-ammo-{weapon.get('id') or key}",
+            "name": ammo_name,
+            "price": int(weapon.get("ammo_price") or 0),
+            "enc": float(weapon.get("ammo_enc") or 0.0),
+            "pack_size": max(1, int(weapon.get("ammo_pack_size") or AMMO_PACK_DEFAULT)),
+            "category": "weapon",
+            "tags": entry_tags,
+            "weapon_id": weapon.get("id"),
+            "weapon_name": weapon.get("name"),
+            "kind": "ammo"
+        }
+        ammo_rows.append(ammo_entry)
+        existing_keys.add(key)
+    rows.extend(ammo_rows)
+    return {"status": "success", "ammo": rows}
+
+@router.post("/inventories/{inv_id}/deposit")
+def deposit_funds(request: Request, inv_id: str, payload: dict = Body(...)):
+    user, role = require_auth(request)
+    db = get_db()
+    inv = db.inventories.find_one({"id": inv_id, "owner": user})
+    if not inv:
+        raise HTTPException(404, "Inventory not found")
+    _ensure_inventory_wallet(inv)
+
+    currency = canonical_currency_name((payload.get("currency") or _pick_currency(inv)).strip())
+    amount_major = _to_decimal_or_zero(payload.get("amount") or 0)
+    amount_minor = major_to_minor(currency, amount_major, rounding="half_up")
+    note = (payload.get("note") or "Deposit").strip()
+    balance_source = _money_bucket_name(payload.get("balance_source") or payload.get("bucket"))
+    if amount_minor == 0:
+        raise HTTPException(400, "Amount must be non-zero")
+
+    _wallet_apply_minor_delta(inv, currency, amount_minor, bucket=balance_source, allow_negative=False)
+    containers = _ensure_self_container(inv.get("containers") or [])
+    containers, inv_enc_total = _recompute_encumbrance(inv.get("items") or [], containers, inv.get("wallet") or {})
+
+    tx = {
+        "ts": datetime.datetime.utcnow().isoformat() + "Z",
+        "currency": currency,
+        "amount": _format_money_major(currency, amount_minor),
+        "amount_minor": amount_minor,
+        "balance_source": balance_source,
+        "note": note, "source": "deposit"
+    }
+    db.inventories.update_one({"id": inv_id}, {
+        "$set": {"currencies": inv.get("currencies") or {}, "wallet": inv.get("wallet") or {}, "exchange_fee_pct": inv.get("exchange_fee_pct", float(DEFAULT_EXCHANGE_FEE_PCT)), "containers": containers, "enc_total": inv_enc_total},
+        "$push": {"transactions": tx}
+    })
+    inv2 = db.inventories.find_one({"id": inv_id}, {"_id": 0})
+    _ensure_inventory_wallet(inv2)
+    inv2["currency_details"] = _wallet_summary(inv2)
+    return {"status": "success", "inventory": inv2, "transaction": tx}
+
+
+@router.patch("/inventories/{inv_id}/exchange_fee")
+def set_inventory_exchange_fee(request: Request, inv_id: str, payload: dict = Body(...)):
+    user, role = require_auth(request)
+    db = get_db()
+    inv = db.inventories.find_one({"id": inv_id, "owner": user})
+    if not inv:
+        raise HTTPException(404, "Inventory not found")
+    _ensure_inventory_wallet(inv)
+
+    raw = payload.get("fee_pct", payload.get("exchange_fee_pct"))
+    fee = _to_decimal_or_zero(raw if raw is not None else inv.get("exchange_fee_pct", DEFAULT_EXCHANGE_FEE_PCT))
+    if fee < 0 or fee > 100:
+        raise HTTPException(400, "fee_pct must be between 0 and 100")
+    fee_float = float(fee.quantize(Decimal("0.01")))
+    inv["exchange_fee_pct"] = fee_float
+
+    containers = _ensure_self_container(inv.get("containers") or [])
+    containers, inv_enc_total = _recompute_encumbrance(inv.get("items") or [], containers, inv.get("wallet") or {})
+    db.inventories.update_one({"id": inv_id}, {"$set": {"exchange_fee_pct": fee_float, "wallet": inv.get("wallet") or {}, "currencies": inv.get("currencies") or {}, "containers": containers, "enc_total": inv_enc_total}})
+    inv2 = db.inventories.find_one({"id": inv_id}, {"_id": 0})
+    _ensure_inventory_wallet(inv2)
+    inv2["currency_details"] = _wallet_summary(inv2)
+    return {"status": "success", "inventory": inv2, "exchange_fee_pct": fee_float}
+
+
+@router.post("/inventories/{inv_id}/exchange")
+def exchange_inventory_currency(request: Request, inv_id: str, payload: dict = Body(...)):
+    user, role = require_auth(request)
+    db = get_db()
+    inv = db.inventories.find_one({"id": inv_id, "owner": user})
+    if not inv:
+        raise HTTPException(404, "Inventory not found")
+    _ensure_inventory_wallet(inv)
+
+    from_currency = canonical_currency_name(payload.get("from_currency") or payload.get("from") or "")
+    to_currency = canonical_currency_name(payload.get("to_currency") or payload.get("to") or "")
+    if not from_currency or not to_currency:
+        raise HTTPException(400, "from_currency and to_currency are required")
+
+    amount_major = _to_decimal_or_zero(payload.get("amount") or 0)
+    amount_minor = major_to_minor(from_currency, amount_major, rounding="half_up")
+    if amount_minor <= 0:
+        raise HTTPException(400, "amount must be positive")
+
+    from_bucket = _money_bucket_name(payload.get("from_balance_source") or payload.get("from_bucket") or payload.get("balance_source"))
+    to_bucket = _money_bucket_name(payload.get("to_balance_source") or payload.get("to_bucket") or payload.get("balance_target") or from_bucket)
+
+    from_val = currency_value_gc(from_currency)
+    to_val = currency_value_gc(to_currency)
+    if from_val is None or to_val is None:
+        raise HTTPException(400, "Only standard currencies can be exchanged")
+
+    fee_raw = payload.get("fee_pct")
+    fee = _to_decimal_or_zero(fee_raw if fee_raw is not None else inv.get("exchange_fee_pct", DEFAULT_EXCHANGE_FEE_PCT))
+    if fee < 0 or fee > 100:
+        raise HTTPException(400, "fee_pct must be between 0 and 100")
+    fee_pct = float(fee.quantize(Decimal("0.01")))
+
+    available_minor = _wallet_minor(inv, from_currency, from_bucket)
+    if amount_minor > available_minor:
+        need = _format_money_major(from_currency, amount_minor)
+        have = _format_money_major(from_currency, available_minor)
+        raise HTTPException(400, f"Insufficient funds in {from_currency} ({from_bucket}). Required {need}, available {have}.")
+
+    gross_gc = minor_to_gc(from_currency, amount_minor)
+    fee_gc = gross_gc * (fee / Decimal("100"))
+    net_gc = gross_gc - fee_gc
+    if net_gc <= 0:
+        raise HTTPException(400, "Exchange amount too low after fees")
+    try:
+        to_minor = gc_to_minor(to_currency, net_gc, rounding="floor")
+    except ValueError as exc:
+        raise HTTPException(400, str(exc))
+    if to_minor <= 0:
+        raise HTTPException(400, "Exchange amount too low for destination currency")
+
+    _wallet_apply_minor_delta(inv, from_currency, -amount_minor, bucket=from_bucket, allow_negative=False)
+    _wallet_apply_minor_delta(inv, to_currency, to_minor, bucket=to_bucket, allow_negative=True)
+
+    from_major = _format_money_major(from_currency, amount_minor)
+    to_major = _format_money_major(to_currency, to_minor)
+    tx = {
+        "ts": datetime.datetime.utcnow().isoformat() + "Z",
+        "currency": from_currency,
+        "amount": -from_major,
+        "amount_minor": -amount_minor,
+        "balance_source": from_bucket,
+        "source": "exchange",
+        "note": f"Exchange {from_major} {from_currency} -> {to_major} {to_currency} (fee {fee_pct}%)",
+        "to_currency": to_currency,
+        "to_amount": to_major,
+        "to_amount_minor": to_minor,
+        "to_balance_source": to_bucket,
+        "fee_pct": fee_pct,
+        "gc_amount": float(gross_gc.quantize(Decimal("0.01"))),
+        "gc_net_amount": float(net_gc.quantize(Decimal("0.01"))),
+    }
+
+    containers = _ensure_self_container(inv.get("containers") or [])
+    containers, inv_enc_total = _recompute_encumbrance(inv.get("items") or [], containers, inv.get("wallet") or {})
+    db.inventories.update_one(
+        {"id": inv_id, "owner": user},
+        {
+            "$set": {
+                "wallet": inv.get("wallet") or {},
+                "currencies": inv.get("currencies") or {},
+                "exchange_fee_pct": fee_pct,
+                "containers": containers,
+                "enc_total": inv_enc_total,
+            },
+            "$push": {"transactions": tx},
+        },
+    )
+    inv2 = db.inventories.find_one({"id": inv_id}, {"_id": 0})
+    _ensure_inventory_wallet(inv2)
+    inv2["currency_details"] = _wallet_summary(inv2)
+    return {
+        "status": "success",
+        "inventory": inv2,
+        "exchange": {
+            "from_currency": from_currency,
+            "from_amount": from_major,
+            "from_balance_source": from_bucket,
+            "to_currency": to_currency,
+            "to_amount": to_major,
+            "to_balance_source": to_bucket,
+            "fee_pct": fee_pct,
+        },
+        "transaction": tx,
+    }
+
+@router.post("/inventories/{inv_id}/transactions/undo")
+def undo_inventory_transaction(request: Request, inv_id: str):
+    user, role = require_auth(request)
+    db = get_db()
+    inv = db.inventories.find_one({"id": inv_id, "owner": user})
+    if not inv:
+        raise HTTPException(404, "Inventory not found")
+    _ensure_inventory_wallet(inv)
+    transactions = inv.get("transactions") or []
+    if not transactions:
+        raise HTTPException(400, "No transactions to undo")
+    tx = transactions[-1]
+    source = (tx.get("source") or "").strip()
+    currency = canonical_currency_name((tx.get("currency") or _pick_currency(inv)).strip())
+    amount_minor = int(tx.get("amount_minor") or major_to_minor(currency, tx.get("amount") or 0, rounding="half_up"))
+    balance_source = _money_bucket_name(tx.get("balance_source") or "carried")
+    set_fields: dict[str, object] = {}
+    if source == "deposit":
+        _wallet_apply_minor_delta(inv, currency, -amount_minor, bucket=balance_source, allow_negative=False)
+        containers = _ensure_self_container(inv.get("containers") or [])
+        containers, inv_enc_total = _recompute_encumbrance(inv.get("items") or [], containers, inv.get("wallet") or {})
+        set_fields["currencies"] = inv.get("currencies") or {}
+        set_fields["wallet"] = inv.get("wallet") or {}
+        set_fields["containers"] = containers
+        set_fields["enc_total"] = inv_enc_total
+        set_fields["exchange_fee_pct"] = inv.get("exchange_fee_pct", float(DEFAULT_EXCHANGE_FEE_PCT))
+    elif source == "purchase":
+        item_id = tx.get("item_id")
+        if not item_id:
+            raise HTTPException(400, "Purchase transaction missing item reference")
+        items = inv.get("items") or []
+        idx = next((i for i, x in enumerate(items) if x.get("item_id") == item_id), -1)
+        if idx < 0:
+            raise HTTPException(400, "Item already removed")
+        items = items[:idx] + items[idx + 1:]
+        containers = inv.get("containers") or []
+        _wallet_apply_minor_delta(inv, currency, -amount_minor, bucket=balance_source, allow_negative=True)
+        containers, inv_enc_total = _recompute_encumbrance(items, containers, inv.get("wallet") or {})
+        set_fields.update({
+            "items": items,
+            "containers": containers,
+            "enc_total": inv_enc_total,
+            "currencies": inv.get("currencies") or {},
+            "wallet": inv.get("wallet") or {},
+            "exchange_fee_pct": inv.get("exchange_fee_pct", float(DEFAULT_EXCHANGE_FEE_PCT)),
+        })
+    else:
+        raise HTTPException(400, f"Undo not supported for {source or 'unknown'} transactions")
+    update_op = {"$pop": {"transactions": 1}}
+    if set_fields:
+        update_op["$set"] = set_fields
+    db.inventories.update_one({"id": inv_id, "owner": user}, update_op)
+    inv2 = db.inventories.find_one({"id": inv_id}, {"_id": 0})
+    _ensure_inventory_wallet(inv2)
+    inv2["currency_details"] = _wallet_summary(inv2)
+    return {"status": "success", "inventory": inv2, "transaction": tx}
+
+@router.patch("/inventories/{inv_id}/items/{item_id}")
+def patch_item(request: Request, inv_id: str, item_id: str, payload: dict = Body(...)):
+    user, role = require_auth(request)
+    db = get_db()
+    inv = db.inventories.find_one({"id": inv_id, "owner": user})
+    if not inv:
+        raise HTTPException(404, "Inventory not found")
+    _ensure_inventory_wallet(inv)
+
+    alt_name = payload.get("alt_name", None)
+    equipped = payload.get("equipped", None)
+    target_container = payload.get("container_id", None)
+    consumable = payload.get("consumable", None)
+    alchemy_tool = payload.get("alchemy_tool", None)
+    linked_nature = payload.get("linked_nature", None)
+    if alt_name is None and equipped is None and target_container is None and consumable is None and alchemy_tool is None and linked_nature is None:
+        raise HTTPException(400, "Nothing to update")
+
+    containers = _ensure_self_container(inv.get("containers") or [])
+    items = inv.get("items") or []
+    idx = next((i for i, x in enumerate(items) if x.get("item_id") == item_id), -1)
+    if idx < 0:
+        raise HTTPException(404, "Item not found")
+
+    it = dict(items[idx])
+    if alt_name is not None:
+        it["alt_name"] = (alt_name or "").strip()
+    if consumable is not None:
+        it["consumable"] = bool(consumable)
+        if it["consumable"]:
+            # consumables should not stay equipped
+            it["equipped"] = False
+            if it.get("container_id") == SELF_CONTAINER_ID:
+                it["container_id"] = it.get("stowed_container_id") or _default_stow_container(containers)
+    if alchemy_tool is not None:
+        it["alchemy_tool"] = bool(alchemy_tool)
+    if linked_nature is not None:
+        it["linked_nature"] = (linked_nature or "").strip()
+
+    valid_ids = {c.get("id") for c in containers}
+    move_target = None
+    if target_container is not None:
+        move_target = target_container if target_container in valid_ids else _default_stow_container(containers)
+        if move_target == SELF_CONTAINER_ID and not (equipped is True or it.get("equipped")):
+            raise HTTPException(400, "Only equipped items can be placed in Self")
+
+    if equipped is not None:
+        if it.get("consumable"):
+            raise HTTPException(400, "Consumable items cannot be equipped")
+        is_eq = bool(equipped)
+        it["equipped"] = is_eq
+        if is_eq:
+            if it.get("container_id") != SELF_CONTAINER_ID:
+                it["stowed_container_id"] = it.get("stowed_container_id") or it.get("container_id") or move_target or _default_stow_container(containers)
+            it["container_id"] = SELF_CONTAINER_ID
+        else:
+            dest = move_target or it.get("stowed_container_id") or _default_stow_container(containers)
+            if dest == SELF_CONTAINER_ID:
+                dest = _default_stow_container(containers)
+            it["container_id"] = dest or _default_stow_container(containers)
+            if it["container_id"] != SELF_CONTAINER_ID:
+                it["stowed_container_id"] = it["container_id"]
+    elif move_target is not None:
+        # only move / update stow without toggling equip
+        if it.get("equipped"):
+            it["stowed_container_id"] = move_target or _default_stow_container(containers)
+        else:
+            it["container_id"] = move_target or _default_stow_container(containers)
+            it["stowed_container_id"] = it["container_id"]
+
+    items[idx] = it
+    containers, inv_total = _recompute_encumbrance(items, containers, inv.get("wallet") or {})
+    db.inventories.update_one(
+        {"id": inv_id, "owner": user},
+        {"$set": {"items": items, "containers": containers, "enc_total": inv_total, "wallet": inv.get("wallet") or {}, "currencies": inv.get("currencies") or {}, "exchange_fee_pct": inv.get("exchange_fee_pct", float(DEFAULT_EXCHANGE_FEE_PCT))}}
+    )
+
+    inv2 = db.inventories.find_one({"id": inv_id}, {"_id": 0})
+    _ensure_inventory_wallet(inv2)
+    inv2["currency_details"] = _wallet_summary(inv2)
+    return {"status": "success", "inventory": inv2}
+
+def _spell_school_info(spell: dict) -> tuple[list[dict], bool]:
+    eff_ids = [str(eid) for eid in (spell.get("effects") or [])]
+    if not eff_ids:
+        return [], False
+    eff_col = get_col("effects")
+    sch_col = get_col("schools")
+    eff_docs = list(eff_col.find({"id": {"$in": eff_ids}}, {"_id": 0, "id": 1, "school": 1}))
+    school_ids = {str(d.get("school") or "") for d in eff_docs if d.get("school")}
+    if not school_ids:
+        return [], False
+    sch_docs = list(sch_col.find({"id": {"$in": list(school_ids)}}, {"_id": 0, "id": 1, "name": 1, "school_type": 1, "type": 1, "upgrade": 1}))
+    schools = []
+    is_complex = False
+    for s in sch_docs:
+        if s.get("upgrade"):
+            continue
+        stype = (s.get("school_type") or s.get("type") or "").strip()
+        schools.append({"id": s.get("id"), "name": s.get("name") or s.get("id"), "school_type": stype})
+        if stype.lower() == "complex":
+            is_complex = True
+    return schools, is_complex
+
+@router.post("/inventories/{inv_id}/items/{item_id}/craftomancy")
+def add_craftomancy(request: Request, inv_id: str, item_id: str, payload: dict = Body(...)):
+    user, role = require_auth(request)
+    db = get_db()
+    inv = db.inventories.find_one({"id": inv_id, "owner": user})
+    if not inv:
+        raise HTTPException(404, "Inventory not found")
+    _ensure_inventory_wallet(inv)
+
+    spell_id = str(payload.get("spell_id") or "").strip()
+    if not spell_id:
+        raise HTTPException(400, "spell_id required")
+    supreme = bool(payload.get("supreme", False))
+    currency = canonical_currency_name((payload.get("currency") or "").strip() or _pick_currency(inv))
+    balance_source = _money_bucket_name(payload.get("balance_source") or payload.get("bucket"))
+
+    items = inv.get("items") or []
+    idx = next((i for i, x in enumerate(items) if x.get("item_id") == item_id), -1)
+    if idx < 0:
+        raise HTTPException(404, "Item not found")
+    it = dict(items[idx])
+
+    quality = (it.get("quality") or "").strip()
+    if not quality:
+        raise HTTPException(400, "Item quality required for craftomancy")
+
+    sp = get_col("spells").find_one({"id": spell_id}, {"_id": 0})
+    if not sp:
+        raise HTTPException(404, "Spell not found")
+    if str(sp.get("status") or "").lower() != "green":
+        raise HTTPException(400, "Spell is not approved")
+
+    row = craftomancy_row_for_quality(quality)
+    allowed_cat = row.get("category") or "Novice"
+    spell_cat = sp.get("category") or "Novice"
+    spell_idx = craftomancy_category_index(spell_cat)
+    allowed_idx = craftomancy_category_index(allowed_cat)
+    if spell_idx < 0 or allowed_idx < 0:
+        raise HTTPException(400, "Invalid spell category")
+    if spell_idx > allowed_idx:
+        raise HTTPException(400, f"Spell category exceeds quality limit ({allowed_cat})")
+
+    effective_cat = craftomancy_next_category(spell_cat) if supreme else None
+    if not effective_cat:
+        effective_cat = spell_cat
+
+    schools, is_complex = _spell_school_info(sp)
+    price = int(row.get("price") or 0)
+    hours = int(row.get("hours") or 0)
+    if is_complex:
+        price *= 2
+        hours *= 2
+    focus_cost = 3 if is_complex else 1
+
+    crafts = it.get("craftomancies") or []
+    if len(crafts) >= 2:
+        raise HTTPException(400, "Craftomancy limit reached for this item")
+
+    import uuid
+    craft_entry = {
+        "id": f"cm_{uuid.uuid4().hex[:8]}",
+        "spell_id": sp.get("id"),
+        "spell_name": sp.get("name") or sp.get("id"),
+        "spell_category": spell_cat,
+        "effective_category": effective_cat,
+        "spell_description": sp.get("description") or sp.get("desc") or "",
+        "spell_description_long": sp.get("description_long") or "",
+        "spell_flavor": sp.get("flavor") or sp.get("flavour") or "",
+        "spell_mp_cost": sp.get("mp_cost"),
+        "spell_en_cost": sp.get("en_cost"),
+        "spell_range": sp.get("range"),
+        "spell_aoe": sp.get("aoe"),
+        "spell_duration": sp.get("duration"),
+        "spell_effects": sp.get("effects") or [],
+        "spell_effects_detail": sp.get("effects_detail") or [],
+        "spell_effects_meta": sp.get("effects_meta") or [],
+        "schools": schools,
+        "supreme": supreme,
+        "focused": False,
+        "order": len(crafts),
+        "is_complex": is_complex,
+        "focus_cost": focus_cost,
+        "craft_quality": quality,
+        "craft_skill": row.get("skill"),
+        "craft_die": row.get("die"),
+        "craft_dc": row.get("dc"),
+        "craft_price": price,
+        "craft_hours": hours,
+        "created_at": datetime.datetime.utcnow().isoformat() + "Z",
+    }
+    crafts.append(craft_entry)
+    it["craftomancies"] = crafts
+
+    spend = _wallet_spend_gc(inv, currency, price, bucket=balance_source)
+    tx = {
+        "ts": datetime.datetime.utcnow().isoformat() + "Z",
+        "currency": currency,
+        "amount": -_format_money_major(currency, int(spend.get("required_minor") or 0)),
+        "amount_minor": -int(spend.get("required_minor") or 0),
+        "balance_source": balance_source,
+        "gc_amount": price,
+        "note": f"Craftomancy {craft_entry['spell_name']} ({spell_cat}) on {it.get('name')}",
+        "source": "craftomancy"
+    }
+
+    items[idx] = it
+    containers = _ensure_self_container(inv.get("containers") or [])
+    containers, inv_enc_total = _recompute_encumbrance(items, containers, inv.get("wallet") or {})
+    db.inventories.update_one({"id": inv_id, "owner": user}, {"$set": {"items": items, "currencies": inv.get("currencies") or {}, "wallet": inv.get("wallet") or {}, "exchange_fee_pct": inv.get("exchange_fee_pct", float(DEFAULT_EXCHANGE_FEE_PCT)), "containers": containers, "enc_total": inv_enc_total}, "$push": {"transactions": tx}})
+    inv2 = db.inventories.find_one({"id": inv_id}, {"_id": 0})
+    _ensure_inventory_wallet(inv2)
+    inv2["currency_details"] = _wallet_summary(inv2)
+    warning = "Second craftomancy requires advanced Craftomancer." if len(crafts) > 1 else ""
+    return {"status": "success", "inventory": inv2, "craftomancy": craft_entry, "warning": warning}
+
+@router.patch("/inventories/{inv_id}/items/{item_id}/craftomancy/{craft_id}")
+def update_craftomancy(request: Request, inv_id: str, item_id: str, craft_id: str, payload: dict = Body(...)):
+    user, role = require_auth(request)
+    db = get_db()
+    inv = db.inventories.find_one({"id": inv_id, "owner": user})
+    if not inv:
+        raise HTTPException(404, "Inventory not found")
+    _ensure_inventory_wallet(inv)
+
+    focused = payload.get("focused", None)
+    order = payload.get("order", None)
+    if focused is None and order is None:
+        raise HTTPException(400, "focused or order required")
+
+    items = inv.get("items") or []
+    idx = next((i for i, x in enumerate(items) if x.get("item_id") == item_id), -1)
+    if idx < 0:
+        raise HTTPException(404, "Item not found")
+    it = dict(items[idx])
+    crafts = it.get("craftomancies") or []
+    hit = next((c for c in crafts if c.get("id") == craft_id), None)
+    if not hit:
+        raise HTTPException(404, "Craftomancy not found")
+    if focused is not None:
+        hit["focused"] = bool(focused)
+    if order is not None:
+        try:
+            hit["order"] = int(order)
+        except (TypeError, ValueError):
+            raise HTTPException(400, "order must be an integer")
+    it["craftomancies"] = crafts
+    items[idx] = it
+    containers = _ensure_self_container(inv.get("containers") or [])
+    containers, inv_enc_total = _recompute_encumbrance(items, containers, inv.get("wallet") or {})
+    db.inventories.update_one({"id": inv_id, "owner": user}, {"$set": {"items": items, "containers": containers, "enc_total": inv_enc_total, "currencies": inv.get("currencies") or {}, "wallet": inv.get("wallet") or {}, "exchange_fee_pct": inv.get("exchange_fee_pct", float(DEFAULT_EXCHANGE_FEE_PCT))}})
+    inv2 = db.inventories.find_one({"id": inv_id}, {"_id": 0})
+    _ensure_inventory_wallet(inv2)
+    inv2["currency_details"] = _wallet_summary(inv2)
+    return {"status": "success", "inventory": inv2}
+@router.post("/inventories/{inv_id}/items/{item_id}/craftomancy/{craft_id}/remove")
+def remove_craftomancy(request: Request, inv_id: str, item_id: str, craft_id: str, payload: dict = Body(...)):
+    user, role = require_auth(request)
+    db = get_db()
+    inv = db.inventories.find_one({"id": inv_id, "owner": user})
+    if not inv:
+        raise HTTPException(404, "Inventory not found")
+    _ensure_inventory_wallet(inv)
+
+    currency = canonical_currency_name((payload.get("currency") or "").strip() or _pick_currency(inv))
+    balance_source = _money_bucket_name(payload.get("balance_source") or payload.get("bucket"))
+    items = inv.get("items") or []
+    idx = next((i for i, x in enumerate(items) if x.get("item_id") == item_id), -1)
+    if idx < 0:
+        raise HTTPException(404, "Item not found")
+    it = dict(items[idx])
+    crafts = it.get("craftomancies") or []
+    hit_idx = next((i for i, c in enumerate(crafts) if c.get("id") == craft_id), -1)
+    if hit_idx < 0:
+        raise HTTPException(404, "Craftomancy not found")
+    removed = crafts.pop(hit_idx)
+    it["craftomancies"] = crafts
+
+    price = 500
+    spend = _wallet_spend_gc(inv, currency, price, bucket=balance_source)
+    tx = {
+        "ts": datetime.datetime.utcnow().isoformat() + "Z",
+        "currency": currency,
+        "amount": -_format_money_major(currency, int(spend.get("required_minor") or 0)),
+        "amount_minor": -int(spend.get("required_minor") or 0),
+        "balance_source": balance_source,
+        "gc_amount": price,
+        "note": f"Remove craftomancy {removed.get('spell_name') or removed.get('spell_id')}",
+        "source": "craftomancy_remove"
+    }
+
+    items[idx] = it
+    containers = _ensure_self_container(inv.get("containers") or [])
+    containers, inv_enc_total = _recompute_encumbrance(items, containers, inv.get("wallet") or {})
+    db.inventories.update_one({"id": inv_id, "owner": user}, {"$set": {"items": items, "currencies": inv.get("currencies") or {}, "wallet": inv.get("wallet") or {}, "exchange_fee_pct": inv.get("exchange_fee_pct", float(DEFAULT_EXCHANGE_FEE_PCT)), "containers": containers, "enc_total": inv_enc_total}, "$push": {"transactions": tx}})
+    inv2 = db.inventories.find_one({"id": inv_id}, {"_id": 0})
+    _ensure_inventory_wallet(inv2)
+    inv2["currency_details"] = _wallet_summary(inv2)
+    return {"status": "success", "inventory": inv2, "removed": craft_id, "cost": price}
+
+@router.post("/inventories/{inv_id}/items/{item_id}/upgrade_quality")
+def upgrade_quality(request: Request, inv_id: str, item_id: str, payload: dict = Body(...)):
+    user, role = require_auth(request)
+    db = get_db()
+    inv = db.inventories.find_one({"id": inv_id, "owner": user})
+    if not inv:
+        raise HTTPException(404, "Inventory not found")
+    _ensure_inventory_wallet(inv)
+
+    items = inv.get("items") or []
+    it = next((x for x in items if x.get("item_id") == item_id), None)
+    if not it:
+        raise HTTPException(404, "Item not found")
+    if it.get("kind") not in ("weapon", "equipment"):
+        raise HTTPException(400, "Only weapons/equipment can upgrade quality")
+
+    to = (payload.get("to") or "").strip()
+    if to not in QUALITY_ORDER:
+        raise HTTPException(400, "Invalid quality target")
+
+    cur_q = it.get("quality") or "Adequate"
+    if QUALITY_ORDER.index(to) <= QUALITY_ORDER.index(cur_q):
+        raise HTTPException(400, "Target quality must be higher than current")
+
+    base_price = int(it.get("base_price") or 0)
+    qty = int(it.get("quantity") or 1)
+    old_unit = int(_qprice(base_price, cur_q))
+    new_unit = int(_qprice(base_price, to))
+    per_unit_delta = new_unit - old_unit
+    delta_total = per_unit_delta * qty
+    if delta_total <= 0:
+        raise HTTPException(400, "No cost difference to apply")
+
+    currency = canonical_currency_name(_pick_currency(inv, (payload.get("currency") or None)))
+    balance_source = _money_bucket_name(payload.get("balance_source") or payload.get("bucket"))
+    spend = _wallet_spend_gc(inv, currency, delta_total, bucket=balance_source)
+
+    new_paid_unit = int(it.get("paid_unit") or old_unit) + per_unit_delta
+    new_variant = _compose_variant(to, it.get("upgrades"))
+
+    tx = {
+        "ts": datetime.datetime.utcnow().isoformat() + "Z",
+        "currency": currency,
+        "amount": -_format_money_major(currency, int(spend.get("required_minor") or 0)),
+        "amount_minor": -int(spend.get("required_minor") or 0),
+        "balance_source": balance_source,
+        "gc_amount": delta_total,
+        "note": f'Upgrade quality: {it.get("name","Item")} {cur_q} -> {to}',
+        "source": "upgrade_quality",
+        "item_id": item_id
+    }
+
+    db.inventories.update_one(
+        {"id": inv_id, "owner": user, "items.item_id": item_id},
+        {
+            "$set": {
+                "currencies": inv.get("currencies") or {},
+                "wallet": inv.get("wallet") or {},
+                "exchange_fee_pct": inv.get("exchange_fee_pct", float(DEFAULT_EXCHANGE_FEE_PCT)),
+                "items.$.quality": to,
+                "items.$.paid_unit": new_paid_unit,
+                "items.$.variant": new_variant
+            },
+            "$push": {"transactions": tx}
+        }
+    )
+    inv2 = db.inventories.find_one({"id": inv_id}, {"_id": 0})
+    _ensure_inventory_wallet(inv2)
+    inv2["currency_details"] = _wallet_summary(inv2)
+    return {"status": "success", "inventory": inv2, "transaction": tx}
+@router.post("/inventories/{inv_id}/items/{item_id}/downgrade_quality")
+def downgrade_quality(request: Request, inv_id: str, item_id: str, payload: dict = Body(...)):
+    user, role = require_auth(request)
+    db = get_db()
+    inv = db.inventories.find_one({"id": inv_id, "owner": user})
+    if not inv:
+        raise HTTPException(404, "Inventory not found")
+    _ensure_inventory_wallet(inv)
+
+    items = inv.get("items") or []
+    it = next((x for x in items if x.get("item_id") == item_id), None)
+    if not it:
+        raise HTTPException(404, "Item not found")
+    if it.get("kind") not in ("weapon", "equipment"):
+        raise HTTPException(400, "Only weapons/equipment can downgrade quality")
+
+    to = (payload.get("to") or "").strip()
+    if to not in QUALITY_ORDER:
+        raise HTTPException(400, "Invalid quality target")
+
+    cur_q = it.get("quality") or "Adequate"
+    if QUALITY_ORDER.index(to) >= QUALITY_ORDER.index(cur_q):
+        raise HTTPException(400, "Target quality must be lower than current")
+
+    base_price = int(it.get("base_price") or 0)
+    old_unit = int(_qprice(base_price, cur_q))
+    new_unit = int(_qprice(base_price, to))
+
+    new_paid_unit = min(int(it.get("paid_unit") or old_unit), new_unit)
+    new_variant = _compose_variant(to, it.get("upgrades"))
+
+    tx = {
+        "ts": datetime.datetime.utcnow().isoformat() + "Z",
+        "currency": canonical_currency_name(_pick_currency(inv, (payload.get("currency") or None))),
+        "amount": 0,
+        "amount_minor": 0,
+        "balance_source": _money_bucket_name(payload.get("balance_source") or payload.get("bucket")),
+        "gc_amount": 0,
+        "note": f'Downgrade quality: {it.get("name","Item")} {cur_q} -> {to}',
+        "source": "downgrade_quality",
+        "item_id": item_id
+    }
+
+    db.inventories.update_one(
+        {"id": inv_id, "owner": user, "items.item_id": item_id},
+        {
+            "$set": {
+                "items.$.quality": to,
+                "items.$.paid_unit": new_paid_unit,
+                "items.$.variant": new_variant,
+                "currencies": inv.get("currencies") or {},
+                "wallet": inv.get("wallet") or {},
+                "exchange_fee_pct": inv.get("exchange_fee_pct", float(DEFAULT_EXCHANGE_FEE_PCT)),
+            },
+            "$push": {"transactions": tx}
+        }
+    )
+    inv2 = db.inventories.find_one({"id": inv_id}, {"_id": 0})
+    _ensure_inventory_wallet(inv2)
+    inv2["currency_details"] = _wallet_summary(inv2)
+    return {"status": "success", "inventory": inv2, "transaction": tx}
+@router.post("/inventories/{inv_id}/items/{item_id}/install_upgrade")
+def install_upgrade(request: Request, inv_id: str, item_id: str, payload: dict = Body(...)):
+    user, role = require_auth(request)
+    db = get_db()
+    inv = db.inventories.find_one({"id": inv_id, "owner": user})
+    if not inv:
+        raise HTTPException(404, "Inventory not found")
+    _ensure_inventory_wallet(inv)
+
+    items = inv.get("items") or []
+    it = next((x for x in items if x.get("item_id") == item_id), None)
+    if not it:
+        raise HTTPException(404, "Item not found")
+    if it.get("kind") not in ("weapon", "equipment"):
+        raise HTTPException(400, "Only weapons/equipment can install upgrades")
+
+    upg_id = (payload.get("upgrade_id") or payload.get("upgrade") or "").strip()
+    if not upg_id:
+        raise HTTPException(400, "Missing upgrade id")
+
+    upg_doc = get_col("upgrades").find_one({"id": upg_id})
+    if not upg_doc:
+        raise HTTPException(404, "Upgrade not found")
+
+    kind = it.get("kind")
+    if upg_doc.get("kind") != kind:
+        raise HTTPException(400, "Upgrade kind mismatch")
+    slot = None
+    if kind == "equipment":
+        slot = (it.get("equipment_slot") or it.get("slot") or "").lower()
+        if upg_doc.get("slot") and slot and upg_doc.get("slot") != slot:
+            raise HTTPException(400, "Upgrade not allowed for this equipment slot")
+
+    existing = it.get("upgrades") or []
+    add_payload = [{"id": upg_id, "target": (payload.get("target") or "").strip()}]
+    add_upgrades, fee_per_unit, steps = _prepare_new_upgrades(existing, add_payload, kind, slot, it.get("quality") or "Adequate")
+    if not add_upgrades:
+        raise HTTPException(400, "Upgrade could not be applied")
+
+    qty = int(it.get("quantity") or 1)
+    delta_total = int(fee_per_unit) * qty
+    currency = canonical_currency_name(_pick_currency(inv, (payload.get("currency") or None)))
+    balance_source = _money_bucket_name(payload.get("balance_source") or payload.get("bucket"))
+    spend = _wallet_spend_gc(inv, currency, delta_total, bucket=balance_source)
+
+    new_upgrades = existing + add_upgrades
+    if kind == "equipment" and not it.get("equipment_slot") and upg_doc.get("slot"):
+        it["equipment_slot"] = upg_doc.get("slot")
+    quality = it.get("quality") or "Adequate"
+    new_paid_unit = int(it.get("paid_unit") or _qprice(int(it.get("base_price") or 0), quality)) + int(fee_per_unit)
+    new_variant = _compose_variant(quality, new_upgrades)
+
+    tx = {
+        "ts": datetime.datetime.utcnow().isoformat() + "Z",
+        "currency": currency,
+        "amount": -_format_money_major(currency, int(spend.get("required_minor") or 0)),
+        "amount_minor": -int(spend.get("required_minor") or 0),
+        "balance_source": balance_source,
+        "gc_amount": delta_total,
+        "note": f'Install upgrade "{upg_doc.get("name","Upgrade")}" on {it.get("name","Item")}',
+        "source": "install_upgrade",
+        "item_id": item_id
+    }
+
+    db.inventories.update_one(
+        {"id": inv_id, "owner": user, "items.item_id": item_id},
+        {
+            "$set": {
+                "currencies": inv.get("currencies") or {},
+                "wallet": inv.get("wallet") or {},
+                "exchange_fee_pct": inv.get("exchange_fee_pct", float(DEFAULT_EXCHANGE_FEE_PCT)),
+                "items.$.upgrades": new_upgrades,
+                "items.$.paid_unit": new_paid_unit,
+                "items.$.variant": new_variant,
+                **({"items.$.equipment_slot": it.get("equipment_slot")} if kind == "equipment" and it.get("equipment_slot") else {})
+            },
+            "$push": {"transactions": tx}
+        }
+    )
+    inv2 = db.inventories.find_one({"id": inv_id}, {"_id": 0})
+    _ensure_inventory_wallet(inv2)
+    inv2["currency_details"] = _wallet_summary(inv2)
+    return {"status": "success", "inventory": inv2, "transaction": tx}
+@router.post("/inventories/{inv_id}/items/{item_id}/remove_upgrade")
+def remove_upgrade(request: Request, inv_id: str, item_id: str, payload: dict = Body(...)):
+    user, role = require_auth(request)
+    db = get_db()
+    inv = db.inventories.find_one({"id": inv_id, "owner": user})
+    if not inv:
+        raise HTTPException(404, "Inventory not found")
+    _ensure_inventory_wallet(inv)
+
+    items = inv.get("items") or []
+    it = next((x for x in items if x.get("item_id") == item_id), None)
+    if not it:
+        raise HTTPException(404, "Item not found")
+    if it.get("kind") not in ("weapon", "equipment"):
+        raise HTTPException(400, "Only weapons/equipment can remove upgrades")
+
+    upg_id = (payload.get("upgrade_id") or payload.get("upgrade") or "").strip()
+    target = (payload.get("target") or "").strip()
+    if not upg_id:
+        raise HTTPException(400, "Missing upgrade id")
+
+    existing = it.get("upgrades") or []
+    idx = next((i for i, u in enumerate(existing) if u.get("id") == upg_id and (not target or (u.get("target") or "") == target)), -1)
+    if idx < 0:
+        raise HTTPException(404, "Upgrade not found on item")
+
+    new_upgrades = existing[:idx] + existing[idx + 1:]
+    quality = it.get("quality") or "Adequate"
+    new_variant = _compose_variant(quality, new_upgrades)
+
+    db.inventories.update_one(
+        {"id": inv_id, "owner": user, "items.item_id": item_id},
+        {"$set": {
+            "items.$.upgrades": new_upgrades,
+            "items.$.variant": new_variant,
+            "currencies": inv.get("currencies") or {},
+            "wallet": inv.get("wallet") or {},
+            "exchange_fee_pct": inv.get("exchange_fee_pct", float(DEFAULT_EXCHANGE_FEE_PCT)),
+        }}
+    )
+    inv2 = db.inventories.find_one({"id": inv_id}, {"_id": 0})
+    _ensure_inventory_wallet(inv2)
+    inv2["currency_details"] = _wallet_summary(inv2)
+    return {"status": "success", "inventory": inv2}
+def _pop_inventory_item(inv: dict, item_id: str):
+    containers = _ensure_self_container(inv.get("containers") or [])
+    items = inv.get("items") or []
+    idx = next((i for i, x in enumerate(items) if x.get("item_id") == item_id), -1)
+    if idx < 0:
+        raise HTTPException(404, "Item not found")
+    item = items[idx]
+    remaining = items[:idx] + items[idx+1:]
+    return item, remaining, containers
+
+
+def _alchemy_tier_from_price(price: float) -> int:
+    # map based on provided price ladder; fallback to nearest lower tier, minimum 1
+    table = [
+        (10000, 6),  # special
+        (2000, 5),
+        (1000, 4),
+        (200, 3),
+        (100, 2),
+        (50, 1),
+    ]
+    for p, tier in table:
+        if price >= p:
+            return tier
+    return 1
+
+
+@router.post("/inventories/{inv_id}/items/{item_id}/dispose")
+def dispose_item(request: Request, inv_id: str, item_id: str, payload: dict = Body(...)):
+    user, role = require_auth(request)
+    db = get_db()
+    inv = db.inventories.find_one({"id": inv_id, "owner": user})
+    if not inv:
+        raise HTTPException(404, "Inventory not found")
+    _ensure_inventory_wallet(inv)
+
+    it, remaining, containers = _pop_inventory_item(inv, item_id)
+    currency = canonical_currency_name((payload.get("currency") or _pick_currency(inv)).strip())
+    balance_source = _money_bucket_name(payload.get("balance_source") or payload.get("bucket"))
+    qty = int(it.get("quantity") or 1)
+
+    containers, inv_enc_total = _recompute_encumbrance(remaining, containers, inv.get("wallet") or {})
+    tx = {
+        "ts": datetime.datetime.utcnow().isoformat() + "Z",
+        "currency": currency,
+        "amount": 0,
+        "amount_minor": 0,
+        "balance_source": balance_source,
+        "gc_amount": 0,
+        "note": f"Disposed {it.get('name','Item')} x{qty}",
+        "source": "dispose",
+        "item_id": item_id
+    }
+    db.inventories.update_one({"id": inv_id}, {
+        "$set": {
+            "currencies": inv.get("currencies") or {},
+            "wallet": inv.get("wallet") or {},
+            "exchange_fee_pct": inv.get("exchange_fee_pct", float(DEFAULT_EXCHANGE_FEE_PCT)),
+            "items": remaining,
+            "containers": containers,
+            "enc_total": inv_enc_total,
+        },
+        "$push": {"transactions": tx}
+    })
+    inv2 = db.inventories.find_one({"id": inv_id}, {"_id": 0})
+    _ensure_inventory_wallet(inv2)
+    inv2["currency_details"] = _wallet_summary(inv2)
+    return {"status": "success", "inventory": inv2, "transaction": tx}
+
+
+@router.post("/inventories/{inv_id}/items/{item_id}/sell")
+def sell_item(request: Request, inv_id: str, item_id: str, payload: dict = Body(...)):
+    user, role = require_auth(request)
+    db = get_db()
+    inv = db.inventories.find_one({"id": inv_id, "owner": user})
+    if not inv:
+        raise HTTPException(404, "Inventory not found")
+    _ensure_inventory_wallet(inv)
+
+    it, remaining, containers = _pop_inventory_item(inv, item_id)
+    currency = canonical_currency_name((payload.get("currency") or _pick_currency(inv)).strip())
+    balance_source = _money_bucket_name(payload.get("balance_source") or payload.get("bucket"))
+    qty = int(it.get("quantity") or 1)
+    base_price = int(it.get("base_price") or 0)
+    quality = it.get("quality") or "Adequate"
+    kind = it.get("kind") or "object"
+    market_unit = _qprice(base_price, quality) if kind in ("weapon", "equipment") else base_price
+    fallback_unit = int(it.get("paid_unit") or market_unit)
+    try:
+        price_input = float(payload.get("price")) if payload.get("price") is not None else fallback_unit
+    except Exception:
+        price_input = fallback_unit
+    unit_price = max(0, int(round(price_input)))
+    total_gc = unit_price * qty
+
+    credit = _wallet_credit_gc(inv, currency, total_gc, bucket=balance_source)
+
+    containers, inv_enc_total = _recompute_encumbrance(remaining, containers, inv.get("wallet") or {})
+    tx = {
+        "ts": datetime.datetime.utcnow().isoformat() + "Z",
+        "currency": currency,
+        "amount": _format_money_major(currency, int(credit.get("credit_minor") or 0)),
+        "amount_minor": int(credit.get("credit_minor") or 0),
+        "balance_source": balance_source,
+        "gc_amount": total_gc,
+        "note": f"Sold {it.get('name','Item')} x{qty} @ {unit_price}",
+        "source": "sell",
+        "item_id": item_id
+    }
+    db.inventories.update_one({"id": inv_id}, {
+        "$set": {
+            "currencies": inv.get("currencies") or {},
+            "wallet": inv.get("wallet") or {},
+            "exchange_fee_pct": inv.get("exchange_fee_pct", float(DEFAULT_EXCHANGE_FEE_PCT)),
+            "items": remaining,
+            "containers": containers,
+            "enc_total": inv_enc_total,
+        },
+        "$push": {"transactions": tx}
+    })
+    inv2 = db.inventories.find_one({"id": inv_id}, {"_id": 0})
+    _ensure_inventory_wallet(inv2)
+    inv2["currency_details"] = _wallet_summary(inv2)
+    return {"status": "success", "inventory": inv2, "transaction": tx}
+
+
+@router.post("/inventories/{inv_id}/items/{item_id}/use")
+def use_item(request: Request, inv_id: str, item_id: str, payload: dict = Body(...)):
+    user, role = require_auth(request)
+    db = get_db()
+    inv = db.inventories.find_one({"id": inv_id, "owner": user})
+    if not inv:
+        raise HTTPException(404, "Inventory not found")
+    _ensure_inventory_wallet(inv)
+
+    items = inv.get("items") or []
+    idx = next((i for i, x in enumerate(items) if x.get("item_id") == item_id), -1)
+    if idx < 0:
+        raise HTTPException(404, "Item not found")
+    it = dict(items[idx])
+    consumable = bool(it.get("consumable"))
+    if not consumable:
+        kind = str(it.get("kind") or it.get("__kind") or "").lower()
+        category = str(it.get("category") or it.get("subcategory") or "").lower()
+        if kind == "ammo" or category == "ammo":
+            consumable = True
+    if not consumable:
+        raise HTTPException(400, "Item is not consumable")
+
+    amount = max(1, int(payload.get("amount") or 1))
+    qty = max(0, int(it.get("quantity") or 1))
+    if qty <= 0:
+        raise HTTPException(400, "No quantity remaining")
+    if qty < amount:
+        raise HTTPException(400, f"Not enough quantity ({qty}) to consume {amount}")
+    new_qty = max(0, qty - amount)
+    keep_item = it.get("alchemy_tool") or new_qty > 0
+    currency = canonical_currency_name((payload.get("currency") or _pick_currency(inv)).strip())
+    balance_source = _money_bucket_name(payload.get("balance_source") or payload.get("bucket"))
+
+    if keep_item:
+        it["quantity"] = new_qty
+        it["equipped"] = False
+        items[idx] = it
+    else:
+        items = items[:idx] + items[idx + 1:]
+
+    containers = _ensure_self_container(inv.get("containers") or [])
+    containers, inv_enc_total = _recompute_encumbrance(items, containers, inv.get("wallet") or {})
+
+    tx = {
+        "ts": datetime.datetime.utcnow().isoformat() + "Z",
+        "currency": currency,
+        "amount": 0,
+        "amount_minor": 0,
+        "balance_source": balance_source,
+        "gc_amount": 0,
+        "note": f"Used {it.get('name','Item')} x{amount} (remaining {new_qty})",
+        "source": "use",
+        "item_id": item_id
+    }
+    db.inventories.update_one({"id": inv_id}, {
+        "$set": {
+            "items": items,
+            "containers": containers,
+            "enc_total": inv_enc_total,
+            "currencies": inv.get("currencies") or {},
+            "wallet": inv.get("wallet") or {},
+            "exchange_fee_pct": inv.get("exchange_fee_pct", float(DEFAULT_EXCHANGE_FEE_PCT)),
+        },
+        "$push": {"transactions": tx}
+    })
+    inv2 = db.inventories.find_one({"id": inv_id}, {"_id": 0})
+    _ensure_inventory_wallet(inv2)
+    inv2["currency_details"] = _wallet_summary(inv2)
+    return {"status": "success", "inventory": inv2, "transaction": tx}
+
+
+@router.post("/inventories/{inv_id}/items/{item_id}/refill_alchemy")
+def refill_alchemy_item(request: Request, inv_id: str, item_id: str, payload: dict = Body(...)):
+    user, role = require_auth(request)
+    db = get_db()
+    inv = db.inventories.find_one({"id": inv_id, "owner": user})
+    if not inv:
+        raise HTTPException(404, "Inventory not found")
+    _ensure_inventory_wallet(inv)
+
+    items = inv.get("items") or []
+    idx = next((i for i, x in enumerate(items) if x.get("item_id") == item_id), -1)
+    if idx < 0:
+        raise HTTPException(404, "Item not found")
+    it = dict(items[idx])
+    if not it.get("alchemy_tool"):
+        raise HTTPException(400, "Item is not an alchemy tool")
+
+    base_price = int(it.get("base_price") or 0)
+    tier = _alchemy_tier_from_price(base_price)
+    cost_gc = 50 * max(1, tier)
+    currency = canonical_currency_name((payload.get("currency") or _pick_currency(inv)).strip())
+    balance_source = _money_bucket_name(payload.get("balance_source") or payload.get("bucket"))
+
+    spend = _wallet_spend_gc(inv, currency, cost_gc, bucket=balance_source)
+
+    it["quantity"] = max(0, int(it.get("quantity") or 0)) + 1
+    items[idx] = it
+
+    containers = _ensure_self_container(inv.get("containers") or [])
+    containers, inv_enc_total = _recompute_encumbrance(items, containers, inv.get("wallet") or {})
+
+    tx = {
+        "ts": datetime.datetime.utcnow().isoformat() + "Z",
+        "currency": currency,
+        "amount": -_format_money_major(currency, int(spend.get("required_minor") or 0)),
+        "amount_minor": -int(spend.get("required_minor") or 0),
+        "balance_source": balance_source,
+        "gc_amount": cost_gc,
+        "note": f"Refill {it.get('name','Alchemy tool')} (+1) tier {tier}",
+        "source": "refill_alchemy",
+        "item_id": item_id
+    }
+    db.inventories.update_one({"id": inv_id}, {
+        "$set": {
+            "items": items,
+            "containers": containers,
+            "enc_total": inv_enc_total,
+            "currencies": inv.get("currencies") or {},
+            "wallet": inv.get("wallet") or {},
+            "exchange_fee_pct": inv.get("exchange_fee_pct", float(DEFAULT_EXCHANGE_FEE_PCT)),
+        },
+        "$push": {"transactions": tx}
+    })
+    inv2 = db.inventories.find_one({"id": inv_id}, {"_id": 0})
+    _ensure_inventory_wallet(inv2)
+    inv2["currency_details"] = _wallet_summary(inv2)
+    return {"status": "success", "inventory": inv2, "transaction": tx}
+@router.get("/catalog/weapons")
+def catalog_weapons(request: Request, q: str = "", tags: str = "", limit: int = 50):
+    require_auth(request)
+    filt = _tags_filter(tags) if tags.strip() else {}
+    projection = {"_id": 0, "id": 1, "name": 1, "price": 1, "enc": 1, "subcategory": 1}
+    if q.strip():
+        rows = ranked_name_rows("weapons", q, filt, projection, int(limit))
+    else:
+        rows = list(get_col("weapons").find(filt, projection).limit(int(limit)))
+    return {"status": "success", "weapons": rows}
+
+@router.get("/catalog/equipment")
+def catalog_equipment(request: Request, q: str = "", tags: str = "", limit: int = 50):
+    require_auth(request)
+    filt = _tags_filter(tags) if tags.strip() else {}
+    projection = {"_id": 0, "id": 1, "name": 1, "price": 1, "enc": 1, "category": 1, "slot":1}
+    if q.strip():
+        rows = ranked_name_rows("equipment", q, filt, projection, int(limit))
+    else:
+        rows = list(get_col("equipment").find(filt, projection).limit(int(limit)))
+    return {"status": "success", "equipment": rows}
+
+@router.get("/catalog/tools")
+def catalog_tools(request: Request, q: str = "", tags: str = "", limit: int = 50):
+    require_auth(request)
+    _ensure_alchemy_tools_consumable()
+    filt = _tags_filter(tags) if tags.strip() else {}
+    projection = {"_id": 0, "id": 1, "name": 1, "price": 1, "enc": 1, "category": 1}
+    if q.strip():
+        rows = ranked_name_rows("tools", q, filt, projection, int(limit))
+    else:
+        rows = list(get_col("tools").find(filt, projection).limit(int(limit)))
+    return {"status": "success", "tools": rows}
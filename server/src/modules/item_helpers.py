@@ -0,0 +1,389 @@
+import datetime
+
+from fastapi import HTTPException
+
+from db_mongo import norm_key
+
+
+EQUIPMENT_SLOTS = {"head","arms","legs","accessory","chest"}
+
+# ---------- Tools (inventory) ----------
+
+_TIER_TABLE = {
+    "1": {"price": 50, "dc": 6, "time": "1 hour"},
+    "2": {"price": 100, "dc": 8, "time": "1 hour"},
+    "3": {"price": 200, "dc": 10, "time": "1 hour"},
+    "4": {"price": 1000, "dc": 12, "time": "2 hours"},
+    "5": {"price": 2000, "dc": 14, "time": "3 hours"},
+    "special": {"price": 10000, "dc": 16, "time": "6 hours"},
+}
+def _tier_key(tier: str | int) -> str:
+    s = str(tier).strip().lower()
+    if s in _TIER_TABLE: return s
+    try:
+        n = int(float(s))
+        return str(n) if str(n) in _TIER_TABLE else "special"
+    except Exception:
+        return "special"
+
+def _derive_for(method: str, tier: str | int) -> dict:
+    key = _tier_key(tier)
+    base = _TIER_TABLE[key]
+    # label differs, values same
+    return {
+        "price": base["price"],
+        "creation_time": base["time"],
+        ("alchemy_dc" if method == "alchemy" else "crafting_dc"): base["dc"],
+    }
+
+def _tool_from_body(b: dict) -> dict:
+    name = (b.get("name") or "").strip() or "Unnamed"
+    tier = b.get("tier", "1")
+    enc  = float(b.get("enc") or 0)
+    method = (b.get("method") or "crafting").strip().lower()
+    if method not in ("crafting","alchemy"): method = "crafting"
+    desc = (b.get("description") or "").strip()
+    consumable = bool(b.get("consumable"))
+    if method == "alchemy":
+        consumable = True
+    tags = b.get("tags") or []
+    if isinstance(tags, str):
+        tags = [t.strip() for t in tags.split(",") if t.strip()]
+    else:
+        tags = [str(t).strip() for t in tags if str(t).strip()]
+    out = {
+        "name": name,
+        "name_key": norm_key(name),
+        "tier": str(tier),
+        "enc": enc,
+        "method": method,
+        "description": desc,
+        "consumable": consumable,
+        "modifiers": _modifiers_from_body(b),
+        "tags": tags,
+    }
+    out.update(_derive_for(method, tier))
+    return out
+
+# ---------- Weapons (inventory) ----------
+def _damage_to_animarma(expr: str) -> str:
+    # "2d6+4+M(REF)" -> "2 ID+4+M(MAG)"
+    import re
+    s = expr or ""
+    s = re.sub(r'(\d+)\s*d6', r'\1 ID', s, flags=re.I)
+    s = re.sub(r'M\(\s*[^)]+\)', 'M(MAG)', s)
+    return s
+
+def _as_list(x):
+    if isinstance(x, list): return [str(v).strip() for v in x if str(v).strip()]
+    if isinstance(x, str):  return [s for s in (v.strip() for v in x.split(",")) if s]
+    return []
+
+def _safe_int(val, default: int = 0) -> int:
+    try:
+        if val is None:
+            return default
+        if isinstance(val, bool):
+            return int(val)
+        if isinstance(val, (int, float)):
+            return int(val)
+        txt = str(val).strip()
+        if not txt:
+            return default
+        return int(float(txt))
+    except Exception:
+        return default
+
+def _safe_float(val, default: float = 0.0) -> float:
+    try:
+        if val is None:
+            return default
+        if isinstance(val, bool):
+            return float(val)
+        if isinstance(val, (int, float)):
+            return float(val)
+        txt = str(val).strip()
+        if not txt:
+            return default
+        return float(txt)
+    except Exception:
+        return default
+
+def _normalize_choice(choice: dict | None) -> dict | None:
+    """Ensure choice metadata keeps restrict fields populated regardless of client shape."""
+    if not isinstance(choice, dict):
+        return None
+    out = dict(choice)
+    restrict_items: list[str] = []
+    choices_items: list[str] = []
+    for key in ("restrict", "choice_restrict", "restrict_list"):
+        vals = out.get(key)
+        if isinstance(vals, list):
+            restrict_items.extend([str(v).strip() for v in vals if str(v).strip()])
+    if not restrict_items:
+        txt = (
+            out.get("restrict_text")
+            or out.get("choice_restrict")
+            or out.get("restrict_list")
+            or out.get("restrict")
+            or out.get("restrict_string")
+            or ""
+        )
+        if isinstance(txt, str):
+            restrict_items = [s for s in (v.strip() for v in txt.split(",")) if s]
+    if isinstance(out.get("choices"), list):
+        choices_items = [str(v).strip() for v in out.get("choices") if str(v).strip()]
+    elif isinstance(out.get("choices_text"), str):
+        choices_items = [s for s in (v.strip() for v in out.get("choices_text").split(",")) if s]
+    out["restrict"] = restrict_items
+    if choices_items:
+        out["choices"] = choices_items
+    if "restrict_text" not in out:
+        out["restrict_text"] = ",".join(restrict_items)
+    if choices_items and "choices_text" not in out:
+        out["choices_text"] = ",".join(choices_items)
+    return out
+def _modifiers_from_body(b: dict) -> list[dict]:
+    """Normalize an optional modifiers list from payload."""
+    mods_in = (b or {}).get("modifiers") or []
+    if not isinstance(mods_in, list):
+        return []
+    mods: list[dict] = []
+    for m in mods_in:
+        if not isinstance(m, dict):
+            continue
+        target = (m.get("target") or m.get("key") or "").strip()
+        if not target:
+            continue
+        mode = (m.get("mode") or "add").lower()
+        if mode not in ("add", "mul", "set"):
+            mode = "add"
+        try:
+            value = float(m.get("value") or 0)
+        except Exception:
+            value = 0.0
+        note = (m.get("note") or "").strip()
+        mod = {"target": target, "mode": mode, "value": value, "note": note}
+        group = (m.get("group") or "").strip()
+        if group:
+            mod["group"] = group
+            try:
+                gmax = int(m.get("group_max_choices") or m.get("group_max") or 1)
+            except Exception:
+                gmax = 1
+            mod["group_max_choices"] = max(0, gmax)
+        choice = _normalize_choice(m.get("choice") if isinstance(m.get("choice"), dict) else None)
+        if choice:
+            mod["choice"] = choice
+        mods.append(mod)
+    return mods
+
+def _weapon_from_body(b: dict) -> dict:
+    name  = (b.get("name") or "").strip() or "Unnamed"
+    skill = (b.get("skill") or "Technicity").strip().title()
+    desc  = (b.get("description") or "").strip()
+    dmg   = (b.get("damage") or "").strip()
+    rng   = str(b.get("range") or "").strip()
+    hands = _safe_int(b.get("hands"), 1)
+    price = _safe_int(b.get("price"), 0)
+    enc   = _safe_float(b.get("enc"), 0.0)
+    magazine_size = _safe_int(b.get("magazine_size") or b.get("magazine"), 0)
+    fx    = _as_list(b.get("effects"))
+    tags = b.get("tags") or []
+    if isinstance(tags, str):
+        tags = [t.strip() for t in tags.split(",") if t.strip()]
+    else:
+        tags = [str(t).strip() for t in tags if str(t).strip()]
+
+    ups = _as_list(b.get("upgrades"))
+    ammo_name = (b.get("ammo_name") or b.get("ammo") or "").strip()
+    ammo_price = _safe_int(b.get("ammo_price"), 0)
+    ammo_enc = _safe_float(b.get("ammo_enc"), 0.0)
+    doc = {
+        "name": name,
+        "name_key": norm_key(name),
+        "skill": skill,                 # Technicity | Brutality | Accuracy | Aura
+        "description": desc,
+        "damage": dmg,
+        "range": rng,
+        "hands": hands,
+        "effects": fx,
+        "price": price,                 # base price (quality applied client-side when needed)
+        "enc": enc,
+        "magazine_size": magazine_size,
+        "is_animarma": bool(b.get("is_animarma") or False),
+        "nature": (b.get("nature") or "").strip(),  # optional, can be edited later
+        "modifiers": _modifiers_from_body(b),
+        "upgrades": ups,
+        "tags": tags,
+        "ammo_name": ammo_name,
+        "ammo_price": ammo_price,
+        "ammo_enc": ammo_enc,
+    }
+    return doc
+
+def _make_animarma(base: dict) -> dict:
+    a = dict(base)
+    a["is_animarma"] = True
+    a["name"] = f'{base["name"]} (Animarma)'
+    a["name_key"] = norm_key(a["name"])
+    a["damage"] = _damage_to_animarma(base.get("damage",""))
+    a["price"] = int(base.get("price",0)) + 100
+    a["enc"] = round(float(base.get("enc",0)) / 2.0, 2)
+    # same skill, hands, range, effects, nature
+    return a
+
+# ---------- Equipment ----------
+
+def _eq_norm_name(name: str, fallback: str = "Unnamed") -> tuple[str, str]:
+    nm = (name or "").strip() or fallback
+    return nm, norm_key(nm)
+
+def _equipment_from_body(b: dict) -> dict:
+    cat = (b.get("category") or "").strip().lower()
+    if cat not in ("special","slot","armor"):
+        raise HTTPException(status_code=400, detail="category must be special | slot | armor")
+    slot = (b.get("slot") or "").strip().lower()
+    if slot in ("arm","leg"):
+        slot = slot + "s"
+    if slot and slot not in EQUIPMENT_SLOTS:
+        raise HTTPException(status_code=400, detail="slot must be one of head/arms/legs/accessory/chest")
+    tags = b.get("tags") or []
+    if isinstance(tags, str):
+        tags = [t.strip() for t in tags.split(",") if t.strip()]
+    else:
+        tags = [str(t).strip() for t in tags if str(t).strip()]
+
+    if cat == "special":
+        name, key = _eq_norm_name(b.get("name"))
+        eff = b.get("effects")
+        if isinstance(eff, str): effects = [s for s in (x.strip() for x in eff.split(",")) if s]
+        else: effects = [str(x).strip() for x in (eff or []) if str(x).strip()]
+        doc = {
+            "category":"special",
+            "name": name, "name_key": key,
+            "description": (b.get("description") or "").strip(),
+            "damage": (b.get("damage") or "").strip(),
+            "range": str(b.get("range") or "").strip(),
+            "hands": int(b.get("hands") or 1),
+            "effects": effects,
+            "slot": slot or "",
+            "price": int(b.get("price") or 0),
+            "enc": float(b.get("enc") or 0),
+            "modifiers": _modifiers_from_body(b),
+            "tags": tags,
+        }
+        return doc
+
+    if cat == "slot":
+        slot = slot or "head"
+        style = (b.get("style") or "").strip() or "Unnamed"
+        name = f"{slot}:{style}"
+        doc = {
+            "category":"slot",
+            "slot": slot,
+            "style": style,
+            "name": name, "name_key": norm_key(name),
+            "description": (b.get("description") or "").strip(),
+            "price": int(b.get("price") or 0),
+            "enc": float(b.get("enc") or 0),
+            "modifiers": _modifiers_from_body(b),
+            "tags": tags,
+        }
+        return doc
+
+    # armor
+    slot = slot or "chest"
+    tname, key = _eq_norm_name(b.get("type"), "Armor")
+    doc = {
+        "category":"armor",
+        "slot": slot,
+        "type": tname,
+        "name": f"armor:{tname}", "name_key": norm_key(f"armor:{tname}"),
+        "enc": float(b.get("enc") or 0),
+        "receptacle": (b.get("receptacle") or "").strip(),
+        "hp_bonus": int(b.get("hp_bonus") or 0),
+        "effect": (b.get("effect") or "").strip(),
+        "mo_penalty": int(b.get("mo_penalty") or 0),
+        "price": int(b.get("price") or 2528),
+        "modifiers": _modifiers_from_body(b),
+        "upgrades": _as_list(b.get("upgrades")),
+        "tags": tags,
+    }
+    return doc
+
+# ---------- Upgrades Catalog ----------
+def _upgrade_from_body(body: dict) -> dict:
+    kind = (body.get("kind") or "").strip().lower()
+    # allow UI to send broader item_types but still enforce core kind
+    item_types_in = body.get("item_types") or body.get("target_types") or []
+    if isinstance(item_types_in, str):
+        item_types = [x.strip().lower() for x in item_types_in.split(",") if x.strip()]
+    else:
+        item_types = [str(x).strip().lower() for x in item_types_in if str(x).strip()]
+    # default kind based on selection
+    if not kind:
+        kind = "weapon" if "weapon" in item_types else "equipment"
+
+    if kind not in ("weapon","equipment"):
+        raise HTTPException(status_code=400, detail="kind must be weapon|equipment")
+    slot = (body.get("slot") or "").strip().lower()
+    slots_in = body.get("slots") or []
+    slots = [str(s).strip().lower() for s in slots_in if str(s).strip()]
+    if kind == "equipment":
+        valid_slots = set(EQUIPMENT_SLOTS)
+        if slot and slot not in valid_slots:
+            raise HTTPException(status_code=400, detail="slot must be one of head/arms/legs/accessory/chest")
+        slots = [s for s in slots if s in valid_slots]
+    else:
+        slot = ""
+        slots = []
+
+    name, key = _eq_norm_name(body.get("name"), "Upgrade")
+    unique = bool(body.get("unique", False))
+
+    holder_src = body
+    if isinstance(body.get("holder_modifiers"), list):
+        holder_src = {"modifiers": body.get("holder_modifiers")}
+    holder_mods = _modifiers_from_body(holder_src)
+    modifiers = holder_mods or _modifiers_from_body(body)
+    targets = body.get("targets")
+    if isinstance(targets, str):
+        targets = [t.strip() for t in targets.split(",") if t.strip()]
+    if targets and not isinstance(targets, list):
+        targets = []
+    exclusive_group = (body.get("exclusive_group") or body.get("exclusive") or "").strip().lower()
+
+    item_effects = body.get("item_effects")
+    if not isinstance(item_effects, list):
+        item_effects = []
+
+    desc_html = (body.get("description_html") or body.get("description") or "").strip()
+    tags_in = body.get("tags") or body.get("tag") or body.get("tags_text") or body.get("tags_str") or ""
+    if isinstance(tags_in, list):
+        tags = [str(t).strip().lower() for t in tags_in if str(t).strip()]
+    elif isinstance(tags_in, str):
+        tags = [t.strip().lower() for t in tags_in.split(",") if t.strip()]
+    else:
+        tags = []
+    if not tags:
+        tags = ["phb"]
+
+    return {
+        "kind": kind,
+        "slot": slot,
+        "slots": slots,
+        "item_types": item_types,
+        "name": name,
+        "name_key": key,
+        "unique": unique,
+        "description": desc_html,
+        "description_html": desc_html,
+        "modifiers": modifiers,
+        "holder_modifiers": holder_mods,
+        "item_effects": item_effects,
+        "tags": tags,
+        "targets": targets or [],
+        "exclusive_group": exclusive_group,
+        "created_at": datetime.datetime.utcnow().isoformat()+"Z",
+    }
@@ -0,0 +1,47 @@
+import importlib
+import threading
+
+from fastapi import FastAPI
+from starlette.concurrency import run_in_threadpool
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+
+class LazyRouters:
+    """
+    Route-group modules (each exposing `router`) that are imported and mounted
+    on `app` when the app starts or on its first request, not when main is
+    imported. `mount()` is idempotent and safe to call from several threads.
+    """
+
+    def __init__(self, app: FastAPI, modules: tuple[str, ...]):
+        self.app = app
+        self.modules = modules
+        self.mounted = False
+        self._pending = list(modules)
+        self._lock = threading.Lock()
+
+    def mount(self) -> None:
+        if self.mounted:
+            return
+        with self._lock:
+            # A module that failed to import stays pending; those already
+            # mounted are not included a second time on the retry.
+            while self._pending:
+                module = importlib.import_module(self._pending[0])
+                self.app.include_router(module.router, prefix="")
+                self._pending.pop(0)
+            self.mounted = True
+
+
+class LazyRouterMiddleware:
+    """Mount the lazy routers before the first request is routed."""
+
+    def __init__(self, app: ASGIApp, routers: LazyRouters):
+        self.app = app
+        self.routers = routers
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if not self.routers.mounted and scope["type"] in ("http", "websocket"):
+            # Importing the route modules blocks; keep it off the event loop.
+            await run_in_threadpool(self.routers.mount)
+        await self.app(scope, receive, send)
@@ -1,6 +1,6 @@
 import logging
 import datetime
-from db_mongo import get_col
+from server.src.modules.audit_writer import AUDIT_WRITER
 
 logging.basicConfig(
     level=logging.INFO,
@@ -10,8 +10,9 @@ logging.basicConfig(
 logger = logging.getLogger("noe")
 
 def write_audit(action, username, spell_id, before, after):
-    get_col("audit_logs").insert_one({
-        "ts": datetime.datetime.utcnow().isoformat() + "Z",
+    # Queued; AUDIT_WRITER batches the inserts off the request path.
+    AUDIT_WRITER.submit({
+        "ts": datetime.datetime.utcnow(),
         "user": username, "action": action, "spell_id": spell_id,
         "before": before, "after": after
     })
@@ -0,0 +1,379 @@
+from __future__ import annotations
+
+import heapq
+import re
+import threading
+import time
+from typing import Iterable
+
+from pymongo import ReturnDocument
+
+from db_mongo import get_col
+from server.src.modules.logging_helpers import logger
+from settings import settings
+
+# Collections whose `name` is served from a trigram index instead of a `$regex` scan.
+NAME_INDEX_COLLECTIONS = (
+    "spells",
+    "effects",
+    "abilities",
+    "apotheoses",
+    "objects",
+    "tools",
+    "weapons",
+    "equipment",
+    "item_weapons_0_3_5",
+    "economy_entities_0_3_5",
+    "economy_services_0_3_5",
+)
+
+_VERSION_PREFIX = "name_index:"
+_FUZZY_MIN_SIMILARITY = 0.3
+_FUZZY_POOL = 200
+
+
+def normalize_name(value) -> str:
+    return re.sub(r"\s+", " ", str(value or "").strip()).casefold()
+
+
+def trigrams(text: str) -> set[str]:
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _read_version(collection: str) -> int:
+    doc = get_col("counters").find_one({"_id": _VERSION_PREFIX + collection}, {"_id": 0, "seq": 1})
+    try:
+        return int((doc or {}).get("seq") or 0)
+    except Exception:
+        return 0
+
+
+class NameIndex:
+    """
+    In-memory trigram index over one collection's `name` field.
+    Postings hold small integer slots rather than id strings to keep the
+    sets compact; `search` verifies candidates against the normalized name.
+    """
+
+    def __init__(self, collection: str, version: int = 0):
+        self.collection = collection
+        self.version = version
+        self.checked_at = time.monotonic()
+        # Documents the last load scanned, kept in step by touch_name_index.
+        # Not len(self): docs with a missing or duplicate id never get a slot.
+        self.doc_count = 0
+        self._lock = threading.RLock()
+        self._slots: dict[str, int] = {}
+        self._ids: list[str | None] = []
+        self._names: list[str] = []
+        self._labels: list[str] = []
+        self._grams: dict[str, set[int]] = {}
+        self._free: list[int] = []
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def __contains__(self, doc_id) -> bool:
+        return str(doc_id) in self._slots
+
+    @classmethod
+    def load(cls, collection: str) -> "NameIndex":
+        version = _read_version(collection)
+        index = cls(collection, version)
+        for doc in get_col(collection).find({}, {"_id": 0, "id": 1, "name": 1}):
+            index.upsert(doc.get("id"), doc.get("name"))
+            index.doc_count += 1
+        return index
+
+    # ---- maintenance --------------------------------------------------------
+    def upsert(self, doc_id, name) -> None:
+        doc_id = str(doc_id or "").strip()
+        if not doc_id:
+            return
+        norm = normalize_name(name)
+        with self._lock:
+            slot = self._slots.get(doc_id)
+            if slot is not None:
+                if self._names[slot] == norm:
+                    self._labels[slot] = str(name or "")
+                    return
+                self._unlink(slot)
+            else:
+                slot = self._free.pop() if self._free else len(self._ids)
+                if slot == len(self._ids):
+                    self._ids.append(None)
+                    self._names.append("")
+                    self._labels.append("")
+                self._slots[doc_id] = slot
+                self._ids[slot] = doc_id
+            self._names[slot] = norm
+            self._labels[slot] = str(name or "")
+            for g in trigrams(norm):
+                self._grams.setdefault(g, set()).add(slot)
+
+    def remove(self, doc_id) -> None:
+        with self._lock:
+            slot = self._slots.pop(str(doc_id), None)
+            if slot is None:
+                return
+            self._unlink(slot)
+            self._ids[slot] = None
+            self._names[slot] = ""
+            self._labels[slot] = ""
+            self._free.append(slot)
+
+    def _unlink(self, slot: int) -> None:
+        for g in trigrams(self._names[slot]):
+            posting = self._grams.get(g)
+            if posting is not None:
+                posting.discard(slot)
+                if not posting:
+                    del self._grams[g]
+
+    # ---- queries ------------------------------------------------------------
+    def label(self, doc_id: str) -> str:
+        slot = self._slots.get(str(doc_id))
+        return self._labels[slot] if slot is not None else ""
+
+    def search(
+        self,
+        query: str,
+        limit: int | None = None,
+        *,
+        fuzzy: bool = False,
+        max_hits: int | None = None,
+    ) -> list[tuple[str, float]] | None:
+        """
+        Ranked (id, score) pairs for names containing `query` (case- and
+        whitespace-insensitive): exact, then prefix, then word-prefix, then
+        other substrings, shorter names first. With `fuzzy`, names sharing
+        enough trigrams follow with score < 1. Returns None when more than
+        `max_hits` names match.
+        """
+        needle = normalize_name(query)
+        if not needle:
+            return []
+        with self._lock:
+            names = self._names
+            if len(needle) < 3:
+                candidates: set[int] = set()
+                for g, posting in self._grams.items():
+                    if needle in g:
+                        candidates |= posting
+            else:
+                # Every trigram of the needle must occur in a containing name;
+                # intersecting from the rarest posting keeps this small.
+                postings = sorted((self._grams.get(g, set()) for g in _inner_trigrams(needle)), key=len)
+                candidates = set.intersection(*postings) if postings[0] else set()
+            if max_hits is not None and len(candidates) > max_hits:
+                # Candidates over-approximate matches; verify before giving up.
+                if sum(1 for slot in candidates if needle in names[slot]) > max_hits:
+                    return None
+
+            hits = [slot for slot in candidates if needle in names[slot]]
+
+            def rank(slot: int) -> tuple:
+                name = names[slot]
+                pos = name.find(needle)
+                tier = 0 if name == needle else 1 if pos == 0 else 2 if name[pos - 1] == " " else 3
+                return (tier, pos, len(name), name)
+
+            if limit is not None and len(hits) > limit:
+                hits = heapq.nsmallest(limit, hits, key=rank)
+            ranked = sorted(((rank(slot), slot) for slot in hits))
+            out = [(self._ids[slot], 1.0 - key[0] * 0.1) for key, slot in ranked]
+
+            if fuzzy and (limit is None or len(out) < limit):
+                matched = {slot for _, slot in ranked}
+                out.extend(self._fuzzy(needle, matched, (limit - len(out)) if limit is not None else _FUZZY_POOL))
+        return out
+
+    def _fuzzy(self, needle: str, exclude: set[int], limit: int) -> list[tuple[str, float]]:
+        grams = trigrams(needle)
+        # Very common trigrams barely discriminate and dominate the cost;
+        # collect candidates from the rarer ones and score the best few exactly.
+        common = max(64, len(self._slots) // 20)
+        shared: dict[int, int] = {}
+        for g in grams:
+            posting = self._grams.get(g)
+            if not posting or len(posting) > common:
+                continue
+            for slot in posting:
+                if slot not in exclude:
+                    shared[slot] = shared.get(slot, 0) + 1
+        pool = heapq.nlargest(_FUZZY_POOL, shared.items(), key=lambda kv: kv[1])
+        scored = []
+        for slot, _ in pool:
+            other = trigrams(self._names[slot])
+            n = len(grams & other)
+            sim = n / (len(grams) + len(other) - n)
+            if sim >= _FUZZY_MIN_SIMILARITY:
+                scored.append((-sim, self._names[slot], slot))
+        scored.sort()
+        return [(self._ids[slot], round(0.6 * -neg, 4)) for neg, _, slot in scored[:limit]]
+
+
+def _inner_trigrams(needle: str) -> list[str]:
+    """Unpadded trigrams of the needle: every one must appear in a containing name."""
+    return [needle[i:i + 3] for i in range(len(needle) - 2)]
+
+
+# ---- process-local registry ---------------------------------------------------
+
+_INDEXES: dict[str, NameIndex] = {}
+_REGISTRY_LOCK = threading.Lock()
+_REBUILDING: set[str] = set()
+
+
+def _rebuild_async(collection: str) -> None:
+    with _REGISTRY_LOCK:
+        if collection in _REBUILDING:
+            return
+        _REBUILDING.add(collection)
+
+    def run():
+        try:
+            index = NameIndex.load(collection)
+            with _REGISTRY_LOCK:
+                _INDEXES[collection] = index
+        except Exception:
+            logger.exception("Rebuilding name index for %s failed", collection)
+        finally:
+            with _REGISTRY_LOCK:
+                _REBUILDING.discard(collection)
+
+    threading.Thread(target=run, name=f"name-index-{collection}", daemon=True).start()
+
+
+def get_name_index(collection: str) -> NameIndex:
+    """
+    The collection's index; built synchronously on first use. Afterwards,
+    at most every NAME_INDEX_CHECK_SECONDS, a moved persisted version (another
+    worker wrote) or a document count that drifted from the last load/patch
+    (a write that skipped touch_name_index) triggers a background rebuild
+    while the current index keeps serving.
+    """
+    index = _INDEXES.get(collection)
+    if index is None:
+        with _REGISTRY_LOCK:
+            index = _INDEXES.get(collection)
+        if index is None:
+            index = NameIndex.load(collection)
+            with _REGISTRY_LOCK:
+                index = _INDEXES.setdefault(collection, index)
+        return index
+    now = time.monotonic()
+    if now - index.checked_at >= settings.name_index_check_seconds:
+        index.checked_at = now
+        try:
+            stale = _read_version(collection) != index.version \
+                or get_col(collection).estimated_document_count() != index.doc_count
+        except Exception:
+            stale = False
+        if stale:
+            _rebuild_async(collection)
+    return index
+
+
+def touch_name_index(collection: str, ids: Iterable[str] | None = None) -> None:
+    """
+    Call after writing names in `collection`. With `ids` the local index is
+    patched from those documents; without, it is rebuilt. The persisted
+    version is bumped so other workers rebuild on their next check.
+    """
+    doc = get_col("counters").find_one_and_update(
+        {"_id": _VERSION_PREFIX + collection},
+        {"$inc": {"seq": 1}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+    seq = int((doc or {}).get("seq") or 0)
+    index = _INDEXES.get(collection)
+    if index is None:
+        return
+    if ids is None:
+        with _REGISTRY_LOCK:
+            _INDEXES[collection] = NameIndex.load(collection)
+        return
+    wanted = [str(i) for i in ids if str(i or "").strip()]
+    found = {d.get("id"): d.get("name") for d in get_col(collection).find({"id": {"$in": wanted}}, {"_id": 0, "id": 1, "name": 1})}
+    for doc_id in wanted:
+        known = doc_id in index
+        if doc_id in found:
+            index.upsert(doc_id, found[doc_id])
+            index.doc_count += not known
+        else:
+            index.remove(doc_id)
+            index.doc_count -= bool(known)
+    # Only adopt the new version if no other worker wrote in between.
+    if seq == index.version + 1:
+        index.version = seq
+
+
+def warm_name_indexes() -> None:
+    """Build every index in a background thread (startup)."""
+    for collection in NAME_INDEX_COLLECTIONS:
+        if collection not in _INDEXES:
+            _rebuild_async(collection)
+
+
+def reset_name_indexes() -> None:
+    with _REGISTRY_LOCK:
+        _INDEXES.clear()
+
+
+# ---- query helpers -------------------------------------------------------------
+
+def name_search_ids(collection: str, query: str, limit: int | None = None, *, fuzzy: bool = False) -> list[str]:
+    return [doc_id for doc_id, _ in get_name_index(collection).search(query, limit, fuzzy=fuzzy) or []]
+
+
+def name_filter(collection: str, query: str, field: str = "name") -> dict:
+    """
+    Mongo filter matching documents whose name contains `query`, as an
+    indexed `id $in` list. Very broad queries (more than NAME_SEARCH_MAX_IDS
+    hits) fall back to an escaped case-insensitive regex, which is no slower
+    than the id list at that point.
+    """
+    hits = get_name_index(collection).search(query, max_hits=settings.name_search_max_ids)
+    if hits is None:
+        return {field: {"$regex": re.escape(str(query or "").strip()), "$options": "i"}}
+    return {"id": {"$in": [doc_id for doc_id, _ in hits]}}
+
+
+def rank_by_ids(rows: list[dict], ranked_ids: list[str]) -> list[dict]:
+    """Order rows (each with an `id`) by search rank; unranked rows keep their order at the end."""
+    order = {doc_id: i for i, doc_id in enumerate(ranked_ids)}
+    return sorted(rows, key=lambda r: order.get(str(r.get("id")), len(order)))
+
+
+def ranked_name_rows(
+    collection: str,
+    query: str,
+    base_filter: dict | None = None,
+    projection: dict | None = None,
+    limit: int | None = None,
+) -> list[dict]:
+    """
+    Documents matching `base_filter` whose name contains `query`, best
+    match first, at most `limit`. Falls back to an unranked regex scan when
+    the query matches more than NAME_SEARCH_MAX_IDS names.
+    """
+    col = get_col(collection)
+    base = dict(base_filter or {})
+    hits = get_name_index(collection).search(query, max_hits=settings.name_search_max_ids)
+    if hits is None:
+        filt = {"$and": [base, {"name": {"$regex": re.escape(str(query or "").strip()), "$options": "i"}}]}
+        cur = col.find(filt, projection)
+        return list(cur.limit(int(limit)) if limit else cur)
+    ranked_ids = [doc_id for doc_id, _ in hits]
+    rows = list(col.find({"$and": [base, {"id": {"$in": ranked_ids}}]}, projection))
+    rows = rank_by_ids(rows, ranked_ids)
+    return rows[:int(limit)] if limit else rows
+
+
+def add_name_filter(q: dict, collection: str, query: str) -> dict:
+    """AND a name_filter onto an existing Mongo query dict (in place)."""
+    q.setdefault("$and", []).append(name_filter(collection, query))
+    return q
@@ -0,0 +1,38 @@
+from __future__ import annotations
+
+import base64
+import json
+from typing import Any
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(sort: str, value: Any, last_id: str) -> str:
+    """Opaque keyset cursor: the sort field, its value on the last row and that row's id."""
+    raw = json.dumps({"s": sort, "v": value, "id": last_id}, separators=(",", ":"), default=str)
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token: str, sort: str) -> tuple[Any, str]:
+    """Return (value, last_id); raises InvalidCursor if the token is malformed or for another sort."""
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        if not isinstance(data, dict) or data.get("s") != sort or not isinstance(data.get("id"), str):
+            raise ValueError
+        return data.get("v"), data["id"]
+    except Exception as e:
+        raise InvalidCursor("Invalid cursor") from e
+
+
+def keyset_filter(sort: str, value: Any, last_id: Any, direction: int = 1, id_field: str = "id") -> dict:
+    """
+    Rows strictly after (value, last_id) in (sort, id) order. Paired with a
+    compound (sort, id) index this is a range scan however deep the page.
+    """
+    op = "$gt" if direction >= 0 else "$lt"
+    if sort == id_field:
+        return {id_field: {op: last_id}}
+    return {"$or": [{sort: {op: value}}, {sort: value, id_field: {op: last_id}}]}
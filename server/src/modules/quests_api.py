@@ -3,20 +3,20 @@ from typing import Any, Iterable, Optional
 
 from fastapi import APIRouter, Body, HTTPException, Request
 
-from db_mongo import get_col, next_id_str
+from db_mongo import lazy_col, next_id_str
 from server.src.modules.authentification_helpers import require_auth
 from server.src.modules.campaign_chat_helpers import (
     build_chat_doc,
     broadcast_campaign_chat,
-    insert_chat_doc,
+    save_chat_doc,
 )
 
 router = APIRouter()
 
-CAMPAIGN_COL = get_col("campaigns")
-QUEST_COL = get_col("quests")
-PROPOSAL_COL = get_col("quest_proposals")
-PROPOSAL_EVENT_COL = get_col("proposal_events")
+CAMPAIGN_COL = lazy_col("campaigns")
+QUEST_COL = lazy_col("quests")
+PROPOSAL_COL = lazy_col("quest_proposals")
+PROPOSAL_EVENT_COL = lazy_col("proposal_events")
 
 VALID_QUEST_STATUSES = {
     "pending",
@@ -252,12 +252,13 @@ def _record_proposal_event(
 
 async def _notify_proposal_action(cid: str, username: str, text: str) -> None:
     doc = build_chat_doc(cid, username, {"text": text, "visibility": "public", "type": "notification"})
-    insert_chat_doc(doc)
-    await broadcast_campaign_chat(cid, doc)
+    message = dict(doc)
+    if await save_chat_doc(doc):
+        await broadcast_campaign_chat(cid, message)
 
 
 @router.get("/campaigns/{cid}/quests")
-async def list_campaign_quests(req: Request, cid: str):
+def list_campaign_quests(req: Request, cid: str):
     user, role = require_auth(req)
     campaign = _require_campaign_access(cid, user, role)
     is_gm = _is_campaign_gm(campaign, user, role)
@@ -277,7 +278,7 @@ async def list_campaign_quests(req: Request, cid: str):
 
 
 @router.post("/campaigns/{cid}/quests")
-async def create_campaign_quest(req: Request, cid: str, payload: dict[str, Any] | None = Body(None)):
+def create_campaign_quest(req: Request, cid: str, payload: dict[str, Any] | None = Body(None)):
     user, role = require_auth(req)
     campaign = _require_campaign_access(cid, user, role)
     if not _is_campaign_gm(campaign, user, role):
@@ -360,7 +361,7 @@ async def create_campaign_quest(req: Request, cid: str, payload: dict[str, Any]
 
 
 @router.patch("/campaigns/{cid}/quests/{quest_id}")
-async def update_campaign_quest(
+def update_campaign_quest(
     req: Request, cid: str, quest_id: str, payload: dict[str, Any] | None = Body(None)
 ):
     user, role = require_auth(req)
@@ -402,7 +403,7 @@ async def update_campaign_quest(
 
 
 @router.delete("/campaigns/{cid}/quests/{quest_id}")
-async def delete_campaign_quest(cid: str, quest_id: str, req: Request):
+def delete_campaign_quest(cid: str, quest_id: str, req: Request):
     user, role = require_auth(req)
     campaign = _require_campaign_access(cid, user, role)
     if not _is_campaign_gm(campaign, user, role):
@@ -414,7 +415,7 @@ async def delete_campaign_quest(cid: str, quest_id: str, req: Request):
 
 
 @router.patch("/campaigns/{cid}/quests/{quest_id}/objectives/{objective_id}")
-async def update_quest_objective(
+def update_quest_objective(
     req: Request, cid: str, quest_id: str, objective_id: str, payload: dict[str, Any] | None = Body(None)
 ):
     user, role = require_auth(req)
@@ -481,7 +482,7 @@ async def update_quest_objective(
 
 
 @router.post("/campaigns/{cid}/quests/{quest_id}/notes")
-async def add_quest_note(
+def add_quest_note(
     req: Request, cid: str, quest_id: str, payload: dict[str, Any] | None = Body(None)
 ):
     user, role = require_auth(req)
@@ -504,7 +505,7 @@ async def add_quest_note(
 
 
 @router.post("/campaigns/{cid}/quests/{quest_id}/theories")
-async def add_quest_theory(
+def add_quest_theory(
     req: Request, cid: str, quest_id: str, payload: dict[str, Any] | None = Body(None)
 ):
     user, role = require_auth(req)
@@ -524,7 +525,7 @@ async def add_quest_theory(
 
 
 @router.post("/campaigns/{cid}/quests/{quest_id}/tracking")
-async def update_quest_tracking(
+def update_quest_tracking(
     req: Request, cid: str, quest_id: str, payload: dict[str, Any] | None = Body(None)
 ):
     user, role = require_auth(req)
@@ -542,7 +543,7 @@ async def update_quest_tracking(
 
 
 @router.post("/campaigns/{cid}/quests/{quest_id}/proposals")
-async def create_quest_proposal(
+def create_quest_proposal(
     req: Request, cid: str, quest_id: str, payload: dict[str, Any] | None = Body(None)
 ):
     user, role = require_auth(req)
@@ -583,7 +584,7 @@ async def create_quest_proposal(
 
 
 @router.post("/campaigns/{cid}/proposals/{proposal_id}/vote")
-async def vote_on_proposal(
+def vote_on_proposal(
     req: Request, cid: str, proposal_id: str, payload: dict[str, Any] | None = Body(None)
 ):
     user, role = require_auth(req)
@@ -614,7 +615,7 @@ async def vote_on_proposal(
 
 
 @router.post("/campaigns/{cid}/proposals/{proposal_id}/review")
-async def review_proposal(
+def review_proposal(
     req: Request, cid: str, proposal_id: str, payload: dict[str, Any] | None = Body(None)
 ):
     user, role = require_auth(req)
@@ -4,10 +4,19 @@ from io import BytesIO
 from typing import Any
 from urllib.parse import quote
 
-try:
-    import boto3
-except Exception:  # pragma: no cover
-    boto3 = None
+# boto3 takes ~100 ms to import, so it is only loaded once R2 is configured.
+boto3 = None
+
+
+def _load_boto3():
+    global boto3
+    if boto3 is None:
+        try:
+            import boto3 as module
+        except Exception:  # pragma: no cover
+            return None
+        boto3 = module
+    return boto3
 
 
 def _truthy(value: str | None) -> bool:
@@ -88,12 +97,12 @@ class R2Storage:
     def is_ready(self) -> bool:
         if not self.enabled:
             return False
-        if not boto3:
-            return False
         required = [self.bucket, self.endpoint, self.access_key_id, self.secret_access_key]
         if not all(required):
             return False
         if self._client is None:
+            if not _load_boto3():
+                return False
             self._client = boto3.client(
                 "s3",
                 endpoint_url=self.endpoint,
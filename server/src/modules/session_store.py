@@ -0,0 +1,152 @@
+from __future__ import annotations
+
+import datetime
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Dict, Optional, Tuple
+
+from db_mongo import get_col, is_mongomock
+from settings import settings
+
+SESSIONS_COL = "sessions"
+SESSION_BACKENDS = ("auto", "memory", "mongo")
+
+# Memory backend state: token -> (username, role) and token -> role override.
+SESSIONS: Dict[str, Tuple[str, str]] = {}
+SESSION_ROLE_OVERRIDES: Dict[str, str] = {}
+
+# (username, stored_role, role_override or None)
+SessionRecord = Tuple[str, str, Optional[str]]
+
+
+def token_key(token: str) -> str:
+    """Sessions are stored under the token's hash, never the token itself."""
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+class MemorySessionStore:
+    """Process-local sessions; the default on mongomock and in tests."""
+
+    def get(self, token: str) -> Optional[SessionRecord]:
+        record = SESSIONS.get(token)
+        if record is None:
+            return None
+        return record[0], record[1], SESSION_ROLE_OVERRIDES.get(token)
+
+    def create(self, token: str, username: str, role: str) -> None:
+        SESSIONS[token] = (username, role)
+
+    def set_override(self, token: str, role: Optional[str]) -> None:
+        if role is None:
+            SESSION_ROLE_OVERRIDES.pop(token, None)
+        else:
+            SESSION_ROLE_OVERRIDES[token] = role
+
+    def delete(self, token: str) -> None:
+        SESSIONS.pop(token, None)
+        SESSION_ROLE_OVERRIDES.pop(token, None)
+
+    def revoke_user(self, username: str) -> int:
+        tokens = [token for token, (user, _role) in list(SESSIONS.items()) if user == username]
+        for token in tokens:
+            self.delete(token)
+        return len(tokens)
+
+
+class MongoSessionStore:
+    """
+    Sessions shared by every worker through the `sessions` collection, which
+    a TTL index on `expires_at` prunes. Lookups go through a per-process LRU
+    whose entries live `cache_seconds`, so a revocation made by another worker
+    takes effect here within that window (immediately on this worker).
+    """
+
+    def __init__(
+        self,
+        ttl_seconds: int | None = None,
+        cache_seconds: float | None = None,
+        cache_size: int | None = None,
+        collection: str = SESSIONS_COL,
+    ):
+        self.ttl_seconds = ttl_seconds or settings.session_ttl_days * 86400
+        self.cache_seconds = cache_seconds if cache_seconds is not None else settings.session_cache_seconds
+        self.cache_size = cache_size or settings.session_cache_size
+        self.collection = collection
+        self._cache: OrderedDict[str, tuple[float, SessionRecord]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _remember(self, key: str, record: SessionRecord) -> None:
+        if self.cache_seconds <= 0:
+            return
+        with self._lock:
+            self._cache[key] = (time.monotonic() + self.cache_seconds, record)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def _forget(self, key: str) -> None:
+        with self._lock:
+            self._cache.pop(key, None)
+
+    def get(self, token: str) -> Optional[SessionRecord]:
+        key = token_key(token)
+        with self._lock:
+            hit = self._cache.get(key)
+            if hit is not None:
+                if hit[0] > time.monotonic():
+                    self._cache.move_to_end(key)
+                    return hit[1]
+                del self._cache[key]
+        doc = get_col(self.collection).find_one(
+            {"_id": key, "expires_at": {"$gt": datetime.datetime.utcnow()}},
+            {"_id": 0, "username": 1, "role": 1, "role_override": 1},
+        )
+        if not doc:
+            return None
+        record = (doc["username"], doc.get("role") or "user", doc.get("role_override"))
+        self._remember(key, record)
+        return record
+
+    def create(self, token: str, username: str, role: str) -> None:
+        now = datetime.datetime.utcnow()
+        key = token_key(token)
+        get_col(self.collection).insert_one({
+            "_id": key, "username": username, "role": role, "role_override": None,
+            "created_at": now, "expires_at": now + datetime.timedelta(seconds=self.ttl_seconds),
+        })
+        self._remember(key, (username, role, None))
+
+    def set_override(self, token: str, role: Optional[str]) -> None:
+        key = token_key(token)
+        get_col(self.collection).update_one({"_id": key}, {"$set": {"role_override": role}})
+        self._forget(key)
+
+    def delete(self, token: str) -> None:
+        key = token_key(token)
+        get_col(self.collection).delete_one({"_id": key})
+        self._forget(key)
+
+    def revoke_user(self, username: str) -> int:
+        deleted = get_col(self.collection).delete_many({"username": username}).deleted_count
+        with self._lock:
+            for key in [k for k, (_exp, record) in self._cache.items() if record[0] == username]:
+                del self._cache[key]
+        return deleted
+
+    def clear_cache(self) -> None:
+        with self._lock:
+            self._cache.clear()
+
+
+@lru_cache(maxsize=1)
+def get_session_store():
+    """SESSION_BACKEND=auto|memory|mongo; auto means memory on mongomock, Mongo otherwise."""
+    backend = settings.session_backend.strip().lower()
+    if backend not in SESSION_BACKENDS:
+        raise RuntimeError(f"SESSION_BACKEND must be one of {', '.join(SESSION_BACKENDS)}")
+    if backend == "memory" or (backend == "auto" and is_mongomock()):
+        return MemorySessionStore()
+    return MongoSessionStore()
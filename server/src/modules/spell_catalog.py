@@ -0,0 +1,169 @@
+from __future__ import annotations
+
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Iterable
+
+from pymongo import ReturnDocument
+
+from db_mongo import get_col
+from settings import settings
+
+# The persisted version lives next to the id sequences so every worker can
+# cheaply detect that another process edited effects or schools.
+CATALOG_VERSION_KEY = "spell_catalog_version"
+
+
+def _type_letter(value) -> str:
+    up = str(value or "A").strip().upper()[:1]
+    return up if up in ("A", "B", "C") else "A"
+
+
+def _int_or_zero(value) -> int:
+    try:
+        return int(value or 0)
+    except Exception:
+        return 0
+
+
+@dataclass(frozen=True)
+class EffectRef:
+    id: str
+    name: str
+    school: str
+    mp_cost: int = 0
+    en_cost: int = 0
+
+
+@dataclass(frozen=True)
+class SchoolRef:
+    id: str
+    name: str
+    school_type: str = "Simple"
+    range_type: str = "A"
+    aoe_type: str = "A"
+    upgrade: bool = False
+
+
+@dataclass(frozen=True)
+class SpellCatalog:
+    """Immutable snapshot of the `effects` and `schools` collections."""
+
+    version: int
+    effects: dict[str, EffectRef] = field(default_factory=dict)
+    schools: dict[str, SchoolRef] = field(default_factory=dict)
+
+    def effect(self, effect_id: str) -> EffectRef | None:
+        return self.effects.get(str(effect_id))
+
+    def school(self, school_id: str) -> SchoolRef | None:
+        return self.schools.get(str(school_id))
+
+    def school_of(self, effect_id: str) -> SchoolRef | None:
+        eff = self.effects.get(str(effect_id))
+        if not eff or not eff.school:
+            return None
+        return self.schools.get(eff.school)
+
+    def missing_effects(self, effect_ids: Iterable[str]) -> list[str]:
+        out = []
+        seen = set()
+        for eid in effect_ids or []:
+            key = str(eid)
+            if key in seen:
+                continue
+            seen.add(key)
+            if key not in self.effects:
+                out.append(key)
+        return out
+
+
+def _read_version() -> int:
+    doc = get_col("counters").find_one({"_id": CATALOG_VERSION_KEY}, {"_id": 0, "seq": 1})
+    return _int_or_zero((doc or {}).get("seq"))
+
+
+def _load_catalog(version: int) -> SpellCatalog:
+    schools: dict[str, SchoolRef] = {}
+    for s in get_col("schools").find({}, {"_id": 0}):
+        sid = str(s.get("id") or "")
+        if not sid:
+            continue
+        schools[sid] = SchoolRef(
+            id=sid,
+            name=str(s.get("name") or sid),
+            school_type=str(s.get("school_type") or "Simple"),
+            range_type=_type_letter(s.get("range_type")),
+            aoe_type=_type_letter(s.get("aoe_type")),
+            upgrade=bool(s.get("upgrade", s.get("is_upgrade", False))),
+        )
+    effects: dict[str, EffectRef] = {}
+    projection = {"_id": 0, "id": 1, "name": 1, "school": 1, "mp_cost": 1, "en_cost": 1}
+    for e in get_col("effects").find({}, projection):
+        eid = str(e.get("id") or "")
+        if not eid:
+            continue
+        effects[eid] = EffectRef(
+            id=eid,
+            name=str(e.get("name") or ""),
+            school=str(e.get("school") or ""),
+            mp_cost=_int_or_zero(e.get("mp_cost")),
+            en_cost=_int_or_zero(e.get("en_cost")),
+        )
+    return SpellCatalog(version=version, effects=effects, schools=schools)
+
+
+_LOCK = threading.Lock()
+_CATALOG: SpellCatalog | None = None
+_CHECKED_AT = 0.0
+
+
+def get_spell_catalog(refresh: bool = False) -> SpellCatalog:
+    """
+    Return the process-local catalog, reloading it when the persisted version
+    moved (checked at most every SPELL_CATALOG_CHECK_SECONDS) or on demand.
+    """
+    global _CATALOG, _CHECKED_AT
+    now = time.monotonic()
+    current = _CATALOG
+    if current is not None and not refresh and now - _CHECKED_AT < settings.spell_catalog_check_seconds:
+        return current
+    with _LOCK:
+        current = _CATALOG
+        now = time.monotonic()
+        if current is not None and not refresh and now - _CHECKED_AT < settings.spell_catalog_check_seconds:
+            return current
+        version = _read_version()
+        if current is None or refresh or current.version != version:
+            current = _load_catalog(version)
+            _CATALOG = current
+        _CHECKED_AT = now
+        return current
+
+
+def invalidate_spell_catalog() -> int:
+    """
+    Bump the persisted catalog version and drop the local snapshot.
+    Call after any write to `effects` or `schools`; other workers pick the
+    new version up on their next periodic check.
+    """
+    global _CATALOG, _CHECKED_AT
+    doc = get_col("counters").find_one_and_update(
+        {"_id": CATALOG_VERSION_KEY},
+        {"$inc": {"seq": 1}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+    with _LOCK:
+        _CATALOG = None
+        _CHECKED_AT = 0.0
+    return _int_or_zero((doc or {}).get("seq"))
+
+
+def reset_spell_catalog() -> None:
+    """Forget the local snapshot without touching the persisted version."""
+    global _CATALOG, _CHECKED_AT
+    with _LOCK:
+        _CATALOG = None
+        _CHECKED_AT = 0.0
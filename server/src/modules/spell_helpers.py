@@ -1,13 +1,13 @@
 from server.src.objects.effects import load_effect
-from db_mongo import get_col
+from db_mongo import get_col, bulk_update, norm_key, spell_sig
 from server.src.objects.spells import Spell
-from server.src.modules.category_table import category_for_mp
-from server.src.modules.cost_tables import ACTIVATION_COSTS, RANGE_COSTS, AOE_COSTS, DURATION_COSTS
+from server.src.modules.cost_engine import get_cost_engine, mp_to_next_category
+from server.src.modules.spell_catalog import SpellCatalog, get_spell_catalog, invalidate_spell_catalog
+from server.src.modules.admin_jobs import JobContext, register_job
+from server.src.modules.logging_helpers import write_audit
+from server.src.modules.name_search import touch_name_index
 import re
-from typing import Tuple
-from collections import Counter
-
-TYPE_ORDER = {"A": 1, "B": 2, "C": 3}
+from typing import Callable, Tuple
 
 def _unique_preserve(seq):
     seen = set()
@@ -22,83 +22,6 @@ def _unique_preserve(seq):
 def _norm_text(s: str) -> str:
     return re.sub(r"\s+", " ", (s or "").strip().lower())
 
-def _pick_max_type(types):
-    best = "A"
-    for t in (types or []):
-        tt = (t or "A").upper()
-        if TYPE_ORDER.get(tt, 1) > TYPE_ORDER.get(best, 1):
-            best = tt
-    return best
-
-def _derive_types_from_effects(effect_ids):
-    # Look up schools of selected effects; choose the max A/B/C across them.
-    eff_col = get_col("effects")
-    sch_col = get_col("schools")
-    effs = list(eff_col.find({"id": {"$in": [str(e) for e in (effect_ids or [])]}} , {"_id":0,"school":1}))
-    sch_ids = sorted({ str(e.get("school","")) for e in effs if e.get("school") })
-    if not sch_ids:
-        return ("A", "A")
-    # fetch only needed fields
-    sch_docs = list(sch_col.find({"id": {"$in": sch_ids}}, {"_id":0,"id":1,"range_type":1,"aoe_type":1}))
-    r_types = [ (s.get("range_type") or "A").upper() for s in sch_docs ]
-    a_types = [ (s.get("aoe_type") or "A").upper()   for s in sch_docs ]
-    return (_pick_max_type(r_types), _pick_max_type(a_types))
-
-def _sum_effect_costs(effect_ids):
-    """
-    Return (mp_sum, en_sum) using a multiplicity-aware DB lookup.
-    - Does NOT call load_effect() to avoid side-effects during recompute.
-    - Respects intentional duplicates: same effect ID counted N times if present N times.
-    """
-    ids = [str(e) for e in (effect_ids or []) if str(e)]
-    if not ids:
-        return (0, 0)
-
-    counts = Counter(ids)
-    eff_col = get_col("effects")
-
-    # fetch minimal fields for all unique ids
-    docs = list(
-        eff_col.find(
-            {"id": {"$in": list(counts.keys())}},
-            {"_id": 0, "id": 1, "mp_cost": 1, "en_cost": 1},
-        )
-    )
-
-    mp_sum = 0
-    en_sum = 0
-    for d in docs:
-        c = counts.get(d["id"], 0)
-        if c:
-            mp_sum += c * int(d.get("mp_cost", 0) or 0)
-            en_sum += c * int(d.get("en_cost", 0) or 0)
-
-def _sum_effect_costs(effect_ids):
-
-    ids = [str(e) for e in (effect_ids or []) if str(e)]
-    if not ids:
-        return (0, 0)
-
-    counts = Counter(ids)
-    eff_col = get_col("effects")
-
-    docs = list(
-        eff_col.find(
-            {"id": {"$in": list(counts.keys())}},
-            {"_id": 0, "id": 1, "mp_cost": 1, "en_cost": 1},
-        )
-    )
-
-    mp_sum = 0
-    en_sum = 0
-    for d in docs:
-        c = counts.get(d["id"], 0)
-        if c:
-            mp_sum += c * int(d.get("mp_cost", 0) or 0)
-            en_sum += c * int(d.get("en_cost", 0) or 0)
-
-    return mp_sum, en_sum
-
 def compute_spell_costs(
     activation: str,
     range_val: int,
@@ -108,67 +31,23 @@ def compute_spell_costs(
     *,
     range_type: str | None = None,
     aoe_type: str | None = None,
+    catalog: SpellCatalog | None = None,
 ) -> dict:
-    effect_ids = [str(e).strip() for e in (effect_ids or []) if str(e).strip()]
-
-
-    # 1) Decide cost table types
-    if not range_type or range_type.upper() not in ("A", "B", "C"):
-        rt, at = _derive_types_from_effects(effect_ids)
-    else:
-        rt = range_type.upper()
-        # if aoe_type is not provided, fall back to derivation; else normalize
-        at = (aoe_type or "A").upper() if aoe_type else _derive_types_from_effects(effect_ids)[1]
-
-    # 2) Sum effect costs (already deduped above)
-    eff_mp, eff_en = _sum_effect_costs(effect_ids)
-
-    # 3) Knob costs (tables)
-    act_mp, act_en = ACTIVATION_COSTS.get(activation, (0, 0))
-    rng_mp, rng_en = RANGE_COSTS.get(rt, RANGE_COSTS["A"]).get(int(range_val), (0, 0))
-    aoe_mp, aoe_en = AOE_COSTS.get(at, AOE_COSTS["A"]).get(str(aoe), (0, 0))
-    dur_mp, dur_en = DURATION_COSTS.get(int(duration), (0, 0))
-
-    mp_cost = eff_mp + act_mp + rng_mp + aoe_mp + dur_mp
-    en_cost = eff_en + act_en + rng_en + aoe_en + dur_en
-
-    breakdown = {
-        "activation": {"mp": act_mp, "en": act_en},
-        "range":      {"mp": rng_mp, "en": rng_en, "type": rt},
-        "aoe":        {"mp": aoe_mp, "en": aoe_en, "type": at},
-        "duration":   {"mp": dur_mp, "en": dur_en},
-        "effects":    {"mp": eff_mp, "en": eff_en},
-    }
-
-    return {
-        "mp_cost": mp_cost,
-        "en_cost": en_cost,
-        "category": category_for_mp(mp_cost),
-        "mp_to_next_category": mp_to_next_category_delta(mp_cost),
-        "breakdown": breakdown,
-    }
+    return get_cost_engine(catalog).compute(
+        activation, range_val, aoe, duration, effect_ids,
+        range_type=range_type, aoe_type=aoe_type,
+    )
 
+def compute_spell_costs_batch(items: list[dict], *, catalog: SpellCatalog | None = None) -> list[dict]:
+    """
+    Evaluate many cost requests against one catalog snapshot.
+    Items carry the compute_spell_costs arguments (activation, range, aoe,
+    duration, effects, range_type, aoe_type) already coerced.
+    """
+    return get_cost_engine(catalog).compute_many(items)
 
 def mp_to_next_category_delta(current_mp: int) -> int:
-    cur_cat = category_for_mp(int(current_mp or 0))
-    step = 1
-    base = int(current_mp or 0)
-    MAX_MP = base + 100_000
-    hi = base + step
-    while hi <= MAX_MP and category_for_mp(hi) == cur_cat:
-        step *= 2
-        hi = base + step
-    if hi > MAX_MP: return 0
-    lo = max(base, hi - step)
-    ans = None
-    while lo <= hi:
-        mid = (lo + hi) // 2
-        if category_for_mp(mid) == cur_cat:
-            lo = mid + 1
-        else:
-            ans = mid
-            hi = mid - 1
-    return 0 if ans is None else max(0, ans - base)
+    return mp_to_next_category(current_mp)
 
 def _norm_text(s: str) -> str:
     return re.sub(r"\s+", " ", (s or "").strip().lower())
@@ -195,133 +74,340 @@ def _effect_duplicate_groups() -> list[dict]:
             })
     return groups
 
-def _recompute_spells_for_school(school_id: str) -> tuple[str, int]:
-    eff_col = get_col("effects")
-    sp_col  = get_col("spells")
+def spell_school_fields(effect_ids, catalog: SpellCatalog | None = None) -> dict:
+    """
+    Denormalized `school_ids` (indexed, used by the school filter) and
+    `schools` [{id, name}] (used for display) for a spell's effects.
+    """
+    catalog = catalog or get_spell_catalog()
+    ids = sorted({eff.school for eff in (catalog.effect(e) for e in (effect_ids or [])) if eff and eff.school})
+    schools = []
+    for sid in ids:
+        sch = catalog.school(sid)
+        schools.append({"id": sid, "name": sch.name if sch else sid})
+    return {"school_ids": ids, "schools": schools}
+
+RECOMPUTE_BATCH_SIZE = 500
+# Changes quoted in a recompute job's note; the full list is the job's output.
+RECOMPUTE_NOTE_SAMPLE = 50
+_RECOMPUTE_FIELDS = {
+    "_id": 0, "id": 1, "name": 1, "activation": 1, "range": 1, "aoe": 1,
+    "duration": 1, "effects": 1, "mp_cost": 1, "en_cost": 1, "category": 1,
+    "school_ids": 1, "schools": 1,
+}
+
+def recompute_spells(
+    query: dict | None = None,
+    *,
+    remove_effects: set[str] | None = None,
+    batch_size: int = RECOMPUTE_BATCH_SIZE,
+    catalog: SpellCatalog | None = None,
+) -> dict:
+    """
+    Recompute stored MP/EN/category for every spell matching `query`.
+    Spells are streamed with a cursor, costed in memory against one catalog
+    snapshot and written back with one bulk_write per batch. When
+    `remove_effects` is given those ids are also stripped from each spell.
+    Stale `school_ids`/`schools` are refreshed along the way but are not
+    reported as changes.
+    Returns {"total", "changed", "changes": [{id, name, before, after, effects_removed}]}.
+    """
+    engine = get_cost_engine(catalog)
+    sp_col = get_col("spells")
+    remove_effects = {str(x) for x in (remove_effects or set())}
+    batch_size = max(1, int(batch_size or RECOMPUTE_BATCH_SIZE))
+
+    total = 0
+    changes: list[dict] = []
+    ops: list[tuple[dict, dict]] = []
+    cursor = sp_col.find(query or {}, _RECOMPUTE_FIELDS).batch_size(batch_size)
+    for sp in cursor:
+        total += 1
+        old_effects = [str(x) for x in (sp.get("effects") or [])]
+        effects = [e for e in old_effects if e not in remove_effects] if remove_effects else old_effects
+
+        cc = engine.compute(
+            sp.get("activation", "Action"),
+            int(sp.get("range", 0) or 0),
+            sp.get("aoe", "A Square"),
+            int(sp.get("duration", 1) or 1),
+            effects,
+        )
+        before = {
+            "mp_cost": int(sp.get("mp_cost", 0) or 0),
+            "en_cost": int(sp.get("en_cost", 0) or 0),
+            "category": sp.get("category", ""),
+        }
+        after = {"mp_cost": cc["mp_cost"], "en_cost": cc["en_cost"], "category": cc["category"]}
+        effects_removed = effects != old_effects
+        school_fields = spell_school_fields(effects, engine.catalog)
+        schools_stale = any(sp.get(k) != v for k, v in school_fields.items())
+
+        update: dict = {}
+        if before != after or effects_removed:
+            update.update(after)
+            if effects_removed:
+                update["effects"] = effects
+            changes.append({
+                "id": sp["id"],
+                "name": sp.get("name", "(unnamed)"),
+                "before": before,
+                "after": after,
+                "effects_removed": effects_removed,
+            })
+        if schools_stale:
+            update.update(school_fields)
+        if not update:
+            continue
+        ops.append(({"id": sp["id"]}, {"$set": update}))
+        if len(ops) >= batch_size:
+            bulk_update(sp_col, ops)
+            ops = []
+    bulk_update(sp_col, ops)
+
+    return {"total": total, "changed": len(changes), "changes": changes}
+
+def format_recompute_line(change: dict, suffix: str = "") -> str:
+    b, a = change["before"], change["after"]
+    return (
+        f"[{change['id']}] {change.get('name') or '(unnamed)'}: "
+        f"MP {b['mp_cost']} → {a['mp_cost']}, EN {b['en_cost']} → {a['en_cost']}, "
+        f"Category {b['category']} → {a['category']}{suffix}"
+    )
 
-    eff_ids = [e["id"] for e in eff_col.find({"school": school_id}, {"_id":0,"id":1})]
+def _recompute_spells_for_school(school_id: str) -> tuple[str, int]:
+    catalog = get_spell_catalog()
+    eff_ids = [e.id for e in catalog.effects.values() if e.school == str(school_id)]
     if not eff_ids:
         return (f"No effects belong to school [{school_id}].", 0)
 
-    affected = list(sp_col.find({"effects": {"$in": eff_ids}}, {"_id": 0}))
-    if not affected:
+    report = recompute_spells({"effects": {"$in": eff_ids}}, catalog=catalog)
+    if not report["total"]:
         return ("No spells referenced effects from this school.", 0)
 
-    changed = 0
     lines: list[str] = [f"Recompute after School update [{school_id}]:", ""]
-
-    for sp in affected:
-        old_mp = int(sp.get("mp_cost", 0))
-        old_en = int(sp.get("en_cost", 0))
-        old_cat = sp.get("category", "")
-
-        cc = compute_spell_costs(
-            sp.get("activation","Action"),
-            int(sp.get("range",0)),
-            sp.get("aoe","A Square"),
-            int(sp.get("duration",1)),
-            [str(x) for x in (sp.get("effects") or [])]
-        )
-
-        new_mp, new_en, new_cat = cc["mp_cost"], cc["en_cost"], cc["category"]
-
-        if (old_mp, old_en, old_cat) != (new_mp, new_en, new_cat):
-            sp_col.update_one({"id": sp["id"]}, {"$set": {
-                "mp_cost": new_mp,
-                "en_cost": new_en,
-                "category": new_cat
-            }})
-            changed += 1
-            lines.append(
-              f"[{sp['id']}] {sp.get('name','(unnamed)')}: "
-              f"MP {old_mp} → {new_mp}, EN {old_en} → {new_en}, Category {old_cat} → {new_cat}"
-            )
-
-    if changed == 0:
+    lines.extend(format_recompute_line(c) for c in report["changes"])
+    if not report["changed"]:
         lines.append("No MP/EN/category changes after recompute.")
-    return ("\n".join(lines), changed)
+    return ("\n".join(lines), report["changed"])
 
 def _recompute_spells_for_effect(effect_id: str) -> tuple[str, int]:
+    return _recompute_spells_for_effects([effect_id])
 
-    sp_col = get_col("spells")
-    changed = 0
-    lines: list[str] = []
-
-    affected = list(sp_col.find({"effects": effect_id}, {"_id": 0}))
-    if not affected:
-        return ("No spells referenced this effect.", 0)
-
-    for sp in affected:
-        old_mp = int(sp.get("mp_cost", 0))
-        old_en = int(sp.get("en_cost", 0))
-        old_cat = sp.get("category", "")
-
-        # recompute with current effect docs
-        cc = compute_spell_costs(
-            sp.get("activation", "Action"),
-            int(sp.get("range", 0)),
-            sp.get("aoe", "A Square"),
-            int(sp.get("duration", 1)),
-            [str(x) for x in (sp.get("effects") or [])]
-        )
-
-        new_mp, new_en, new_cat = cc["mp_cost"], cc["en_cost"], cc["category"]
-
-        # Only write if something changed
-        if (old_mp, old_en, old_cat) != (new_mp, new_en, new_cat):
-            sp_col.update_one({"id": sp["id"]}, {"$set": {
-                "mp_cost": new_mp,
-                "en_cost": new_en,
-                "category": new_cat
-            }})
-            changed += 1
-            lines.append(
-                f"[{sp['id']}] {sp.get('name','(unnamed)')}: "
-                f"MP {old_mp} → {new_mp}, EN {old_en} → {new_en}, Category {old_cat} → {new_cat}"
-            )
+def _recompute_spells_for_effects(effect_ids: list[str]) -> tuple[str, int]:
+    """One pass over every spell using any of `effect_ids`, against one catalog snapshot."""
+    report = recompute_spells({"effects": {"$in": list(effect_ids)}})
+    if not report["total"]:
+        return ("No spells referenced this effect." if len(effect_ids) == 1 else "No spells referenced these effects.", 0)
 
+    lines = [format_recompute_line(c) for c in report["changes"]]
     if not lines:
         lines.append("No MP/EN/category changes after recompute.")
-    return ("\n".join(lines), changed)
+    return ("\n".join(lines), report["changed"])
 
-def recompute_all_spells() -> Tuple[str, int, int]:
-    sp_col = get_col("spells")
-    spells = list(sp_col.find({}, {"_id": 0}))
-    total = len(spells)
-    changed = 0
+def _recompute_all_note(changes: list[dict], changed: int | None = None) -> str:
+    """`changes` may be a sample of the first rows; `changed` is the full count."""
+    changed = len(changes) if changed is None else changed
     lines: list[str] = ["Recompute ALL spells:", ""]
+    lines.extend(format_recompute_line(c) for c in changes)
+    if not changed:
+        lines.append("No MP/EN/category changes after recompute.")
+    elif changed > len(changes):
+        lines.append(f"… and {changed - len(changes)} more (see the job output).")
+    return "\n".join(lines)
 
-    for sp in spells:
-        old_mp = int(sp.get("mp_cost", 0))
-        old_en = int(sp.get("en_cost", 0))
-        old_cat = sp.get("category", "")
+def recompute_all_spells() -> Tuple[str, int, int, dict]:
+    report = recompute_spells({})
+    note = _recompute_all_note(report["changes"])
+    return (note, report["changed"], report["total"], report)
 
-        old_list = [str(x) for x in (sp.get("effects") or [])]
-        eff_list = [str(x) for x in (sp.get("effects") or [])]
+# ---- Maintenance jobs -----------------------------------------------------------
 
-        cc = compute_spell_costs(
-            sp.get("activation", "Action"),
-            int(sp.get("range", 0)),
-            sp.get("aoe", "A Square"),
-            int(sp.get("duration", 1)),
-            eff_list,
+@register_job("spells.recompute_all")
+def _job_recompute_all(ctx: JobContext) -> dict:
+    sp_col = get_col("spells")
+    catalog = get_spell_catalog()
+    total = sp_col.count_documents({})
+    done = ctx.done
+    last = ctx.checkpoint or ""
+    while True:
+        ids = [d["id"] for d in sp_col.find({"id": {"$gt": last}}, {"_id": 0, "id": 1}).sort("id", 1).limit(RECOMPUTE_BATCH_SIZE)]
+        if not ids:
+            break
+        report = recompute_spells({"id": {"$in": ids}}, catalog=catalog)
+        last = ids[-1]
+        done += len(ids)
+        ctx.progress(done, total, checkpoint=last, append=report["changes"])
+
+    changed = ctx.output_count()
+    return {
+        "status": "success",
+        "changed": changed,
+        "total": done,
+        "note": _recompute_all_note(ctx.output(limit=RECOMPUTE_NOTE_SAMPLE), changed),
+    }
+
+@register_job("spells.backfill_sigs")
+def _job_backfill_spell_sigs(ctx: JobContext) -> dict:
+    sp_col = get_col("spells")
+    q_missing = {"$or": [{"sig_v1": {"$exists": False}}, {"sig_v1": None}, {"sig_v1": ""}]}
+    state = dict(ctx.checkpoint or {"last": "", "updated": 0, "skipped": 0})
+    total = ctx.done + sp_col.count_documents({"$and": [q_missing, {"id": {"$gt": state["last"]}}]})
+    done = ctx.done
+    fields = {"_id": 0, "id": 1, "activation": 1, "range": 1, "aoe": 1, "duration": 1, "effects": 1}
+    while True:
+        rows = list(
+            sp_col.find({"$and": [q_missing, {"id": {"$gt": state["last"]}}]}, fields)
+            .sort("id", 1).limit(RECOMPUTE_BATCH_SIZE)
         )
-        new_mp, new_en, new_cat = cc["mp_cost"], cc["en_cost"], cc["category"]
-
-        if (old_mp, old_en, old_cat) != (new_mp, new_en, new_cat):
-            sp_col.update_one({"id": sp["id"]}, {"$set": {
-                "mp_cost": new_mp,
-                "en_cost": new_en,
-                "category": new_cat
-            }})
-            changed += 1
-            lines.append(
-                f"[{sp['id']}] {sp.get('name','(unnamed)')}: "
-                f"MP {old_mp} → {new_mp}, EN {old_en} → {new_en}, "
-                f"Category {old_cat} → {new_cat}{dedup_note}"
-            )
-
-    if changed == 0:
-        lines.append("No MP/EN/category changes after recompute.")
-    note = "\n".join(lines)
-    return (note, changed, total)
+        if not rows:
+            break
+        sigs = {
+            sp["id"]: spell_sig(sp.get("activation", ""), sp.get("range", 0), sp.get("aoe", ""), sp.get("duration", 0),
+                                [str(e) for e in (sp.get("effects") or [])])
+            for sp in rows
+        }
+        # sig_v1 is unique: spells whose signature is already taken are left for the dedupe job.
+        taken = {d["sig_v1"] for d in sp_col.find({"sig_v1": {"$in": list(sigs.values())}}, {"_id": 0, "sig_v1": 1})}
+        ops = []
+        for sid, sig in sigs.items():
+            if sig in taken:
+                state["skipped"] += 1
+                continue
+            taken.add(sig)
+            ops.append(({"id": sid}, {"$set": {"sig_v1": sig}}))
+        bulk_update(sp_col, ops)
+        state["updated"] += len(ops)
+        state["last"] = rows[-1]["id"]
+        done += len(rows)
+        ctx.progress(done, total, checkpoint=state)
+    return {"status": "success", "updated": state["updated"], "skipped_conflicts": state["skipped"]}
+
+@register_job("spells.backfill_schools")
+def _job_backfill_spell_schools(ctx: JobContext) -> dict:
+    sp_col = get_col("spells")
+    catalog = get_spell_catalog()
+    state = dict(ctx.checkpoint or {"last": "", "updated": 0})
+    total = sp_col.count_documents({})
+    done = ctx.done
+    fields = {"_id": 0, "id": 1, "effects": 1, "school_ids": 1, "schools": 1}
+    while True:
+        rows = list(sp_col.find({"id": {"$gt": state["last"]}}, fields).sort("id", 1).limit(RECOMPUTE_BATCH_SIZE))
+        if not rows:
+            break
+        ops = []
+        for sp in rows:
+            school_fields = spell_school_fields(sp.get("effects"), catalog)
+            if any(sp.get(k) != v for k, v in school_fields.items()):
+                ops.append(({"id": sp["id"]}, {"$set": school_fields}))
+        bulk_update(sp_col, ops)
+        state["updated"] += len(ops)
+        state["last"] = rows[-1]["id"]
+        done += len(rows)
+        ctx.progress(done, total, checkpoint=state)
+    return {"status": "success", "updated": state["updated"], "total": done}
+
+def backfill_spell_name_keys() -> int:
+    """
+    Give every spell a string `name_key` matching its name ("" without one).
+    `sort=name` cursors page on it, and a missing or null key would fall
+    outside every `$gt` after the first page.
+    """
+    sp_col = get_col("spells")
+    ops = []
+    for sp in sp_col.find({}, {"_id": 1, "name": 1, "name_key": 1}):
+        name = sp.get("name")
+        key = norm_key(str(name)) if name is not None else ""
+        if sp.get("name_key") != key:
+            ops.append(({"_id": sp["_id"]}, {"$set": {"name_key": key}}))
+    bulk_update(sp_col, ops)
+    return len(ops)
+
+def spell_sig_duplicate_groups() -> list[dict]:
+    pipeline = [
+        {"$match": {"sig_v1": {"$exists": True, "$nin": [None, ""]}}},
+        {"$group": {"_id": "$sig_v1", "ids": {"$addToSet": "$id"}, "count": {"$sum": 1}}},
+        {"$match": {"count": {"$gt": 1}}},
+    ]
+    plan = []
+    for g in get_col("spells").aggregate(pipeline):
+        ids = sorted(g["ids"])
+        plan.append({"sig": g["_id"], "keep": ids[0], "remove": ids[1:]})
+    return plan
+
+@register_job("spells.dedupe_by_sig")
+def _job_dedupe_spells_by_sig(ctx: JobContext) -> dict:
+    # Groups go to the job output, not the result: a large plan would not fit
+    # in the job document. Applied groups drop out of a resumed run's plan.
+    apply = bool(ctx.params.get("apply"))
+    plan = spell_sig_duplicate_groups()
+    state = dict(ctx.checkpoint or {"removed": 0})
+    base = ctx.done
+    sp_col = get_col("spells")
+    for i in range(0, len(plan), RECOMPUTE_BATCH_SIZE):
+        chunk = plan[i:i + RECOMPUTE_BATCH_SIZE]
+        if apply:
+            remove = [sid for g in chunk for sid in g["remove"]]
+            sp_col.delete_many({"id": {"$in": remove}})
+            state["removed"] += len(remove)
+        ctx.progress(base + i + len(chunk), base + len(plan), checkpoint=state, append=chunk)
+    return {"status": "success", "applied": apply, "total_groups": ctx.output_count(), "removed_spells": state["removed"]}
+
+def apply_effect_duplicates(plan: list[dict], progress: Callable[[int, int, list], None] | None = None) -> tuple[int, int]:
+    """
+    For each duplicate group keep the lowest id, repoint spells that use the
+    removed ids (without repeating the kept id) and delete the others.
+    `progress(done, total, groups)` gets the groups applied since the last
+    call, every RECOMPUTE_BATCH_SIZE groups. Returns (deleted_effects, touched_spells).
+    """
+    eff_col = get_col("effects")
+    sp_col = get_col("spells")
+    catalog = get_spell_catalog()
+    total_deleted = 0
+    total_spells_touched = 0
+    for n, grp in enumerate(plan, start=1):
+        keep = grp["keep"]
+        remove_ids = grp["remove"]
+        if remove_ids:
+            ops = []
+            for sp in sp_col.find({"effects": {"$in": remove_ids}}, {"_id": 1, "effects": 1}):
+                new_list = []
+                seen = set()
+                for eid in (str(x) for x in (sp.get("effects") or [])):
+                    if eid in remove_ids:
+                        eid = keep
+                    if eid not in seen:
+                        new_list.append(eid)
+                        seen.add(eid)
+                ops.append(({"_id": sp["_id"]}, {"$set": {"effects": new_list, **spell_school_fields(new_list, catalog)}}))
+            bulk_update(sp_col, ops)
+            total_spells_touched += len(ops)
+            r = eff_col.delete_many({"id": {"$in": remove_ids}})
+            total_deleted += int(r.deleted_count or 0)
+        if progress and (n % RECOMPUTE_BATCH_SIZE == 0 or n == len(plan)):
+            progress(n, len(plan), plan[(n - 1) // RECOMPUTE_BATCH_SIZE * RECOMPUTE_BATCH_SIZE:n])
+    invalidate_spell_catalog()
+    touch_name_index("effects", [eid for grp in plan for eid in grp["remove"]])
+    return total_deleted, total_spells_touched
+
+@register_job("effects.dedupe")
+def _job_dedupe_effects(ctx: JobContext) -> dict:
+    plan = _effect_duplicate_groups()
+    base = ctx.done
+    total_deleted, total_spells_touched = apply_effect_duplicates(
+        plan,
+        progress=lambda done, total, groups: ctx.progress(base + done, base + total, checkpoint=base + done, append=groups),
+    )
+    total_groups = ctx.output_count()
+    try:
+        write_audit("effects.dedupe", ctx.created_by, "—", None, {"total_deleted": total_deleted, "total_spells_touched": total_spells_touched, "total_groups": total_groups, "job_id": ctx.id})
+    except Exception:
+        pass
+    return {
+        "status": "success",
+        "applied": True,
+        "deleted_effects": total_deleted,
+        "touched_spells": total_spells_touched,
+        "total_groups": total_groups,
+        "message": f"Removed {total_deleted} duplicate effects; updated {total_spells_touched} spell(s).",
+    }
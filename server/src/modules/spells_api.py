@@ -0,0 +1,557 @@
+import datetime
+from typing import Any
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import JSONResponse
+
+from db_mongo import get_col, next_id_str, norm_key, spell_sig
+from server.src.modules.authentification_helpers import require_auth, require_user_doc
+from server.src.modules.avatar_helpers import _avatar_field
+from server.src.modules.db_async import json_body
+from server.src.modules.fast_json import FastJSONResponse
+from server.src.modules.logging_helpers import logger, write_audit
+from server.src.modules.name_search import add_name_filter, get_name_index, touch_name_index
+from server.src.modules.pagination import InvalidCursor, decode_cursor, encode_cursor, keyset_filter
+from server.src.modules.spell_catalog import get_spell_catalog
+from server.src.modules.spell_helpers import compute_spell_costs, compute_spell_costs_batch, spell_school_fields
+
+router = APIRouter()
+
+def _normalize_effects_meta(effect_ids: list[str], raw_meta):
+    if not isinstance(raw_meta, list):
+        return []
+    out = []
+    for idx, eid in enumerate(effect_ids or []):
+        entry = raw_meta[idx] if idx < len(raw_meta) else {}
+        if not isinstance(entry, dict):
+            entry = {}
+        cleaned = {"id": eid}
+        if "skill_roll" in entry:
+            cleaned["skill_roll"] = bool(entry.get("skill_roll"))
+        raw_skills = entry.get("skill_roll_skills")
+        if isinstance(raw_skills, list):
+            skills = [str(x).strip() for x in raw_skills if str(x).strip()]
+            if skills:
+                cleaned["skill_roll_skills"] = skills
+        raw_rolls = entry.get("rolls")
+        if isinstance(raw_rolls, list):
+            rolls = []
+            for r in raw_rolls:
+                if not isinstance(r, dict):
+                    continue
+                expr = str(r.get("expr") or r.get("expression") or "").strip()
+                if not expr:
+                    continue
+                kind = str(r.get("kind") or r.get("reason") or "custom").strip()
+                dmg_type = str(r.get("damage_type") or r.get("damageType") or "").strip()
+                label = str(r.get("label") or r.get("custom_label") or "").strip()
+                rolls.append({
+                    "expr": expr,
+                    "kind": kind,
+                    "damage_type": dmg_type,
+                    "label": label,
+                })
+            if rolls:
+                cleaned["rolls"] = rolls
+        out.append(cleaned)
+    return out
+
+def _catalog_with_effects(effect_ids: list[str]):
+    """Return (catalog, missing_ids); reload once before reporting unknown ids."""
+    catalog = get_spell_catalog()
+    missing = catalog.missing_effects(effect_ids)
+    if missing:
+        catalog = get_spell_catalog(refresh=True)
+        missing = catalog.missing_effects(effect_ids)
+    return catalog, missing
+
+# Kinds exposed by /search; apotheoses and private 0.3.5 items stay behind their own routes.
+SEARCH_KINDS = ("spells", "effects", "abilities", "objects", "tools", "weapons", "equipment")
+
+@router.get("/search")
+def search_names(request: Request, q: str = "", kinds: str = "", limit: int = Query(default=10, ge=1, le=100), fuzzy: bool = True):
+    """Ranked substring/fuzzy name search across catalogs, served from the trigram indexes."""
+    require_auth(request)
+    wanted = [k.strip() for k in kinds.split(",") if k.strip()] or list(SEARCH_KINDS)
+    unknown = [k for k in wanted if k not in SEARCH_KINDS]
+    if unknown:
+        return JSONResponse({"status": "error", "message": f"Unknown kind(s): {', '.join(unknown)}"}, status_code=400)
+    results: dict[str, list] = {}
+    for kind in wanted:
+        index = get_name_index(kind)
+        results[kind] = [
+            {"id": doc_id, "name": index.label(doc_id), "score": score}
+            for doc_id, score in (index.search(q, limit, fuzzy=fuzzy) or [])
+        ]
+    return {"status": "success", "query": q, "results": results}
+
+# Name order pages on name_key: always a string (see backfill_spell_name_keys),
+# so no spell falls outside the keyset comparison.
+SPELL_SORT_KEYS = {"id": "id", "name": "name_key"}
+SPELL_TOTAL_MODES = ("none", "exact", "estimate")
+
+@router.get("/spells")
+def list_spells(request: Request):
+    qp = request.query_params
+    name         = qp.get("name") or None
+    category     = qp.get("category") or None
+    status       = qp.get("status") or None
+    favorite     = (qp.get("favorite") or qp.get("fav") or "").lower() in ("1", "true", "yes")
+    creator      = qp.get("creator") or None            # "self" or a username
+    school_id    = qp.get("school_id") or None          # <— preferred
+    school_legacy= qp.get("school") or None             # id OR name (fallback)
+
+    # pagination: legacy page/skip, or keyset when `cursor` is present (empty = first page)
+    try:    page  = max(1, int(qp.get("page") or 1))
+    except: page  = 1
+    try:    limit = max(1, min(500, int(qp.get("limit") or 100)))
+    except: limit = 100
+    cursor_mode  = "cursor" in qp
+    sort_key     = SPELL_SORT_KEYS.get((qp.get("sort") or "id").lower())
+    total_mode   = (qp.get("total") or ("none" if cursor_mode else "exact")).lower()
+    if sort_key is None:
+        return JSONResponse({"status": "error", "message": "sort must be 'id' or 'name'"}, status_code=400)
+    if total_mode not in SPELL_TOTAL_MODES:
+        return JSONResponse({"status": "error", "message": "total must be 'none', 'exact' or 'estimate'"}, status_code=400)
+    after = None
+    if cursor_mode and qp.get("cursor"):
+        try:
+            after = decode_cursor(qp["cursor"], sort_key)
+        except InvalidCursor as e:
+            return JSONResponse({"status": "error", "message": str(e)}, status_code=400)
+
+    def _empty(**extra):
+        if cursor_mode:
+            return {"spells": [], "limit": limit, "next_cursor": None, "has_more": False, "total": 0, **extra}
+        return {"spells": [], "page": page, "limit": limit, "total": 0, **extra}
+
+    sp_col  = get_col("spells")
+
+    # ---------------- Base query (name/category/status/favorites/creator)
+    q: dict = {}
+    if name:
+        add_name_filter(q, "spells", name)
+    if category:
+        q["category"] = category
+    if status:
+        vals = [s.strip().lower() for s in status.split(",") if s.strip()]
+        q["status"] = vals[0] if len(vals) == 1 else {"$in": vals}
+
+    if favorite:
+        try:
+            user, _ = require_user_doc(request)
+        except HTTPException as he:
+            return _empty(error=he.detail)
+        fav_ids = [str(x) for x in (user.get("favorites") or [])]
+        if not fav_ids:
+            return _empty()
+        q["id"] = {"$in": fav_ids}
+
+    if creator:
+        if creator == "self":
+            u, _ = require_auth(request, roles=["user", "moderator", "admin"])
+            q["creator"] = u
+        else:
+            _, _ = require_auth(request, roles=["moderator", "admin"])
+            q["creator"] = creator
+
+    # ---------------- School filter (denormalized, indexed school_ids)
+    catalog = get_spell_catalog()
+    target_school_ids: set[str] = set()
+    if school_id:
+        target_school_ids.add(str(school_id).strip())
+    elif school_legacy:
+        probe = str(school_legacy).strip()
+        # If it matches an ID exactly, use it; else resolve by name (exact -> contains)
+        if catalog.school(probe):
+            target_school_ids.add(probe)
+        else:
+            needle = probe.lower()
+            exact = [s.id for s in catalog.schools.values() if s.name.lower() == needle]
+            target_school_ids.update(exact or [s.id for s in catalog.schools.values() if needle in s.name.lower()])
+
+    if target_school_ids:
+        q["school_ids"] = {"$in": sorted(target_school_ids)}
+
+    # ---------------- Count + page WITH school filter applied
+    next_cursor = None
+    if cursor_mode:
+        page_q = {"$and": [q, keyset_filter(sort_key, *after)]} if after else q
+        # One extra row tells us whether another page exists without counting.
+        rows = list(sp_col.find(page_q, {"_id": 0}).sort([(sort_key, 1), ("id", 1)]).limit(limit + 1))
+        spells = rows[:limit]
+        if len(rows) > limit:
+            last = spells[-1]
+            next_cursor = encode_cursor(sort_key, last.get(sort_key), str(last.get("id")))
+        if total_mode == "estimate" and not q:
+            total = sp_col.estimated_document_count()
+        elif total_mode != "none":
+            # The collection estimate cannot account for a filter: count exactly.
+            total = sp_col.count_documents(q)
+        else:
+            total = None
+    else:
+        total  = sp_col.count_documents(q)
+        cursor = sp_col.find(q, {"_id": 0}).skip((page - 1) * limit).limit(limit)
+        spells = list(cursor)
+
+    # ---------------- Schools for display are stored on the spell; derive only for
+    # documents written before the school_ids backfill.
+    for sp in spells:
+        if "school_ids" not in sp:
+            sp.update(spell_school_fields(sp.get("effects"), catalog))
+
+    if cursor_mode:
+        return FastJSONResponse({"spells": spells, "limit": limit, "next_cursor": next_cursor, "has_more": next_cursor is not None, "total": total})
+    return FastJSONResponse({"spells": spells, "page": page, "limit": limit, "total": total})
+
+@router.get("/spells/{spell_id}")
+def get_spell(spell_id: str):
+    doc = get_col("spells").find_one({"id": spell_id}, {"_id": 0})
+    if not doc:
+        raise HTTPException(404, f"Spell {spell_id} not found")
+    return {"spell": doc}
+
+@router.put("/spells/{spell_id}")
+def update_spell(spell_id: str, request: Request, body: Any = Depends(json_body)):
+    # Auth & authorization checks
+    try:
+        username, role = require_auth(request, roles=["user", "moderator", "admin"])
+    except Exception as e:
+        return JSONResponse({"status": "error", "message": str(e)}, status_code=401)
+
+    before = get_col("spells").find_one({"id": spell_id})
+    if not before:
+        return JSONResponse({"status": "error", "message": f"Spell {spell_id} not found"}, status_code=404)
+
+    # Owner can edit only if not approved (not green)
+    if role == "user":
+        if before.get("creator") != username:
+            return JSONResponse({"status": "error", "message": "Not your spell"}, status_code=403)
+        if (before.get("status") or "").lower() == "green":
+            return JSONResponse({"status": "error", "message": "Approved spells are read-only; use clone from template"}, status_code=403)
+
+    # Parse payload and recompute costs (status is NOT changed here)
+    if body is None:
+        return JSONResponse({"status": "error", "message": "Invalid JSON body"}, status_code=400)
+
+    try:
+        name        = (body.get("name") or before.get("name","Unnamed Spell")).strip()
+        activation  = body.get("activation") or before.get("activation","Action")
+        try:
+            range_val = int(body.get("range", before.get("range", 0)))
+        except Exception:
+            return JSONResponse({"status":"error","message":"range must be an integer"}, status_code=400)
+        aoe_val     = body.get("aoe") or before.get("aoe","A Square")
+        try:
+            duration  = int(body.get("duration", before.get("duration", 1)))
+        except Exception:
+            return JSONResponse({"status":"error","message":"duration must be an integer"}, status_code=400)
+
+        effect_ids = [str(e).strip() for e in (body.get("effects") or before.get("effects") or []) if str(e).strip()]
+        catalog, missing = _catalog_with_effects(effect_ids)
+        if missing:
+            return JSONResponse({"status":"error","message":f"Unknown effect id(s): {', '.join(missing)}"}, status_code=400)
+
+        cc = compute_spell_costs(activation, range_val, aoe_val, duration, effect_ids, catalog=catalog)
+
+        updates = {
+            "name": name,
+            "name_key": norm_key(name),
+            "activation": activation,
+            "range": range_val,
+            "aoe": aoe_val,
+            "duration": duration,
+            "effects": effect_ids,
+            "mp_cost": cc["mp_cost"],
+            "en_cost": cc["en_cost"],
+            "category": cc["category"],
+            "spell_type": body.get("spell_type") or before.get("spell_type") or "Simple",
+            **spell_school_fields(effect_ids, catalog),
+            # DO NOT touch status here (moderation workflow)
+        }
+        if "effects_meta" in body:
+            updates["effects_meta"] = _normalize_effects_meta(effect_ids, body.get("effects_meta"))
+
+        unset_fields = {}
+        avatar_key, avatar_unset = _avatar_field(body)
+        if avatar_key:
+            updates["default_avatar"] = avatar_key
+        elif avatar_unset:
+            unset_fields["default_avatar"] = ""
+
+        ops = {"$set": updates}
+        if unset_fields:
+            ops["$unset"] = unset_fields
+        r = get_col("spells").update_one({"id": spell_id}, ops, upsert=False)
+        if r.matched_count == 0:
+            return JSONResponse({"status": "error", "message": f"Spell {spell_id} not found"}, status_code=404)
+        touch_name_index("spells", [spell_id])
+
+        after = get_col("spells").find_one({"id": spell_id}, {"_id": 0})
+
+        try:
+            action = "spell.update.admin" if role in ("admin","moderator") else "spell.update.user"
+            write_audit(action, username, spell_id, {k: before.get(k) for k in ("name","activation","range","aoe","duration","effects","mp_cost","en_cost","category","spell_type","status","creator")}, after)
+        except Exception:
+            pass
+
+        return {"status": "success", "id": spell_id, "spell": after}
+
+    except Exception as e:
+        logger.exception("PUT /spells/%s failed", spell_id)
+        return JSONResponse({"status": "error", "message": f"{type(e).__name__}: {e}"}, status_code=500)
+
+@router.delete("/spells/{spell_id}")
+def delete_spell(spell_id: str, request: Request):
+    try:
+        require_auth(request, ["admin", "moderator"])
+        get_col("spells").delete_one({"id": spell_id})
+        touch_name_index("spells", [spell_id])
+        return {"status": "success", "deleted": spell_id}
+    except Exception as e:
+        return {"status": "error", "message": str(e)}
+
+@router.post("/spells/{spell_id}/clone")
+def clone_from_template(spell_id: str, request: Request):
+    try:
+        username, _ = require_auth(request, roles=["user", "moderator", "admin"])
+    except Exception as e:
+        return JSONResponse({"status": "error", "message": str(e)}, status_code=401)
+
+    col = get_col("spells")
+    base = col.find_one({"id": spell_id}, {"_id": 0})
+    if not base:
+        return JSONResponse({"status": "error", "message": "Not found"}, status_code=404)
+
+    # (optionally require base to be green)
+    # if (base.get("status") or "").lower() != "green":
+    #     return JSONResponse({"status": "error", "message": "Only approved (green) spells can be used as template"}, status_code=403)
+
+    new_id = next_id_str("spells", padding=4)
+    new_doc = {
+        "id": new_id,
+        "name": f"{base.get('name','Spell')} (copy)",
+        "name_key": norm_key(f"{base.get('name','Spell')} (copy)"),
+        "activation": base.get("activation","Action"),
+        "range": int(base.get("range",0)),
+        "aoe": base.get("aoe","A Square"),
+        "duration": int(base.get("duration",1)),
+        "effects": [str(x) for x in (base.get("effects") or [])],
+        "effects_meta": base.get("effects_meta") or [],
+        "mp_cost": int(base.get("mp_cost",0)),
+        "en_cost": int(base.get("en_cost",0)),
+        "category": base.get("category",""),
+        "spell_type": base.get("spell_type") or "Simple",
+        "status": "yellow",              # new draft
+        "creator": username,
+        "created_at": datetime.datetime.utcnow().isoformat() + "Z",
+    }
+    new_doc.update(spell_school_fields(new_doc["effects"]))
+    get_col("spells").insert_one(dict(new_doc))
+    touch_name_index("spells", [new_id])
+
+    try:
+        write_audit("spell.clone.user", username, new_id, {"from": spell_id}, {"status": "yellow"})
+    except Exception:
+        pass
+
+    return {"status": "success", "id": new_id, "spell": new_doc}
+
+
+COSTS_BATCH_MAX = 1000
+
+def _cost_args_from_body(body: dict) -> dict:
+    """Coerce a /costs payload into compute_spell_costs kwargs (ValueError on bad ints)."""
+    try:
+        range_val    = int(body.get("range", 0))
+        duration_val = int(body.get("duration", 1))
+    except Exception:
+        raise ValueError("range/duration must be integers")
+    return {
+        "activation": body.get("activation") or "Action",
+        "range": range_val,
+        "aoe": body.get("aoe") or "A Square",
+        "duration": duration_val,
+        "effects": [str(e).strip() for e in (body.get("effects") or []) if str(e).strip()],
+        "range_type": (body.get("range_type") or "").strip().upper() or None,
+        "aoe_type": (body.get("aoe_type") or "").strip().upper() or None,
+    }
+
+def _costs_view(cc: dict) -> dict:
+    return {
+        "mp_cost": cc["mp_cost"],
+        "en_cost": cc["en_cost"],
+        "category": cc["category"],
+        "mp_to_next_category": cc["mp_to_next_category"],
+        "breakdown": cc["breakdown"],
+    }
+
+@router.post("/costs")
+def get_costs(request: Request, body: Any = Depends(json_body)):
+    if body is None:
+        return JSONResponse({"status": "error", "message": "Invalid JSON"}, status_code=400)
+
+    try:
+        args = _cost_args_from_body(body)
+    except ValueError as e:
+        return JSONResponse({"status": "error", "message": str(e)}, status_code=400)
+
+    cc = compute_spell_costs(
+        args["activation"], args["range"], args["aoe"], args["duration"], args["effects"],
+        range_type=args["range_type"], aoe_type=args["aoe_type"]
+    )
+    return _costs_view(cc)
+
+@router.post("/costs/batch")
+def get_costs_batch(request: Request, body: Any = Depends(json_body)):
+    """
+    Evaluate many cost configurations in one call.
+    Body: {"items": [<same payload as /costs>, ...]} (a bare list is accepted too).
+    Results keep the request order; invalid items get an error entry instead of failing the batch.
+    """
+    if body is None:
+        return JSONResponse({"status": "error", "message": "Invalid JSON"}, status_code=400)
+
+    items = body.get("items") if isinstance(body, dict) else body
+    if not isinstance(items, list):
+        return JSONResponse({"status": "error", "message": "items must be a list"}, status_code=400)
+    if len(items) > COSTS_BATCH_MAX:
+        return JSONResponse({"status": "error", "message": f"At most {COSTS_BATCH_MAX} items per batch"}, status_code=400)
+
+    results: list[dict | None] = [None] * len(items)
+    valid_idx: list[int] = []
+    valid_args: list[dict] = []
+    for idx, raw in enumerate(items):
+        if not isinstance(raw, dict):
+            results[idx] = {"index": idx, "status": "error", "message": "item must be an object"}
+            continue
+        try:
+            valid_args.append(_cost_args_from_body(raw))
+            valid_idx.append(idx)
+        except ValueError as e:
+            results[idx] = {"index": idx, "status": "error", "message": str(e)}
+
+    for idx, cc in zip(valid_idx, compute_spell_costs_batch(valid_args)):
+        results[idx] = {"index": idx, "status": "success", **_costs_view(cc)}
+
+    return {"status": "success", "count": len(results), "results": results}
+
+@router.post("/submit_spell")
+def submit_spell(request: Request, body: Any = Depends(json_body)):
+    # 🔐 must be logged in (user/mod/admin)
+    try:
+        username, _role = require_auth(request, roles=["user", "moderator", "admin"])
+    except Exception as e:
+        return JSONResponse({"status": "error", "message": str(e)}, status_code=401)
+
+    if body is None:
+        return JSONResponse({"status": "error", "message": "Invalid JSON"}, status_code=400)
+
+    try:
+        name        = (body.get("name") or "Unnamed Spell").strip()
+        activation  = body.get("activation") or "Action"
+        try:
+            range_val = int(body.get("range", 0))
+        except Exception:
+            return JSONResponse({"status": "error", "message": "range must be an integer"}, status_code=400)
+
+        aoe_val = body.get("aoe") or "A Square"
+        try:
+            duration = int(body.get("duration", 1))
+        except Exception:
+            return JSONResponse({"status": "error", "message": "duration must be an integer"}, status_code=400)
+
+        effect_ids = [str(e).strip() for e in (body.get("effects") or []) if str(e).strip()]
+        effects_meta = _normalize_effects_meta(effect_ids, body.get("effects_meta"))
+
+        catalog, missing = _catalog_with_effects(effect_ids)
+        if missing:
+            return JSONResponse({"status": "error", "message": f"Unknown effect id(s): {', '.join(missing)}"}, status_code=400)
+
+        if not effect_ids:
+            return JSONResponse({"status": "error", "message": "At least one effect is required."}, status_code=400)
+
+        cc  = compute_spell_costs(activation, range_val, aoe_val, duration, effect_ids, catalog=catalog)
+        sig = spell_sig(activation, range_val, aoe_val, duration, effect_ids)
+
+        conflict = get_col("spells").find_one({"sig_v1": sig}, {"_id": 0, "id": 1, "name": 1})
+        if conflict:
+            return JSONResponse(
+                {"status": "error",
+                 "message": f"Another spell with identical parameters already exists (id {conflict.get('id')}, name '{conflict.get('name','')}')."},
+                status_code=409
+            )
+
+        sid = next_id_str("spells", padding=4)
+        doc = {
+            "id": sid,
+            "name": name,
+            "name_key": norm_key(name),
+            "sig_v1": sig,
+            "activation": activation,
+            "range": range_val,
+            "aoe": aoe_val,
+            "duration": duration,
+            "effects": effect_ids,
+            "effects_meta": effects_meta,
+            "mp_cost": cc["mp_cost"],
+            "en_cost": cc["en_cost"],
+            "category": cc["category"],
+            **spell_school_fields(effect_ids, catalog),
+            "spell_type": body.get("spell_type") or "Simple",
+            "status": "yellow",          # pending review
+            "creator": username,         # ← track owner
+            "created_at": datetime.datetime.utcnow().isoformat() + "Z",
+        }
+        spell_avatar, _ = _avatar_field(body)
+        if spell_avatar:
+            doc["default_avatar"] = spell_avatar
+
+        get_col("spells").insert_one(dict(doc))
+        touch_name_index("spells", [sid])
+
+        try:
+            write_audit("spell.create", username, sid, None, {"status": "yellow"})
+        except Exception:
+            pass
+
+        return {"status": "success", "id": sid, "spell": doc}
+
+    except Exception as e:
+        logger.exception("POST /submit_spell failed")
+        return JSONResponse({"status": "error", "message": f"{type(e).__name__}: {e}"}, status_code=500)
+
+# ---------- Favorites ----------
+@router.get("/favorites/ids")
+def favorites_ids(request: Request):
+    user, _ = require_user_doc(request)
+    ids = [str(x) for x in (user.get("favorites") or [])]
+    return {"status": "success", "ids": ids}
+
+@router.get("/favorites")
+def favorites_list(request: Request):
+    user, _ = require_user_doc(request)
+    fav = [str(x) for x in (user.get("favorites") or [])]
+    if not fav:
+        return {"status": "success", "spells": []}
+    spells = list(get_col("spells").find({"id": {"$in": fav}}, {"_id": 0}))
+    return {"status": "success", "spells": spells}
+
+@router.post("/favorites/{spell_id}")
+def favorites_add(spell_id: str, request: Request):
+    user, _ = require_user_doc(request)
+    get_col("users").update_one(
+        {"_id": user["_id"]},
+        {"$addToSet": {"favorites": str(spell_id)}}
+    )
+    return {"status": "success", "id": spell_id, "action": "added"}
+
+@router.delete("/favorites/{spell_id}")
+def favorites_remove(spell_id: str, request: Request):
+    user, _ = require_user_doc(request)
+    get_col("users").update_one(
+        {"_id": user["_id"]},
+        {"$pull": {"favorites": str(spell_id)}}
+    )
+    return {"status": "success", "id": spell_id, "action": "removed"}
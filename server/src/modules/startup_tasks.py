@@ -0,0 +1,154 @@
+from __future__ import annotations
+
+import datetime
+import os
+import socket
+import time
+from typing import Callable, NamedTuple
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from db_mongo import SCHEMA_VERSION, ensure_indexes, get_col, sync_counters
+from server.src.modules.logging_helpers import logger
+from settings import settings
+
+SCHEMA_META_COL = "schema_meta"
+STARTUP_MODES = ("auto", "always", "skip")
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+_POLL_SECONDS = 0.5
+
+
+def _now_iso(offset_seconds: float = 0) -> str:
+    ts = datetime.datetime.utcnow() + datetime.timedelta(seconds=offset_seconds)
+    return ts.isoformat() + "Z"
+
+
+class StartupTask(NamedTuple):
+    name: str
+    version: str
+    fn: Callable[[], None]
+    critical: bool = True
+
+
+def _claim(task: StartupTask, lease_seconds: int) -> bool:
+    """Take the task's lease unless it is already current or another worker holds it."""
+    now = _now_iso()
+    try:
+        doc = get_col(SCHEMA_META_COL).find_one_and_update(
+            {
+                "_id": task.name,
+                "version": {"$ne": task.version},
+                "$or": [{"lease_until": {"$exists": False}}, {"lease_until": None}, {"lease_until": {"$lt": now}}],
+            },
+            {"$set": {"lease_until": _now_iso(lease_seconds), "lease_owner": WORKER_ID}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+    except DuplicateKeyError:
+        return False
+    return bool(doc and doc.get("lease_owner") == WORKER_ID)
+
+
+def _is_current(task: StartupTask) -> bool:
+    doc = get_col(SCHEMA_META_COL).find_one({"_id": task.name}, {"version": 1})
+    return bool(doc and doc.get("version") == task.version)
+
+
+def _stamp(task: StartupTask) -> None:
+    get_col(SCHEMA_META_COL).update_one(
+        {"_id": task.name},
+        {
+            "$set": {"version": task.version, "applied_at": _now_iso(), "applied_by": WORKER_ID},
+            "$unset": {"lease_until": "", "lease_owner": ""},
+        },
+        upsert=True,
+    )
+
+
+def run_once(task: StartupTask, lease_seconds: int | None = None, wait_seconds: int | None = None) -> bool:
+    """
+    Run `task.fn` unless `schema_meta` already records `task.version`. Across
+    workers only the lease holder runs it; the others wait (up to
+    STARTUP_WAIT_SECONDS) for the stamp, and take over if the lease expires.
+    Returns True when this process ran the task.
+    """
+    lease_seconds = lease_seconds or settings.startup_lease_seconds
+    deadline = time.monotonic() + (wait_seconds or settings.startup_wait_seconds)
+    while True:
+        if _is_current(task):
+            return False
+        if _claim(task, lease_seconds):
+            break
+        if time.monotonic() >= deadline:
+            logger.warning("Startup task %s is still held by another worker; continuing without it", task.name)
+            return False
+        time.sleep(_POLL_SECONDS)
+
+    col = get_col(SCHEMA_META_COL)
+    started = time.monotonic()
+    try:
+        task.fn()
+    except Exception:
+        col.update_one({"_id": task.name, "lease_owner": WORKER_ID}, {"$unset": {"lease_until": "", "lease_owner": ""}})
+        raise
+    _stamp(task)
+    logger.info("Startup task %s@%s done in %.2fs", task.name, task.version, time.monotonic() - started)
+    return True
+
+
+def default_tasks() -> list[StartupTask]:
+    from server.src.modules.audit_logs import AUDIT_SCHEMA_VERSION, migrate_audit_log, retention_days
+    from server.src.modules.spell_helpers import backfill_spell_name_keys
+    # Imported here: wiki_repo pulls in the wiki service stack.
+    from server.src.modules.wiki_config import get_wiki_settings
+    from server.src.modules.wiki_repo import WIKI_SCHEMA_VERSION, ensure_wiki_collections_and_indexes
+
+    # Counters only lag behind ids after out-of-band imports, so they are
+    # synced once per DEPLOY_ID. Without one, every boot syncs.
+    deploy_id = settings.deploy_id.strip()
+    tasks = [
+        StartupTask("core.indexes", str(SCHEMA_VERSION), ensure_indexes),
+        StartupTask("core.counters", f"deploy:{deploy_id}" if deploy_id else "", sync_counters),
+        # Re-runs when AUDIT_RETENTION_DAYS changes, to rebuild the TTL index.
+        StartupTask("audit.schema", f"{AUDIT_SCHEMA_VERSION}:ttl={retention_days()}", migrate_audit_log, critical=False),
+        # `sort=name` spell cursors need a string name_key on every spell.
+        StartupTask("spells.name_keys", "1", backfill_spell_name_keys, critical=False),
+    ]
+    if get_wiki_settings().enabled:
+        tasks.append(StartupTask("wiki.schema", str(WIKI_SCHEMA_VERSION), ensure_wiki_collections_and_indexes, critical=False))
+    return tasks
+
+
+def run_startup_tasks(mode: str | None = None, tasks: list[StartupTask] | None = None) -> dict[str, str]:
+    """
+    STARTUP_TASKS_MODE:
+      auto   - version-stamped and leased (default)
+      always - run everything on every boot, ignoring stamps
+      skip   - run nothing (a release step runs scripts/startup_tasks.py)
+    """
+    mode = (mode or settings.startup_tasks_mode).strip().lower()
+    if mode not in STARTUP_MODES:
+        raise RuntimeError(f"STARTUP_TASKS_MODE must be one of {', '.join(STARTUP_MODES)}")
+    outcome: dict[str, str] = {}
+    for task in tasks if tasks is not None else default_tasks():
+        if mode == "skip":
+            outcome[task.name] = "skipped"
+            continue
+        try:
+            if mode == "always" or not task.version:
+                task.fn()
+                if task.version:
+                    _stamp(task)
+                ran = True
+            else:
+                ran = run_once(task)
+        except Exception:
+            if task.critical:
+                raise
+            logger.exception("Startup task %s failed", task.name)
+            outcome[task.name] = "failed"
+            continue
+        outcome[task.name] = "ran" if ran else "current"
+    return outcome
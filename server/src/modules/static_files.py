@@ -0,0 +1,97 @@
+from __future__ import annotations
+
+import os
+import re
+from mimetypes import guess_type
+from typing import Optional
+
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+from starlette.types import Scope
+
+from server.src.modules.compression import negotiate_encoding
+
+# Sibling files written by scripts/precompress_static.py, in preference order.
+PRECOMPRESSED_SUFFIXES = (("br", ".br"), ("gzip", ".gz"))
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# Vite's default asset names, `<name>-<8 char base64url hash>.<ext>`, or a hex
+# digest of 8+ chars in either case (`vendor.3f9a1c2b.js`, `app.DEADBEEF.js`).
+# A base64url hash must contain an uppercase letter or a digit so that plain
+# words such as `index-item-manager.js` are not mistaken for fingerprints.
+_HASHED_NAME = re.compile(
+    r"[-.](?:(?=[A-Za-z0-9_]{0,7}[A-Z0-9])[A-Za-z0-9_]{8}|[0-9a-fA-F]{8,64})\.[A-Za-z0-9]+$"
+)
+
+
+def is_fingerprinted(path: str) -> bool:
+    return _HASHED_NAME.search(os.path.basename(path)) is not None
+
+
+class PrecompressedStaticFiles(StaticFiles):
+    """
+    StaticFiles that serves `<file>.br` / `<file>.gz` siblings when the client
+    accepts them, and sets Cache-Control: content-hashed names are cached for a
+    year as immutable, everything else gets `cache_control` (revalidated via
+    the ETag/Last-Modified that FileResponse already sends).
+
+    Range requests always get the identity file so byte offsets stay
+    meaningful; FileResponse handles the 206 itself. Variants older than their
+    source are ignored, so a stale build never masks an edited file.
+    """
+
+    def __init__(self, *args, cache_control: str = "no-cache", **kwargs):
+        super().__init__(*args, **kwargs)
+        self.cache_control = cache_control
+
+    def _variants(self, full_path: str, source_mtime: float) -> dict[str, tuple[str, os.stat_result]]:
+        found = {}
+        for encoding, suffix in PRECOMPRESSED_SUFFIXES:
+            candidate = full_path + suffix
+            try:
+                st = os.stat(candidate)
+            except OSError:
+                continue
+            if st.st_mtime >= source_mtime:
+                found[encoding] = (candidate, st)
+        return found
+
+    def file_response(
+        self,
+        full_path,
+        stat_result: os.stat_result,
+        scope: Scope,
+        status_code: int = 200,
+    ) -> Response:
+        request_headers = Headers(scope=scope)
+        full_path = os.fspath(full_path)
+        variants = self._variants(full_path, stat_result.st_mtime)
+        encoding: Optional[str] = None
+        if variants and "range" not in request_headers:
+            encoding = negotiate_encoding(
+                request_headers.get("accept-encoding", ""),
+                candidates=[enc for enc, _ in PRECOMPRESSED_SUFFIXES if enc in variants],
+            )
+
+        if encoding is not None:
+            variant_path, variant_stat = variants[encoding]
+            media_type = guess_type(full_path)[0] or "text/plain"
+            response = FileResponse(
+                variant_path,
+                status_code=status_code,
+                stat_result=variant_stat,
+                media_type=media_type,
+                headers={"Content-Encoding": encoding},
+            )
+        else:
+            response = FileResponse(full_path, status_code=status_code, stat_result=stat_result)
+
+        if variants:
+            response.headers.add_vary_header("Accept-Encoding")
+        response.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL if is_fingerprinted(full_path) else self.cache_control
+
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        return response
@@ -0,0 +1,22 @@
+import datetime
+
+from db_mongo import get_col, next_id_str
+
+
+def _now_iso():
+    return datetime.datetime.utcnow().isoformat() + "Z"
+
+def _create_pending_submission(submitter: str, role: str, sub_type: str, payload: dict, kind: str | None = None) -> dict:
+    doc = {
+        "id": next_id_str("pending", padding=5),
+        "type": sub_type,
+        "kind": kind or "",
+        "status": "pending",
+        "payload": payload,
+        "submitter": submitter,
+        "submitter_role": role,
+        "created_at": _now_iso(),
+        "updated_at": _now_iso(),
+    }
+    get_col("pending_submissions").insert_one(dict(doc))
+    return {k: v for k, v in doc.items() if k != "_id"}
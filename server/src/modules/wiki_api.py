@@ -8,7 +8,7 @@ from pydantic import BaseModel
 from pymongo.errors import DuplicateKeyError
 
 from db_mongo import get_col
-from server.src.modules.wiki_auth import require_wiki_admin, require_wiki_editor, require_wiki_viewer
+from server.src.modules.wiki_auth import invalidate_wiki_role, require_wiki_admin, require_wiki_editor, require_wiki_viewer
 from server.src.modules.wiki_repo import WikiMongoRepo
 from server.src.modules.wiki_service import (
     can_edit_page,
@@ -280,7 +280,7 @@ def _can_edit_with_auth(repo: WikiMongoRepo, auth: dict[str, Any], page: dict[st
 
 
 @router.get("/categories", response_model=list[WikiCategoryOut])
-async def list_categories(auth: dict[str, Any] = Depends(require_wiki_viewer)):
+def list_categories(auth: dict[str, Any] = Depends(require_wiki_viewer)):
     _ = auth
     try:
         return [_category_to_out(row) for row in _repo().list_categories()]
@@ -290,7 +290,7 @@ async def list_categories(auth: dict[str, Any] = Depends(require_wiki_viewer)):
 
 
 @router.post("/categories", response_model=WikiCategoryOut)
-async def create_category(
+def create_category(
     payload: WikiCategoryPayload,
     auth: dict[str, Any] = Depends(require_wiki_admin),
 ):
@@ -321,7 +321,7 @@ async def create_category(
 
 
 @router.put("/categories/{category_id}", response_model=WikiCategoryOut)
-async def update_category(
+def update_category(
     category_id: str,
     payload: WikiCategoryUpdatePayload,
     auth: dict[str, Any] = Depends(require_wiki_admin),
@@ -350,7 +350,7 @@ async def update_category(
 
 
 @router.delete("/categories/{category_id}")
-async def delete_category(
+def delete_category(
     category_id: str,
     auth: dict[str, Any] = Depends(require_wiki_admin),
 ):
@@ -363,7 +363,7 @@ async def delete_category(
 
 
 @router.get("/templates", response_model=list[WikiTemplateOut])
-async def list_templates(auth: dict[str, Any] = Depends(require_wiki_viewer)):
+def list_templates(auth: dict[str, Any] = Depends(require_wiki_viewer)):
     _ = auth
     try:
         return [_template_to_out(row) for row in _repo().list_templates()]
@@ -373,7 +373,7 @@ async def list_templates(auth: dict[str, Any] = Depends(require_wiki_viewer)):
 
 
 @router.post("/templates", response_model=WikiTemplateOut)
-async def create_template(
+def create_template(
     payload: WikiTemplatePayload,
     auth: dict[str, Any] = Depends(require_wiki_admin),
 ):
@@ -402,7 +402,7 @@ async def create_template(
 
 
 @router.put("/templates/{template_id}", response_model=WikiTemplateOut)
-async def update_template(
+def update_template(
     template_id: str,
     payload: WikiTemplateUpdatePayload,
     auth: dict[str, Any] = Depends(require_wiki_admin),
@@ -429,7 +429,7 @@ async def update_template(
 
 
 @router.delete("/templates/{template_id}")
-async def delete_template(
+def delete_template(
     template_id: str,
     auth: dict[str, Any] = Depends(require_wiki_admin),
 ):
@@ -441,7 +441,7 @@ async def delete_template(
 
 
 @router.get("/me")
-async def get_wiki_me(auth: dict[str, Any] = Depends(require_wiki_viewer)):
+def get_wiki_me(auth: dict[str, Any] = Depends(require_wiki_viewer)):
     return {
         "username": str(auth.get("username") or ""),
         "role": str(auth.get("role") or ""),
@@ -450,7 +450,7 @@ async def get_wiki_me(auth: dict[str, Any] = Depends(require_wiki_viewer)):
 
 
 @router.get("/settings", response_model=WikiSiteSettingsOut)
-async def get_wiki_settings_route(auth: dict[str, Any] = Depends(require_wiki_admin)):
+def get_wiki_settings_route(auth: dict[str, Any] = Depends(require_wiki_admin)):
     _ = auth
     try:
         return _site_settings_to_out(_repo().get_site_settings())
@@ -460,7 +460,7 @@ async def get_wiki_settings_route(auth: dict[str, Any] = Depends(require_wiki_ad
 
 
 @router.put("/settings", response_model=WikiSiteSettingsOut)
-async def update_wiki_settings_route(
+def update_wiki_settings_route(
     payload: WikiSiteSettingsPayload,
     auth: dict[str, Any] = Depends(require_wiki_admin),
 ):
@@ -476,7 +476,7 @@ async def update_wiki_settings_route(
 
 
 @router.get("/users", response_model=list[WikiUserRoleOut])
-async def list_wiki_users(auth: dict[str, Any] = Depends(require_wiki_admin)):
+def list_wiki_users(auth: dict[str, Any] = Depends(require_wiki_admin)):
     _ = auth
     try:
         return _list_wiki_users()
@@ -486,7 +486,7 @@ async def list_wiki_users(auth: dict[str, Any] = Depends(require_wiki_admin)):
 
 
 @router.put("/users/{username}/role", response_model=WikiUserRoleOut)
-async def update_wiki_user_role(
+def update_wiki_user_role(
     username: str,
     payload: WikiUserRolePayload,
     auth: dict[str, Any] = Depends(require_wiki_admin),
@@ -504,6 +504,7 @@ async def update_wiki_user_role(
         if not current:
             raise HTTPException(status_code=404, detail="User not found")
         users.update_one({"username": clean_username}, {"$set": {"wiki_role": clean_wiki_role}})
+        invalidate_wiki_role(clean_username)
         updated = users.find_one({"username": clean_username}, {"_id": 0, "username": 1, "role": 1, "wiki_role": 1}) or {}
     except HTTPException:
         raise
@@ -516,7 +517,7 @@ async def update_wiki_user_role(
 
 
 @router.post("/pages", response_model=WikiPageOut)
-async def create_page(
+def create_page(
     payload: WikiPagePayload,
     auth: dict[str, Any] = Depends(require_wiki_editor),
 ):
@@ -553,7 +554,7 @@ async def create_page(
 
 
 @router.get("/pages/{page_id}", response_model=WikiPageOut)
-async def get_page(page_id: str, auth: dict[str, Any] = Depends(require_wiki_viewer)):
+def get_page(page_id: str, auth: dict[str, Any] = Depends(require_wiki_viewer)):
     repo = _repo()
     page = repo.get_page_by_id(page_id)
     if not page:
@@ -564,7 +565,7 @@ async def get_page(page_id: str, auth: dict[str, Any] = Depends(require_wiki_vie
 
 
 @router.put("/pages/{page_id}", response_model=WikiPageOut)
-async def update_page(
+def update_page(
     page_id: str,
     payload: WikiPagePayload,
     auth: dict[str, Any] = Depends(require_wiki_editor),
@@ -612,7 +613,7 @@ async def update_page(
 
 
 @router.patch("/pages/{page_id}/fields", response_model=WikiPageOut)
-async def patch_page_fields(
+def patch_page_fields(
     page_id: str,
     payload: WikiFieldsPatchPayload,
     auth: dict[str, Any] = Depends(require_wiki_editor),
@@ -634,7 +635,7 @@ async def patch_page_fields(
 
 
 @router.delete("/pages/{page_id}")
-async def delete_page(
+def delete_page(
     page_id: str,
     auth: dict[str, Any] = Depends(require_wiki_editor),
 ):
@@ -655,7 +656,7 @@ async def delete_page(
 
 
 @router.put("/pages/{page_id}/acl", response_model=WikiPageOut)
-async def update_page_acl(
+def update_page_acl(
     page_id: str,
     payload: WikiAclPayload,
     auth: dict[str, Any] = Depends(require_wiki_admin),
@@ -679,7 +680,7 @@ async def update_page_acl(
 
 
 @router.put("/pages/{page_id}/editors", response_model=WikiPageOut)
-async def update_page_editors(
+def update_page_editors(
     page_id: str,
     payload: WikiPageEditorsPayload,
     auth: dict[str, Any] = Depends(require_wiki_admin),
@@ -698,7 +699,7 @@ async def update_page_editors(
 
 
 @router.get("/pages", response_model=WikiListResponse)
-async def list_pages(
+def list_pages(
     query: str | None = Query(default=None),
     category_id: str | None = Query(default=None),
     entity_type: str | None = Query(default=None),
@@ -733,7 +734,7 @@ async def list_pages(
 
 
 @router.get("/pages/slug/{slug}", response_model=WikiPageOut)
-async def get_page_by_slug(slug: str, auth: dict[str, Any] = Depends(require_wiki_viewer)):
+def get_page_by_slug(slug: str, auth: dict[str, Any] = Depends(require_wiki_viewer)):
     repo = _repo()
     normalized = resolve_slug(slug, slug)
     page = repo.get_page_by_slug(normalized)
@@ -745,7 +746,7 @@ async def get_page_by_slug(slug: str, auth: dict[str, Any] = Depends(require_wik
 
 
 @router.get("/resolve")
-async def resolve_pages(
+def resolve_pages(
     query: str = Query(..., min_length=1),
     limit: int = Query(default=10, ge=1),
     auth: dict[str, Any] = Depends(require_wiki_viewer),
@@ -759,7 +760,7 @@ async def resolve_pages(
 
 
 @router.post("/pages/{page_id}/links/rebuild")
-async def rebuild_links(page_id: str, auth: dict[str, Any] = Depends(require_wiki_editor)):
+def rebuild_links(page_id: str, auth: dict[str, Any] = Depends(require_wiki_editor)):
     repo = _repo()
     page = repo.get_page_by_id(page_id)
     if not page:
@@ -775,7 +776,7 @@ async def rebuild_links(page_id: str, auth: dict[str, Any] = Depends(require_wik
 
 
 @router.get("/pages/{page_id}/links")
-async def list_links(page_id: str, auth: dict[str, Any] = Depends(require_wiki_viewer)):
+def list_links(page_id: str, auth: dict[str, Any] = Depends(require_wiki_viewer)):
     repo = _repo()
     page = repo.get_page_by_id(page_id)
     if not page:
@@ -790,7 +791,7 @@ async def list_links(page_id: str, auth: dict[str, Any] = Depends(require_wiki_v
 
 
 @router.get("/pages/{page_id}/backlinks")
-async def list_backlinks(page_id: str, auth: dict[str, Any] = Depends(require_wiki_viewer)):
+def list_backlinks(page_id: str, auth: dict[str, Any] = Depends(require_wiki_viewer)):
     repo = _repo()
     page = repo.get_page_by_id(page_id)
     if not page:
@@ -805,7 +806,7 @@ async def list_backlinks(page_id: str, auth: dict[str, Any] = Depends(require_wi
 
 
 @router.get("/pages/{page_id}/context")
-async def get_page_context(page_id: str, auth: dict[str, Any] = Depends(require_wiki_viewer)):
+def get_page_context(page_id: str, auth: dict[str, Any] = Depends(require_wiki_viewer)):
     repo = _repo()
     page = repo.get_page_by_id(page_id)
     if not page:
@@ -825,7 +826,7 @@ async def get_page_context(page_id: str, auth: dict[str, Any] = Depends(require_
 
 
 @router.post("/pages/{page_id}/revisions", response_model=WikiRevisionOut)
-async def create_revision(page_id: str, auth: dict[str, Any] = Depends(require_wiki_editor)):
+def create_revision(page_id: str, auth: dict[str, Any] = Depends(require_wiki_editor)):
     repo = _repo()
     page = repo.get_page_by_id(page_id)
     if not page:
@@ -841,7 +842,7 @@ async def create_revision(page_id: str, auth: dict[str, Any] = Depends(require_w
 
 
 @router.get("/pages/{page_id}/revisions", response_model=list[WikiRevisionOut])
-async def list_revisions(page_id: str, auth: dict[str, Any] = Depends(require_wiki_viewer)):
+def list_revisions(page_id: str, auth: dict[str, Any] = Depends(require_wiki_viewer)):
     repo = _repo()
     page = repo.get_page_by_id(page_id)
     if not page:
@@ -857,7 +858,7 @@ async def list_revisions(page_id: str, auth: dict[str, Any] = Depends(require_wi
 
 
 @router.post("/pages/{page_id}/revisions/{revision_id}/restore", response_model=WikiPageOut)
-async def restore_revision(
+def restore_revision(
     page_id: str,
     revision_id: str,
     auth: dict[str, Any] = Depends(require_wiki_editor),
@@ -883,7 +884,7 @@ async def restore_revision(
 
 
 @router.get("/pages/{page_id}/relations")
-async def list_relations(page_id: str, auth: dict[str, Any] = Depends(require_wiki_viewer)):
+def list_relations(page_id: str, auth: dict[str, Any] = Depends(require_wiki_viewer)):
     repo = _repo()
     page = repo.get_page_by_id(page_id)
     if not page:
@@ -898,7 +899,7 @@ async def list_relations(page_id: str, auth: dict[str, Any] = Depends(require_wi
 
 
 @router.post("/pages/{page_id}/relations")
-async def create_relation(
+def create_relation(
     page_id: str,
     payload: WikiRelationPayload,
     auth: dict[str, Any] = Depends(require_wiki_editor),
@@ -926,7 +927,7 @@ async def create_relation(
 
 
 @router.delete("/relations/{relation_id}")
-async def delete_relation(
+def delete_relation(
     relation_id: str,
     auth: dict[str, Any] = Depends(require_wiki_editor),
 ):
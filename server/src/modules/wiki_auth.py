@@ -1,9 +1,13 @@
 from __future__ import annotations
 
+import threading
+import time
+from collections import OrderedDict
+
 from fastapi import HTTPException, Request
 
+from db_mongo import get_col
 from server.src.modules.authentification_helpers import (
-    find_user,
     get_auth_token,
     get_session_identity,
 )
@@ -13,6 +17,46 @@ from server.src.modules.wiki_service import (
     resolve_wiki_role,
     role_at_least,
 )
+from settings import settings
+
+
+# session token -> (expires_at, username, app_role, wiki_role). Entries are
+# dropped by invalidate_wiki_role() on this worker; other workers see a role
+# change once WIKI_ROLE_CACHE_SECONDS have passed.
+_ROLE_CACHE: OrderedDict[str, tuple[float, str, str, str]] = OrderedDict()
+_ROLE_CACHE_LOCK = threading.Lock()
+_ROLE_CACHE_SECONDS = settings.wiki_role_cache_seconds
+_ROLE_CACHE_SIZE = settings.wiki_role_cache_size
+
+
+def invalidate_wiki_role(username: str | None = None) -> None:
+    """Forget cached wiki roles for `username` (everyone when None)."""
+    with _ROLE_CACHE_LOCK:
+        if username is None:
+            _ROLE_CACHE.clear()
+            return
+        for token in [t for t, entry in _ROLE_CACHE.items() if entry[1] == username]:
+            del _ROLE_CACHE[token]
+
+
+def _wiki_role_for(token: str, username: str, app_role: str) -> str:
+    now = time.monotonic()
+    with _ROLE_CACHE_LOCK:
+        hit = _ROLE_CACHE.get(token)
+        # The effective app role changes without a new token when an admin
+        # toggles their privileges, so it is part of the match.
+        if hit is not None and hit[0] > now and hit[1] == username and hit[2] == app_role:
+            _ROLE_CACHE.move_to_end(token)
+            return hit[3]
+    user_doc = get_col("users").find_one({"username": username}, {"_id": 0, "wiki_role": 1}) or {}
+    wiki_role = normalize_wiki_role(resolve_wiki_role(app_role, user_doc))
+    if _ROLE_CACHE_SECONDS > 0:
+        with _ROLE_CACHE_LOCK:
+            _ROLE_CACHE[token] = (now + _ROLE_CACHE_SECONDS, username, app_role, wiki_role)
+            _ROLE_CACHE.move_to_end(token)
+            while len(_ROLE_CACHE) > _ROLE_CACHE_SIZE:
+                _ROLE_CACHE.popitem(last=False)
+    return wiki_role
 
 
 def _resolve_wiki_identity(request: Request) -> dict[str, str | bool]:
@@ -33,8 +77,7 @@ def _resolve_wiki_identity(request: Request) -> dict[str, str | bool]:
         }
 
     username, _base_role, effective_role = identity
-    user_doc = find_user(username) or {}
-    wiki_role = normalize_wiki_role(resolve_wiki_role(effective_role, user_doc))
+    wiki_role = _wiki_role_for(token, username, effective_role)
     return {
         "username": username,
         "role": effective_role,
@@ -240,6 +240,10 @@ def _ensure_collection_with_validator(db, name: str) -> None:
             pass
 
 
+# Stamped in schema_meta by startup_tasks; raise it with any validator or index change below.
+WIKI_SCHEMA_VERSION = 1
+
+
 def ensure_wiki_collections_and_indexes() -> None:
     cfg = get_wiki_settings()
     if not cfg.enabled:
@@ -894,11 +898,17 @@ class WikiMongoRepo:
         clean_page_id = str(page.get("id") or "").strip()
         doc_json = page.get("doc_json") or {"type": "doc", "content": []}
         extracted = extract_internal_links(doc_json, clean_page_id)
-        for row in extracted:
-            if not row.get("to_page_id") and row.get("to_page_slug"):
-                target = self.pages.find_one({"slug": str(row.get("to_page_slug") or "").strip()}, {"_id": 0, "id": 1})
-                if target:
-                    row["to_page_id"] = str(target.get("id") or "").strip() or None
+        unresolved = [row for row in extracted if not row.get("to_page_id") and row.get("to_page_slug")]
+        if unresolved:
+            slugs = sorted({str(row.get("to_page_slug") or "").strip() for row in unresolved})
+            ids_by_slug = {
+                str(target.get("slug") or ""): str(target.get("id") or "").strip() or None
+                for target in self.pages.find({"slug": {"$in": slugs}}, {"_id": 0, "id": 1, "slug": 1})
+            }
+            for row in unresolved:
+                slug = str(row.get("to_page_slug") or "").strip()
+                if slug in ids_by_slug:
+                    row["to_page_id"] = ids_by_slug[slug]
         self.links.delete_many({"from_page_id": clean_page_id})
         if extracted:
             self.links.insert_many(extracted)
@@ -1,5 +1,6 @@
 from __future__ import annotations
-from dataclasses import dataclass, asdict
+from collections import ChainMap
+from dataclasses import dataclass, asdict, replace
 from typing import List, Union
 from db_mongo import get_col
 from server.src.modules.category_table import category_for_mp
@@ -8,33 +9,8 @@ from server.src.modules.cost_utils import (
 )
 from .effects import Effect
 from typing import Iterable, Tuple, Dict, Any
-from server.src.modules.cost_tables import (
-    ACTIVATION_COSTS, RANGE_COSTS, AOE_COSTS, DURATION_COSTS
-)
-from server.src.modules.category_table import category_for_mp
-from server.src.objects.schools import load_school
-
-TYPE_ORDER = {"A": 1, "B": 2, "C": 3}
-
-def _dominant_type(letters: Iterable[str]) -> str:
-    best = "A"
-    for lt in letters or []:
-        up = str(lt or "A").strip().upper()[:1]
-        if TYPE_ORDER.get(up, 1) > TYPE_ORDER[best]:
-            best = up
-    return best
-
-
-def _coerce_school_id(school_field: Any) -> str | None:
-    """
-    Effects may carry a school id string or an object with .id.
-    Return '0001'… or None.
-    """
-    if not school_field:
-        return None
-    if isinstance(school_field, str):
-        return school_field
-    return getattr(school_field, "id", None)
+from server.src.modules.cost_engine import CostEngine, get_cost_engine
+from server.src.modules.spell_catalog import EffectRef, SchoolRef
 
 @dataclass
 class Spell:
@@ -93,7 +69,7 @@ class Spell:
         return (x or 0, 0)
 
     def update_cost(self):
-        self.mp_cost, self.en_cost = Spell.compute_cost(
+        self.mp_cost, self.en_cost, _ = Spell.compute_cost(
             self.range, self.aoe, self.duration, self.activation, self.effects
         )
 
@@ -105,86 +81,65 @@ class Spell:
         activation_val: str,
         effects: Iterable[Any],
     ) -> Tuple[int, int, Dict[str, Any]]:
+        """
+        Strict cost evaluation for in-memory Spell objects.
+        Delegates to the shared CostEngine so objects and routes agree; unlike
+        the routes, unknown knob values raise ValueError. Effect objects are
+        priced from their own fields (and school), ids from the catalog.
+        """
+        eff_ids = [str(getattr(eff, "id", eff)) for eff in (effects or [])]
+        engine = _engine_for(effects)
+        cc = engine.compute(activation_val, range_val, aoe_val, duration_val, eff_ids, strict=True)
 
-        # ----- gather schools for type resolution -----
-        school_objs = []
-        for eff in (effects or []):
-            sid = _coerce_school_id(getattr(eff, "school", None))
-            if sid:
-                try:
-                    school_objs.append(load_school(sid))
-                except Exception:
-                    # fail-safe: skip if not found
-                    pass
-
-        range_type = _dominant_type([getattr(s, "range_type", "A") for s in school_objs])
-        aoe_type   = _dominant_type([getattr(s, "aoe_type",   "A") for s in school_objs])
-
-        # ----- knobs from tables -----
-        try:
-            act_mp, act_en = ACTIVATION_COSTS[activation_val]
-        except KeyError:
-            raise ValueError(f"Unknown activation '{activation_val}'")
-
-        try:
-            rng_mp, rng_en = RANGE_COSTS[range_type][int(range_val)]
-        except KeyError:
-            raise ValueError(f"Invalid range '{range_val}' for type '{range_type}'")
-
-        try:
-            aoe_mp, aoe_en = AOE_COSTS[aoe_type][aoe_val]
-        except KeyError:
-            raise ValueError(f"Invalid AoE '{aoe_val}' for type '{aoe_type}'")
-
-        try:
-            dur_mp, dur_en = DURATION_COSTS[int(duration_val)]
-        except KeyError:
-            raise ValueError(f"Invalid duration '{duration_val}'")
-
-        # ----- effects -----
         eff_rows = []
-        eff_mp = eff_en = 0
-        for eff in (effects or []):
-            e_mp = int(getattr(eff, "mp_cost", 0))
-            e_en = int(getattr(eff, "en_cost", 0))
-            eff_mp += e_mp
-            eff_en += e_en
+        for eid in eff_ids:
+            ref = engine.catalog.effect(eid)
             eff_rows.append({
-                "id":   getattr(eff, "id", ""),
-                "name": getattr(eff, "name", ""),
-                "mp":   e_mp,
-                "en":   e_en,
-                "school": _coerce_school_id(getattr(eff, "school", None)) or "",
+                "id":   eid,
+                "name": ref.name if ref else "",
+                "mp":   ref.mp_cost if ref else 0,
+                "en":   ref.en_cost if ref else 0,
+                "school": ref.school if ref else "",
             })
 
-        # ----- school mix surcharge (non-upgrade schools only) -----
-        non_upgrade_ids = []
-        for s in school_objs:
-            if not getattr(s, "upgrade", False):
-                non_upgrade_ids.append(getattr(s, "id", None))
-        distinct = len({sid for sid in non_upgrade_ids if sid})
-        # At least 1 school; each extra non-upgrade school costs (+1 MP, +5 EN)
-        extra_count = max(distinct, 1) - 1
-        sch_mp, sch_en = 5 * extra_count, extra_count
-
-        # ----- totals -----
-        mp_total = act_mp + rng_mp + aoe_mp + dur_mp + eff_mp + sch_mp
-        en_total = act_en + rng_en + aoe_en + dur_en + eff_en + sch_en
-
-        breakdown = {
-            "activation": {"mp": act_mp, "en": act_en},
-            "range":      {"mp": rng_mp, "en": rng_en, "type": range_type},
-            "aoe":        {"mp": aoe_mp, "en": aoe_en, "type": aoe_type},
-            "duration":   {"mp": dur_mp, "en": dur_en},
-            "effects":    eff_rows,
-            "schools": {
-                "distinct_non_upgrade": max(distinct, 1),
-                "surcharge": {"mp": sch_mp, "en": sch_en},
-            },
-            "total": {"mp": mp_total, "en": en_total},
-            "category": category_for_mp(mp_total),
-        }
-        return mp_total, en_total, breakdown
+        breakdown = dict(cc["breakdown"])
+        breakdown["effects"] = eff_rows
+        breakdown["total"] = {"mp": cc["mp_cost"], "en": cc["en_cost"]}
+        breakdown["category"] = cc["category"]
+        return cc["mp_cost"], cc["en_cost"], breakdown
+
+
+def _engine_for(effects: Iterable[Any]) -> CostEngine:
+    """The shared engine, overlaid with any Effect objects passed in."""
+    engine = get_cost_engine()
+    local = [e for e in (effects or []) if isinstance(e, Effect)]
+    if not local:
+        return engine
+    catalog = engine.catalog
+    # Local refs shadow the shared snapshot without copying it.
+    eff_refs: dict[str, EffectRef] = {}
+    school_refs: dict[str, SchoolRef] = {}
+    for e in local:
+        school = e.school
+        sid = str(getattr(school, "id", school) or "")
+        if hasattr(school, "range_type"):
+            school_refs[sid] = SchoolRef(
+                id=sid,
+                name=str(getattr(school, "name", "") or ""),
+                school_type=str(getattr(school, "school_type", "Simple") or "Simple"),
+                range_type=str(school.range_type or "A").strip().upper()[:1] or "A",
+                aoe_type=str(getattr(school, "aoe_type", "A") or "A").strip().upper()[:1] or "A",
+                upgrade=bool(getattr(school, "upgrade", False)),
+            )
+        eff_refs[str(e.id)] = EffectRef(
+            id=str(e.id), name=e.name or "", school=sid,
+            mp_cost=int(e.mp_cost or 0), en_cost=int(e.en_cost or 0),
+        )
+    return CostEngine(replace(
+        catalog,
+        effects=ChainMap(eff_refs, catalog.effects),
+        schools=ChainMap(school_refs, catalog.schools),
+    ))
 
 
 def load_spell(id: str) -> Spell:
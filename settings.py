@@ -1,8 +1,68 @@
+from pydantic import Field
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 class Settings(BaseSettings):
     mongodb_uri: str
     jwt_secret: str | None = None
+    # Response encoding: orjson for JSON bodies, negotiated br/gzip on the wire.
+    json_fast_serializer: bool = True
+    compression_enabled: bool = True
+    compression_min_size: int = 1024
+    compression_gzip_level: int = 6
+    compression_brotli: bool = True
+    compression_brotli_quality: int = 4
+    html_brotli_quality: int = 9
+    # Static mounts: unhashed files revalidate, /assets media may be cached briefly.
+    static_cache_control: str = "no-cache"
+    media_cache_control: str = "public, max-age=86400"
+    # Per-request Mongo command accounting (/admin/metrics, Server-Timing).
+    db_metrics_enabled: bool = True
+    # Re-encodes every command and reply to size it: a debugging aid, off by default.
+    db_metrics_track_bytes: bool = False
+    db_query_budget: int = 50
+    server_timing_header: bool = True
+    # hi/lo id allocation: ids reserved per process and round-trip to `counters`.
+    # ID_BLOCK_SIZES overrides single sequences, e.g. "inventory=16,pending=8".
+    id_block_size: int = 1
+    id_block_sizes: str = ""
+    # Backends: "auto" picks the in-memory one on mongomock, Mongo otherwise.
+    session_backend: str = "auto"
+    chat_bus: str = "auto"
+    # Sessions: lifetime, and how long a worker trusts its cached lookup.
+    session_ttl_days: int = Field(30, ge=1)
+    session_cache_seconds: int = Field(5, ge=0)
+    session_cache_size: int = Field(10000, ge=1)
+    # Per-worker wiki role cache; invalidated locally on role changes.
+    wiki_role_cache_seconds: int = Field(60, ge=0)
+    wiki_role_cache_size: int = Field(10000, ge=1)
+    # Cross-worker chat fan-out and per-socket send buffer (messages).
+    chat_bus_capped_mb: int = Field(16, ge=1)
+    chat_send_queue: int = Field(256, ge=1)
+    # Batched inserts (BatchWriter): audit entries and chat messages.
+    audit_async: bool = True
+    audit_queue_size: int = Field(10000, ge=1)
+    audit_batch_size: int = Field(200, ge=1)
+    audit_flush_ms: int = Field(500, ge=1)
+    audit_retention_days: int = Field(0, ge=0)
+    chat_write_async: bool = True
+    chat_write_queue_size: int = Field(5000, ge=1)
+    chat_write_batch_size: int = Field(100, ge=1)
+    chat_write_flush_ms: int = Field(5, ge=1)
+    chat_durable: bool = False
+    # Boot-time tasks (see startup_tasks.py); DEPLOY_ID keys the counter sync.
+    startup_tasks_mode: str = "auto"
+    startup_lease_seconds: int = Field(300, ge=1)
+    startup_wait_seconds: int = Field(120, ge=1)
+    deploy_id: str = ""
+    # Thread pools and in-process caches.
+    db_max_workers: int = Field(16, ge=1)
+    jobs_max_workers: int = Field(2, ge=1)
+    jobs_stale_seconds: int = Field(120, ge=1)
+    jobs_heartbeat_seconds: float = Field(30.0, gt=0)
+    jobs_sweep_seconds: float = Field(60.0, ge=0)
+    spell_catalog_check_seconds: float = Field(5.0, ge=0)
+    name_index_check_seconds: float = Field(5.0, ge=0)
+    name_search_max_ids: int = Field(5000, ge=0)
 
     model_config = SettingsConfigDict(
         env_file=".env", 
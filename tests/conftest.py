@@ -1,6 +1,9 @@
 import os
-from contextlib import asynccontextmanager
+import threading
+from collections import Counter
+from contextlib import asynccontextmanager, contextmanager
 
+import mongomock
 import pytest
 from httpx import ASGITransport, AsyncClient
 
@@ -10,18 +13,30 @@ os.environ.setdefault("ASSETS_MAX_UPLOAD_MB", "1")
 os.environ.setdefault("WIKI_ENABLED", "true")
 os.environ.setdefault("WIKI_REQUIRE_AUTH", "true")
 
-from db_mongo import get_db
+from db_mongo import ID_ALLOCATOR, get_db
 from main import app
-from server.src.modules.authentification_helpers import SESSIONS, SESSION_ROLE_OVERRIDES
+from server.src.modules.audit_writer import AUDIT_WRITER
+from server.src.modules.campaign_chat_helpers import CHAT_WRITER
+from server.src.modules.name_search import reset_name_indexes
+from server.src.modules.session_store import SESSIONS, SESSION_ROLE_OVERRIDES
+from server.src.modules.spell_catalog import reset_spell_catalog
+from server.src.modules.wiki_auth import invalidate_wiki_role
 
 
 @pytest.fixture(autouse=True)
 def clean_state():
+    # Queued audit entries and chat messages from the previous test must not land in this one.
+    AUDIT_WRITER.flush()
+    CHAT_WRITER.flush()
     db = get_db()
     for name in db.list_collection_names():
         db.drop_collection(name)
+    ID_ALLOCATOR.reset()
     SESSIONS.clear()
     SESSION_ROLE_OVERRIDES.clear()
+    reset_spell_catalog()
+    reset_name_indexes()
+    invalidate_wiki_role()
     yield
     SESSIONS.clear()
     SESSION_ROLE_OVERRIDES.clear()
@@ -44,6 +59,76 @@ async def wiki_client(
             {"$set": {"username": username, "wiki_role": wiki_role}},
             upsert=True,
         )
+        invalidate_wiki_role(username)
     transport = ASGITransport(app=app)
     async with AsyncClient(transport=transport, base_url="http://test", headers=headers) as client:
         yield client
+
+
+# Collection methods that are one round-trip each on a real server.
+COUNTED_COLLECTION_METHODS = (
+    "find", "find_one", "find_one_and_update", "find_one_and_replace", "find_one_and_delete",
+    "insert_one", "insert_many", "update_one", "update_many", "replace_one", "delete_one", "delete_many",
+    "bulk_write", "count_documents", "estimated_document_count", "distinct", "aggregate",
+)
+
+
+class QueryCounter:
+    """
+    Counts Mongo operations issued through the collections `db_mongo.get_col`
+    and `get_db()[...]` hand out (module-level handles included). Nested calls
+    inside mongomock (find_one -> find) count once.
+    """
+
+    def __init__(self):
+        self.calls: list[tuple[str, str]] = []
+        self.active = False
+        self._lock = threading.Lock()
+        self._depth = threading.local()
+
+    def wrap(self, method_name, original):
+        counter = self
+
+        def counted(col, *args, **kwargs):
+            depth = getattr(counter._depth, "value", 0)
+            if counter.active and depth == 0:
+                with counter._lock:
+                    counter.calls.append((method_name, col.name))
+            counter._depth.value = depth + 1
+            try:
+                return original(col, *args, **kwargs)
+            finally:
+                counter._depth.value = depth
+
+        return counted
+
+    @contextmanager
+    def capture(self):
+        with self._lock:
+            self.calls = []
+        self.active = True
+        try:
+            yield self
+        finally:
+            self.active = False
+
+    @property
+    def count(self) -> int:
+        return len(self.calls)
+
+    def report(self) -> str:
+        return ", ".join(f"{method} {col} x{n}" for (method, col), n in Counter(self.calls).most_common())
+
+
+@pytest.fixture
+def db_queries(monkeypatch):
+    """
+    Usage:
+        with db_queries.capture():
+            resp = await client.get(...)
+        assert db_queries.count <= 5, db_queries.report()
+    """
+    counter = QueryCounter()
+    for name in COUNTED_COLLECTION_METHODS:
+        monkeypatch.setattr(mongomock.collection.Collection, name, counter.wrap(name, getattr(mongomock.collection.Collection, name)))
+    return counter
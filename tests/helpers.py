@@ -1,5 +1,22 @@
+from db_mongo import get_db
+
+
 async def create_page(client, title: str, slug: str):
     payload = {"title": title, "slug": slug, "doc_json": {"type": "doc", "content": []}}
     resp = await client.post("/api/wiki/pages", json=payload)
     resp.raise_for_status()
     return resp.json()
+
+
+def seed_catalog():
+    db = get_db()
+    db.schools.insert_many([
+        {"id": "0001", "name": "Fire", "school_type": "Simple", "range_type": "A", "aoe_type": "A", "upgrade": False},
+        {"id": "0002", "name": "Storm", "school_type": "Complex", "range_type": "B", "aoe_type": "C", "upgrade": False},
+        {"id": "0003", "name": "Amplify", "school_type": "Simple", "range_type": "A", "aoe_type": "A", "upgrade": True},
+    ])
+    db.effects.insert_many([
+        {"id": "0001", "name": "Burn", "school": "0001", "mp_cost": 3, "en_cost": 1},
+        {"id": "0002", "name": "Shock", "school": "0002", "mp_cost": 5, "en_cost": 2},
+        {"id": "0003", "name": "Boost", "school": "0003", "mp_cost": 2, "en_cost": 0},
+    ])
@@ -0,0 +1,237 @@
+import datetime
+import threading
+import time
+
+import pytest
+
+from db_mongo import get_db
+from server.src.modules.admin_jobs import get_job_output, register_job, resume_jobs, submit_job, sweep_jobs, wait_for_job
+from server.src.modules.audit_writer import AUDIT_WRITER
+from server.src.modules.spell_helpers import RECOMPUTE_BATCH_SIZE
+from settings import settings
+from tests.conftest import wiki_client
+from tests.helpers import seed_catalog
+
+
+def _seed_spells(count: int):
+    get_db().spells.insert_many([
+        {
+            "id": f"{i:04d}", "name": f"Spell {i}", "activation": "Action", "range": 0,
+            "aoe": "A Square", "duration": 1, "effects": ["0001"],
+            "mp_cost": 0, "en_cost": 0, "category": "",
+        }
+        for i in range(1, count + 1)
+    ])
+
+
+@pytest.mark.asyncio
+async def test_recompute_job_reports_progress_and_is_pollable():
+    seed_catalog()
+    _seed_spells(3)
+    async with wiki_client() as client:
+        resp = await client.post("/admin/spells/recompute_all")
+        assert resp.status_code == 202
+        job_id = resp.json()["job"]["id"]
+        wait_for_job(job_id)
+
+        polled = await client.get(f"/admin/jobs/{job_id}")
+        job = polled.json()["job"]
+        assert job["status"] == "succeeded"
+        assert job["progress"] == {"done": 3, "total": 3}
+        assert job["checkpoint"] == "0003"
+        assert job["result"]["changed"] == 3
+        assert "output" not in job
+
+        listed = await client.get("/admin/jobs", params={"kind": "spells.recompute_all"})
+        assert [j["id"] for j in listed.json()["jobs"]] == [job_id]
+
+        missing = await client.get("/admin/jobs/job_nope")
+        assert missing.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_jobs_require_moderator():
+    async with wiki_client(role="user") as client:
+        resp = await client.get("/admin/jobs")
+        assert resp.status_code in (401, 403)
+
+
+def test_stale_running_job_resumes_from_checkpoint():
+    seed_catalog()
+    _seed_spells(RECOMPUTE_BATCH_SIZE + 2)
+    stale = (datetime.datetime.utcnow() - datetime.timedelta(hours=1)).isoformat() + "Z"
+    # A worker died after the first page: those spells were written and reported.
+    db = get_db()
+    db.jobs.insert_one({
+        "id": "job_000001", "kind": "spells.recompute_all", "status": "running",
+        "params": {}, "created_by": "tester", "heartbeat_at": stale,
+        "progress": {"done": RECOMPUTE_BATCH_SIZE, "total": RECOMPUTE_BATCH_SIZE + 2},
+        "checkpoint": f"{RECOMPUTE_BATCH_SIZE:04d}", "attempts": 1,
+    })
+    db.job_output.insert_one({"_id": "job_000001:0000000000:000000", "job_id": "job_000001", "row": {
+        "id": "0001", "name": "Spell 1", "effects_removed": False,
+        "before": {"mp_cost": 0, "en_cost": 0, "category": ""},
+        "after": {"mp_cost": 3, "en_cost": 1, "category": "Novice"},
+    }})
+
+    assert resume_jobs() == 1
+    job = wait_for_job("job_000001")
+    assert job["status"] == "succeeded"
+    assert job["attempts"] == 2
+    assert job["progress"]["done"] == RECOMPUTE_BATCH_SIZE + 2
+    # Only the two spells past the checkpoint were recomputed on resume.
+    assert job["result"]["changed"] == 3
+    assert db.spells.find_one({"id": "0001"})["mp_cost"] == 0
+    assert db.spells.find_one({"id": f"{RECOMPUTE_BATCH_SIZE + 1:04d}"})["mp_cost"] == 3
+
+
+@pytest.mark.asyncio
+async def test_recompute_output_lives_outside_the_job_document(monkeypatch):
+    monkeypatch.setattr("server.src.modules.spell_helpers.RECOMPUTE_NOTE_SAMPLE", 1)
+    seed_catalog()
+    _seed_spells(3)
+    async with wiki_client() as client:
+        job_id = (await client.post("/admin/spells/recompute_all")).json()["job"]["id"]
+        wait_for_job(job_id)
+        output = (await client.get(f"/admin/jobs/{job_id}/output")).json()["items"]
+        assert [row["id"] for row in output] == ["0001", "0002", "0003"]
+        assert (await client.get("/admin/jobs/job_nope/output")).status_code == 404
+
+    doc = get_db().jobs.find_one({"id": job_id})
+    assert "output" not in doc
+    assert set(doc["result"]) == {"status", "changed", "total", "note"}
+    assert doc["result"]["note"].splitlines()[-1] == "… and 2 more (see the job output)."
+
+
+def test_fresh_running_job_is_left_alone():
+    now = datetime.datetime.utcnow().isoformat() + "Z"
+    get_db().jobs.insert_one({
+        "id": "job_000002", "kind": "spells.recompute_all", "status": "running",
+        "params": {}, "heartbeat_at": now, "progress": {"done": 0, "total": None},
+    })
+    assert resume_jobs() == 0
+    assert get_db().jobs.find_one({"id": "job_000002"})["status"] == "running"
+
+
+def test_running_job_heartbeats_before_its_first_progress(monkeypatch):
+    monkeypatch.setattr(settings, "jobs_heartbeat_seconds", 0.01)
+    release = threading.Event()
+
+    @register_job("tests.long_phase")
+    def _long_phase(ctx):
+        release.wait(5)
+        return {"status": "success"}
+
+    job_id = submit_job("tests.long_phase")["id"]
+    db = get_db()
+    first = None
+    for _ in range(200):
+        doc = db.jobs.find_one({"id": job_id})
+        if doc["status"] == "running":
+            first = first or doc["heartbeat_at"]
+            if doc["heartbeat_at"] != first:
+                break
+        release.wait(0.01)
+    release.set()
+    assert first is not None and doc["heartbeat_at"] > first
+    assert wait_for_job(job_id)["status"] == "succeeded"
+
+
+def test_reclaimed_job_is_not_overwritten_by_the_old_run(monkeypatch):
+    monkeypatch.setattr(settings, "jobs_heartbeat_seconds", 0.01)
+    started, release = threading.Event(), threading.Event()
+
+    @register_job("tests.slow_run")
+    def _slow_run(ctx):
+        started.set()
+        release.wait(5)
+        return {"status": "success", "run": "old"}
+
+    job_id = submit_job("tests.slow_run")["id"]
+    assert started.wait(5)
+    db = get_db()
+    # The sweep requeued it and another worker claimed and finished it.
+    db.jobs.update_one({"id": job_id}, {"$set": {"status": "succeeded", "result": {"run": "new"}, "heartbeat_at": "x"}, "$inc": {"attempts": 1}})
+    release.set()
+    # Give the old run time to reach its (now conditional) final write.
+    time.sleep(0.2)
+    doc = db.jobs.find_one({"id": job_id})
+    assert doc["result"] == {"run": "new"}
+    assert doc["attempts"] == 2
+    assert doc["heartbeat_at"] == "x"
+
+
+def test_sweep_requeues_jobs_that_go_stale_after_startup():
+    seed_catalog()
+    _seed_spells(1)
+    now = datetime.datetime.utcnow().isoformat() + "Z"
+    db = get_db()
+    db.jobs.insert_one({
+        "id": "job_000003", "kind": "spells.recompute_all", "status": "running",
+        "params": {}, "heartbeat_at": now, "progress": {"done": 0, "total": None}, "attempts": 1,
+    })
+    # The restarted worker saw a fresh heartbeat at startup...
+    assert resume_jobs() == 0
+    assert sweep_jobs() == 0
+    # ...but the owner never beats again, so a later sweep picks it up.
+    stale = (datetime.datetime.utcnow() - datetime.timedelta(hours=1)).isoformat() + "Z"
+    db.jobs.update_one({"id": "job_000003"}, {"$set": {"heartbeat_at": stale}})
+    assert sweep_jobs() == 1
+    job = wait_for_job("job_000003")
+    assert job["status"] == "succeeded"
+    assert job["attempts"] == 2
+
+
+@pytest.mark.asyncio
+async def test_effect_dedupe_runs_as_job():
+    seed_catalog()
+    db = get_db()
+    db.effects.insert_one({"id": "0004", "name": "Burn", "description": "", "school": "0001", "mp_cost": 3, "en_cost": 1})
+    db.effects.update_one({"id": "0001"}, {"$set": {"description": ""}})
+    db.spells.insert_one({"id": "0001", "name": "S", "effects": ["0004", "0001"]})
+    async with wiki_client() as client:
+        preview = await client.get("/admin/effects/duplicates")
+        assert preview.json()["total_groups"] == 1
+
+        resp = await client.post("/admin/effects/duplicates", json={"apply": True})
+        assert resp.status_code == 202
+        job = wait_for_job(resp.json()["job"]["id"])
+    assert job["status"] == "succeeded", job
+    assert job["result"]["deleted_effects"] == 1
+    assert job["result"]["total_groups"] == 1
+    assert "groups" not in job["result"]
+    assert [(g["keep"], g["remove"]) for g in get_job_output(job["id"])] == [("0001", ["0004"])]
+    AUDIT_WRITER.flush()
+    audit = db.audit_logs.find_one({"action": "effects.dedupe"})
+    assert audit["after"]["total_groups"] == 1 and "groups" not in audit["after"]
+    assert db.spells.find_one({"id": "0001"})["effects"] == ["0001"]
+    assert db.effects.find_one({"id": "0004"}) is None
+
+
+@pytest.mark.asyncio
+async def test_spell_sig_dedupe_streams_groups_to_job_output(monkeypatch):
+    monkeypatch.setattr("server.src.modules.spell_helpers.RECOMPUTE_BATCH_SIZE", 1)
+    db = get_db()
+    db.spells.insert_many([
+        {"id": "0001", "sig_v1": "a"}, {"id": "0002", "sig_v1": "a"},
+        {"id": "0003", "sig_v1": "b"}, {"id": "0004", "sig_v1": "b"}, {"id": "0005", "sig_v1": "b"},
+    ])
+    async with wiki_client() as client:
+        resp = await client.post("/admin/maintenance/dedupe_spells_by_sig", json={"apply": True})
+        job = wait_for_job(resp.json()["job"]["id"])
+    assert job["result"] == {"status": "success", "applied": True, "total_groups": 2, "removed_spells": 3}
+    groups = sorted(get_job_output(job["id"]), key=lambda g: g["sig"])
+    assert [(g["keep"], g["remove"]) for g in groups] == [("0001", ["0002"]), ("0003", ["0004", "0005"])]
+    assert sorted(d["id"] for d in db.spells.find({}, {"id": 1})) == ["0001", "0003"]
+
+
+@pytest.mark.asyncio
+async def test_backfill_sigs_skips_conflicts():
+    db = get_db()
+    base = {"activation": "Action", "range": 0, "aoe": "A Square", "duration": 1, "effects": ["0001"]}
+    db.spells.insert_many([{"id": "0001", **base}, {"id": "0002", **base}, {"id": "0003", **base, "duration": 2}])
+    async with wiki_client() as client:
+        resp = await client.post("/admin/maintenance/backfill_spell_sigs")
+        job = wait_for_job(resp.json()["job"]["id"])
+    assert job["result"] == {"status": "success", "updated": 2, "skipped_conflicts": 1}
+    assert db.spells.find_one({"id": "0002"}).get("sig_v1") is None
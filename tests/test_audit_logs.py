@@ -0,0 +1,82 @@
+import datetime
+import json
+
+import pytest
+
+from db_mongo import get_db
+from server.src.modules.audit_logs import ensure_audit_indexes, migrate_audit_timestamps
+from tests.conftest import wiki_client
+
+EPOCH = datetime.datetime(2024, 3, 1)
+
+
+def _seed(n: int) -> None:
+    get_db().audit_logs.insert_many([
+        {"ts": EPOCH + datetime.timedelta(hours=i), "user": "alice" if i % 2 else "bob",
+         "action": "spell.edit", "spell_id": f"{i:04d}", "before": None, "after": None}
+        for i in range(n)
+    ])
+
+
+def test_migration_types_string_timestamps():
+    col = get_db().audit_logs
+    col.insert_many([
+        {"ts": "2024-03-01T10:00:00.123456Z", "action": "spell.create"},
+        {"ts": "2024-03-01T11:00:00+02:00", "action": "spell.edit"},
+        {"ts": "not a date", "action": "spell.delete"},
+    ])
+    assert migrate_audit_timestamps(batch_size=2) == 2
+    by_action = {d["action"]: d["ts"] for d in col.find()}
+    assert by_action["spell.create"].replace(microsecond=0) == datetime.datetime(2024, 3, 1, 10, 0)
+    assert by_action["spell.edit"] == datetime.datetime(2024, 3, 1, 9, 0)
+    assert by_action["spell.delete"] == "not a date"
+
+
+def test_indexes_and_retention():
+    ensure_audit_indexes(days=0)
+    info = get_db().audit_logs.index_information()
+    assert {tuple(k for k, _ in spec["key"][:2]) for spec in info.values()} >= {("user", "ts"), ("action", "ts"), ("spell_id", "ts")}
+    assert "expireAfterSeconds" not in info["ts_1"]
+
+    ensure_audit_indexes(days=90)
+    assert get_db().audit_logs.index_information()["ts_1"]["expireAfterSeconds"] == 90 * 86400
+
+
+@pytest.mark.asyncio
+async def test_logs_are_keyset_paginated_and_date_filtered():
+    _seed(25)
+    async with wiki_client(role="admin") as client:
+        seen, cursor = [], ""
+        while True:
+            body = (await client.get("/admin/logs", params={"user": "alice", "limit": 5, "cursor": cursor})).json()
+            seen += [row["spell_id"] for row in body["items"]]
+            cursor = body["next_cursor"]
+            if not cursor:
+                break
+        assert seen == [f"{i:04d}" for i in range(23, 0, -2)]
+        assert body["items"][-1]["ts"] == "2024-03-01T01:00:00.000Z"
+
+        window = (await client.get("/admin/logs", params={
+            "from_": "2024-03-01T05:00:00.000Z", "to": "2024-03-01T07:00:00Z", "action": "spell.edit",
+        })).json()
+        assert [row["spell_id"] for row in window["items"]] == ["0007", "0006", "0005"]
+
+        bad = await client.get("/admin/logs", params={"from_": "yesterday"})
+        assert bad.status_code == 400
+        assert (await client.get("/admin/logs", params={"cursor": "garbage"})).status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_export_streams_ndjson_oldest_first():
+    _seed(12)
+    async with wiki_client(role="admin") as client:
+        resp = await client.get("/admin/logs/export", params={"user": "bob"})
+        assert resp.status_code == 200
+        assert resp.headers["content-type"].startswith("application/x-ndjson")
+        assert "attachment" in resp.headers["content-disposition"]
+        rows = [json.loads(line) for line in resp.text.splitlines()]
+        assert [row["spell_id"] for row in rows] == ["0000", "0002", "0004", "0006", "0008", "0010"]
+        assert rows[0]["ts"] == "2024-03-01T00:00:00.000Z"
+
+    async with wiki_client(role="moderator") as client:
+        assert (await client.get("/admin/logs/export")).status_code == 403
@@ -0,0 +1,60 @@
+import pytest
+
+from db_mongo import get_db
+from server.src.modules.audit_writer import AUDIT_WRITER, AuditWriter
+from tests.conftest import wiki_client
+
+
+def _entry(i: int) -> dict:
+    return {"ts": f"2024-01-01T00:00:{i:02d}Z", "user": "tester", "action": "spell.edit", "spell_id": f"{i:04d}"}
+
+
+def test_entries_are_written_in_batches():
+    writer = AuditWriter(enabled=True, batch_size=4, flush_interval=60)
+    for i in range(10):
+        writer.submit(_entry(i))
+    assert writer.flush()
+
+    assert get_db().audit_logs.count_documents({}) == 10
+    stats = writer.stats()
+    assert stats["written"] == 10
+    assert stats["batches"] == 3
+    assert stats["sync_writes"] == 0 and stats["depth"] == 0
+    writer.shutdown()
+
+
+def test_full_queue_falls_back_to_inline_writes():
+    writer = AuditWriter(enabled=True, max_queue=2, batch_size=100, flush_interval=60)
+    for i in range(5):
+        writer.submit(_entry(i))
+
+    # Two entries wait in the queue; the overflow was written by the caller.
+    assert get_db().audit_logs.count_documents({}) == 3
+    stats = writer.stats()
+    assert stats["overflows"] == 3 and stats["sync_writes"] == 3
+    assert stats["depth"] == 2 and stats["max_depth"] == 2
+
+    writer.shutdown()
+    assert get_db().audit_logs.count_documents({}) == 5
+    writer.submit(_entry(9))
+    assert get_db().audit_logs.count_documents({}) == 6
+    assert not writer.stats()["running"]
+
+
+def test_disabled_writer_is_synchronous():
+    writer = AuditWriter(enabled=False)
+    writer.submit(_entry(1))
+    assert get_db().audit_logs.count_documents({}) == 1
+    assert writer.stats()["sync_writes"] == 1
+
+
+@pytest.mark.asyncio
+async def test_admin_logs_sees_queued_entries_and_metrics_report_the_queue():
+    AUDIT_WRITER.submit(_entry(1))
+    async with wiki_client(role="admin") as client:
+        logs = await client.get("/admin/logs")
+        assert [item["spell_id"] for item in logs.json()["items"]] == ["0001"]
+
+        metrics = (await client.get("/admin/metrics")).json()
+        assert metrics["audit"]["enabled"] is True
+        assert metrics["audit"]["capacity"] == AUDIT_WRITER.max_queue
@@ -0,0 +1,24 @@
+import pytest
+
+from db_mongo import get_db
+from main import app
+from scripts.bench_endpoints import BENCH_TOKEN, BENCH_USER, compare, run, scenarios, seed
+from server.src.modules.session_store import SESSIONS
+
+
+@pytest.mark.asyncio
+async def test_benchmark_scenarios_run_against_a_small_seed():
+    ids = seed(get_db(), scale=0.002)
+    SESSIONS[BENCH_TOKEN] = (BENCH_USER, "admin")
+    results = await run(app, scenarios(ids), repeat=2, warmup=0)
+    assert set(results) == {name for name, *_ in scenarios(ids)}
+    for row in results.values():
+        assert row["status"] < 400
+        assert row["n"] == 2
+        assert 0 < row["p50_ms"] <= row["p95_ms"]
+
+
+def test_compare_flags_only_meaningful_p95_growth():
+    baseline = {"results": {"a": {"p95_ms": 10.0}, "b": {"p95_ms": 1.0}, "c": {"p95_ms": 10.0}}}
+    results = {"a": {"p95_ms": 20.0}, "b": {"p95_ms": 2.5}, "c": {"p95_ms": 11.0}, "new": {"p95_ms": 99.0}}
+    assert compare(results, baseline, max_regression=0.25, min_delta_ms=2.0) == ["a: p95 10.0 -> 20.0 ms"]
@@ -0,0 +1,153 @@
+import asyncio
+import json
+
+import pytest
+
+from db_mongo import get_db
+from server.src.modules import chat_bus as chat_bus_module
+from server.src.modules.campaign_chat_helpers import CAMPAIGN_CHAT_WS, deliver_campaign_chat, register_chat_socket
+from server.src.modules.chat_bus import InProcessChatBus, MongoChatBus, set_chat_bus
+from settings import settings
+from tests.conftest import wiki_client
+
+
+class FakeSocket:
+    def __init__(self, fail: bool = False):
+        self.sent: list[dict] = []
+        self.fail = fail
+
+    async def send_text(self, text):
+        if self.fail:
+            raise RuntimeError("socket closed")
+        self.sent.append(json.loads(text))
+
+    async def close(self, code=1000):
+        pass
+
+
+@pytest.fixture(autouse=True)
+def fresh_bus():
+    CAMPAIGN_CHAT_WS.clear()
+    set_chat_bus(None)
+    yield
+    CAMPAIGN_CHAT_WS.clear()
+    set_chat_bus(None)
+
+
+class RecordingBus(InProcessChatBus):
+    def __init__(self):
+        super().__init__(deliver_campaign_chat)
+        self.published: list[tuple[str, dict]] = []
+
+    async def publish(self, cid, payload):
+        self.published.append((cid, payload))
+        await super().publish(cid, payload)
+
+
+@pytest.mark.asyncio
+async def test_posted_messages_are_published_through_the_bus():
+    bus = RecordingBus()
+    set_chat_bus(bus)
+    get_db().campaigns.insert_one({"id": "0001", "owner": "tester", "members": []})
+    listener, gone = FakeSocket(), FakeSocket(fail=True)
+    conn = register_chat_socket("0001", listener)
+    register_chat_socket("0001", gone)
+
+    async with wiki_client(role="user") as client:
+        resp = await client.post("/campaigns/0001/chat", json={"text": "hello"})
+    assert resp.json()["status"] == "success"
+    await asyncio.sleep(0)
+
+    assert [cid for cid, _ in bus.published] == ["0001"]
+    assert listener.sent[0]["type"] == "chat"
+    assert listener.sent[0]["message"]["text"] == "hello"
+    assert "_id" not in listener.sent[0]["message"]
+    assert CAMPAIGN_CHAT_WS["0001"] == {conn}
+    conn.detach()
+    await asyncio.sleep(0)
+
+
+@pytest.mark.asyncio
+async def test_mongo_bus_relays_events_between_workers(monkeypatch):
+    received: dict[str, list] = {"a": [], "b": []}
+
+    def deliverer(name):
+        async def deliver(cid, payload):
+            received[name].append((cid, payload["message"]["text"]))
+        return deliver
+
+    worker_a = MongoChatBus(deliverer("a"))
+    worker_b = MongoChatBus(deliverer("b"))
+    await worker_a.publish("0001", {"type": "chat", "message": {"text": "from a"}})
+    assert received["a"] == [("0001", "from a")]
+
+    event = get_db().chat_events.find_one()
+    assert event["campaign_id"] == "0001" and event["origin"] == chat_bus_module.WORKER_ID
+
+    # Tailed by worker A itself: already delivered locally, so skipped.
+    await worker_a.dispatch(event)
+    assert received["a"] == [("0001", "from a")]
+
+    monkeypatch.setattr(chat_bus_module, "WORKER_ID", "other-host:1")
+    await worker_b.dispatch(event)
+    assert received["b"] == [("0001", "from a")]
+
+
+def test_backend_selection(monkeypatch):
+    monkeypatch.setattr(settings, "chat_bus", "mongo")
+    assert isinstance(chat_bus_module.get_chat_bus(deliver_campaign_chat), MongoChatBus)
+    set_chat_bus(None)
+    monkeypatch.setattr(settings, "chat_bus", "auto")
+    assert isinstance(chat_bus_module.get_chat_bus(deliver_campaign_chat), InProcessChatBus)
+
+
+class FakeCursor:
+    def __init__(self, events, after=None):
+        self.events, self.after, self.alive = events, after, True
+
+    def __iter__(self):
+        yield from self.events
+        self.alive = False
+        if self.after:
+            self.after()
+
+
+class FakeEvents:
+    """A capped collection seen through a scripted sequence of tail cursors."""
+
+    def __init__(self, stored, cursors):
+        self.stored, self.cursors = stored, cursors
+
+    def find_one(self, query, projection=None, sort=None):
+        if sort:
+            return self.stored[-1] if self.stored else None
+        return next((e for e in self.stored if e["_id"] == query["_id"]), None)
+
+    def find(self, query, **kwargs):
+        assert query == {}, "the tail must not filter on _id"
+        return self.cursors.pop(0)
+
+
+def test_tail_resumes_by_position_not_by_objectid_order():
+    from bson import ObjectId
+
+    def oid(seconds: int) -> ObjectId:
+        return ObjectId(f"{seconds:08x}" + "0" * 16)
+
+    # e3 comes from a host whose clock is behind: its _id sorts below e2's.
+    e1, e2, e3, e4, e5 = ({"_id": oid(t), "campaign_id": "0001", "origin": "other:1", "payload": {"n": n}}
+                          for n, t in ((1, 500), (2, 600), (3, 100), (4, 601), (5, 50)))
+    bus = MongoChatBus(deliver_campaign_chat)
+    emitted = []
+    bus._emit = lambda event: emitted.append(event["payload"]["n"])
+    events = FakeEvents([e1, e2], [])
+    # First cursor ends after e4; the reconnect replays everything still stored.
+    events.cursors = [
+        FakeCursor([e1, e2, e3, e4], after=lambda: events.stored.extend([e3, e4])),
+        FakeCursor([e1, e2, e3, e4, e5], after=bus._stopping.set),
+    ]
+    bus._col = lambda: events
+
+    bus._tail()
+
+    assert emitted == [3, 4, 5]
@@ -0,0 +1,85 @@
+import asyncio
+import json
+
+import pytest
+
+from server.src.modules.campaign_chat_helpers import (
+    CAMPAIGN_CHAT_WS,
+    CHAT_SOCKET_STATS,
+    SLOW_CONSUMER_CLOSE_CODE,
+    chat_socket_stats,
+    deliver_campaign_chat,
+    register_chat_socket,
+)
+
+
+class FakeSocket:
+    def __init__(self, blocked: bool = False):
+        self.sent: list[str] = []
+        self.closed_with = None
+        self.gate = asyncio.Event()
+        if not blocked:
+            self.gate.set()
+
+    async def send_text(self, text):
+        await self.gate.wait()
+        self.sent.append(text)
+
+    async def close(self, code=1000):
+        self.closed_with = code
+
+
+@pytest.fixture(autouse=True)
+def fresh_sockets():
+    CAMPAIGN_CHAT_WS.clear()
+    CHAT_SOCKET_STATS.clear()
+    yield
+    CAMPAIGN_CHAT_WS.clear()
+
+
+async def _close_all():
+    for conn in [c for group in CAMPAIGN_CHAT_WS.values() for c in group]:
+        conn.detach()
+    await asyncio.sleep(0)
+
+
+@pytest.mark.asyncio
+async def test_slow_socket_does_not_hold_up_fast_ones():
+    fast, slow = FakeSocket(), FakeSocket(blocked=True)
+    register_chat_socket("0001", fast)
+    register_chat_socket("0001", slow, max_queue=8)
+
+    for i in range(3):
+        await asyncio.wait_for(deliver_campaign_chat("0001", {"type": "chat", "n": i}), timeout=1)
+    await asyncio.sleep(0)
+
+    assert [json.loads(text)["n"] for text in fast.sent] == [0, 1, 2]
+    assert slow.sent == []
+    stats = chat_socket_stats()
+    assert stats["connections"] == 2 and stats["queued"] >= 2 and stats["evicted"] == 0
+
+    slow.gate.set()
+    await asyncio.sleep(0.01)
+    assert len(slow.sent) == 3
+    assert chat_socket_stats()["sent"] == 6
+    await _close_all()
+
+
+@pytest.mark.asyncio
+async def test_overflowing_socket_is_evicted():
+    fast, slow = FakeSocket(), FakeSocket(blocked=True)
+    register_chat_socket("0001", fast)
+    register_chat_socket("0001", slow, max_queue=2)
+
+    for i in range(5):
+        await deliver_campaign_chat("0001", {"n": i})
+        await asyncio.sleep(0)
+
+    assert slow.closed_with == SLOW_CONSUMER_CLOSE_CODE
+    assert [conn.websocket for conn in CAMPAIGN_CHAT_WS["0001"]] == [fast]
+    assert len(fast.sent) == 5
+    stats = chat_socket_stats()
+    # One message in flight on the blocked socket, two queued, the fourth overflows.
+    assert stats["evicted"] == 1 and stats["dropped"] == 3
+    assert stats["max_depth"] == 2
+    await _close_all()
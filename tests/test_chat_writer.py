@@ -0,0 +1,86 @@
+import asyncio
+
+import pytest
+
+from db_mongo import get_db
+from server.src.modules.campaign_chat_helpers import CHAT_WRITER, ChatIdGenerator, ChatWriter, save_chat_doc
+from tests.conftest import wiki_client
+
+
+def test_ids_are_monotonic_even_when_the_clock_stalls_or_steps_back():
+    ids = ChatIdGenerator(node="aaaaaa")
+    issued = [ids.next(1_700_000_000_000), ids.next(1_700_000_000_000), ids.next(1_699_999_999_000), ids.next(1_700_000_000_001)]
+    assert issued == sorted(issued) and len(set(issued)) == 4
+    assert issued[0] == "msg_18bcfe56800" + "0000" + "aaaaaa"
+
+    ids._seq = 0xFFFF
+    rolled = ids.next(1_700_000_000_001)
+    assert rolled > issued[-1] and rolled.endswith("0000aaaaaa")
+    assert ChatIdGenerator().node != ChatIdGenerator().node
+
+
+@pytest.mark.asyncio
+async def test_posts_are_group_committed_without_counter_writes(db_queries, monkeypatch):
+    monkeypatch.setattr(CHAT_WRITER, "flush_interval", 60)
+    written_before = CHAT_WRITER.stats()["written"]
+    get_db().campaigns.insert_one({"id": "0001", "owner": "tester", "members": []})
+    async with wiki_client(role="user") as client:
+        with db_queries.capture():
+            for i in range(20):
+                resp = await client.post("/campaigns/0001/chat", json={"text": f"roll {i}", "ts": 1000})
+                assert resp.json()["status"] == "success"
+            assert CHAT_WRITER.flush()
+        chat_calls = [call for call in db_queries.calls if call[1] in ("campaign_chat", "counters")]
+        assert chat_calls == [("insert_many", "campaign_chat")], db_queries.report()
+
+        history = (await client.get("/campaigns/0001/chat")).json()["messages"]
+        assert [m["text"] for m in history] == [f"roll {i}" for i in range(20)]
+        assert all(m["ts"] == 1000 for m in history)
+    assert CHAT_WRITER.stats()["written"] - written_before == 20
+
+
+@pytest.mark.asyncio
+async def test_history_read_sees_messages_still_queued(monkeypatch):
+    monkeypatch.setattr(CHAT_WRITER, "flush_interval", 60)
+    get_db().campaigns.insert_one({"id": "0001", "owner": "tester", "members": []})
+    async with wiki_client(role="user") as client:
+        await client.post("/campaigns/0001/chat", json={"text": "hello"})
+        history = (await client.get("/campaigns/0001/chat")).json()["messages"]
+    assert [m["text"] for m in history] == ["hello"]
+
+
+@pytest.mark.asyncio
+async def test_durable_mode_waits_for_the_batch(monkeypatch):
+    writer = ChatWriter(durable=True, batch_size=10, flush_interval=60)
+    monkeypatch.setattr("server.src.modules.campaign_chat_helpers.CHAT_WRITER", writer)
+    docs = [{"id": f"msg_{i}", "campaign_id": "0001", "ts": i} for i in range(10)]
+
+    saved = await asyncio.wait_for(asyncio.gather(*(save_chat_doc(doc) for doc in docs)), timeout=5)
+    assert saved == [True] * 10
+    assert get_db().campaign_chat.count_documents({}) == 10
+    assert writer.stats()["batches"] == 1
+
+    # A message that cannot be written is reported back instead of acknowledged.
+    get_db().campaign_chat.create_index("id", unique=True)
+    writer.flush_interval = 0.005
+    assert await save_chat_doc({"id": "msg_0", "campaign_id": "0001", "ts": 99}) is False
+    assert writer.stats()["dropped"] == 1
+    writer.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_history_pages_keep_messages_that_share_a_timestamp():
+    get_db().campaigns.insert_one({"id": "0001", "owner": "tester", "members": []})
+    async with wiki_client(role="user") as client:
+        for i in range(12):
+            await client.post("/campaigns/0001/chat", json={"text": f"roll {i}", "ts": 1000 + i // 5})
+        seen, cursor = [], None
+        while True:
+            params = {"limit": 5, **({"cursor": cursor} if cursor else {})}
+            page = (await client.get("/campaigns/0001/chat", params=params)).json()
+            seen = [m["text"] for m in page["messages"]] + seen
+            cursor = page["next_cursor"]
+            if not cursor:
+                break
+        assert seen == [f"roll {i}" for i in range(12)]
+        assert (await client.get("/campaigns/0001/chat", params={"cursor": "junk"})).status_code == 400
@@ -0,0 +1,159 @@
+import itertools
+
+import pytest
+
+from server.src.modules.category_table import category_for_mp
+from server.src.modules.cost_engine import CostEngine, category_for, mp_to_next_category
+from server.src.modules.cost_tables import ACTIVATION_COSTS, AOE_COSTS, DURATION_COSTS, RANGE_COSTS
+from server.src.modules.spell_catalog import get_spell_catalog
+from server.src.modules.spell_helpers import compute_spell_costs
+from server.src.objects.effects import Effect
+from server.src.objects.schools import School
+from server.src.objects.spells import Spell, _engine_for
+from tests.helpers import seed_catalog
+
+
+# ---- Reference: the pre-engine route implementation, minus the Mongo reads ----
+
+def _legacy_pick_max(types):
+    order = {"A": 1, "B": 2, "C": 3}
+    best = "A"
+    for t in types:
+        tt = (t or "A").upper()
+        if order.get(tt, 1) > order.get(best, 1):
+            best = tt
+    return best
+
+
+def _legacy_next_delta(current_mp):
+    cur_cat = category_for_mp(int(current_mp or 0))
+    step = 1
+    base = int(current_mp or 0)
+    max_mp = base + 100_000
+    hi = base + step
+    while hi <= max_mp and category_for_mp(hi) == cur_cat:
+        step *= 2
+        hi = base + step
+    if hi > max_mp:
+        return 0
+    lo = max(base, hi - step)
+    ans = None
+    while lo <= hi:
+        mid = (lo + hi) // 2
+        if category_for_mp(mid) == cur_cat:
+            lo = mid + 1
+        else:
+            ans = mid
+            hi = mid - 1
+    return 0 if ans is None else max(0, ans - base)
+
+
+def _legacy_costs(catalog, activation, range_val, aoe, duration, effect_ids, range_type=None, aoe_type=None):
+    schools = {catalog.school_of(e).id: catalog.school_of(e) for e in effect_ids if catalog.school_of(e)}
+    derived = (
+        _legacy_pick_max([s.range_type for s in schools.values()]),
+        _legacy_pick_max([s.aoe_type for s in schools.values()]),
+    ) if schools else ("A", "A")
+    if not range_type or range_type.upper() not in ("A", "B", "C"):
+        rt, at = derived
+    else:
+        rt = range_type.upper()
+        at = (aoe_type or "A").upper() if aoe_type else derived[1]
+    eff_mp = sum(catalog.effect(e).mp_cost for e in effect_ids if catalog.effect(e))
+    eff_en = sum(catalog.effect(e).en_cost for e in effect_ids if catalog.effect(e))
+    act = ACTIVATION_COSTS.get(activation, (0, 0))
+    rng = RANGE_COSTS.get(rt, RANGE_COSTS["A"]).get(int(range_val), (0, 0))
+    area = AOE_COSTS.get(at, AOE_COSTS["A"]).get(str(aoe), (0, 0))
+    dur = DURATION_COSTS.get(int(duration), (0, 0))
+    mp = eff_mp + act[0] + rng[0] + area[0] + dur[0]
+    en = eff_en + act[1] + rng[1] + area[1] + dur[1]
+    return {
+        "mp_cost": mp,
+        "en_cost": en,
+        "category": category_for_mp(mp),
+        "mp_to_next_category": _legacy_next_delta(mp),
+        "breakdown": {
+            "activation": {"mp": act[0], "en": act[1]},
+            "range": {"mp": rng[0], "en": rng[1], "type": rt},
+            "aoe": {"mp": area[0], "en": area[1], "type": at},
+            "duration": {"mp": dur[0], "en": dur[1]},
+            "effects": {"mp": eff_mp, "en": eff_en},
+        },
+    }
+
+
+EFFECT_SETS = [[], ["0001"], ["0002"], ["0003"], ["0001", "0002", "0002"], ["0003", "9999"]]
+ACTIVATIONS = list(ACTIVATION_COSTS) + ["Unknown"]
+RANGES = sorted({v for rows in RANGE_COSTS.values() for v in rows}) + [2]
+AOES = list(AOE_COSTS["A"]) + ["Blob (4)"]
+DURATIONS = list(DURATION_COSTS) + [3]
+
+
+@pytest.mark.parametrize("mp", range(-30, 200))
+def test_category_lookup_matches_linear_scan(mp):
+    assert category_for(mp) == category_for_mp(mp)
+    assert mp_to_next_category(mp) == _legacy_next_delta(mp)
+
+
+@pytest.mark.parametrize("effects", EFFECT_SETS)
+def test_engine_matches_legacy_rules_for_every_knob(effects):
+    seed_catalog()
+    catalog = get_spell_catalog()
+    engine = CostEngine(catalog)
+    for activation, range_val, aoe, duration in itertools.product(ACTIVATIONS, RANGES, AOES, DURATIONS):
+        expected = _legacy_costs(catalog, activation, range_val, aoe, duration, effects)
+        assert engine.compute(activation, range_val, aoe, duration, effects) == expected
+
+
+@pytest.mark.parametrize("range_type,aoe_type", [("A", None), ("C", None), ("B", "A"), ("C", "z"), ("x", "C")])
+def test_engine_matches_legacy_rules_with_type_overrides(range_type, aoe_type):
+    seed_catalog()
+    catalog = get_spell_catalog()
+    engine = CostEngine(catalog)
+    for effects in EFFECT_SETS:
+        got = engine.compute("Action", 5, "Circle (5)", 4, effects, range_type=range_type, aoe_type=aoe_type)
+        assert got == _legacy_costs(catalog, "Action", 5, "Circle (5)", 4, effects, range_type, aoe_type)
+
+
+def test_golden_values():
+    seed_catalog()
+    cc = compute_spell_costs("Special Action", 9, "Cone (7)", 6, ["0001", "0002"])
+    assert (cc["mp_cost"], cc["en_cost"]) == (48, 8)
+    assert cc["category"] == "Master"
+    assert cc["mp_to_next_category"] == 5
+    assert cc["breakdown"]["range"] == {"mp": 13, "en": 1, "type": "B"}
+    assert cc["breakdown"]["aoe"] == {"mp": 14, "en": 2, "type": "C"}
+
+    ritual = compute_spell_costs("Ritual", 0, "A Square", 1, ["0003"])
+    assert (ritual["mp_cost"], ritual["en_cost"], ritual["category"]) == (-3, -1, "Novice")
+    assert ritual["mp_to_next_category"] == 16
+
+
+def test_spell_object_costs_agree_with_routes():
+    seed_catalog()
+    mp, en, breakdown = Spell.compute_cost(9, "Cone (7)", 6, "Special Action", ["0001", "0002"])
+    cc = compute_spell_costs("Special Action", 9, "Cone (7)", 6, ["0001", "0002"])
+    assert (mp, en) == (cc["mp_cost"], cc["en_cost"])
+    assert breakdown["category"] == cc["category"]
+    assert [row["id"] for row in breakdown["effects"]] == ["0001", "0002"]
+
+    with pytest.raises(ValueError):
+        Spell.compute_cost(2, "A Square", 1, "Action", ["0001"])
+
+
+def test_spell_object_prices_effect_objects_from_their_own_fields():
+    seed_catalog()
+    storm = School(id="0002", name="Storm", school_type="Complex", range_type="B", aoe_type="C")
+    edited = Effect(id="0001", name="Burn", school=School(id="0001", name="Fire"), mp_cost=10, en_cost=4)
+    unsaved = Effect(id="9999", name="Gale", school=storm, mp_cost=5, en_cost=2)
+
+    mp, en, breakdown = Spell.compute_cost(9, "Cone (7)", 6, "Special Action", [edited, unsaved])
+    cc = compute_spell_costs("Special Action", 9, "Cone (7)", 6, ["0001", "0002"])
+    # Same knobs as the catalog spell (Storm's B/C types), effects priced +7 MP / +3 EN.
+    assert (mp, en) == (cc["mp_cost"] + 7, cc["en_cost"] + 3)
+    assert [(row["id"], row["mp"]) for row in breakdown["effects"]] == [("0001", 10), ("9999", 5)]
+    # The shared catalog is untouched, and overlaid rather than copied.
+    assert get_spell_catalog().effect("0001").mp_cost == 3
+    overlay = _engine_for([edited]).catalog
+    assert overlay.effects.maps[-1] is get_spell_catalog().effects
+    assert overlay.schools.maps[-1] is get_spell_catalog().schools
@@ -0,0 +1,115 @@
+import datetime
+import logging
+
+import pytest
+from fastapi import FastAPI
+from httpx import ASGITransport, AsyncClient
+from pymongo import monitoring
+
+from server.src.modules.db_metrics import (
+    CURRENT_DB_STATS,
+    ROUTE_METRICS,
+    DBMetricsMiddleware,
+    MongoCommandListener,
+    RequestDBStats,
+)
+from tests.conftest import wiki_client
+
+ADDRESS = ("db.example", 27017)
+
+
+@pytest.fixture(autouse=True)
+def fresh_metrics():
+    ROUTE_METRICS.reset()
+    yield
+    ROUTE_METRICS.reset()
+
+
+def _run_command(listener, request_id, name="find", collection="inventories", micros=1500):
+    command = {name: collection, "filter": {"id": f"{request_id:04d}"}}
+    listener.started(monitoring.CommandStartedEvent(command, "noe", request_id, ADDRESS, request_id))
+    reply = {"ok": 1, "cursor": {"firstBatch": [{"id": f"{request_id:04d}"}]}}
+    listener.succeeded(monitoring.CommandSucceededEvent(
+        datetime.timedelta(microseconds=micros), reply, name, request_id, ADDRESS, request_id,
+    ))
+
+
+def test_listener_attributes_commands_to_the_current_request():
+    listener = MongoCommandListener(track_bytes=True)
+    _run_command(listener, 1)  # outside a request: ignored
+
+    stats = RequestDBStats()
+    token = CURRENT_DB_STATS.set(stats)
+    try:
+        for i in range(3):
+            _run_command(listener, 10 + i)
+        _run_command(listener, 20, name="ping", collection=1)
+    finally:
+        CURRENT_DB_STATS.reset(token)
+
+    assert stats.commands == 3
+    assert stats.duration_s == pytest.approx(0.0045)
+    assert stats.bytes_out > 0 and stats.bytes_in > 0
+    assert stats.targets == {"find inventories": 3}
+    assert listener._pending == {}
+
+    untracked = RequestDBStats()
+    token = CURRENT_DB_STATS.set(untracked)
+    try:
+        _run_command(MongoCommandListener(), 30)
+    finally:
+        CURRENT_DB_STATS.reset(token)
+    assert untracked.commands == 1 and untracked.bytes_out == untracked.bytes_in == 0
+
+
+@pytest.mark.asyncio
+async def test_middleware_reports_server_timing_budget_and_route_totals(caplog):
+    listener = MongoCommandListener()
+
+    api = FastAPI()
+
+    @api.get("/items/{n}")
+    def item_lookups(n: int):
+        # Sync endpoint: runs in the threadpool, like the app's DB-bound routes.
+        for i in range(n):
+            _run_command(listener, 100 + i)
+        return {"ok": True}
+
+    app = DBMetricsMiddleware(api, query_budget=5)
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        with caplog.at_level(logging.WARNING, logger="noe.db"):
+            small = await client.get("/items/2")
+            assert not caplog.records
+            big = await client.get("/items/8")
+
+    assert small.headers["server-timing"].startswith('db;dur=3.0;desc="2 queries"')
+    assert 'desc="8 queries"' in big.headers["server-timing"]
+    assert "app;dur=" in big.headers["server-timing"]
+    assert "8 Mongo commands (budget 5" in caplog.text
+    assert "find inventories x8" in caplog.text
+
+    row = ROUTE_METRICS.snapshot()["routes"]["GET /items/{n}"]
+    assert row["requests"] == 2
+    assert row["commands"] == 10
+    assert row["max_commands"] == 8
+    assert row["over_budget"] == 1
+    assert row["avg_db_ms"] == pytest.approx(7.5)
+
+
+@pytest.mark.asyncio
+async def test_admin_metrics_endpoint():
+    async with wiki_client(role="admin") as client:
+        first = await client.get("/admin/metrics")
+        assert first.status_code == 200
+        assert "server-timing" in first.headers
+        second = await client.get("/admin/metrics")
+        body = second.json()
+        assert body["status"] == "success"
+        assert body["routes"]["GET /admin/metrics"]["requests"] == 1
+
+        reset = await client.post("/admin/metrics/reset")
+        assert reset.json() == {"status": "success"}
+
+    async with wiki_client(role="user") as client:
+        denied = await client.get("/admin/metrics")
+        assert denied.status_code == 403
@@ -0,0 +1,132 @@
+import asyncio
+import gc
+import inspect
+import threading
+import time
+from contextlib import asynccontextmanager
+
+import mongomock
+import pytest
+from fastapi.routing import APIRoute, APIWebSocketRoute
+
+from main import LAZY_ROUTERS, app
+from server.src.modules.db_async import aget_col, run_db
+from tests.conftest import wiki_client
+from tests.helpers import seed_catalog
+
+DB_DELAY = 0.05
+# Only a backstop for gross stalls: scheduler/GIL jitter alone reaches
+# ~DB_DELAY on a busy box. The thread check in slow_mongo is the real guard.
+MAX_LOOP_LAG = 3 * DB_DELAY
+ASYNC_ENDPOINTS = {"post_campaign_chat", "campaign_chat_ws", "upload_asset"}
+
+
+@asynccontextmanager
+async def loop_lag_probe(interval: float = 0.005):
+    """
+    Ticks on the event loop and records the worst overshoot between ticks.
+    GC is paused meanwhile: a full collection stalls every thread and would
+    read as blocking.
+    """
+    lag = {"max": 0.0}
+    stop = asyncio.Event()
+
+    async def tick():
+        while not stop.is_set():
+            start = time.perf_counter()
+            await asyncio.sleep(interval)
+            lag["max"] = max(lag["max"], time.perf_counter() - start - interval)
+
+    gc.disable()
+    task = asyncio.create_task(tick())
+    await asyncio.sleep(0)
+    try:
+        yield lag
+    finally:
+        stop.set()
+        await task
+        gc.enable()
+
+
+@pytest.fixture
+def slow_mongo(monkeypatch):
+    """
+    Every mongomock call sleeps first, like a slow Atlas round trip, and
+    records `(method, thread ident)` so tests can check where it ran.
+    """
+    calls: list[tuple[str, int]] = []
+    for name in ("find", "find_one", "insert_one", "update_one", "find_one_and_update", "count_documents"):
+        original = getattr(mongomock.collection.Collection, name)
+
+        def slow(self, *args, __original=original, __name=name, **kwargs):
+            calls.append((__name, threading.get_ident()))
+            time.sleep(DB_DELAY)
+            return __original(self, *args, **kwargs)
+
+        monkeypatch.setattr(mongomock.collection.Collection, name, slow)
+    return calls
+
+
+def on_loop_thread(calls: list[tuple[str, int]]) -> list[str]:
+    loop_thread = threading.get_ident()
+    return [name for name, ident in calls if ident == loop_thread]
+
+
+@pytest.mark.asyncio
+async def test_probe_detects_a_blocking_call():
+    async with loop_lag_probe() as lag:
+        time.sleep(2 * MAX_LOOP_LAG)
+        await asyncio.sleep(0.01)
+    assert lag["max"] > MAX_LOOP_LAG
+
+
+@pytest.mark.asyncio
+async def test_slow_mongo_does_not_stall_the_event_loop(slow_mongo):
+    seed_catalog()
+    spell = {"name": "Ember", "activation": "Action", "range": 0, "aoe": "A Square", "duration": 1, "effects": ["0001"]}
+    async with wiki_client() as client:
+        # The first threadpool hop imports anyio's backend; keep that out of the measurement.
+        assert (await client.get("/campaigns")).status_code == 200
+        del slow_mongo[:]
+        async with loop_lag_probe() as lag:
+            started = time.perf_counter()
+            created = await client.post("/campaigns", json={"name": "Slow Table"})
+            assert created.status_code == 200
+            cid = created.json()["campaign"]["id"]
+            assert (await client.get("/campaigns")).status_code == 200
+            assert (await client.post(f"/campaigns/{cid}/chat", json={"text": "hi"})).status_code == 200
+            assert (await client.get(f"/campaigns/{cid}/quests")).status_code == 200
+            submitted = await client.post("/submit_spell", json=spell)
+            assert submitted.json()["status"] == "success"
+            updated = await client.put(f"/spells/{submitted.json()['id']}", json={"duration": 2})
+            assert updated.status_code == 200
+            assert (await client.get("/api/wiki/categories")).status_code == 200
+            elapsed = time.perf_counter() - started
+    assert elapsed > 10 * DB_DELAY
+    assert len(slow_mongo) > 10
+    assert on_loop_thread(slow_mongo) == []
+    assert lag["max"] < MAX_LOOP_LAG, f"event loop stalled for {lag['max']:.3f}s"
+
+
+@pytest.mark.asyncio
+async def test_async_collection_runs_off_the_loop(slow_mongo):
+    col = aget_col("campaigns")
+    async with loop_lag_probe() as lag:
+        await asyncio.gather(*(col.insert_one({"id": f"c{i}", "n": i}) for i in range(4)))
+        rows = await col.find({}, {"_id": 0}, sort=[("n", -1)], limit=2)
+        assert await run_db(lambda: col.name) == "campaigns"
+    assert [r["id"] for r in rows] == ["c3", "c2"]
+    assert slow_mongo and on_loop_thread(slow_mongo) == []
+    assert lag["max"] < MAX_LOOP_LAG
+
+
+def test_only_reviewed_endpoints_are_coroutines():
+    # Plain `def` handlers run in the worker pool; a coroutine endpoint must
+    # send its Mongo work through run_db, so new ones get a deliberate look.
+    LAZY_ROUTERS.mount()
+    coroutines = {
+        route.endpoint.__name__
+        for route in app.routes
+        if isinstance(route, (APIRoute, APIWebSocketRoute)) and inspect.iscoroutinefunction(route.endpoint)
+    }
+    assert coroutines == ASYNC_ENDPOINTS
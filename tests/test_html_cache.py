@@ -0,0 +1,62 @@
+import os
+
+import pytest
+
+from main import GLOBAL_SHARED_UI_INJECTS
+from server.src.modules.html_cache import clear_html_cache, load_html
+from tests.conftest import wiki_client
+
+
+@pytest.fixture(autouse=True)
+def fresh_cache():
+    clear_html_cache()
+    yield
+    clear_html_cache()
+
+
+@pytest.mark.asyncio
+async def test_pages_are_injected_precompressed_and_revalidated():
+    async with wiki_client() as client:
+        first = await client.get("/portal.html", headers={"Accept-Encoding": "br"})
+        assert first.status_code == 200
+        assert first.headers["content-encoding"] == "br"
+        assert first.headers["cache-control"] == "no-cache"
+        assert all(inject in first.text for inject in GLOBAL_SHARED_UI_INJECTS)
+        etag = first.headers["etag"]
+
+        gz = await client.get("/portal.html", headers={"Accept-Encoding": "gzip"})
+        assert gz.headers["content-encoding"] == "gzip"
+        assert gz.headers["etag"] == etag
+        assert gz.text == first.text
+
+        plain = await client.get("/portal.html", headers={"Accept-Encoding": "identity"})
+        assert "content-encoding" not in plain.headers
+        assert plain.text == first.text
+
+        cached = await client.get("/portal.html", headers={"If-None-Match": f'W/{etag}, "other"'})
+        assert cached.status_code == 304
+        assert cached.headers["etag"] == etag
+        assert cached.content == b""
+
+
+def test_cache_renders_once_per_file_version(tmp_path):
+    page = tmp_path / "page.html"
+    page.write_text("<html><body>v1</body></html>", encoding="utf-8")
+    calls = []
+
+    def render(html):
+        calls.append(html)
+        return html.upper()
+
+    first = load_html(page, render)
+    assert load_html(page, render) is first
+    assert first.body == b"<HTML><BODY>V1</BODY></HTML>"
+    assert len(calls) == 1
+
+    page.write_text("<html><body>v2</body></html>", encoding="utf-8")
+    stat = page.stat()
+    os.utime(page, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+    second = load_html(page, render)
+    assert second.body.endswith(b"V2</BODY></HTML>")
+    assert second.etag != first.etag
+    assert len(calls) == 2
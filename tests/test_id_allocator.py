@@ -0,0 +1,61 @@
+import pytest
+
+from db_mongo import ID_ALLOCATOR, IdBlockAllocator, get_db, next_id_str, next_ids, sync_counters
+from tests.conftest import wiki_client
+
+
+def test_blocks_are_reserved_per_process_and_never_overlap(db_queries):
+    worker_a = IdBlockAllocator(default_size=10)
+    worker_b = IdBlockAllocator(default_size=10)
+
+    with db_queries.capture():
+        first = [worker_a.take("things")[0] for _ in range(12)]
+    assert first == list(range(1, 13))
+    assert db_queries.count == 2, db_queries.report()
+
+    second = worker_b.take("things", 3)
+    assert second == [21, 22, 23]
+    assert worker_a.take("things", 10) == [13, 14, 15, 16, 17, 18, 19, 20, 31, 32]
+    assert get_db().counters.find_one({"_id": "things"})["seq"] == 40
+
+
+def test_default_block_size_keeps_ids_dense():
+    allocator = IdBlockAllocator()
+    assert [allocator.take("spells")[0] for _ in range(3)] == [1, 2, 3]
+    assert get_db().counters.find_one({"_id": "spells"})["seq"] == 3
+
+
+def test_next_ids_keeps_zero_padded_format():
+    assert next_ids("pending", 3, padding=5) == ["00001", "00002", "00003"]
+    assert next_id_str("pending", padding=5) == "00004"
+    assert next_ids("pending", 0) == []
+
+
+def test_sync_counters_drops_stale_blocks(monkeypatch):
+    monkeypatch.setitem(ID_ALLOCATOR.sizes, "spells", 100)
+    assert next_id_str("spells") == "0001"
+    get_db().spells.insert_one({"id": "0500"})
+    sync_counters()
+    assert next_id_str("spells") == "0501"
+    assert ID_ALLOCATOR.block_size("combat_part") == 50
+
+
+@pytest.mark.asyncio
+async def test_only_the_owner_read_persists_upgrade_choice_ids():
+    db = get_db()
+    db.objects.insert_one({"id": "0001", "name": "Rope", "enc": 1, "price": 2})
+    db.characters.insert_one({"id": "0001", "owner": "owner", "inventory_id": "0001", "public": True})
+    # The catalog name changed since the item was stored, so the read rewrites items.
+    db.inventories.insert_one({"id": "0001", "owner": "owner", "name": "Pack", "items": [
+        {"item_id": "it1", "kind": "object", "ref_id": "0001", "name": "Old Rope", "qty": 1, "upgrades": [{"name": "Sturdy"}]},
+    ]})
+
+    for token, user in ((None, None), ("other-token", "someone")):
+        async with wiki_client(auth_token=token, role="user", username=user or "tester") as client:
+            assert (await client.get("/inventories/0001")).status_code == 200
+        assert "choice_id" not in db.inventories.find_one({"id": "0001"})["items"][0]["upgrades"][0]
+
+    async with wiki_client(auth_token="owner-token", role="user", username="owner") as client:
+        resp = await client.get("/inventories/0001")
+    choice_id = resp.json()["inventory"]["items"][0]["upgrades"][0]["choice_id"]
+    assert db.inventories.find_one({"id": "0001"})["items"][0]["upgrades"][0]["choice_id"] == choice_id
@@ -0,0 +1,65 @@
+import os
+import re
+import subprocess
+import sys
+
+import pytest
+from fastapi import FastAPI
+from httpx import ASGITransport, AsyncClient
+
+from main import LAZY_ROUTERS
+from server.src.modules.lazy_routers import LazyRouterMiddleware, LazyRouters
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Cold `import main` is ~0.7 s on a laptop; the budget leaves room for slow CI.
+IMPORT_BUDGET_MS = int(os.getenv("IMPORT_BUDGET_MS", "3000"))
+DEFERRED_MODULES = ("boto3", "botocore", "uvicorn")
+# Route groups are imported when the app starts (or on its first request).
+LAZY_ROUTE_MODULES = LAZY_ROUTERS.modules
+
+PROBE = """
+import sys
+import db_mongo
+import main
+print("clients", db_mongo.get_client.cache_info().currsize)
+print("loaded", [m for m in sys.argv[1:] if m in sys.modules])
+"""
+
+
+def _import_main():
+    env = {**os.environ, "MONGODB_URI": "mongomock://localhost", "PYTHONDONTWRITEBYTECODE": "1"}
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", PROBE, *DEFERRED_MODULES, *LAZY_ROUTE_MODULES],
+        cwd=ROOT, env=env, capture_output=True, text=True, timeout=120,
+    )
+    assert proc.returncode == 0, proc.stderr[-2000:]
+    return proc.stdout, proc.stderr
+
+
+def test_import_main_is_side_effect_free_and_within_budget():
+    stdout, importtime = _import_main()
+
+    assert "clients 0" in stdout, "importing main opened a Mongo client"
+    assert "loaded []" in stdout, stdout
+
+    match = re.search(r"^import time:\s+\d+ \|\s+(\d+) \| main$", importtime, re.M)
+    assert match, "main missing from -X importtime output"
+    cumulative_ms = int(match.group(1)) / 1000
+    assert cumulative_ms < IMPORT_BUDGET_MS, f"import main took {cumulative_ms:.0f} ms (budget {IMPORT_BUDGET_MS} ms)"
+
+
+@pytest.mark.asyncio
+async def test_lazy_routers_mount_once_on_the_first_request():
+    app = FastAPI()
+    routers = LazyRouters(app, ("server.src.modules.economy_api",))
+    app.add_middleware(LazyRouterMiddleware, routers=routers)
+    assert not routers.mounted
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        # Routed (and rejected for the missing login) rather than a 404.
+        assert (await client.get("/economy-0-3-5/entities")).status_code == 401
+    assert routers.mounted
+    count = len(app.routes)
+    routers.mount()
+    assert len(app.routes) == count
@@ -0,0 +1,108 @@
+import pytest
+
+from db_mongo import get_db
+from server.src.modules.name_search import NameIndex, get_name_index, name_filter, touch_name_index
+from settings import settings
+from tests.conftest import wiki_client
+
+
+def _index(*names):
+    index = NameIndex("test")
+    for i, name in enumerate(names, start=1):
+        index.upsert(f"{i:04d}", name)
+    return index
+
+
+def test_substring_ranking_and_maintenance():
+    index = _index("Fireball", "Greater Fire Ward", "Bonfire", "fire", "Ice Lance", "Wildfire  Storm")
+    ranked = [doc_id for doc_id, _ in index.search("FIRE")]
+    # exact, prefix, word prefix, then inner substrings (earlier/shorter first)
+    assert ranked == ["0004", "0001", "0002", "0003", "0006"]
+    assert [d for d, _ in index.search("fire storm")] == ["0006"]
+    assert [d for d, _ in index.search("ce")] == ["0005"]
+    assert index.search("fire", 2) == [("0004", 1.0), ("0001", 0.9)]
+
+    index.upsert("0001", "Frostball")
+    index.remove("0004")
+    assert [d for d, _ in index.search("fire")] == ["0002", "0003", "0006"]
+    assert [d for d, _ in index.search("ball")] == ["0001"]
+    assert index.search("fire", max_hits=2) is None
+
+
+def test_fuzzy_matches_follow_substring_hits():
+    index = _index("Fireball", "Lightning Bolt", "Frost Nova")
+    hits = index.search("firebal", fuzzy=True)
+    assert hits[0] == ("0001", 0.9)
+    fuzzy = index.search("lightnin blt", fuzzy=True)
+    assert fuzzy and fuzzy[0][0] == "0002" and fuzzy[0][1] < 0.9
+    assert index.search("zzzz", fuzzy=True) == []
+
+
+def test_writes_patch_the_local_index_and_bump_version():
+    db = get_db()
+    db.objects.insert_many([{"id": "0001", "name": "Rope"}, {"id": "0002", "name": "Lantern"}])
+    index = get_name_index("objects")
+    assert [d for d, _ in index.search("rope")] == ["0001"]
+
+    db.objects.update_one({"id": "0001"}, {"$set": {"name": "Silk Rope"}})
+    db.objects.insert_one({"id": "0003", "name": "Rope Ladder"})
+    touch_name_index("objects", ["0001", "0003"])
+    assert [d for d, _ in get_name_index("objects").search("rope")] == ["0003", "0001"]
+    assert get_name_index("objects").version == 1
+
+    db.objects.delete_one({"id": "0003"})
+    touch_name_index("objects", ["0003"])
+    assert name_filter("objects", "rope") == {"id": {"$in": ["0001"]}}
+
+
+def test_broad_queries_fall_back_to_regex(monkeypatch):
+    get_db().tools.insert_many([{"id": f"{i:04d}", "name": f"Tool {i}"} for i in range(5)])
+    monkeypatch.setattr(settings, "name_search_max_ids", 3)
+    assert name_filter("tools", "tool") == {"name": {"$regex": "tool", "$options": "i"}}
+    assert name_filter("tools", "tool 4") == {"id": {"$in": ["0004"]}}
+
+
+@pytest.mark.asyncio
+async def test_routes_use_the_index_and_see_new_writes():
+    get_db().weapons.insert_many([
+        {"id": "0001", "name": "Long Sword", "name_key": "long sword", "price": 10},
+        {"id": "0002", "name": "Sword", "name_key": "sword", "price": 5},
+        {"id": "0003", "name": "Bow", "name_key": "bow", "price": 7},
+    ])
+    async with wiki_client() as client:
+        listed = (await client.get("/weapons", params={"q": "SWORD"})).json()["weapons"]
+        assert {w["id"] for w in listed} == {"0001", "0002"}
+
+        ranked = (await client.get("/catalog/weapons", params={"q": "sword", "limit": 1})).json()["weapons"]
+        assert [w["id"] for w in ranked] == ["0002"]
+
+        created = await client.post("/objects", json={"name": "Sword Oil", "price": 1})
+        assert created.status_code == 200
+        found = (await client.get("/search", params={"q": "sword", "kinds": "weapons,objects"})).json()["results"]
+        assert [h["name"] for h in found["weapons"]] == ["Sword", "Long Sword"]
+        assert [h["name"] for h in found["objects"]] == ["Sword Oil"]
+
+        bad = await client.get("/search", params={"q": "x", "kinds": "apotheoses"})
+        assert bad.status_code == 400
+
+
+def test_docs_without_an_id_do_not_trigger_rebuilds(monkeypatch):
+    db = get_db()
+    db.effects.insert_many([{"id": "0001", "name": "Burn"}, {"name": "Orphan"}, {"id": "0001", "name": "Burn copy"}])
+    index = get_name_index("effects")
+    assert len(index) == 1 and index.doc_count == 3
+
+    db.effects.insert_one({"id": "0002", "name": "Freeze"})
+    touch_name_index("effects", ["0002"])
+    assert index.doc_count == 4
+
+    monkeypatch.setattr(settings, "name_index_check_seconds", 0)
+    rebuilds = []
+    monkeypatch.setattr("server.src.modules.name_search._rebuild_async", rebuilds.append)
+    for _ in range(3):
+        get_name_index("effects")
+    assert rebuilds == []
+
+    db.effects.insert_one({"id": "0003", "name": "Written elsewhere"})
+    get_name_index("effects")
+    assert rebuilds == ["effects"]
@@ -0,0 +1,76 @@
+import pytest
+
+from db_mongo import get_db
+from tests.conftest import wiki_client
+
+
+def _seed_inventory(items: int = 200):
+    db = get_db()
+    db.objects.insert_many([{"id": f"{i:04d}", "name": f"Rope {i}", "enc": 1, "price": 2} for i in range(1, 51)])
+    db.equipment.insert_many([{"id": f"{i:04d}", "name": f"Shield {i}", "category": "gear"} for i in range(1, 51)])
+    db.tools.insert_many([{"id": f"{i:04d}", "name": f"Kit {i}", "name_key": f"kit {i}"} for i in range(1, 51)])
+    kinds = ("object", "equipment", "tool")
+    db.inventories.insert_one({"id": "0001", "owner": "tester", "name": "Pack", "items": [
+        {"item_id": f"it{j}", "kind": kinds[j % 3], "ref_id": f"{j % 50 + 1:04d}", "qty": 1} for j in range(items)
+    ]})
+
+
+@pytest.mark.asyncio
+async def test_inventory_read_is_not_per_item(db_queries):
+    _seed_inventory(200)
+    async with wiki_client(role="user") as client:
+        with db_queries.capture():
+            first = await client.get("/inventories/0001")
+        assert first.status_code == 200
+        assert len(first.json()["inventory"]["items"]) == 200
+        assert first.json()["inventory"]["items"][0]["name"] == "Rope 1"
+        assert db_queries.count <= 5, db_queries.report()
+
+        with db_queries.capture():
+            await client.get("/inventories/0001")
+        assert db_queries.count <= 4, db_queries.report()
+
+
+@pytest.mark.asyncio
+async def test_spell_pages_stay_within_budget(db_queries):
+    get_db().spells.insert_many([{"id": f"{i:04d}", "name": f"Spell {i}", "status": "green"} for i in range(1, 301)])
+    async with wiki_client(role="user") as client:
+        await client.get("/spells?limit=50")  # loads the cost catalog once
+        for path in ("/spells?limit=50&page=3", "/spells?cursor=&limit=50", "/spells?limit=50&sort=name&total=none"):
+            with db_queries.capture():
+                resp = await client.get(path)
+            assert resp.status_code == 200
+            assert db_queries.count <= 4, f"{path}: {db_queries.report()}"
+
+
+@pytest.mark.asyncio
+async def test_wiki_link_rebuild_resolves_slugs_in_one_query(db_queries):
+    async with wiki_client(role="admin") as client:
+        for i in range(30):
+            await client.post("/api/wiki/pages", json={"title": f"Target {i}", "slug": f"target-{i}", "doc_json": {"type": "doc", "content": []}})
+        links = [
+            {"type": "text", "text": f"target {i}", "marks": [{"type": "link", "attrs": {"pageSlug": f"target-{i}"}}]}
+            for i in range(30)
+        ]
+        doc = {"type": "doc", "content": [{"type": "paragraph", "content": links}]}
+        with db_queries.capture():
+            resp = await client.post("/api/wiki/pages", json={"title": "Hub", "slug": "hub", "doc_json": doc})
+        assert resp.status_code == 200
+        assert db_queries.count <= 12, db_queries.report()
+
+        out = await client.get(f"/api/wiki/pages/{resp.json()['id']}/links")
+        assert all(row["to_page_id"] for row in out.json())
+
+
+@pytest.mark.asyncio
+async def test_campaign_reads_stay_within_budget(db_queries):
+    db = get_db()
+    db.campaigns.insert_one({"id": "0001", "owner": "tester", "members": []})
+    db.quests.insert_many([{"campaignId": "0001", "id": f"q{i}", "scope": "group"} for i in range(40)])
+    db.campaign_chat.insert_many([{"id": f"msg_{i:06d}", "campaign_id": "0001", "ts": i, "text": "hi"} for i in range(300)])
+    async with wiki_client(role="user") as client:
+        for path, budget in (("/campaigns/0001/quests", 3), ("/campaigns/0001/chat", 2)):
+            with db_queries.capture():
+                resp = await client.get(path)
+            assert resp.status_code == 200
+            assert db_queries.count <= budget, f"{path}: {db_queries.report()}"
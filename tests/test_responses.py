@@ -0,0 +1,110 @@
+import datetime
+import json
+from decimal import Decimal
+
+import pytest
+from bson import ObjectId
+from httpx import ASGITransport, AsyncClient
+from starlette.applications import Starlette
+from starlette.responses import StreamingResponse
+from starlette.routing import Route
+
+from db_mongo import get_db
+from server.src.modules.compression import CompressionMiddleware, negotiate_encoding
+from server.src.modules.fast_json import FastJSONResponse, dumps
+from settings import settings
+from tests.conftest import wiki_client
+
+brotli = pytest.importorskip("brotli")
+
+PAYLOAD = {
+    "when": datetime.datetime(2024, 5, 1, 12, 30, 5, 120000),
+    "day": datetime.date(2024, 5, 1),
+    "oid": ObjectId("65f000000000000000000001"),
+    "price": Decimal("2.50"),
+    "tags": {"fire"},
+    "name": "Épée",
+    "nested": [{"n": 1}, None, True],
+}
+EXPECTED = {
+    "when": "2024-05-01T12:30:05.120000",
+    "day": "2024-05-01",
+    "oid": "65f000000000000000000001",
+    "price": 2.5,
+    "tags": ["fire"],
+    "name": "Épée",
+    "nested": [{"n": 1}, None, True],
+}
+
+
+@pytest.mark.parametrize("fast", [True, False])
+def test_dumps_handles_mongo_and_python_types(monkeypatch, fast):
+    monkeypatch.setattr(settings, "json_fast_serializer", fast)
+    assert json.loads(dumps(PAYLOAD)) == EXPECTED
+    assert json.loads(FastJSONResponse({"big": 2**70}).body) == {"big": 2**70}
+
+
+@pytest.mark.parametrize("header,expected", [
+    ("gzip, deflate, br", "br"),
+    ("gzip;q=1.0, br;q=0.5", "gzip"),
+    ("br;q=0, gzip", "gzip"),
+    ("*", "br"),
+    ("identity", None),
+    ("", None),
+])
+def test_accept_encoding_negotiation(header, expected):
+    assert negotiate_encoding(header) == expected
+
+
+def _seed_abilities(count: int = 200):
+    get_db().abilities.insert_many([
+        {"id": f"{i:04d}", "name": f"Ability {i}", "description": "Strikes true. " * 10, "tags": ["phb"]}
+        for i in range(count)
+    ])
+
+
+@pytest.mark.asyncio
+async def test_large_lists_are_compressed_for_clients_that_ask():
+    _seed_abilities()
+    async with wiki_client() as client:
+        br = await client.get("/abilities", headers={"Accept-Encoding": "br"})
+        assert br.headers["content-encoding"] == "br"
+        assert "accept-encoding" in br.headers["vary"].lower()
+        assert int(br.headers["content-length"]) < len(br.content) / 4
+        assert len(br.json()["abilities"]) == 200
+
+        gz = await client.get("/abilities", headers={"Accept-Encoding": "gzip"})
+        assert gz.headers["content-encoding"] == "gzip"
+        assert gz.json() == br.json()
+
+        plain = await client.get("/abilities", headers={"Accept-Encoding": "identity"})
+        assert "content-encoding" not in plain.headers
+        assert plain.json() == br.json()
+
+        small = await client.get("/abilities/0001", headers={"Accept-Encoding": "br"})
+        assert "content-encoding" not in small.headers
+
+
+@pytest.mark.asyncio
+async def test_streamed_bodies_are_compressed_incrementally():
+    async def stream(request):
+        async def chunks():
+            for i in range(50):
+                yield (f"line {i} " * 20 + "\n").encode()
+        return StreamingResponse(chunks(), media_type="text/plain")
+
+    async def image(request):
+        async def chunks():
+            yield b"\x89PNG" * 1000
+        return StreamingResponse(chunks(), media_type="image/png")
+
+    app = CompressionMiddleware(Starlette(routes=[Route("/s", stream), Route("/i", image)]), minimum_size=10)
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        resp = await client.get("/s", headers={"Accept-Encoding": "gzip"})
+        assert resp.headers["content-encoding"] == "gzip"
+        assert "content-length" not in resp.headers
+        assert resp.text.count("\n") == 50
+
+        raw = await client.get("/i", headers={"Accept-Encoding": "gzip"})
+        assert "content-encoding" not in raw.headers
+        assert raw.content == b"\x89PNG" * 1000
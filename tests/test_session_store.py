@@ -0,0 +1,89 @@
+import datetime
+
+import pytest
+
+from db_mongo import get_db
+from server.src.modules.authentification_helpers import get_session_identity, set_session_admin_privileges
+from server.src.modules.session_store import SESSIONS, MemorySessionStore, MongoSessionStore, token_key
+from tests.conftest import wiki_client
+
+
+@pytest.fixture
+def mongo_sessions(monkeypatch):
+    """Two 'workers' sharing the sessions collection; worker_a backs the auth helpers."""
+    worker_a = MongoSessionStore(cache_seconds=60)
+    worker_b = MongoSessionStore(cache_seconds=60)
+    monkeypatch.setattr("server.src.modules.authentification_helpers.get_session_store", lambda: worker_a)
+    return worker_a, worker_b
+
+
+def test_sessions_are_shared_and_stored_hashed(mongo_sessions, db_queries):
+    worker_a, worker_b = mongo_sessions
+    worker_a.create("tok-1", "alice", "admin")
+
+    doc = get_db().sessions.find_one()
+    assert doc["_id"] == token_key("tok-1") and "tok-1" not in str(doc)
+    assert doc["expires_at"] > datetime.datetime.utcnow() + datetime.timedelta(days=29)
+
+    with db_queries.capture():
+        assert worker_b.get("tok-1") == ("alice", "admin", None)
+        assert worker_b.get("tok-1") == ("alice", "admin", None)
+    assert db_queries.count == 1, db_queries.report()
+    assert worker_b.get("unknown") is None
+
+
+def test_revocation_reaches_other_workers_when_their_cache_expires(mongo_sessions):
+    worker_a, worker_b = mongo_sessions
+    worker_a.create("tok-1", "alice", "user")
+    worker_a.create("tok-2", "alice", "user")
+    worker_a.create("tok-3", "bob", "user")
+    assert worker_b.get("tok-1") is not None
+
+    assert worker_a.revoke_user("alice") == 2
+    assert worker_a.get("tok-1") is None
+    assert worker_b.get("tok-1") is not None  # still inside worker_b's cache window
+    worker_b.clear_cache()
+    assert worker_b.get("tok-1") is None
+    assert worker_b.get("tok-3") == ("bob", "user", None)
+
+
+def test_expired_sessions_are_ignored():
+    store = MongoSessionStore(ttl_seconds=60, cache_seconds=0)
+    store.create("tok", "alice", "user")
+    get_db().sessions.update_one({}, {"$set": {"expires_at": datetime.datetime.utcnow() - datetime.timedelta(seconds=1)}})
+    assert store.get("tok") is None
+
+
+def test_admin_privilege_toggle_goes_through_the_store(mongo_sessions):
+    worker_a, _ = mongo_sessions
+    worker_a.create("tok", "root", "admin")
+    assert set_session_admin_privileges("tok", False) == ("root", "admin", "user")
+    assert get_db().sessions.find_one()["role_override"] == "user"
+    assert set_session_admin_privileges("tok", True) == ("root", "admin", "admin")
+    assert get_session_identity("tok") == ("root", "admin", "admin")
+
+
+def test_memory_store_revokes_by_user():
+    store = MemorySessionStore()
+    store.create("a", "alice", "user")
+    store.create("b", "bob", "user")
+    assert store.revoke_user("alice") == 1
+    assert set(SESSIONS) == {"b"}
+
+
+@pytest.mark.asyncio
+async def test_login_and_role_change_use_the_shared_store(mongo_sessions):
+    get_db().users.insert_one({"username": "alice", "password": "pw", "role": "user", "password_reset_version": 1})
+    async with wiki_client(auth_token=None) as client:
+        login = (await client.post("/auth/login", json={"username": "alice", "password": "pw"})).json()
+    assert login["status"] == "success"
+    assert get_db().sessions.count_documents({"username": "alice"}) == 1
+    assert get_session_identity(login["token"]) == ("alice", "user", "user")
+
+    mongo_sessions[0].create("admin-token", "root", "admin")
+    async with wiki_client(auth_token=None) as admin:
+        changed = await admin.put(
+            "/admin/users/alice/role", json={"role": "moderator"}, headers={"Authorization": "Bearer admin-token"},
+        )
+        assert changed.json()["status"] == "success"
+    assert get_session_identity(login["token"]) is None
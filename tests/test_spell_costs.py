@@ -0,0 +1,144 @@
+import pytest
+
+from db_mongo import get_db
+from server.src.modules.spell_catalog import CATALOG_VERSION_KEY, get_spell_catalog
+from server.src.modules.admin_jobs import wait_for_job
+from server.src.modules.spell_helpers import recompute_spells
+from settings import settings
+from tests.conftest import wiki_client
+from tests.helpers import seed_catalog
+
+
+@pytest.mark.asyncio
+async def test_costs_use_catalog_types_and_sums():
+    seed_catalog()
+    async with wiki_client() as client:
+        resp = await client.post("/costs", json={
+            "activation": "Action", "range": 3, "aoe": "Cone (3)", "duration": 1,
+            "effects": ["0001", "0002", "0002"],
+        })
+        assert resp.status_code == 200
+        body = resp.json()
+        assert body["breakdown"]["range"]["type"] == "B"
+        assert body["breakdown"]["aoe"]["type"] == "C"
+        assert body["breakdown"]["effects"] == {"mp": 13, "en": 5}
+
+
+@pytest.mark.asyncio
+async def test_admin_effect_edit_invalidates_catalog():
+    seed_catalog()
+    payload = {"activation": "Action", "range": 0, "aoe": "A Square", "duration": 1, "effects": ["0001"]}
+    async with wiki_client() as client:
+        first = await client.post("/costs", json=payload)
+        assert first.json()["breakdown"]["effects"]["mp"] == 3
+
+        edit = await client.put("/admin/effects/0001", json={"mp_cost": 9})
+        assert edit.status_code == 200
+
+        second = await client.post("/costs", json=payload)
+        assert second.json()["breakdown"]["effects"]["mp"] == 9
+
+
+def test_catalog_reloads_when_persisted_version_moves(monkeypatch):
+    seed_catalog()
+    monkeypatch.setattr(settings, "spell_catalog_check_seconds", 0)
+    assert get_spell_catalog().effect("0001").mp_cost == 3
+
+    # Simulate another worker editing an effect and bumping the version.
+    db = get_db()
+    db.effects.update_one({"id": "0001"}, {"$set": {"mp_cost": 7}})
+    assert get_spell_catalog().effect("0001").mp_cost == 3
+    db.counters.update_one({"_id": CATALOG_VERSION_KEY}, {"$inc": {"seq": 1}}, upsert=True)
+    assert get_spell_catalog().effect("0001").mp_cost == 7
+
+
+@pytest.mark.asyncio
+async def test_costs_batch_matches_single_calls():
+    seed_catalog()
+    items = [
+        {"activation": "Action", "range": 3, "aoe": "Cone (3)", "duration": 1, "effects": ["0001", "0002"]},
+        {"activation": "Ritual", "range": 5, "aoe": "Line (5)", "duration": 4, "effects": ["0003"], "range_type": "C"},
+        {"activation": "Special Action", "range": 0, "aoe": "A Square", "duration": 2, "effects": ["0002", "0002", "9999"]},
+        {"activation": "Action", "range": "far", "effects": ["0001"]},
+    ]
+    async with wiki_client() as client:
+        batch = await client.post("/costs/batch", json={"items": items})
+        assert batch.status_code == 200
+        results = batch.json()["results"]
+        assert len(results) == 4
+        for item, result in zip(items[:3], results[:3]):
+            single = await client.post("/costs", json=item)
+            expected = single.json()
+            assert result["status"] == "success"
+            assert {k: result[k] for k in expected} == expected
+        assert results[3]["status"] == "error"
+
+
+def seed_spells(count: int = 5):
+    get_db().spells.insert_many([
+        {
+            "id": f"{i:04d}", "name": f"Spell {i}", "activation": "Action", "range": 0,
+            "aoe": "A Square", "duration": 1, "effects": ["0001", "0002"] if i % 2 else ["0001"],
+            "mp_cost": 0, "en_cost": 0, "category": "",
+        }
+        for i in range(1, count + 1)
+    ])
+
+
+@pytest.mark.asyncio
+async def test_recompute_all_returns_structured_report():
+    seed_catalog()
+    seed_spells()
+    async with wiki_client() as client:
+        resp = await client.post("/admin/spells/recompute_all")
+        assert resp.status_code == 202
+        job_id = resp.json()["job"]["id"]
+        body = wait_for_job(job_id)["result"]
+        assert (body["total"], body["changed"]) == (5, 5)
+        assert set(body) == {"status", "changed", "total", "note"}
+        first = (await client.get(f"/admin/jobs/{job_id}/output", params={"limit": 1})).json()["items"][0]
+        assert first["before"] == {"mp_cost": 0, "en_cost": 0, "category": ""}
+        assert first["after"] == {"mp_cost": 8, "en_cost": 3, "category": "Novice"}
+
+        again = await client.post("/admin/spells/recompute_all")
+        assert wait_for_job(again.json()["job"]["id"])["result"]["changed"] == 0
+    assert get_db().spells.find_one({"id": "0002"})["mp_cost"] == 3
+
+
+def test_recompute_pipeline_batches_and_strips_removed_effects():
+    seed_catalog()
+    seed_spells()
+    report = recompute_spells({"effects": "0002"}, remove_effects={"0002"}, batch_size=2)
+    assert report["total"] == 3
+    assert all(c["effects_removed"] for c in report["changes"])
+    doc = get_db().spells.find_one({"id": "0001"})
+    assert doc["effects"] == ["0001"]
+    assert doc["mp_cost"] == 3
+
+
+@pytest.mark.asyncio
+async def test_bulk_replace_bumps_the_catalog_once_and_recomputes_in_one_pass(db_queries):
+    seed_catalog()
+    seed_spells()
+    body = {
+        "school_name": "Fire", "replace_duplicates": True,
+        "effects": [
+            {"name": "Burn", "mp_cost": 4, "en_cost": 1},
+            {"name": "Burn", "mp_cost": 5, "en_cost": 1},
+            {"name": "Burn", "mp_cost": 6, "en_cost": 2},
+        ],
+    }
+    async with wiki_client() as client:
+        version = get_spell_catalog().version
+        with db_queries.capture():
+            resp = await client.post("/admin/effects/bulk_create", json=body)
+        assert resp.json()["updated"] == ["0001", "0001", "0001"]
+        assert get_db().counters.find_one({"_id": CATALOG_VERSION_KEY})["seq"] == version + 1
+        assert sum(1 for c in db_queries.calls if c == ("find", "spells")) == 1, db_queries.report()
+        assert get_db().spells.find_one({"id": "0002"})["mp_cost"] == 6
+
+        bad = {**body, "effects": [{"name": "Burn", "mp_cost": 1, "en_cost": 1}, {"name": "Oops", "mp_cost": "x"}]}
+        with db_queries.capture():
+            resp = await client.post("/admin/effects/bulk_create", json=bad)
+        assert resp.status_code == 400
+        assert not [c for c in db_queries.calls if c[0] != "find_one" or c[1] != "users"], db_queries.report()
@@ -0,0 +1,144 @@
+import pytest
+
+from db_mongo import get_db
+from server.src.modules.admin_jobs import wait_for_job
+from server.src.modules.spell_helpers import backfill_spell_name_keys, spell_school_fields
+from tests.conftest import wiki_client
+from tests.helpers import seed_catalog
+
+
+def _seed(count: int, with_schools: bool = True):
+    docs = []
+    for i in range(1, count + 1):
+        name = f"Spell {(count - i) % 7}"
+        doc = {"id": f"{i:04d}", "name": name, "name_key": name.lower(), "status": "green",
+               "activation": "Action", "range": 0, "aoe": "A Square", "duration": 1,
+               "effects": ["0001"] if i % 3 else ["0002"]}
+        if with_schools:
+            doc.update(spell_school_fields(doc["effects"]))
+        docs.append(doc)
+    get_db().spells.insert_many(docs)
+
+
+async def _walk(client, **params):
+    seen, cursor, pages = [], "", 0
+    while cursor is not None:
+        resp = await client.get("/spells", params={**params, "cursor": cursor})
+        assert resp.status_code == 200
+        body = resp.json()
+        seen.extend(sp["id"] for sp in body["spells"])
+        assert body["has_more"] == (body["next_cursor"] is not None)
+        cursor = body["next_cursor"]
+        pages += 1
+    return seen, pages
+
+
+@pytest.mark.asyncio
+async def test_cursor_pages_cover_every_spell_once():
+    seed_catalog()
+    _seed(23)
+    async with wiki_client() as client:
+        ids, pages = await _walk(client, limit=5)
+        assert ids == [f"{i:04d}" for i in range(1, 24)]
+        assert pages == 5
+
+        by_name, _ = await _walk(client, limit=4, sort="name")
+        docs = {d["id"]: d["name"] for d in get_db().spells.find({}, {"_id": 0})}
+        assert sorted(by_name) == sorted(docs)
+        assert by_name == sorted(docs, key=lambda sid: (docs[sid], sid))
+
+        fire, _ = await _walk(client, limit=3, school_id="0001")
+        assert fire == [f"{i:04d}" for i in range(1, 24) if i % 3]
+
+
+@pytest.mark.asyncio
+async def test_cursor_totals_are_opt_in():
+    _seed(6)
+    async with wiki_client() as client:
+        first = (await client.get("/spells", params={"cursor": "", "limit": 2})).json()
+        assert first["total"] is None
+        exact = (await client.get("/spells", params={"cursor": "", "limit": 2, "total": "exact", "name": "Spell 1"})).json()
+        assert exact["total"] == 1
+        estimate = (await client.get("/spells", params={"cursor": "", "limit": 2, "total": "estimate"})).json()
+        assert estimate["total"] == 6
+        # No estimate exists for a filtered set, so it is counted exactly.
+        filtered = (await client.get("/spells", params={"cursor": "", "limit": 2, "total": "estimate", "name": "Spell 1"})).json()
+        assert filtered["total"] == 1
+        bad = await client.get("/spells", params={"cursor": "", "total": "approx"})
+        assert bad.status_code == 400
+
+        legacy = (await client.get("/spells", params={"page": 2, "limit": 4})).json()
+        assert (legacy["page"], legacy["total"], len(legacy["spells"])) == (2, 6, 2)
+
+
+@pytest.mark.asyncio
+async def test_name_cursor_keeps_spells_without_a_name():
+    _seed(5)
+    db = get_db()
+    db.spells.update_one({"id": "0002"}, {"$unset": {"name": "", "name_key": ""}})
+    db.spells.update_one({"id": "0004"}, {"$set": {"name": None}, "$unset": {"name_key": ""}})
+    db.spells.update_one({"id": "0005"}, {"$set": {"name": "  ZAP  Bolt"}})
+    assert backfill_spell_name_keys() == 3
+    assert backfill_spell_name_keys() == 0
+    async with wiki_client() as client:
+        by_name, _ = await _walk(client, limit=1, sort="name")
+    assert by_name == ["0002", "0004", "0003", "0001", "0005"]
+
+
+@pytest.mark.asyncio
+async def test_bad_cursor_is_rejected():
+    _seed(3)
+    async with wiki_client() as client:
+        first = (await client.get("/spells", params={"cursor": "", "limit": 1})).json()
+        wrong_sort = await client.get("/spells", params={"cursor": first["next_cursor"], "sort": "name"})
+        assert wrong_sort.status_code == 400
+        garbage = await client.get("/spells", params={"cursor": "not-a-cursor"})
+        assert garbage.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_spell_writes_store_school_ids():
+    seed_catalog()
+    async with wiki_client() as client:
+        created = await client.post("/submit_spell", json={
+            "name": "Storm Fire", "activation": "Action", "range": 0, "aoe": "A Square",
+            "duration": 1, "effects": ["0002", "0001"],
+        })
+        sid = created.json()["id"]
+        doc = get_db().spells.find_one({"id": sid})
+        assert doc["school_ids"] == ["0001", "0002"]
+        assert doc["schools"] == [{"id": "0001", "name": "Fire"}, {"id": "0002", "name": "Storm"}]
+
+        await client.put(f"/spells/{sid}", json={"effects": ["0003"]})
+        assert get_db().spells.find_one({"id": sid})["school_ids"] == ["0003"]
+
+        clone = await client.post(f"/spells/{sid}/clone")
+        assert clone.json()["spell"]["school_ids"] == ["0003"]
+
+        await client.put("/admin/schools/0003", json={"name": "Amplifier"})
+        listed = (await client.get("/spells", params={"school_id": "0003"})).json()["spells"]
+        assert {sp["id"] for sp in listed} == {sid, clone.json()["id"]}
+        assert all(sp["schools"] == [{"id": "0003", "name": "Amplifier"}] for sp in listed)
+
+        await client.put("/admin/effects/0003", json={"school": "0001"})
+        assert get_db().spells.find_one({"id": sid})["school_ids"] == ["0001"]
+        by_name = (await client.get("/spells", params={"school": "fire"})).json()["spells"]
+        assert sid in {sp["id"] for sp in by_name}
+
+
+@pytest.mark.asyncio
+async def test_backfill_school_ids_job():
+    seed_catalog()
+    _seed(4, with_schools=False)
+    async with wiki_client() as client:
+        before = (await client.get("/spells", params={"school_id": "0002"})).json()
+        assert before["spells"] == []
+        # Legacy docs are still enriched for display.
+        assert (await client.get("/spells")).json()["spells"][0]["schools"] == [{"id": "0001", "name": "Fire"}]
+
+        resp = await client.post("/admin/maintenance/backfill_spell_schools")
+        job = wait_for_job(resp.json()["job"]["id"])
+        assert job["result"]["updated"] == 4
+
+        after = (await client.get("/spells", params={"school_id": "0002"})).json()
+        assert [sp["id"] for sp in after["spells"]] == ["0003"]
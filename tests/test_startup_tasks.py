@@ -0,0 +1,84 @@
+import pytest
+
+from db_mongo import SCHEMA_VERSION, get_db, sync_counters
+from server.src.modules import startup_tasks
+from server.src.modules.startup_tasks import SCHEMA_META_COL, StartupTask, run_once, run_startup_tasks
+from settings import settings
+
+
+def _counting_task(name="demo", version="1", critical=True, fail=False):
+    calls = []
+
+    def fn():
+        calls.append(1)
+        if fail:
+            raise RuntimeError("boom")
+
+    return StartupTask(name, version, fn, critical), calls
+
+
+def test_default_tasks_are_skipped_once_stamped(monkeypatch):
+    monkeypatch.setattr(settings, "deploy_id", "")
+    assert run_startup_tasks() == {"core.indexes": "ran", "core.counters": "ran", "audit.schema": "ran", "spells.name_keys": "ran", "wiki.schema": "ran"}
+    # Without a DEPLOY_ID the (cheap, idempotent) counter sync runs every boot.
+    assert run_startup_tasks() == {"core.indexes": "current", "core.counters": "ran", "audit.schema": "current", "spells.name_keys": "current", "wiki.schema": "current"}
+
+    monkeypatch.setattr(settings, "deploy_id", "abc123")
+    assert run_startup_tasks()["core.counters"] == "ran"
+    assert run_startup_tasks()["core.counters"] == "current"
+
+    stamp = get_db()[SCHEMA_META_COL].find_one({"_id": "core.indexes"})
+    assert stamp["version"] == str(SCHEMA_VERSION)
+    assert "lease_owner" not in stamp
+
+
+def test_version_bump_reruns_and_modes():
+    task, calls = _counting_task(version="1")
+    assert run_startup_tasks(tasks=[task]) == {"demo": "ran"}
+    assert run_startup_tasks(tasks=[task]) == {"demo": "current"}
+    assert run_startup_tasks(mode="always", tasks=[task]) == {"demo": "ran"}
+    assert run_startup_tasks(mode="skip", tasks=[task]) == {"demo": "skipped"}
+    bumped, bumped_calls = _counting_task(version="2")
+    assert run_startup_tasks(tasks=[bumped]) == {"demo": "ran"}
+    assert len(calls) == 2 and len(bumped_calls) == 1
+    with pytest.raises(RuntimeError):
+        run_startup_tasks(mode="sometimes", tasks=[task])
+
+
+def test_other_workers_lease_is_respected_until_it_expires(monkeypatch):
+    monkeypatch.setattr(startup_tasks, "_POLL_SECONDS", 0.01)
+    col = get_db()[SCHEMA_META_COL]
+    col.insert_one({"_id": "demo", "lease_owner": "other:1", "lease_until": startup_tasks._now_iso(60)})
+    task, calls = _counting_task()
+    assert run_once(task, wait_seconds=1) is False
+    assert calls == []
+
+    col.update_one({"_id": "demo"}, {"$set": {"lease_until": startup_tasks._now_iso(-1)}})
+    assert run_once(task, wait_seconds=1) is True
+    assert calls == [1]
+    assert col.find_one({"_id": "demo"})["applied_by"] == startup_tasks.WORKER_ID
+
+
+def test_failures_release_the_lease():
+    critical, _ = _counting_task(fail=True)
+    with pytest.raises(RuntimeError):
+        run_startup_tasks(tasks=[critical])
+    assert "lease_owner" not in get_db()[SCHEMA_META_COL].find_one({"_id": "demo"})
+
+    optional, calls = _counting_task(name="optional", critical=False, fail=True)
+    assert run_startup_tasks(tasks=[optional]) == {"optional": "failed"}
+    assert run_startup_tasks(tasks=[optional]) == {"optional": "failed"}
+    assert len(calls) == 2
+
+
+def test_sync_counters_uses_numeric_max():
+    db = get_db()
+    db.spells.insert_many([{"id": "0009"}, {"id": "10000"}, {"id": "draft"}, {"id": 12}])
+    db.effects.insert_one({"id": "0042"})
+    db.counters.insert_one({"_id": "effects", "seq": 100})
+    sync_counters()
+    seqs = {d["_id"]: d["seq"] for d in db.counters.find()}
+    assert seqs["spells"] == 10000
+    assert seqs["effects"] == 100
+    assert seqs["schools"] == 0
+    assert "campaign_chat" not in seqs
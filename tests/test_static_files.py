@@ -0,0 +1,115 @@
+import gzip
+import os
+
+import pytest
+from httpx import ASGITransport, AsyncClient
+from starlette.applications import Starlette
+from starlette.routing import Mount
+
+from scripts.precompress_static import precompress
+from server.src.modules.static_files import IMMUTABLE_CACHE_CONTROL, PrecompressedStaticFiles, is_fingerprinted
+from tests.conftest import wiki_client
+
+brotli = pytest.importorskip("brotli")
+
+SCRIPT = b"export const greet = (name) => `hello ${name}`;\n" * 200
+
+
+@pytest.mark.parametrize("name,expected", [
+    ("index-BLliIMS0.js", True),
+    ("index-kVVCbDqp.css", True),
+    ("vendor.3f9a1c2b.js", True),
+    ("chunk-deadbeef.js", True),
+    ("app.5d41402abc4b2a76b9719d911017c592.css", True),
+    ("app.5D41402ABC4B2A76B9719D911017C592.css", True),
+    ("index-item-manager.js", False),
+    ("global-auth-module.js", False),
+    ("logo_animated.mp4", False),
+])
+def test_fingerprint_detection(name, expected):
+    assert is_fingerprinted(name) is expected
+
+
+def _client(root):
+    app = Starlette(routes=[Mount("/s", PrecompressedStaticFiles(directory=str(root)))])
+    return AsyncClient(transport=ASGITransport(app=app), base_url="http://test")
+
+
+@pytest.mark.asyncio
+async def test_precompressed_variants_are_negotiated(tmp_path):
+    (tmp_path / "app-Ab12Cd34.js").write_bytes(SCRIPT)
+    (tmp_path / "plain.js").write_bytes(SCRIPT)
+    written, _, _ = precompress(tmp_path)
+    assert written == 4
+    assert precompress(tmp_path)[0] == 0
+
+    async with _client(tmp_path) as client:
+        br = await client.get("/s/app-Ab12Cd34.js", headers={"Accept-Encoding": "br, gzip"})
+        assert br.status_code == 200
+        assert br.headers["content-encoding"] == "br"
+        assert br.headers["content-type"].startswith("text/javascript")
+        assert br.headers["cache-control"] == IMMUTABLE_CACHE_CONTROL
+        assert "accept-encoding" in br.headers["vary"].lower()
+        assert int(br.headers["content-length"]) == (tmp_path / "app-Ab12Cd34.js.br").stat().st_size
+        assert br.content == SCRIPT
+
+        gz = await client.get("/s/plain.js", headers={"Accept-Encoding": "gzip"})
+        assert gz.headers["content-encoding"] == "gzip"
+        assert gz.headers["cache-control"] == "no-cache"
+        assert gz.content == SCRIPT
+
+        plain = await client.get("/s/plain.js", headers={"Accept-Encoding": "identity"})
+        assert "content-encoding" not in plain.headers
+        assert plain.content == SCRIPT
+
+        again = await client.get("/s/plain.js", headers={"Accept-Encoding": "gzip", "If-None-Match": gz.headers["etag"]})
+        assert again.status_code == 304
+
+        ranged = await client.get("/s/plain.js", headers={"Accept-Encoding": "br", "Range": "bytes=0-9"})
+        assert ranged.status_code == 206
+        assert "content-encoding" not in ranged.headers
+        assert ranged.content == SCRIPT[:10]
+
+
+@pytest.mark.asyncio
+async def test_stale_variants_are_ignored(tmp_path):
+    source = tmp_path / "plain.js"
+    source.write_bytes(SCRIPT)
+    (tmp_path / "plain.js.gz").write_bytes(gzip.compress(b"old build"))
+    stat = source.stat()
+    os.utime(tmp_path / "plain.js.gz", ns=(stat.st_atime_ns, stat.st_mtime_ns - 10**9))
+
+    async with _client(tmp_path) as client:
+        resp = await client.get("/s/plain.js", headers={"Accept-Encoding": "gzip"})
+        assert "content-encoding" not in resp.headers
+        assert resp.content == SCRIPT
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("path", ["/assets/logo/logo_animated.mp4", "/assets/dazzling_spark/dazzling_spark.mp3"])
+async def test_media_supports_range_requests(path):
+    async with wiki_client() as client:
+        full = await client.get(path)
+        assert full.status_code == 200
+        assert full.headers["accept-ranges"] == "bytes"
+        assert full.headers["cache-control"] == "public, max-age=86400"
+
+        part = await client.get(path, headers={"Range": "bytes=100-199", "Accept-Encoding": "gzip, br"})
+        assert part.status_code == 206
+        assert part.headers["content-range"] == f"bytes 100-199/{len(full.content)}"
+        assert "content-encoding" not in part.headers
+        assert part.content == full.content[100:200]
+
+
+@pytest.mark.asyncio
+async def test_vite_bundles_are_immutable_only_when_hashed():
+    async with wiki_client() as client:
+        hashed = await client.get("/character-manager/assets/index-BLliIMS0.js")
+        assert hashed.status_code == 200
+        assert hashed.headers["cache-control"] == IMMUTABLE_CACHE_CONTROL
+
+        unhashed = await client.get("/character-manager/assets/index-item-manager.js")
+        assert unhashed.headers["cache-control"] == "no-cache"
+
+        client_js = await client.get("/static/global-auth-module.js")
+        assert client_js.headers["cache-control"] == "no-cache"
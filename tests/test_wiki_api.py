@@ -410,3 +410,20 @@ async def test_editor_access_mode_own_requires_owner_or_assigned_editor():
             },
         )
         assert forbidden.status_code == 403
+
+
+@pytest.mark.asyncio
+async def test_wiki_role_is_cached_per_session_and_invalidated_on_role_change(db_queries):
+    get_db()["users"].insert_one({"username": "writer", "role": "user"})
+    async with wiki_client(role="user", username="writer", auth_token="writer-token") as writer:
+        with db_queries.capture():
+            for _ in range(3):
+                assert (await writer.post("/api/wiki/pages", json={"title": "X", "slug": "x"})).status_code == 403
+        assert db_queries.calls.count(("find_one", "users")) == 1, db_queries.report()
+
+        async with wiki_client(wiki_role="admin") as admin:
+            promoted = await admin.put("/api/wiki/users/writer/role", json={"wiki_role": "editor"})
+            assert promoted.status_code == 200
+
+        created = await writer.post("/api/wiki/pages", json={"title": "X", "slug": "x", "doc_json": {"type": "doc", "content": []}})
+        assert created.status_code == 200